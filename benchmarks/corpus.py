@@ -0,0 +1,281 @@
+import io
+import os
+import random
+import shutil
+import subprocess
+import wave
+from typing import Dict, List, TypedDict
+
+from mutagen.mp4 import MP4, MP4Cover
+from PIL import Image
+
+
+class CorpusSpec(TypedDict):
+    """Shape of a synthetic album corpus."""
+
+    """Seed all generated audio and images are derived from"""
+    seed: int
+
+    """Number of album folders to generate for each layout"""
+    folder_count: int
+
+    """Folder layouts to generate albums in ("bandcamp", "soulseek")"""
+    layouts: List[str]
+
+    """Number of tracks in each album"""
+    tracks_per_folder: int
+
+    """Track formats ("flac", "wav", "mp3", "m4a"), cycled over the tracks"""
+    track_formats: List[str]
+
+    """Duration of each track, in seconds"""
+    track_seconds: float
+
+    """Sample rate of each track"""
+    sample_rate: int
+
+    """Bit depth of each track (16 or 24)"""
+    bit_depth: int
+
+    """Number of audio channels of each track"""
+    channels: int
+
+    """Width and height of cover images, in pixels"""
+    cover_size: int
+
+    """Whether to add a loose `cover.jpg` to each album folder"""
+    loose_cover: bool
+
+    """Whether to embed the cover image in `.m4a` tracks"""
+    embedded_cover: bool
+
+
+# specs that can be picked by name when running benchmarks
+SPECS: Dict[str, CorpusSpec] = {
+    "quick": {
+        "seed": 1,
+        "folder_count": 2,
+        "layouts": ["bandcamp", "soulseek"],
+        "tracks_per_folder": 4,
+        "track_formats": ["flac", "wav", "mp3", "m4a"],
+        "track_seconds": 5.0,
+        "sample_rate": 44100,
+        "bit_depth": 16,
+        "channels": 2,
+        "cover_size": 600,
+        "loose_cover": True,
+        "embedded_cover": True,
+    },
+    "full": {
+        "seed": 1,
+        "folder_count": 10,
+        "layouts": ["bandcamp", "soulseek"],
+        "tracks_per_folder": 12,
+        "track_formats": ["flac", "flac", "wav", "mp3", "m4a"],
+        "track_seconds": 60.0,
+        "sample_rate": 96000,
+        "bit_depth": 24,
+        "channels": 2,
+        "cover_size": 3000,
+        "loose_cover": True,
+        "embedded_cover": True,
+    },
+}
+
+# ffmpeg encoder arguments for each track format generated from WAV
+ENCODER_ARGS: Dict[str, List[str]] = {
+    "flac": ["-c:a", "flac"],
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "320k"],
+    "m4a": ["-c:a", "alac"],
+}
+
+# number of frames of noise repeated to fill each track
+NOISE_FRAMES = 4096
+
+
+def album_folder_path(root: str, layout: str, index: int) -> str:
+    """
+    Get the path of an album folder in a layout, matching how downloads from
+    each source are nested.
+
+    Args:
+        root (str): corpus root folder
+        layout (str): folder layout ("bandcamp", "soulseek")
+        index (int): index of the album in the layout
+
+    Raises:
+        ValueError: if the layout is unknown
+
+    Returns:
+        str: album folder path
+    """
+    if layout == "bandcamp":
+        # [band folder] > [album folder] > [...files]
+        return os.path.join(
+            root, "bandcamp", f"Artist {index:02d}", f"Album {index:02d}"
+        )
+    if layout == "soulseek":
+        # [Soulseek user folder] > [album folder] > [...files]
+        return os.path.join(
+            root, "soulseek", "complete", f"user{index:02d}", f"Album {index:02d}"
+        )
+    raise ValueError(f"unknown layout: {layout}")
+
+
+def folder_globs(root: str) -> Dict[str, List[str]]:
+    """
+    Get globs locating album folders of each layout in a corpus, in the form
+    used by `FOLDER_TYPE_GLOB_MAPPINGS`.
+
+    Args:
+        root (str): corpus root folder
+
+    Returns:
+        Dict[str, List[str]]: layouts mapped to globs
+    """
+    return {
+        "bandcamp": [os.path.join(root, "bandcamp", "**", "*")],
+        "soulseek": [os.path.join(root, "soulseek", "complete", "**", "*")],
+    }
+
+
+def write_wav(path: str, spec: CorpusSpec, rng: random.Random) -> None:
+    """
+    Write a WAV file of noise with the duration and format of a spec.
+
+    Args:
+        path (str): path of file to write
+        spec (CorpusSpec): corpus spec
+        rng (random.Random): source of the noise
+    """
+    sample_width = spec["bit_depth"] // 8
+    frame_count = int(spec["track_seconds"] * spec["sample_rate"])
+    block = rng.randbytes(NOISE_FRAMES * sample_width * spec["channels"])
+    repeats, remainder = divmod(frame_count, NOISE_FRAMES)
+
+    with wave.open(path, "wb") as file:
+        file.setnchannels(spec["channels"])
+        file.setsampwidth(sample_width)
+        file.setframerate(spec["sample_rate"])
+        for _ in range(repeats):
+            file.writeframesraw(block)
+        file.writeframes(block[: remainder * sample_width * spec["channels"]])
+
+
+def encode_track(
+    wav_path: str, path: str, track_format: str, tags: Dict[str, str]
+) -> None:
+    """
+    Encode a WAV file into another track format with ffmpeg, reproducibly.
+
+    Args:
+        wav_path (str): source WAV file
+        path (str): path of file to write
+        track_format (str): track format ("flac", "mp3", "m4a")
+        tags (Dict[str, str]): tags to set on the track
+
+    Raises:
+        RuntimeError: if ffmpeg fails
+    """
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", wav_path]
+    command.extend(ENCODER_ARGS[track_format])
+    for key, value in tags.items():
+        command.extend(["-metadata", f"{key}={value}"])
+    command.extend(["-fflags", "+bitexact", "-flags:a", "+bitexact", path])
+
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode("utf-8", errors="replace").strip())
+
+
+def cover_image_data(spec: CorpusSpec, rng: random.Random) -> bytes:
+    """
+    Create a JPEG cover image of noise with the size of a spec.
+
+    Args:
+        spec (CorpusSpec): corpus spec
+        rng (random.Random): source of the noise
+
+    Returns:
+        bytes: JPEG image data
+    """
+    size = spec["cover_size"]
+    image = Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3))
+    data = io.BytesIO()
+    image.save(data, format="JPEG", quality=90)
+    return data.getvalue()
+
+
+def generate_album(
+    path: str, spec: CorpusSpec, rng: random.Random, album: str, artist: str
+) -> None:
+    """
+    Generate the tracks and cover images of a single album folder.
+
+    Args:
+        path (str): album folder to create
+        spec (CorpusSpec): corpus spec
+        rng (random.Random): source of the album's noise
+        album (str): album title
+        artist (str): album artist
+    """
+    os.makedirs(path, exist_ok=True)
+    cover = cover_image_data(spec, rng)
+    if spec["loose_cover"]:
+        with open(os.path.join(path, "cover.jpg"), "wb") as file:
+            file.write(cover)
+
+    wav_path = os.path.join(path, ".source.wav")
+    for number in range(1, spec["tracks_per_folder"] + 1):
+        track_format = spec["track_formats"][(number - 1) % len(spec["track_formats"])]
+        track_path = os.path.join(path, f"{number:02d} Track {number}.{track_format}")
+        write_wav(wav_path, spec, rng)
+
+        if track_format == "wav":
+            os.replace(wav_path, track_path)
+            continue
+
+        tags = {
+            "title": f"Track {number}",
+            "artist": artist,
+            "album": album,
+            "track": f"{number}/{spec['tracks_per_folder']}",
+        }
+        encode_track(wav_path, track_path, track_format, tags)
+        os.unlink(wav_path)
+
+        if track_format == "m4a" and spec["embedded_cover"]:
+            audio = MP4(track_path)
+            audio["covr"] = [MP4Cover(cover, imageformat=MP4Cover.FORMAT_JPEG)]
+            audio.save()
+
+
+def generate_corpus(root: str, spec: CorpusSpec) -> List[str]:
+    """
+    Generate a synthetic corpus of album folders. The same spec always
+    generates the same audio and images.
+
+    Args:
+        root (str): folder to generate the corpus in
+        spec (CorpusSpec): corpus spec
+
+    Raises:
+        RuntimeError: if the spec has formats that need ffmpeg, which is missing
+
+    Returns:
+        List[str]: paths of the generated album folders
+    """
+    needs_ffmpeg = any(track_format != "wav" for track_format in spec["track_formats"])
+    if needs_ffmpeg and shutil.which("ffmpeg") is None:
+        raise RuntimeError("ffmpeg is needed to generate non-WAV tracks")
+
+    paths: List[str] = []
+    for layout in spec["layouts"]:
+        for index in range(spec["folder_count"]):
+            path = album_folder_path(root, layout, index)
+            # derive each album from its own seed, so albums do not depend on
+            # which others are generated
+            rng = random.Random(f"{spec['seed']}-{layout}-{index}")
+            generate_album(path, spec, rng, f"Album {index:02d}", f"Artist {index:02d}")
+            paths.append(path)
+    return paths
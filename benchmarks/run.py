@@ -0,0 +1,371 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple, TypedDict
+from unittest.mock import patch
+
+from benchmarks.corpus import SPECS, CorpusSpec, folder_globs, generate_corpus
+from src.folder_classes.bandcamp_folder import BandCampAlbumFolder
+from src.folder_classes.soulseek_folder import SoulseekAlbumFolder
+from src.lib.constants import APPLE_MUSIC_COMPATIBLE_MIME_TYPES
+from src.lib.cover_image import CoverImage, CoverImagesInAlbumFiles
+from src.lib.file_convertor import FileConvertor
+from src.lib.helpers import file_size, find_files_by_mime_type
+from src.lib.logger import logger
+from src.main import discover_folders
+
+
+class StageResult(TypedDict):
+    """Timings of a benchmarked stage over all repeats."""
+
+    """Wall clock seconds of each repeat"""
+    runs: List[float]
+
+    """Fastest repeat, in seconds"""
+    min: float
+
+    """Median repeat, in seconds"""
+    median: float
+
+    """Number of items (folders, files) handled in each repeat"""
+    items: int
+
+    """Bytes read or written in each repeat"""
+    bytes: int
+
+
+# a stage benchmark times one repeat over a fresh copy of the corpus, returning
+# the number of items and bytes it handled
+StageBenchmark = Callable[[str, List[str]], Tuple[int, int]]
+
+# default folder to write results to
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def album_paths(root: str, pristine_root: str, pristine_paths: List[str]) -> List[str]:
+    """
+    Map album folder paths of the pristine corpus into a copy of it.
+
+    Args:
+        root (str): root of the corpus copy
+        pristine_root (str): root of the pristine corpus
+        pristine_paths (List[str]): album folders in the pristine corpus
+
+    Returns:
+        List[str]: album folders in the copy
+    """
+    return [
+        os.path.join(root, os.path.relpath(path, pristine_root))
+        for path in pristine_paths
+    ]
+
+
+def compatible_files(path: str) -> List[str]:
+    """
+    Find Apple Music compatible tracks in an album folder.
+
+    Args:
+        path (str): album folder
+
+    Returns:
+        List[str]: paths of compatible tracks
+    """
+    return find_files_by_mime_type(path, APPLE_MUSIC_COMPATIBLE_MIME_TYPES)
+
+
+def bench_discovery(root: str, paths: List[str]) -> Tuple[int, int]:
+    """
+    Discover album folders the way `src.main` does.
+
+    Args:
+        root (str): corpus root
+        paths (List[str]): album folders in the corpus
+
+    Returns:
+        Tuple[int, int]: folders found, and no bytes
+    """
+    globs = folder_globs(root)
+    folders = discover_folders(
+        {
+            BandCampAlbumFolder: globs["bandcamp"],
+            SoulseekAlbumFolder: globs["soulseek"],
+        }
+    )
+    return len(folders), 0
+
+
+def bench_conversion(root: str, paths: List[str]) -> Tuple[int, int]:
+    """
+    Convert all incompatible tracks in every album folder.
+
+    Args:
+        root (str): corpus root
+        paths (List[str]): album folders in the corpus
+
+    Returns:
+        Tuple[int, int]: files converted, and bytes of their sources and outputs
+    """
+    count = 0
+    size = 0
+    for path in paths:
+        for file in FileConvertor(path).convert_all():
+            count += 1
+            size += file_size(os.path.join(file["path"], file["old_name"]))
+            size += file_size(os.path.join(file["path"], file["new_name"]))
+    return count, size
+
+
+def prepare_converted(paths: List[str]) -> None:
+    """
+    Convert all album folders ahead of stages that need compatible tracks.
+
+    Args:
+        paths (List[str]): album folders in the corpus
+    """
+    for path in paths:
+        for _ in FileConvertor(path).convert_all():
+            pass
+
+
+def bench_tagging(root: str, paths: List[str]) -> Tuple[int, int]:
+    """
+    Tag every compatible track with its album's loose cover image.
+
+    Args:
+        root (str): corpus root
+        paths (List[str]): album folders in the corpus
+
+    Returns:
+        Tuple[int, int]: tracks tagged, and bytes of the tagged tracks
+    """
+    count = 0
+    size = 0
+    for path in paths:
+        cover_path = os.path.join(path, "cover.jpg")
+        if not os.path.isfile(cover_path):
+            continue
+        cover = CoverImage(cover_path)
+        for track in compatible_files(path):
+            cover.tag_music_file(track)
+            count += 1
+            size += file_size(track)
+    return count, size
+
+
+def bench_cover_scanning(root: str, paths: List[str]) -> Tuple[int, int]:
+    """
+    Find the unique cover images embedded in every album folder's tracks.
+
+    Args:
+        root (str): corpus root
+        paths (List[str]): album folders in the corpus
+
+    Returns:
+        Tuple[int, int]: folders scanned, and bytes of the scanned tracks
+    """
+    size = 0
+    for path in paths:
+        size += sum(file_size(track) for track in compatible_files(path))
+        for image_path in CoverImagesInAlbumFiles(path).process():
+            os.unlink(image_path)
+    return len(paths), size
+
+
+def bench_process_files(root: str, paths: List[str]) -> Tuple[int, int]:
+    """
+    Run every bandcamp album folder through `process_files`, with an importer
+    that copies tracks into a stand-in library instead of Apple Music.
+
+    Args:
+        root (str): corpus root
+        paths (List[str]): album folders in the corpus
+
+    Returns:
+        Tuple[int, int]: tracks imported, and bytes of the imported tracks
+    """
+    library = os.path.join(root, "library")
+    os.makedirs(library)
+    imported: List[str] = []
+
+    def import_file(file_path: str) -> None:
+        """
+        Copy a track into the stand-in library.
+
+        Args:
+            file_path (str): track to import
+        """
+        shutil.copy(file_path, library)
+        imported.append(file_path)
+
+    with patch("src.lib.abstract_album_folder.import_file_to_apple_music", import_file):
+        for path in paths:
+            if os.path.isfile(os.path.join(path, "cover.jpg")):
+                BandCampAlbumFolder(path).process_files()
+
+    return len(imported), sum(file_size(path) for path in imported)
+
+
+# stages mapped to their benchmark, and whether they need converted tracks
+STAGES: Dict[str, Tuple[StageBenchmark, bool]] = {
+    "discovery": (bench_discovery, False),
+    "conversion": (bench_conversion, False),
+    "tagging": (bench_tagging, True),
+    "cover scanning": (bench_cover_scanning, True),
+    "process_files": (bench_process_files, False),
+}
+
+
+def environment() -> Dict[str, Optional[str]]:
+    """
+    Describe the environment results were measured in.
+
+    Returns:
+        Dict[str, Optional[str]]: python, platform, ffmpeg and git versions
+    """
+
+    def command_output(command: List[str]) -> Optional[str]:
+        """
+        Get the first line of a command's output, if it runs.
+
+        Args:
+            command (List[str]): command to run
+
+        Returns:
+            Optional[str]: first line of output
+        """
+        try:
+            result = subprocess.run(command, capture_output=True, check=True)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return result.stdout.decode("utf-8").splitlines()[0]
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "ffmpeg": command_output(["ffmpeg", "-version"]),
+        "commit": command_output(["git", "rev-parse", "HEAD"]),
+    }
+
+
+def run_benchmarks(
+    spec: CorpusSpec, stages: List[str], repeat: int, corpus_dir: Optional[str]
+) -> Dict[str, StageResult]:
+    """
+    Generate a corpus and time each stage over fresh copies of it.
+
+    Args:
+        spec (CorpusSpec): spec of the corpus to generate
+        stages (List[str]): names of stages to benchmark
+        repeat (int): number of times to time each stage
+        corpus_dir (Optional[str]): folder to generate the corpus in and keep
+                                    it, or None for a temporary folder
+
+    Returns:
+        Dict[str, StageResult]: results of each stage
+    """
+    results: Dict[str, StageResult] = {}
+    with tempfile.TemporaryDirectory(prefix="apple_music_import_bench_") as work_dir:
+        pristine_root = corpus_dir or os.path.join(work_dir, "pristine")
+        pristine_paths = generate_corpus(pristine_root, spec)
+
+        for stage in stages:
+            benchmark, needs_conversion = STAGES[stage]
+            runs: List[float] = []
+            items = 0
+            size = 0
+            for i in range(repeat):
+                # each repeat gets an untouched copy of the corpus
+                root = os.path.join(work_dir, f"{stage}-{i}".replace(" ", "-"))
+                shutil.copytree(pristine_root, root)
+                paths = album_paths(root, pristine_root, pristine_paths)
+                if needs_conversion:
+                    prepare_converted(paths)
+
+                start = time.perf_counter()
+                items, size = benchmark(root, paths)
+                runs.append(time.perf_counter() - start)
+                shutil.rmtree(root)
+
+            results[stage] = {
+                "runs": runs,
+                "min": min(runs),
+                "median": statistics.median(runs),
+                "items": items,
+                "bytes": size,
+            }
+    return results
+
+
+def compare(results: Dict[str, StageResult], baseline: Dict[str, StageResult]) -> None:
+    """
+    Print how each stage's median time changed against a baseline.
+
+    Args:
+        results (Dict[str, StageResult]): new results
+        baseline (Dict[str, StageResult]): results to compare against
+    """
+    print(f"{'stage':<16} {'baseline (s)':>12} {'median (s)':>12} {'change':>8}")
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        before = baseline[stage]["median"]
+        change = f"{result['median'] / before - 1:+.1%}" if before else ""
+        print(f"{stage:<16} {before:>12.3f} {result['median']:>12.3f} {change:>8}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Run benchmarks and write their results as JSON.
+
+    Args:
+        argv (Optional[List[str]]): command line arguments. Defaults to None, for
+                                    the arguments the benchmarks were run with.
+    """
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.run", description="benchmark each pipeline stage"
+    )
+    parser.add_argument("--spec", choices=sorted(SPECS), default="quick")
+    parser.add_argument(
+        "--stage", action="append", choices=list(STAGES), help="defaults to all"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--corpus-dir", help="generate and keep the corpus here")
+    parser.add_argument("--output", help="results file (defaults to a new file)")
+    parser.add_argument("--compare", metavar="RESULTS", help="baseline results file")
+    args = parser.parse_args(argv)
+
+    # keep stage logging from being timed along with the stages
+    logger.setLevel(logging.WARNING)
+
+    spec = SPECS[args.spec]
+    results = run_benchmarks(
+        spec, args.stage or list(STAGES), args.repeat, args.corpus_dir
+    )
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{args.spec}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(
+            {"spec": spec, "environment": environment(), "stages": results},
+            file,
+            indent=2,
+        )
+    print(f"results written to: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            compare(results, json.load(file)["stages"])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, TypedDict
+
+from benchmarks.run import RESULTS_DIR, environment
+
+# root of the repo, which the app is run from
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# time the import of `src.main` from inside the interpreter, so interpreter
+# startup is not counted
+IMPORT_TIMER = (
+    "import time; start = time.perf_counter(); import src.main; "
+    + "print(time.perf_counter() - start)"
+)
+
+
+class StartupResult(TypedDict):
+    """Timings of a startup measurement over all repeats."""
+
+    """Seconds of each repeat"""
+    runs: List[float]
+
+    """Fastest repeat, in seconds"""
+    min: float
+
+    """Median repeat, in seconds"""
+    median: float
+
+
+def summarize(runs: List[float]) -> StartupResult:
+    """
+    Summarize the repeats of a measurement.
+
+    Args:
+        runs (List[float]): seconds of each repeat
+
+    Returns:
+        StartupResult: summarized measurement
+    """
+    return {"runs": runs, "min": min(runs), "median": statistics.median(runs)}
+
+
+def time_command(command: List[str], env: Dict[str, str]) -> float:
+    """
+    Time a command from start to exit.
+
+    Args:
+        command (List[str]): command to run
+        env (Dict[str, str]): environment to run it in
+
+    Returns:
+        float: wall clock seconds the command took
+    """
+    start = time.perf_counter()
+    subprocess.run(command, cwd=REPO_DIR, env=env, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def measure_startup(repeat: int) -> Dict[str, StartupResult]:
+    """
+    Time an empty run of the app, where no album folders are found, against
+    the startup of a bare interpreter.
+
+    Args:
+        repeat (int): number of times to time each measurement
+
+    Returns:
+        Dict[str, StartupResult]: results of each measurement
+    """
+    with tempfile.TemporaryDirectory(prefix="apple_music_import_startup_") as home:
+        # an empty home folder means the default folder globs match nothing
+        env = {**os.environ, "HOME": home}
+        interpreter: List[float] = []
+        empty_run: List[float] = []
+        import_time: List[float] = []
+
+        for _ in range(repeat):
+            interpreter.append(time_command([sys.executable, "-c", "pass"], env))
+            empty_run.append(time_command([sys.executable, "-m", "src.main"], env))
+            result = subprocess.run(
+                [sys.executable, "-c", IMPORT_TIMER],
+                cwd=REPO_DIR,
+                env=env,
+                capture_output=True,
+                check=True,
+            )
+            import_time.append(float(result.stdout.decode("utf-8").strip()))
+
+    return {
+        "interpreter": summarize(interpreter),
+        "empty run": summarize(empty_run),
+        "empty run without interpreter": summarize(
+            [run - base for run, base in zip(empty_run, interpreter)]
+        ),
+        "import src.main": summarize(import_time),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Measure app startup and write the results as JSON.
+
+    Args:
+        argv (Optional[List[str]]): command line arguments. Defaults to None, for
+                                    the arguments the benchmark was run with.
+    """
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.startup", description="benchmark app startup"
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", help="results file (defaults to a new file)")
+    args = parser.parse_args(argv)
+
+    results = measure_startup(args.repeat)
+    for name, result in results.items():
+        print(f"{name:<32} median {result['median'] * 1000:8.1f} ms")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-startup.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump({"environment": environment(), "startup": results}, file, indent=2)
+    print(f"results written to: {output}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,15 +1,145 @@
-from typing import Dict, List, Type
+from typing import Dict, List, Optional, Type
 
+from src.folder_classes.bandcamp_archive_folder import BandCampArchiveAlbumFolder
 from src.folder_classes.bandcamp_folder import BandCampAlbumFolder
 from src.folder_classes.soulseek_folder import SoulseekAlbumFolder
 from src.lib.abstract_album_folder import AbstractAlbumFolder
+from src.lib.governor import IOPriority
+from src.lib.output_profile import OutputProfile
+from src.lib.scheduler import SchedulePolicy
 
 # Map album folder classes to lists of globs for where those folder
 # can be located
 FOLDER_TYPE_GLOB_MAPPINGS: Dict[Type[AbstractAlbumFolder], List[str]] = {
     BandCampAlbumFolder: ["~/Music/bandcamp/**/*"],
+    BandCampArchiveAlbumFolder: ["~/Music/bandcamp/*.zip"],
     SoulseekAlbumFolder: ["~/Music/soulseek/complete/**/*"],
 }
 
+# Order to process discovered folders in:
+# - "shortest-job-first": cheapest folders first, estimated from a probe of each
+#   folder and throughput measured in previous runs, so small albums are not
+#   held up behind large box sets
+# - "oldest-first": folders downloaded earliest first
+# - "priority": folder types with the highest `FOLDER_TYPE_PRIORITIES` first,
+#   cheapest first within a priority
+# - "discovery": the order folders were discovered in
+SCHEDULE_POLICY: SchedulePolicy = "shortest-job-first"
+
+# Priority of each folder type for the "priority" `SCHEDULE_POLICY`. Types not
+# listed have priority 0
+FOLDER_TYPE_PRIORITIES: Dict[Type[AbstractAlbumFolder], int] = {}
+
+# Output profile converted files of each folder type are encoded with, from
+# `src/lib/output_profile.py`: `ALAC_AS_SOURCE` keeps the source's sample rate
+# and bit depth, `ALAC_24_48` resamples hi-res sources to at most 24-bit/48 kHz
+# and `AAC_256` encodes 256 kbit/s AAC. Compatible tracks that don't meet their
+# profile are converted too. Types not listed use `ALAC_AS_SOURCE`, e.g.
+# `{SoulseekAlbumFolder: ALAC_24_48}`
+FOLDER_TYPE_OUTPUT_PROFILES: Dict[Type[AbstractAlbumFolder], OutputProfile] = {}
+
 # If true, will delete found folders after successful import
 DELETE_FOLDER_AFTER_IMPORT: bool = True
+
+# Number of processed folders to delete together, with a single look at each
+# parent folder and renaming into the trash where it is on the same filesystem.
+# Whatever is left is deleted at the end of the run. If 0, each folder is
+# deleted as soon as it is processed
+DELETION_BATCH_SIZE: int = 20
+
+# If true, each track is tagged and imported as soon as it is converted instead
+# of converting the whole album before tagging and importing any of it
+STREAM_TRACKS: bool = False
+
+# Maximum number of converted tracks to hold ahead of tagging and import when
+# `STREAM_TRACKS` is set
+STREAM_BUFFER_SIZE: int = 2
+
+# Whether to measure the loudness of every track (ITU-R BS.1770) and tag it with
+# Sound Check (iTunNORM) and ReplayGain 2.0 track and album gains, so Apple
+# Music doesn't have to analyze it after import. Converted tracks are measured
+# from the conversion's own decode pass
+LOUDNESS_ANALYSIS: bool = True
+
+# Whether to decode every converted file alongside its source and check they
+# hold the same audio, sample for sample for lossless sources. A file that
+# doesn't match fails its conversion, so the folder isn't deleted
+VERIFY_CONVERSIONS: bool = True
+
+# Maximum number of encoders (file conversions and cue sheet splits) running at
+# once. With `AUTOTUNE_PATH` set, tuning never runs more encoders than this, and
+# starts from it for sources that were never tuned
+MAX_CONCURRENT_ENCODERS: int = 2
+
+# If set, the number of encoders running at once and the threads each uses are
+# hill-climbed while conversions run, within CPU and memory limits and
+# `MAX_CONCURRENT_ENCODERS`, and the fastest settings found for each type of
+# source (codec, resolution, local or network) are kept in this file for the
+# next run
+AUTOTUNE_PATH: Optional[str] = "~/Music/apple_music_import/autotune.json"
+
+# If set, encoders run at this niceness (0 to 19, higher is lower CPU priority)
+ENCODER_NICE: Optional[int] = 10
+
+# If set, encoders run at this IO priority ("low", "idle"), with `ionice` on
+# Linux and `taskpolicy` on macOS
+ENCODER_IO_PRIORITY: Optional[IOPriority] = "low"
+
+# Bytes that must stay free on a volume. Folders whose estimated output would
+# leave less are skipped, and conversions and tagging that would are failed
+# before they start
+MIN_FREE_SPACE: int = 2 * 1024 * 1024 * 1024
+
+# If set, each folder is copied into a new folder in this local directory and
+# processed there, so slow or network mounted sources are read once. Files that
+# processing changes are written back, unless the folder is deleted. Tracks are
+# imported from the scratch copy, so Apple Music must be set to copy files to
+# its media folder when adding them
+SCRATCH_DIR: Optional[str] = None
+
+# Number of files copied at once when staging a folder in `SCRATCH_DIR`
+STAGING_COPY_WORKERS: int = 4
+
+# If set, file conversions are published to a job queue in this SQLite file for
+# worker processes (`apple_music_import --worker`) to convert, on any host that
+# mounts the file and the music folders at the same paths. The run converts
+# jobs too while it waits, then tags and imports as usual. Folders staged in
+# `SCRATCH_DIR` and archives are always converted locally
+JOB_QUEUE_PATH: Optional[str] = None
+
+# Seconds a worker holds a job without renewing its lease, after which another
+# worker takes the job over
+JOB_LEASE_SECONDS: float = 60.0
+
+# Whether to show progress of the run (folders and tracks done per stage, current
+# throughput and estimated time left): redrawn below the log on a terminal, or
+# logged every `PROGRESS_INTERVAL` seconds otherwise
+PROGRESS_DISPLAY: bool = True
+
+# Seconds between progress lines when output is not a terminal
+PROGRESS_INTERVAL: float = 60.0
+
+# If set, every log event is also written to this file as a JSON object per
+# line, without color codes, for log shipping
+JSON_LOG_PATH: Optional[str] = None
+
+# If set, run metrics (folders and tracks processed, conversion outcomes, bytes
+# read and written, stage latencies) are written to this file in the Prometheus
+# text format after every folder, e.g. for the node exporter textfile collector
+METRICS_TEXTFILE_PATH: Optional[str] = None
+
+# If set, run metrics are also served on this local port while the app runs
+METRICS_PORT: Optional[int] = None
+
+# Folder that runs with `--profile` write their profiles to, in a new folder
+# per run
+PROFILE_DIR: str = "~/Music/apple_music_import/profiles"
+
+# If set, every completed conversion, tag, import and deletion is recorded in
+# this file, so a run that dies halfway is continued where it stopped by the
+# next run instead of starting over
+JOURNAL_PATH: Optional[str] = "~/Music/apple_music_import/journal.jsonl"
+
+# File that throughput measured in each run is kept in, to estimate the cost of
+# runs planned with `--plan`
+THROUGHPUT_HISTORY_PATH: str = "~/Music/apple_music_import/throughput.json"
@@ -0,0 +1,186 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from typing import List, Tuple
+
+from src.lib.abstract_album_folder import AbstractAlbumFolder
+from src.lib.archive_file_convertor import (
+    ArchiveFileConvertor,
+    classify_archive_member,
+    extract_archive_member,
+    member_paths,
+)
+from src.lib.cover_image import CoverImage
+from src.lib.file_convertor import FileConvertor
+from src.lib.folder_snapshot import FolderSnapshot
+from src.lib.logger import logger
+from src.lib.output_profile import matches_profile
+from src.lib.planner import AlbumProbe
+from src.lib.staging import copy_file
+from src.lib.trash import move_to_trash
+
+
+class BandCampArchiveAlbumFolder(AbstractAlbumFolder):
+    """
+    Concrete album folder class for processing bandcamp downloads that are
+    still zipped. Tracks are streamed straight out of the archive into
+    conversion, so the archive never has to be unzipped by hand.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self.cover_image_member_name = "cover.jpg"
+        self.archive_path = path
+        super().__init__(path)
+
+    @property
+    def folder_type(self) -> str:
+        return "bandcamp archive"
+
+    @classmethod
+    def is_album_path(cls, path: str) -> bool:
+        """
+        Check if a matched path is a zip archive.
+
+        Args:
+            path (str): matched path
+
+        Returns:
+            bool: whether the path is a zip archive
+        """
+        return os.path.isfile(path) and zipfile.is_zipfile(path)
+
+    def _create_file_convertor(self) -> FileConvertor:
+        """
+        Create a convertor that streams incompatible tracks out of the archive.
+
+        Returns:
+            FileConvertor: convertor writing to the working path
+        """
+        return ArchiveFileConvertor(self.archive_path, self.working_path, self.snapshot)
+
+    def _probe_compatible_files(self) -> List[Tuple[str, int]]:
+        """
+        Find the archive members that are already compatible, without
+        extracting them.
+
+        Returns:
+            List[Tuple[str, int]]: path it would be extracted to and uncompressed
+                                   size of each member
+        """
+        compatible_files: List[Tuple[str, int]] = []
+        with zipfile.ZipFile(self.path) as archive:
+            paths = member_paths(archive)
+            for info in archive.infolist():
+                relative_path = paths.get(info.filename)
+                if relative_path is None:
+                    continue
+                if os.path.basename(relative_path) == self.cover_image_member_name:
+                    continue
+                media_info = classify_archive_member(archive, info)
+                if matches_profile(media_info, self.output_profile):
+                    compatible_files.append((relative_path, info.file_size))
+        return compatible_files
+
+    def _probe_cover_decision(self) -> str:
+        """
+        Describe how the cover image would be chosen from the archive.
+
+        Returns:
+            str: cover image decision
+        """
+        with zipfile.ZipFile(self.path) as archive:
+            names = [os.path.basename(name) for name in archive.namelist()]
+        if self.cover_image_member_name in names:
+            return f"use {self.cover_image_member_name} from the archive"
+        return "prompt to pick from covers embedded in tracks, or for a URL"
+
+    def output_dir(self) -> str:
+        """
+        Get a path on the volume the archive is extracted and converted to.
+
+        Returns:
+            str: path on the output volume
+        """
+        return self.scratch_dir or tempfile.gettempdir()
+
+    def estimate_output_size(self, probe: AlbumProbe) -> int:
+        """
+        Extend abstract class method to count compatible tracks, which are
+        extracted from the archive too.
+
+        Args:
+            probe (AlbumProbe): probe of the album
+
+        Returns:
+            int: estimated bytes written
+        """
+        extracted = sum(size for _, size in probe["compatible_files"])
+        return super().estimate_output_size(probe) + extracted
+
+    def _prepare(self) -> None:
+        """
+        Extract only the cover image and already compatible tracks from the
+        archive into a working folder. Incompatible tracks are converted straight
+        out of the archive into the working folder later.
+
+        With a scratch directory set, the working folder is created there and
+        the archive is copied into it first, so it is only read once from a slow
+        source.
+        """
+        if self.scratch_dir is not None:
+            os.makedirs(self.scratch_dir, exist_ok=True)
+        self.working_path = tempfile.mkdtemp(
+            prefix="apple_music_import_", dir=self.scratch_dir
+        )
+        self.snapshot = FolderSnapshot(self.working_path, recursive=True)
+
+        if self.scratch_dir is not None:
+            end_section = logger.log_section("staging archive", kind="stage")
+            staged_archive = os.path.join(
+                self.working_path, f".{os.path.basename(self.path)}"
+            )
+            copy_file(self.path, staged_archive)
+            self.archive_path = staged_archive
+            size = os.path.getsize(staged_archive)
+            end_section(bytes_processed=size * 2, bytes_written=size)
+
+        with zipfile.ZipFile(self.archive_path) as archive:
+            paths = member_paths(archive)
+            for info in archive.infolist():
+                relative_path = paths.get(info.filename)
+                if relative_path is None:
+                    continue
+
+                if os.path.basename(relative_path) == self.cover_image_member_name:
+                    cover_path = extract_archive_member(
+                        archive, info, self.working_path, relative_path
+                    )
+                    self.cover_image = CoverImage(cover_path)
+                    continue
+
+                media_info = classify_archive_member(archive, info)
+                if matches_profile(media_info, self.output_profile):
+                    extract_archive_member(
+                        archive, info, self.working_path, relative_path
+                    )
+
+    def _cleanup(self) -> None:
+        """Remove the working folder the archive was processed in."""
+        if self.working_path != self.path:
+            shutil.rmtree(self.working_path, ignore_errors=True)
+            self.working_path = self.path
+            self.snapshot = FolderSnapshot(self.path, recursive=True)
+        self.archive_path = self.path
+
+    def delete_folder(self):
+        """
+        Extend abstract class method to delete the archive, which holds the whole
+        album.
+        """
+
+        move_to_trash(self.path)
+        logger.indent()
+        logger.info(f"archive was deleted ({self.path})")
+        logger.dedent()
@@ -8,6 +8,9 @@ class BandCampAlbumFolder(AbstractAlbumFolder):
     Concrete album folder class for processing bandcamp downloads.
     """
 
+    # album folders are nested in a folder of their own, which goes once empty
+    delete_empty_parent = True
+
     def __init__(self, path: str):
         self._path = path
         super().__init__(path, "cover.jpg")
@@ -8,6 +8,9 @@ class SoulseekAlbumFolder(AbstractAlbumFolder):
     Concrete album folder class for processing completed Soulseek downloads.
     """
 
+    # album folders are nested in a folder of their own, which goes once empty
+    delete_empty_parent = True
+
     def __init__(self, path: str):
         self._path = path
         super().__init__(path)
@@ -1,13 +1,42 @@
 import os
+import shutil
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from itertools import chain
+from typing import TYPE_CHECKING, Dict, Generator, List, Optional, Tuple
 
 from src.lib.apple_music import import_file_to_apple_music
 from src.lib.constants import APPLE_MUSIC_COMPATIBLE_MIME_TYPES, IMAGE_EXTENSIONS
 from src.lib.cover_image import CoverImage, CoverImagesInAlbumFiles
-from src.lib.file_convertor import FileConvertor
-from src.lib.helpers import find_files_by_ext, find_files_by_mime_type
+from src.lib.deletion import DeletionBatch
+from src.lib.file_convertor import FileConversion, FileConvertor
+from src.lib.folder_snapshot import FolderSnapshot, disc_number
+from src.lib.governor import (
+    DEFAULT_COVER_IMAGE_SIZE,
+    estimate_output_size,
+    governor,
+)
+from src.lib.helpers import (
+    buffered_generator,
+    file_size,
+    find_files_by_ext,
+    find_files_by_mime_type,
+)
+from src.lib.job_queue import JobQueue
 from src.lib.logger import logger
+from src.lib.loudness import (
+    TrackLoudness,
+    album_loudness,
+    analyze_file,
+    loudness_tags,
+    write_loudness_tags,
+)
+from src.lib.media_classifier import classify_media_file
+from src.lib.output_profile import ALAC_AS_SOURCE, OutputProfile, matches_profile
+from src.lib.planner import AlbumProbe, PlannedConversion
+from src.lib.staging import FolderState, stage_folder, write_back
+
+if TYPE_CHECKING:
+    from src.lib.journal import RunJournal
 
 
 class AbstractAlbumFolder(ABC):
@@ -15,14 +44,25 @@ class AbstractAlbumFolder(ABC):
     Abstract class for processing images from a folder that contains
     music files to import.
 
+    The folder is listed as a whole tree, so an album split into disc sub
+    folders is converted, tagged and imported as a single album, with each
+    track tagged with the disc its sub folder is named after.
+
     Args:
         path (str): path to the folder
         cover_image_file_name (Optional[str]): name of image file within the folder
     """
 
+    # whether deleting the folder also deletes its parent, once nothing else is
+    # left in it
+    delete_empty_parent = False
+
     def __init__(self, path: str, cover_image_file_name: Optional[str] = None) -> None:
         self.path = path
+        self.working_path = path
+        self.snapshot = FolderSnapshot(path, recursive=True)
         self.compatible_file_paths: List[str] = []
+        self.disc_count = 0
         self.file_convertor: Optional[FileConvertor] = None
         self.cover_image = (
             CoverImage(os.path.join(path, cover_image_file_name))
@@ -30,6 +70,18 @@ class AbstractAlbumFolder(ABC):
             else None
         )
         self.has_errors = False
+        self.journal: Optional["RunJournal"] = None
+        self.job_queue: Optional[JobQueue] = None
+        self.analyze_loudness = False
+        self.verify_conversions = False
+        self.output_profile: OutputProfile = ALAC_AS_SOURCE
+        self.track_loudness: Dict[str, TrackLoudness] = {}
+        self.album_loudness: Optional[TrackLoudness] = None
+        self.delete_folder_after = False
+        self.deletions: Optional[DeletionBatch] = None
+        self.scratch_dir: Optional[str] = None
+        self.staging_workers = 1
+        self.staged_state: FolderState = {}
 
     @property
     @abstractmethod
@@ -37,22 +89,252 @@ class AbstractAlbumFolder(ABC):
         """Friendly unique name to call the folder type"""
         pass
 
+    @classmethod
+    def is_album_path(cls, path: str) -> bool:
+        """
+        Check if a path matched by this folder type's globs is an album this
+        folder type can process.
+
+        Args:
+            path (str): matched path
+
+        Returns:
+            bool: whether the path is an album of this folder type
+        """
+        return os.path.isdir(path)
+
+    def _create_file_convertor(self) -> FileConvertor:
+        """
+        Create the convertor for incompatible files in the album.
+
+        Returns:
+            FileConvertor: convertor writing to the working path
+        """
+        return FileConvertor(self.working_path, self.snapshot)
+
+    def _prepare(self) -> None:
+        """
+        Make the album's files available at `working_path` before processing.
+        Files are processed in place, unless a scratch directory is set to stage
+        the folder in.
+        """
+        if self.scratch_dir is None:
+            return
+        self.working_path, self.staged_state = stage_folder(
+            self.path, self.scratch_dir, self.staging_workers
+        )
+        self.snapshot = FolderSnapshot(self.working_path, recursive=True)
+
+    def _will_delete(self) -> bool:
+        """
+        Check if the folder will be deleted once processing is done.
+
+        Returns:
+            bool: whether the folder will be deleted
+        """
+        return (
+            self.delete_folder_after
+            and not self.has_errors
+            and len(self.compatible_file_paths) > 0
+        )
+
+    def _cleanup(self) -> None:
+        """
+        Clean up anything `_prepare` created once processing is done. Files
+        created or changed in a staged folder are written back to the folder,
+        unless it is about to be deleted.
+        """
+        if self.working_path == self.path:
+            return
+        try:
+            if not self._will_delete():
+                count = write_back(
+                    self.working_path,
+                    self.path,
+                    self.staged_state,
+                    self.staging_workers,
+                )
+                logger.info(f"wrote {count} changed files back to '{self.path}'")
+        finally:
+            shutil.rmtree(self.working_path, ignore_errors=True)
+            self.working_path = self.path
+            self.snapshot = FolderSnapshot(self.path, recursive=True)
+
+    def _meeting_profile(self, paths: List[str]) -> List[str]:
+        """
+        Leave out compatible files that don't meet the folder's output profile,
+        which are converted instead of imported as they are.
+
+        Args:
+            paths (List[str]): paths of compatible files
+
+        Returns:
+            List[str]: paths of the files that meet the profile
+        """
+        media_info = {
+            entry["path"]: entry["media_info"]
+            for entry in self.snapshot.files()
+            if entry["media_info"] is not None
+        }
+        return [
+            path
+            for path in paths
+            if path not in media_info
+            or matches_profile(media_info[path], self.output_profile)
+        ]
+
+    def _probe_compatible_files(self) -> List[Tuple[str, int]]:
+        """
+        Find the album's files that are already compatible, without preparing
+        the album.
+
+        Returns:
+            List[Tuple[str, int]]: path relative to the album folder and size of
+                                   each compatible file
+        """
+        return [
+            (os.path.relpath(path, self.path), file_size(path))
+            for path in self._meeting_profile(
+                find_files_by_mime_type(
+                    self.path, APPLE_MUSIC_COMPATIBLE_MIME_TYPES, self.snapshot
+                )
+            )
+        ]
+
+    def _probe_cover_decision(self) -> str:
+        """
+        Describe how the cover image would be chosen, without extracting any
+        covers embedded in tracks.
+
+        Returns:
+            str: cover image decision
+        """
+        if self.cover_image:
+            return f"use {os.path.basename(self.cover_image.path)}"
+        image_paths = find_files_by_ext(self.path, IMAGE_EXTENSIONS, self.snapshot)
+        if image_paths:
+            return (
+                f"prompt to pick from {len(image_paths)} images in the folder "
+                + "and any covers embedded in tracks"
+            )
+        return "prompt to pick from covers embedded in tracks, or for a URL"
+
+    def probe(self) -> AlbumProbe:
+        """
+        Find what processing the album would do, reading only file listings and
+        headers. Nothing is decoded, converted or written.
+
+        Returns:
+            AlbumProbe: conversions, compatible files and cover image decision
+        """
+        convertor = self._create_file_convertor()
+        convertor.profile = self.output_profile
+        convertor.find_conversions()
+
+        conversions: List[PlannedConversion] = [
+            {
+                "kind": "split",
+                "source": convertor.source_path(split),
+                "mime_type": split["tracks"][0]["old_mime_type"]
+                if split["tracks"]
+                else None,
+                "targets": [track["new_name"] for track in split["tracks"]],
+                "bytes": file_size(convertor.source_path(split)),
+            }
+            for split in convertor.cue_splits
+        ]
+        conversions.extend(
+            {
+                "kind": "convert",
+                "source": os.path.join(file["path"], file["old_name"]),
+                "mime_type": file["old_mime_type"],
+                "targets": [file["new_name"]],
+                "bytes": convertor.source_size(file),
+            }
+            for file in convertor.incompatible_files
+        )
+
+        # misnamed files can look compatible but still need converting
+        sources = {
+            os.path.relpath(conversion["source"], self.path)
+            for conversion in conversions
+        }
+        compatible_files = [
+            (name, size)
+            for name, size in self._probe_compatible_files()
+            if name not in sources
+        ]
+
+        return {
+            "conversions": conversions,
+            "compatible_files": compatible_files,
+            "cover_decision": self._probe_cover_decision(),
+        }
+
+    def output_dir(self) -> str:
+        """
+        Get a path on the volume processing writes the album's files to.
+
+        Returns:
+            str: path on the output volume
+        """
+        return self.scratch_dir or self.path
+
+    def estimate_output_size(self, probe: AlbumProbe) -> int:
+        """
+        Estimate the bytes processing would write, from converted files and
+        cover images embedded in every track.
+
+        Args:
+            probe (AlbumProbe): probe of the album
+
+        Returns:
+            int: estimated bytes written
+        """
+        cover_size = (
+            file_size(self.cover_image.path)
+            if self.cover_image
+            else DEFAULT_COVER_IMAGE_SIZE
+        )
+        track_count = len(probe["compatible_files"])
+        size = 0
+        for conversion in probe["conversions"]:
+            size += estimate_output_size(conversion["mime_type"], conversion["bytes"])
+            track_count += len(conversion["targets"])
+
+        # a staged folder's tracks are copied to the scratch directory first
+        if self.scratch_dir is not None:
+            size += sum(conversion["bytes"] for conversion in probe["conversions"])
+            size += sum(file_bytes for _, file_bytes in probe["compatible_files"])
+        return size + track_count * cover_size
+
     def __find_files(self) -> None:
         """Find all music files in folder path"""
 
-        # find all compatible music files
-        compatible_files = find_files_by_mime_type(
-            self.path, APPLE_MUSIC_COMPATIBLE_MIME_TYPES
+        # find all compatible music files, leaving out any that are converted
+        # to meet the output profile
+        compatible_files = self._meeting_profile(
+            find_files_by_mime_type(
+                self.working_path, APPLE_MUSIC_COMPATIBLE_MIME_TYPES, self.snapshot
+            )
         )
 
         self.compatible_file_paths = [
-            os.path.join(self.path, file_name) for file_name in compatible_files
+            os.path.join(self.working_path, file_name) for file_name in compatible_files
         ]
 
+        # every disc the album is split into, including discs with no
+        # compatible files until they are converted
+        self.disc_count = max(self.snapshot.discs(), default=0)
+
     def __choose_cover_image(self) -> None:
         # get all cover images from image files as well as from music file tags
-        image_paths_in_folder = find_files_by_ext(self.path, IMAGE_EXTENSIONS)
-        cover_images_in_album_folder = CoverImagesInAlbumFiles(self.path).process()
+        image_paths_in_folder = find_files_by_ext(
+            self.working_path, IMAGE_EXTENSIONS, self.snapshot
+        )
+        cover_images_in_album_folder = CoverImagesInAlbumFiles(
+            self.working_path, self.snapshot
+        ).process()
         potential_cover_image_paths = [
             *image_paths_in_folder,
             *cover_images_in_album_folder,
@@ -118,74 +400,512 @@ class AbstractAlbumFolder(ABC):
         logger.info("cover image set to:")
         self.cover_image.display()
 
+    def __new_file_convertor(self) -> FileConvertor:
+        """
+        Create the folder's file convertor, handing conversions to the job queue
+        if one is set and the folder is processed in place, where workers on
+        other hosts can reach it.
+
+        Returns:
+            FileConvertor: file convertor for the working path
+        """
+        convertor = self._create_file_convertor()
+        convertor.analyze_loudness = self.analyze_loudness
+        convertor.verify = self.verify_conversions
+        convertor.profile = self.output_profile
+        if self.working_path == self.path:
+            convertor.job_queue = self.job_queue
+        return convertor
+
+    def __file_key(self, file_path: str) -> str:
+        """
+        Get the name a file is recorded under in the run journal.
+
+        Args:
+            file_path (str): path of a file in the working path
+
+        Returns:
+            str: path of the file relative to the working path
+        """
+        return os.path.relpath(file_path, self.working_path)
+
+    def __conversion_done(self, file: FileConversion) -> bool:
+        """
+        Check if a conversion was done by an interrupted run, and its output is
+        unchanged since.
+
+        Args:
+            file (FileConversion): conversion to check
+
+        Returns:
+            bool: whether the conversion can be skipped
+        """
+        assert self.journal is not None
+        new_path = os.path.join(file["path"], file["new_name"])
+        return self.journal.skip(
+            self.path, "converted", self.__file_key(new_path), new_path
+        )
+
+    def __log_conversion(self, file: FileConversion) -> None:
+        """
+        Log the outcome of a single file conversion, flagging the folder as
+        having errors if it failed.
+
+        Args:
+            file (FileConversion): converted file info
+        """
+        old_path = os.path.join(file["path"], file["old_name"])
+        new_path = os.path.join(file["path"], file["new_name"])
+        if file["state"]["status"] == "success":
+            if self.journal is not None:
+                assert self.file_convertor is not None
+                self.journal.record(
+                    self.path,
+                    "converted",
+                    self.__file_key(new_path),
+                    new_path,
+                    self.file_convertor.source_size(file),
+                )
+            logger.info("conversion succeeded:")
+            logger.indent()
+            logger.info(f"{old_path} -->")
+            logger.info(f"{new_path}")
+            logger.dedent()
+        if file["state"]["status"] == "error":
+            self.has_errors = True
+            logger.error(f"conversion failed for {old_path}:")
+            logger.indent()
+            logger.error(f"error: {file['state']['error_message']}")
+            logger.dedent()
+
     def __convert_files(self) -> None:
         """Convert any files not compatible with Apple Music to .aac."""
 
         # convert all incompatible audio files in folder
-        self.file_convertor = FileConvertor(self.path)
-        for file in self.file_convertor.convert_all():
-            old_path = os.path.join(file["path"], file["old_name"])
-            new_path = os.path.join(file["path"], file["new_name"])
-            if file["state"]["status"] == "success":
-                logger.info("conversion succeeded:")
-                logger.indent()
-                logger.info(f"{old_path} -->")
-                logger.info(f"{new_path}")
-                logger.dedent()
-            if file["state"]["status"] == "error":
-                self.has_errors = True
-                logger.error(f"conversion failed for {old_path}:")
-                logger.indent()
-                logger.error(f"error: {file['state']['error_message']}")
-                logger.dedent()
-
-    def __tag_files_with_image(self) -> None:
-        """Tag compatible audio files with cover image."""
+        self.file_convertor = self.__new_file_convertor()
+        skip = self.__conversion_done if self.journal is not None else None
+        for file in self.file_convertor.convert_all(skip):
+            self.__log_conversion(file)
+
+        # conversions write new files to the folder
+        self.snapshot.invalidate()
+
+    def __measure_loudness(self, file_path: str) -> Optional[TrackLoudness]:
+        """
+        Get the loudness of a compatible audio file, as measured while it was
+        converted, or by decoding it if it wasn't converted in this run.
+
+        Args:
+            file_path (str): path of audio file
+
+        Returns:
+            Optional[TrackLoudness]: loudness of the file, if it could be measured
+        """
+        if file_path in self.track_loudness:
+            return self.track_loudness[file_path]
+        measured = (
+            self.file_convertor.loudness.get(file_path)
+            if self.file_convertor is not None
+            else None
+        )
+        if measured is None:
+            end_section = logger.log_section(
+                "analyze file", kind="file", label=file_path, log=False
+            )
+            try:
+                channels = classify_media_file(file_path)["channels"] or 2
+                measured = analyze_file(file_path, channels)
+            except Exception as e:
+                end_section(outcome="error")
+                logger.warning(f"could not measure loudness of {file_path} ({e})")
+                return None
+            end_section(bytes_processed=file_size(file_path))
+        self.track_loudness[file_path] = measured
+        return measured
+
+    def __analyze_loudness(self) -> None:
+        """
+        Measure the loudness of every compatible audio file, and of the album
+        as a whole.
+        """
+        measured = [
+            self.__measure_loudness(path) for path in self.compatible_file_paths
+        ]
+        tracks = [track for track in measured if track is not None]
+        if tracks:
+            self.album_loudness = album_loudness(tracks)
+
+    def __loudness_tags(self, file_path: str) -> Optional[Dict[str, bytes]]:
+        """
+        Get the Sound Check and ReplayGain tags of a compatible audio file. Album
+        gain is only known once every track was measured.
+
+        Args:
+            file_path (str): path of audio file
+
+        Returns:
+            Optional[Dict[str, bytes]]: tags, if loudness is analyzed
+        """
+        if not self.analyze_loudness:
+            return None
+        track = self.__measure_loudness(file_path)
+        return loudness_tags(track, self.album_loudness) if track else None
+
+    def __tag_album_loudness(self) -> None:
+        """
+        Add album gain to every streamed track once the last one is tagged, as
+        the loudness of the album is only known then. Tracks were tagged with
+        their own gain as they were streamed, and are imported after this.
+        """
+        measured = [
+            self.__measure_loudness(path) for path in self.compatible_file_paths
+        ]
+        tracks = [track for track in measured if track is not None]
+        if not tracks:
+            return
+        self.album_loudness = album_loudness(tracks)
+        for path, track in zip(self.compatible_file_paths, measured):
+            if track is None:
+                continue
+            try:
+                write_loudness_tags(path, loudness_tags(track, self.album_loudness))
+            except Exception as e:
+                logger.warning(f"could not tag album gain of {path} ({e})")
+                continue
+            if self.journal is not None:
+                # the tagged file changed again, and is checked on resume
+                key = self.__file_key(path)
+                self.journal.refresh(self.path, "tagged", key, path)
+                self.journal.refresh(self.path, "converted", key, path)
+
+    def __disc(self, file_path: str) -> Optional[Tuple[int, int]]:
+        """
+        Get the disc of the album a file is on, from the disc sub folder it is in.
+
+        Args:
+            file_path (str): path of audio file
+
+        Returns:
+            Optional[Tuple[int, int]]: disc number and number of discs, if the
+                                       album is split into disc sub folders
+        """
+        disc = disc_number(self.__file_key(file_path))
+        return (disc, max(disc, self.disc_count)) if disc is not None else None
+
+    def __tag_file(self, file_path: str) -> bool:
+        """
+        Tag a compatible audio file with the cover image, its disc if the album
+        is split into discs, and its loudness if analyzed, in one write.
+
+        Args:
+            file_path (str): path of audio file to tag
+
+        Returns:
+            bool: whether the file is tagged, and can be imported
+        """
+        assert isinstance(self.cover_image, CoverImage)
+        key = self.__file_key(file_path)
+        if self.journal is not None and self.journal.skip(
+            self.path, "tagged", key, file_path
+        ):
+            return True
+        if not governor.has_space(file_path, file_size(self.cover_image.path)):
+            self.has_errors = True
+            logger.error(f"not enough free space to tag {file_path}")
+            return False
+        end_section = logger.log_section(
+            "tag file", kind="file", label=file_path, log=False
+        )
+        self.cover_image.tag_music_file(
+            file_path, self.__loudness_tags(file_path), self.__disc(file_path)
+        )
+        size = file_size(file_path)
+        end_section(bytes_processed=size)
+        if self.journal is not None:
+            self.journal.record(self.path, "tagged", key, file_path, size)
+            # tagging rewrites converted files, which are checked on resume
+            self.journal.refresh(self.path, "converted", key, file_path)
+        return True
+
+    def __tag_files_with_image(self) -> List[str]:
+        """
+        Tag compatible audio files with cover image.
+
+        Returns:
+            List[str]: paths of the files that were tagged
+        """
 
         # if no cover image file name was set, choose a cover image
         if not self.cover_image:
-            self.__choose_cover_image()
+            # keep the progress status from drawing over previews and input
+            with logger.status_paused():
+                self.__choose_cover_image()
 
         # tag each music file in folder with cover image
-        assert isinstance(self.cover_image, CoverImage)
-        for path in self.compatible_file_paths:
-            self.cover_image.tag_music_file(path)
+        return [path for path in self.compatible_file_paths if self.__tag_file(path)]
 
-    def __import_all_files(self) -> None:
-        """Try to import all compatible audio files into Apple Music."""
-        for file_path in self.compatible_file_paths:
-            try:
-                import_file_to_apple_music(file_path)
-                logger.indent()
-                logger.info("imported file into Apple Music:")
-                logger.indent()
-                logger.info(file_path)
-                logger.dedent(2)
-            except Exception as e:
-                self.has_errors = True
-                logger.indent()
-                logger.error("import into Apple Music failed:")
-                logger.indent()
-                logger.error(file_path)
-                logger.error(f"error: {str(e)}")
-                logger.dedent(2)
+    def __import_file(self, file_path: str) -> None:
+        """
+        Try to import a compatible audio file into Apple Music.
+
+        Args:
+            file_path (str): path of audio file to import
+        """
+        key = self.__file_key(file_path)
+        if self.journal is not None and self.journal.skip(self.path, "imported", key):
+            logger.indent()
+            logger.info(f"already imported into Apple Music: {file_path}")
+            logger.dedent()
+            return
+        end_section = logger.log_section(
+            "import file", kind="file", label=file_path, log=False
+        )
+        try:
+            import_file_to_apple_music(file_path)
+            size = file_size(file_path)
+            end_section(bytes_processed=size)
+            if self.journal is not None:
+                self.journal.record(self.path, "imported", key, size=size)
+            logger.indent()
+            logger.info("imported file into Apple Music:")
+            logger.indent()
+            logger.info(file_path)
+            logger.dedent(2)
+        except Exception as e:
+            end_section(outcome="error")
+            self.has_errors = True
+            logger.indent()
+            logger.error("import into Apple Music failed:")
+            logger.indent()
+            logger.error(file_path)
+            logger.error(f"error: {str(e)}")
+            logger.dedent(2)
+
+    def __import_all_files(self, file_paths: List[str]) -> None:
+        """
+        Try to import compatible audio files into Apple Music.
+
+        Args:
+            file_paths (List[str]): paths of tagged audio files to import
+        """
+        for file_path in file_paths:
+            self.__import_file(file_path)
+
+    def __converted_file_paths(self, buffer_size: int) -> Generator[str, None, None]:
+        """
+        Convert incompatible files on a background thread, yielding the path of
+        each successfully converted file as soon as it is ready.
+
+        Args:
+            buffer_size (int): maximum number of converted files to hold ahead
+                               of the consumer
+
+        Yields:
+            str: path of a converted file
+        """
+        from src.lib.metrics import stream_queue_depth
+
+        self.file_convertor = self.__new_file_convertor()
+        skip = self.__conversion_done if self.journal is not None else None
+        conversions = buffered_generator(
+            self.file_convertor.convert_all(skip), buffer_size, stream_queue_depth.set
+        )
+        for file in conversions:
+            self.__log_conversion(file)
+            if file["state"]["status"] == "success":
+                yield os.path.join(file["path"], file["new_name"])
+
+        # conversions write new files to the folder
+        self.snapshot.invalidate()
+
+    def __stream_files(self, buffer_size: int) -> List[str]:
+        """
+        Tag and import each track as soon as it is available: already compatible
+        files first, then each file as its conversion completes. Conversions run
+        ahead of tagging and import by at most `buffer_size` files.
+
+        If the folder has no cover image set, one is chosen when the first track
+        is ready, from image files and tracks that are already compatible.
+
+        When loudness is analyzed, tracks are only tagged, and imported once
+        the album gain is added to them, since Apple Music copies each track
+        into its library as it is imported.
+
+        Args:
+            buffer_size (int): maximum number of converted files to hold ahead
+                               of tagging and import
+
+        Returns:
+            List[str]: paths of tagged tracks held back from import
+        """
+        held: List[str] = []
+        for path in chain(
+            list(self.compatible_file_paths),
+            self.__converted_file_paths(buffer_size),
+        ):
+            if path not in self.compatible_file_paths:
+                self.compatible_file_paths.append(path)
+            if not self.cover_image:
+                end_section = logger.log_section("cover image selection", kind="stage")
+                with logger.status_paused():
+                    self.__choose_cover_image()
+                end_section()
+            # an untagged track would be imported without its cover and tags
+            if not self.__tag_file(path):
+                continue
+            if self.analyze_loudness:
+                held.append(path)
+            else:
+                self.__import_file(path)
+        return held
 
     @abstractmethod
     def delete_folder(self) -> None:
         """Delete the folder at this path."""
         pass
 
-    def process_files(self, delete_folder_after: bool = False) -> None:
+    def __delete_folder_if_clean(self) -> None:
+        """
+        Delete the album folder unless errors happened during processing, or
+        queue it to be deleted with the rest of its batch.
+        """
+        end_section = logger.log_section("delete album folder", kind="stage")
+        if self.has_errors:
+            logger.warning("errors during processing. will not delete folder")
+            end_section()
+        elif self.deletions is not None:
+            self.deletions.add(self.path, self.delete_empty_parent, self.journal)
+            logger.info("folder will be deleted with the rest of its batch")
+            end_section()
+        else:
+            self.delete_folder()
+            if self.journal is not None:
+                self.journal.record(self.path, "deleted")
+            end_section()
+
+    def process_files(
+        self,
+        delete_folder_after: bool = False,
+        stream_tracks: bool = False,
+        stream_buffer_size: int = 2,
+        journal: Optional["RunJournal"] = None,
+        scratch_dir: Optional[str] = None,
+        staging_workers: int = 4,
+        job_queue: Optional[JobQueue] = None,
+        analyze_loudness: bool = False,
+        verify_conversions: bool = False,
+        deletions: Optional[DeletionBatch] = None,
+    ) -> None:
+        """
+        Convert, tag and import all music files in the folder, and optionally
+        delete the folder afterwards.
+
+        Args:
+            delete_folder_after (bool): whether to delete the folder after all
+                                        files were imported without errors.
+                                        Defaults to False.
+            stream_tracks (bool): whether to tag and import each track as soon as
+                                  it is converted instead of stage-by-stage.
+                                  Defaults to False.
+            stream_buffer_size (int): maximum number of converted tracks to hold
+                                      ahead of tagging and import when streaming.
+                                      Defaults to 2.
+            journal (Optional[RunJournal]): journal to record completed steps
+                                            in, and to skip steps an interrupted
+                                            run completed. Defaults to None.
+            scratch_dir (Optional[str]): local directory to copy the folder to
+                                         and process it in, instead of in
+                                         place. Defaults to None.
+            staging_workers (int): number of files to copy at once when staging.
+                                   Defaults to 4.
+            job_queue (Optional[JobQueue]): queue to publish file conversions
+                                            to for worker processes. Defaults
+                                            to None.
+            analyze_loudness (bool): whether to measure loudness and tag tracks
+                                     with Sound Check and ReplayGain gains.
+                                     Defaults to False.
+            verify_conversions (bool): whether to decode each converted file
+                                       alongside its source and fail it unless
+                                       it holds the same audio, which keeps the
+                                       folder from being deleted. Defaults to
+                                       False.
+            deletions (Optional[DeletionBatch]): batch to queue the folder's
+                                                 deletion in, instead of
+                                                 deleting it right away.
+                                                 Defaults to None.
+        """
         end_process_section = logger.log_section(
             "processing folder",
             f"[{{section_name}}]: {self.folder_type} folder at '{self.path}'",
+            kind="folder",
+            label=self.path,
         )
 
-        end_section = logger.log_section("file conversions")
+        self.journal = journal
+        self.delete_folder_after = delete_folder_after
+        self.scratch_dir = scratch_dir
+        self.staging_workers = staging_workers
+        self.job_queue = job_queue
+        self.analyze_loudness = analyze_loudness
+        self.verify_conversions = verify_conversions
+        self.deletions = deletions
+        self.track_loudness = {}
+        self.album_loudness = None
+        if journal is not None and journal.skip(self.path, "deleted"):
+            logger.info("folder was already deleted by an interrupted run")
+            journal.forget(self.path)
+            end_process_section()
+            return
+
+        # only start on the folder if its output fits in the free space
+        output_dir = self.output_dir()
+        try:
+            reserved = (
+                self.estimate_output_size(self.probe())
+                if governor.min_free_space > 0
+                else 0
+            )
+        except Exception as e:
+            logger.warning(f"could not estimate output size ({e})")
+            reserved = 0
+        if not governor.admit(output_dir, reserved):
+            logger.warning(
+                f"skipping folder, its output of about {reserved / 1e6:.0f} MB "
+                + "would leave too little free space"
+            )
+            end_process_section(outcome="skipped")
+            return
+
+        try:
+            self._prepare()
+            if stream_tracks:
+                self.__process_files_streaming(stream_buffer_size)
+            else:
+                self.__process_files_staged()
+        finally:
+            self._cleanup()
+            governor.release(output_dir, reserved)
+
+        if delete_folder_after and len(self.compatible_file_paths) > 0:
+            self.__delete_folder_if_clean()
+
+        # steps of a folder processed without errors are never retried. A
+        # queued deletion forgets them once it is done
+        if (
+            journal is not None
+            and not self.has_errors
+            and not (deletions is not None and deletions.is_pending(self.path))
+        ):
+            journal.forget(self.path)
+        end_process_section()
+
+    def __process_files_staged(self) -> None:
+        """Run each processing stage over all files before the next stage."""
+        end_section = logger.log_section("file conversions", kind="stage")
         self.__convert_files()
         end_section()
 
-        end_section = logger.log_section("finding files")
+        end_section = logger.log_section("finding files", kind="stage")
         self.__find_files()
         logger.info(
             f"found {len(self.compatible_file_paths)} compatible files to import"
@@ -194,20 +914,48 @@ class AbstractAlbumFolder(ABC):
         if len(self.compatible_file_paths) == 0:
             return
 
-        end_section = logger.log_section("cover image tagging")
-        self.__tag_files_with_image()
+        if self.analyze_loudness:
+            end_section = logger.log_section("loudness analysis", kind="stage")
+            self.__analyze_loudness()
+            end_section()
+
+        end_section = logger.log_section("cover image tagging", kind="stage")
+        tagged_file_paths = self.__tag_files_with_image()
         end_section()
 
-        end_section = logger.log_section("Apple Music import")
-        self.__import_all_files()
+        end_section = logger.log_section("Apple Music import", kind="stage")
+        self.__import_all_files(tagged_file_paths)
         end_section()
 
-        if delete_folder_after:
-            end_section = logger.log_section("delete album folder")
-            if self.has_errors:
-                logger.warning("errors during processing. will not delete folder")
-                end_section()
-            else:
-                self.delete_folder()
-                end_section()
-        end_process_section()
+    def __process_files_streaming(self, buffer_size: int) -> None:
+        """
+        Convert, tag and import files as a per-track pipeline so that the first
+        tracks reach Apple Music before the whole album has been converted.
+
+        Args:
+            buffer_size (int): maximum number of converted tracks to hold ahead
+                               of tagging and import
+        """
+        end_section = logger.log_section("finding files", kind="stage")
+        self.__find_files()
+        logger.info(
+            f"found {len(self.compatible_file_paths)} compatible files to import"
+        )
+        end_section()
+
+        end_section = logger.log_section(
+            "streaming conversion, tagging and import", kind="stage"
+        )
+        held = self.__stream_files(buffer_size)
+        logger.info(f"processed {len(self.compatible_file_paths)} files")
+        end_section()
+
+        if held:
+            end_section = logger.log_section("album loudness tagging", kind="stage")
+            self.__tag_album_loudness()
+            end_section()
+
+            end_section = logger.log_section("Apple Music import", kind="stage")
+            for path in held:
+                self.__import_file(path)
+            end_section()
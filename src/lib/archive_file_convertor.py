@@ -0,0 +1,288 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import zipfile
+from functools import partial
+from typing import IO, Dict, List, Optional
+
+from src.lib.file_convertor import FileConversion, FileConvertor
+from src.lib.folder_snapshot import IGNORE_DIRS, FolderSnapshot
+from src.lib.media_classifier import HEADER_SIZE, MediaInfo, classify_media_header
+from src.lib.output_profile import matches_profile
+from src.lib.verifier import Verification
+
+# size of chunks streamed out of archive members
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def classify_archive_member(
+    archive: zipfile.ZipFile, info: zipfile.ZipInfo
+) -> MediaInfo:
+    """
+    Identify the container and codec of an archive member from the start of
+    its contents, without extracting it.
+
+    Args:
+        archive (zipfile.ZipFile): open archive
+        info (zipfile.ZipInfo): member of the archive
+
+    Returns:
+        MediaInfo: classified media info
+    """
+    with archive.open(info) as member:
+        header = member.read(HEADER_SIZE)
+    return classify_media_header(header, info.filename)
+
+
+def member_paths(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """
+    Get the path each file in an archive is extracted or converted to, relative
+    to the working folder. Folders within the archive, e.g. one per disc, are
+    kept, except a single folder holding everything. Hidden folders and
+    archive metadata are left out.
+
+    Args:
+        archive (zipfile.ZipFile): open archive
+
+    Raises:
+        ValueError: if a member's path leads out of the working folder
+
+    Returns:
+        Dict[str, str]: relative path of each file, by member name
+    """
+    paths: Dict[str, List[str]] = {}
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        parts = [
+            part
+            for part in info.filename.replace("\\", "/").split("/")
+            if part not in ("", ".")
+        ]
+        if (
+            info.filename.startswith(("/", "\\"))
+            or ".." in parts
+            or (parts and ":" in parts[0])
+        ):
+            raise ValueError(f"unsafe path in archive: {info.filename}")
+        if not parts or any(
+            part.startswith(".") or part in IGNORE_DIRS for part in parts[:-1]
+        ):
+            continue
+        paths[info.filename] = parts
+
+    # a folder holding everything, e.g. "Band - Album/", is left out
+    while (
+        paths
+        and all(len(parts) > 1 for parts in paths.values())
+        and len({parts[0] for parts in paths.values()}) == 1
+    ):
+        for parts in paths.values():
+            del parts[0]
+    return {name: os.path.join(*parts) for name, parts in paths.items()}
+
+
+def extract_archive_member(
+    archive: zipfile.ZipFile, info: zipfile.ZipInfo, path: str, relative_path: str
+) -> str:
+    """
+    Stream a single archive member into a folder.
+
+    Args:
+        archive (zipfile.ZipFile): open archive
+        info (zipfile.ZipInfo): member of the archive
+        path (str): folder to extract the member into
+        relative_path (str): path to extract the member to within the folder,
+                             from `member_paths`
+
+    Returns:
+        str: path of the extracted file
+    """
+    file_path = os.path.join(path, relative_path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with archive.open(info) as member, open(file_path, "wb") as file:
+        shutil.copyfileobj(member, file, STREAM_CHUNK_SIZE)
+    return file_path
+
+
+class ArchiveFileConvertor(FileConvertor):
+    """
+    Convert all music files in a zip archive that are not compatible with
+    Apple Music imports to .m4a files, streaming each member straight into the
+    encoder instead of extracting it first. Converted files keep the folders
+    the archive holds them in, so tracks of different discs don't collide.
+
+    Args:
+        archive_path (str): path to zip archive containing music files.
+        path (str): path to folder to write converted files to.
+        snapshot (Optional[FolderSnapshot]): existing listing of the output
+                                             folder. Defaults to None.
+    """
+
+    def __init__(
+        self, archive_path: str, path: str, snapshot: Optional[FolderSnapshot] = None
+    ) -> None:
+        super().__init__(path, snapshot)
+        self.archive_path = archive_path
+        self.member_names: Dict[str, str] = {}
+        self.member_sizes: Dict[str, int] = {}
+        self.member_media_info: Dict[str, MediaInfo] = {}
+
+    def source_location(self) -> str:
+        """Get the path conversions read their sources from.
+
+        Returns:
+            str: path of the archive
+        """
+        return self.archive_path
+
+    def _find_incompatible_audio_files(self) -> None:
+        """
+        Find all audio files in the archive that are not compatible with Apple
+        Music.
+        """
+        incompatible_files: List[FileConversion] = []
+        member_names: Dict[str, str] = {}
+
+        with zipfile.ZipFile(self.archive_path) as archive:
+            paths = member_paths(archive)
+            for info in archive.infolist():
+                relative_path = paths.get(info.filename)
+                if relative_path is None:
+                    continue
+                media_info = classify_archive_member(archive, info)
+                mime_type = media_info["mime_type"]
+                is_audio = isinstance(mime_type, str) and mime_type.startswith("audio/")
+                if not is_audio or matches_profile(media_info, self.profile):
+                    continue
+
+                name = os.path.basename(relative_path)
+                base_name = os.path.splitext(name)[0]
+                new_name = f"{base_name}.m4a"
+                if new_name == name:
+                    new_name = f"{base_name}.{self.profile['codec']}.m4a"
+                member_names[relative_path] = info.filename
+                self.member_sizes[relative_path] = info.file_size
+                self.member_media_info[relative_path] = media_info
+                incompatible_files.append(
+                    {
+                        "old_mime_type": mime_type,
+                        "new_mime_type": "audio/ipod",
+                        "old_name": name,
+                        "new_name": new_name,
+                        "path": os.path.dirname(os.path.join(self.path, relative_path)),
+                        "state": {"status": "pre-conversion", "error_message": None},
+                    }
+                )
+
+        self.incompatible_files = incompatible_files
+        self.member_names = member_names
+
+    def member_path(self, file: FileConversion) -> str:
+        """Get the path of the archive member a conversion reads, as given by
+        `member_paths`.
+
+        Args:
+            file (FileConversion): info about converted file
+
+        Returns:
+            str: path of the member relative to the working folder
+        """
+        return os.path.relpath(os.path.join(file["path"], file["old_name"]), self.path)
+
+    def source_size(self, file: FileConversion) -> int:
+        """Get the uncompressed size of the archive member a conversion reads.
+
+        Args:
+            file (FileConversion): info about converted file
+
+        Returns:
+            int: size of the archive member in bytes
+        """
+        return self.member_sizes.get(self.member_path(file), 0)
+
+    def source_media_info(self, file: FileConversion) -> Optional[MediaInfo]:
+        """Get the media info of the archive member a conversion reads.
+
+        Args:
+            file (FileConversion): info about converted file
+
+        Returns:
+            Optional[MediaInfo]: media info, if the member was classified
+        """
+        return self.member_media_info.get(self.member_path(file))
+
+    def _open_member(self, name: str) -> IO[bytes]:
+        """
+        Open an archive member as a stream.
+
+        Args:
+            name (str): path of the member relative to the working folder
+
+        Returns:
+            IO[bytes]: stream of the member, which keeps the archive open until
+                       it is closed
+        """
+        with zipfile.ZipFile(self.archive_path) as archive:
+            return archive.open(self.member_names[name])
+
+    def verification(self, files: List[FileConversion]) -> Verification:
+        """
+        Describe how to check a converted file against the archive member it was
+        streamed from.
+
+        Args:
+            files (List[FileConversion]): conversion of a single member
+
+        Returns:
+            Verification: source and converted file to compare
+        """
+        verification = super().verification(files)
+        verification["source"] = "pipe:0"
+        verification["open_source"] = partial(
+            self._open_member, self.member_path(files[0])
+        )
+        return verification
+
+    def _convert_file(self, file: FileConversion) -> None:
+        """Attempt to convert a single archive member to lossless .m4a.
+
+        Args:
+            file (FileConversion): info about file to convert
+        """
+        command = self._encode_command("pipe:0", file)
+        try:
+            os.makedirs(file["path"], exist_ok=True)
+            with (
+                zipfile.ZipFile(self.archive_path) as archive,
+                archive.open(self.member_names[self.member_path(file)]) as member,
+                tempfile.TemporaryFile() as stderr,
+            ):
+                if self.analyze_loudness:
+                    self._encode_and_analyze(command, file, member)
+                    file["state"]["status"] = "success"
+                    return
+                process = subprocess.Popen(
+                    command,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.DEVNULL,
+                    stderr=stderr,
+                )
+                assert process.stdin is not None
+                try:
+                    shutil.copyfileobj(member, process.stdin, STREAM_CHUNK_SIZE)
+                except BrokenPipeError:
+                    # ffmpeg stopped reading, and will report why
+                    pass
+                finally:
+                    process.stdin.close()
+
+                if process.wait() != 0:
+                    stderr.seek(0)
+                    message = stderr.read().decode("utf-8", errors="replace").strip()
+                    raise RuntimeError(message or "ffmpeg failed")
+            file["state"]["status"] = "success"
+        except Exception as e:
+            file["state"]["status"] = "error"
+            file["state"]["error_message"] = str(e)
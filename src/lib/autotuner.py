@@ -0,0 +1,336 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+from src.lib.governor import governor
+from src.lib.logger import logger
+
+# memory assumed to be taken by each running encoder, in bytes
+ENCODER_MEMORY = 256 * 1024 * 1024
+
+# least relative gain in throughput for a change of settings to be kept, so
+# measurement noise doesn't make the tuner wander
+MIN_IMPROVEMENT = 0.05
+
+# fewest conversions a measurement window spans
+MIN_WINDOW_CONVERSIONS = 3
+
+# filesystem types of network mounts on Linux
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "afpfs", "fuse.sshfs"}
+
+# changes to (encoders, threads per encoder) tried by each hill-climbing step
+MOVES: List[Tuple[int, int]] = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+class TunedSettings(TypedDict):
+    """Best concurrency settings found for a type of source."""
+
+    """Number of encoders running at once"""
+    encoders: int
+
+    """Threads each encoder uses"""
+    encoder_threads: int
+
+    """Source bytes converted per second with these settings"""
+    bytes_per_second: float
+
+    """Conversions finished per second with these settings"""
+    tracks_per_second: float
+
+
+def is_network_path(path: str) -> bool:
+    """
+    Check if a path is on a network mount, from the Linux mount table.
+
+    Args:
+        path (str): path to check
+
+    Returns:
+        bool: whether the path is on a network mount. Always False where the
+              mount table can't be read.
+    """
+    try:
+        with open("/proc/self/mounts", encoding="utf-8") as file:
+            mounts = [line.split() for line in file]
+    except OSError:
+        return False
+
+    real_path = os.path.realpath(path)
+    best_match, fs_type = "", ""
+    for mount in mounts:
+        if len(mount) < 3:
+            continue
+        mount_point = mount[1].replace("\\040", " ")
+        inside = real_path == mount_point or real_path.startswith(
+            mount_point.rstrip("/") + "/"
+        )
+        if inside and len(mount_point) > len(best_match):
+            best_match, fs_type = mount_point, mount[2]
+    return fs_type in NETWORK_FILESYSTEMS
+
+
+def available_memory() -> Optional[int]:
+    """
+    Get the physical memory available to new processes.
+
+    Returns:
+        Optional[int]: available bytes, if the system reports them
+    """
+    try:
+        if sys.platform == "linux":
+            pages = os.sysconf("SC_AVPHYS_PAGES")
+        else:
+            # macOS counts caches as used, so take half of all memory instead
+            pages = os.sysconf("SC_PHYS_PAGES") // 2
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class TuningSession(object):
+    """
+    Hill-climb the number of encoders running at once and the threads each
+    uses while a folder's conversions run.
+
+    Throughput is measured over windows of finished conversions. After each
+    window one setting is moved a step; a move that raises throughput by at
+    least `MIN_IMPROVEMENT` is kept and repeated, any other is undone and the
+    next move is tried. Once no move helps, the best settings are kept.
+
+    Args:
+        source_type (str): type of source being converted
+        start (Tuple[int, int]): encoders and threads per encoder to start from
+        max_encoders (int): most encoders the CPU, memory and configured cap
+                            allow
+        max_threads (int): most threads all encoders together may use
+    """
+
+    def __init__(
+        self,
+        source_type: str,
+        start: Tuple[int, int],
+        max_encoders: int,
+        max_threads: int,
+    ) -> None:
+        self.source_type = source_type
+        self.max_encoders = max(1, max_encoders)
+        self.max_threads = max(1, max_threads)
+        self.settings = self._clamp(start)
+        self.best: Optional[Tuple[Tuple[int, int], float, float]] = None
+        self.converged = False
+        self._move = 0
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._window_count = 0
+        # limits the governor had before tuning, restored once it is done
+        self.previous: Tuple[int, Optional[int]] = (
+            governor.max_encoders,
+            governor.encoder_threads,
+        )
+        self._apply(self.settings)
+
+    def _clamp(self, settings: Tuple[int, int]) -> Tuple[int, int]:
+        """
+        Bring settings within the CPU and memory limits.
+
+        Args:
+            settings (Tuple[int, int]): encoders and threads per encoder
+
+        Returns:
+            Tuple[int, int]: settings within the limits
+        """
+        encoders = min(max(1, settings[0]), self.max_encoders)
+        threads = min(max(1, settings[1]), max(1, self.max_threads // encoders))
+        return encoders, threads
+
+    def _apply(self, settings: Tuple[int, int]) -> None:
+        """
+        Start running conversions with new settings.
+
+        Args:
+            settings (Tuple[int, int]): encoders and threads per encoder
+        """
+        self.settings = settings
+        governor.set_encoder_limits(*settings)
+
+    def _next_settings(self) -> Optional[Tuple[int, int]]:
+        """
+        Find the next move from the best settings that stays within limits.
+
+        Returns:
+            Optional[Tuple[int, int]]: settings to try, or None once every
+                                       move was tried
+        """
+        assert self.best is not None
+        while self._move < len(MOVES):
+            encoders, threads = self.best[0]
+            step_encoders, step_threads = MOVES[self._move]
+            candidate = (encoders + step_encoders, threads + step_threads)
+            if candidate == self._clamp(candidate):
+                return candidate
+            self._move += 1
+        return None
+
+    def observe(self, source_bytes: int) -> None:
+        """
+        Count a finished conversion, and step the settings at the end of a
+        measurement window.
+
+        Args:
+            source_bytes (int): bytes the conversion read
+        """
+        with self._lock:
+            self._window_bytes += source_bytes
+            self._window_count += 1
+            if self.converged or self._window_count < max(
+                MIN_WINDOW_CONVERSIONS, self.settings[0]
+            ):
+                return
+            elapsed = max(time.monotonic() - self._window_start, 1e-9)
+            self._step(self._window_bytes / elapsed, self._window_count / elapsed)
+            self._window_start = time.monotonic()
+            self._window_bytes = 0
+            self._window_count = 0
+
+    def _step(self, bytes_per_second: float, tracks_per_second: float) -> None:
+        """
+        Keep or undo the last move, and make the next one.
+
+        Args:
+            bytes_per_second (float): throughput of the last window
+            tracks_per_second (float): conversions per second of the last window
+        """
+        if self.best is None:
+            self.best = (self.settings, bytes_per_second, tracks_per_second)
+        elif bytes_per_second > self.best[1] * (1 + MIN_IMPROVEMENT):
+            self.best = (self.settings, bytes_per_second, tracks_per_second)
+            logger.info(
+                f"autotuner: {self.settings[0]} encoders x {self.settings[1]} "
+                + f"threads is faster ({bytes_per_second / 1e6:.1f} MB/s)"
+            )
+        else:
+            self._move += 1
+
+        candidate = self._next_settings()
+        if candidate is None:
+            self.converged = True
+            self._apply(self.best[0])
+            return
+        self._apply(candidate)
+
+    def result(self) -> Optional[TunedSettings]:
+        """
+        Get the best settings measured.
+
+        Returns:
+            Optional[TunedSettings]: best settings, if any window was measured
+        """
+        if self.best is None:
+            return None
+        (encoders, threads), bytes_per_second, tracks_per_second = self.best
+        return {
+            "encoders": encoders,
+            "encoder_threads": threads,
+            "bytes_per_second": bytes_per_second,
+            "tracks_per_second": tracks_per_second,
+        }
+
+
+class Autotuner(object):
+    """
+    Tune conversion concurrency per type of source, keeping the best settings
+    found for each in a file so the next run starts from them. Off until
+    configured.
+    """
+
+    def __init__(self) -> None:
+        self.path: Optional[str] = None
+        self.max_encoders = 1
+        self.settings: Dict[str, TunedSettings] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, path: Optional[str], max_encoders: int) -> None:
+        """
+        Turn tuning on or off, and load the settings tuned by previous runs.
+
+        Args:
+            path (Optional[str]): JSON file to keep tuned settings in, or None
+                                  to turn tuning off
+            max_encoders (int): most encoders tuning may run at once, which is
+                                also where source types that were never tuned
+                                start
+        """
+        self.path = path
+        self.max_encoders = max_encoders
+        self.settings = {}
+        if path is None:
+            return
+        try:
+            with open(path, encoding="utf-8") as file:
+                self.settings = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def start(self, source_type: str) -> Optional[TuningSession]:
+        """
+        Start tuning the conversions of a folder.
+
+        Args:
+            source_type (str): type of source the folder's conversions read
+
+        Returns:
+            Optional[TuningSession]: tuning session, or None if tuning is off
+        """
+        if self.path is None:
+            return None
+        cpus = os.cpu_count() or 1
+        memory = available_memory()
+        max_encoders = cpus if memory is None else min(cpus, memory // ENCODER_MEMORY)
+        max_encoders = min(max_encoders, self.max_encoders)
+
+        tuned = self.settings.get(source_type)
+        start = (
+            (tuned["encoders"], tuned["encoder_threads"])
+            if tuned is not None
+            else (self.max_encoders, 1)
+        )
+        return TuningSession(source_type, start, max_encoders, cpus)
+
+    def finish(self, session: TuningSession) -> None:
+        """
+        Keep the best settings of a session for the next folder and run, and
+        give the governor back the limits it had before the session.
+
+        Args:
+            session (TuningSession): finished session
+        """
+        governor.set_encoder_limits(*session.previous)
+        result = session.result()
+        if result is None or self.path is None:
+            return
+        with self._lock:
+            self.settings[session.source_type] = result
+            self.save()
+        logger.info(
+            f"autotuner: {session.source_type} converts fastest with "
+            + f"{result['encoders']} encoders x {result['encoder_threads']} threads"
+        )
+
+    def save(self) -> None:
+        """Write the tuned settings to their file, replacing it atomically."""
+        assert self.path is not None
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(self.settings, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+# autotuner shared by all conversions
+autotuner = Autotuner()
@@ -1,4 +1,22 @@
-from typing import List
+from typing import Dict, List
 
 IMAGE_EXTENSIONS: List[str] = [".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tiff"]
 APPLE_MUSIC_COMPATIBLE_MIME_TYPES: List[str] = ["audio/mp4a-latm"]
+
+# codecs inside an mp4 container that Apple Music can import
+APPLE_MUSIC_COMPATIBLE_CODECS: List[str] = ["alac", "aac"]
+
+# MIME types guessed from extensions on some platforms that mean the same thing as
+# an Apple Music compatible MIME type
+MIME_TYPE_ALIASES: Dict[str, str] = {
+    "audio/mp4": "audio/mp4a-latm",
+    "audio/x-m4a": "audio/mp4a-latm",
+}
+
+# MIME types for extensions that aren't known, or are known as something else, by the
+# `mimetypes` module
+EXTENSION_MIME_TYPES: Dict[str, str] = {
+    ".ape": "audio/x-ape",
+    ".wv": "audio/x-wavpack",
+    ".cue": "application/x-cue",
+}
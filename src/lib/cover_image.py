@@ -1,16 +1,17 @@
-import hashlib
 import io
-import mimetypes
 import subprocess
 import tempfile
-from typing import List, Set
-
-import requests
-from mutagen.mp4 import MP4, MP4Cover
-from PIL import Image
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
 
 from src.lib.constants import APPLE_MUSIC_COMPATIBLE_MIME_TYPES
+from src.lib.folder_snapshot import FolderSnapshot
 from src.lib.helpers import find_files_by_mime_type
+from src.lib.media_classifier import classify_media_file
+
+# mutagen, PIL and requests are imported where they are used, so that runs
+# without any music to process start quickly
+if TYPE_CHECKING:
+    from mutagen.mp4 import MP4, MP4Cover
 
 
 class CoverImage(object):
@@ -22,7 +23,7 @@ class CoverImage(object):
 
     def __init__(self, path: str):
         self.path = path
-        self.mime_type = mimetypes.guess_type(path)[0]
+        self.mime_type = classify_media_file(path)["mime_type"]
 
     def display(self) -> None:
         subprocess.run(f'viu "{self.path}"', shell=True)
@@ -39,6 +40,8 @@ class CoverImage(object):
             (CoverImage): new instance of `CoverImage`
         """
 
+        import requests
+
         # request image file and make sure it exists
         response = requests.get(url)
         response.raise_for_status()
@@ -53,12 +56,24 @@ class CoverImage(object):
 
         return CoverImage(tmp_file.name)
 
-    def tag_music_file(self, file_path: str) -> None:
-        """Add cover image to music file.
+    def tag_music_file(
+        self,
+        file_path: str,
+        tags: Optional[Dict[str, bytes]] = None,
+        disc: Optional[Tuple[int, int]] = None,
+    ) -> None:
+        """Add cover image to music file, along with any other tags in the same
+        write.
 
         Args:
             file_path (str): file to tag with cover image
+            tags (Optional[Dict[str, bytes]]): freeform MP4 tags to also write.
+                                               Defaults to None.
+            disc (Optional[Tuple[int, int]]): disc number and number of discs
+                                              to also write. Defaults to None.
         """
+        from mutagen.mp4 import MP4, MP4Cover
+
         audio = MP4(file_path)
         if not audio.tags:
             audio.add_tags()
@@ -75,6 +90,10 @@ class CoverImage(object):
 
         # assign the image
         audio["covr"] = [cover]
+        for key, value in (tags or {}).items():
+            audio[key] = [value]
+        if disc is not None:
+            audio["disk"] = [disc]
         getattr(audio, "save")()
         audio.save()
 
@@ -87,21 +106,29 @@ class CoverImagesInAlbumFiles(object):
 
     Args:
         dir_path (str): Album folder path.
+        snapshot (Optional[FolderSnapshot]): existing listing of the album folder
+                                             to use instead of listing it again.
+                                             Defaults to None.
     """
 
-    def __init__(self, dir_path: str) -> None:
+    def __init__(
+        self, dir_path: str, snapshot: Optional[FolderSnapshot] = None
+    ) -> None:
         self.dir_path = dir_path
-        self.music_files: List[MP4] = []
+        self.snapshot = snapshot
+        self.music_files: List["MP4"] = []
         self._cover_image_hashes: Set[bytes] = set()
-        self._unique_cover_image_data: List[MP4Cover] = []
+        self._unique_cover_image_data: List["MP4Cover"] = []
         self.cover_image_paths: List[str] = []
 
     def __find_files(self) -> None:
         """
         Find all `.m4a` files in the album folder.
         """
+        from mutagen.mp4 import MP4
+
         music_file_paths = find_files_by_mime_type(
-            self.dir_path, APPLE_MUSIC_COMPATIBLE_MIME_TYPES
+            self.dir_path, APPLE_MUSIC_COMPATIBLE_MIME_TYPES, self.snapshot
         )
         self.music_files = [MP4(path) for path in music_file_paths]
 
@@ -110,6 +137,10 @@ class CoverImagesInAlbumFiles(object):
         Find all cover images tagged to files in the album folder and
         only save the ones that are unique at the byte hash level.
         """
+        import hashlib
+
+        from mutagen.mp4 import MP4Cover
+
         for music_file in self.music_files:
             # find all valid cover images in file
             cover_images = [
@@ -134,6 +165,9 @@ class CoverImagesInAlbumFiles(object):
         """
         Turn all the unique cover images into temporary files.
         """
+        from mutagen.mp4 import MP4Cover
+        from PIL import Image
+
         for image_data in self._unique_cover_image_data:
             if getattr(image_data, "imageformat") == MP4Cover.FORMAT_PNG:
                 format = "PNG"
@@ -0,0 +1,260 @@
+import os
+import re
+from typing import Dict, List, Optional, TypedDict
+
+
+class CueTrack(TypedDict):
+    """A single track of a cue sheet."""
+
+    """Track number"""
+    number: int
+
+    """Track title, if set"""
+    title: Optional[str]
+
+    """Track performer, if set"""
+    performer: Optional[str]
+
+    """Start of the track in the image file, in seconds"""
+    start: float
+
+
+class CueSheet(TypedDict):
+    """Album info and tracks parsed from a cue sheet."""
+
+    """Name of the image file the cue sheet describes"""
+    file: Optional[str]
+
+    """Number of image files the cue sheet references"""
+    file_count: int
+
+    """Album title, if set"""
+    title: Optional[str]
+
+    """Album performer, if set"""
+    performer: Optional[str]
+
+    """Album release date, if set"""
+    date: Optional[str]
+
+    """Album genre, if set"""
+    genre: Optional[str]
+
+    """Tracks in the order they appear in the image file"""
+    tracks: List[CueTrack]
+
+
+# cue sheet timestamps are mm:ss:ff, with 75 frames a second
+FRAMES_PER_SECOND = 75
+
+CUE_LINE_PATTERN = re.compile(r"^\s*(\S+)\s*(.*?)\s*$")
+INDEX_PATTERN = re.compile(r"^(\d+)\s+(\d+):(\d+):(\d+)$")
+
+
+def _unquote(value: str) -> str:
+    """
+    Strip the quotes around a cue sheet value, if it is quoted.
+
+    Args:
+        value (str): raw value
+
+    Returns:
+        str: unquoted value
+    """
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def _read_cue_file(path: str) -> str:
+    """
+    Read a cue sheet, which is often not saved as UTF-8.
+
+    Args:
+        path (str): path to the cue sheet
+
+    Returns:
+        str: cue sheet contents
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace")
+
+
+def parse_cue_sheet(path: str) -> CueSheet:
+    """
+    Parse the album info and track layout of a cue sheet.
+
+    Args:
+        path (str): path to the cue sheet
+
+    Returns:
+        CueSheet: parsed cue sheet
+    """
+    sheet: CueSheet = {
+        "file": None,
+        "file_count": 0,
+        "title": None,
+        "performer": None,
+        "date": None,
+        "genre": None,
+        "tracks": [],
+    }
+    track: Optional[CueTrack] = None
+
+    for line in _read_cue_file(path).splitlines():
+        match = CUE_LINE_PATTERN.match(line)
+        if not match:
+            continue
+        command, value = match.group(1).upper(), match.group(2)
+
+        if command == "FILE":
+            # the file type follows the (possibly quoted) file name
+            file_name = value.rsplit(" ", 1)[0] if " " in value else value
+            sheet["file"] = _unquote(file_name)
+            sheet["file_count"] += 1
+        elif command == "TRACK":
+            track = {
+                "number": int(value.split()[0]),
+                "title": None,
+                "performer": None,
+                "start": 0.0,
+            }
+            sheet["tracks"].append(track)
+        elif command == "TITLE":
+            if track is None:
+                sheet["title"] = _unquote(value)
+            else:
+                track["title"] = _unquote(value)
+        elif command == "PERFORMER":
+            if track is None:
+                sheet["performer"] = _unquote(value)
+            else:
+                track["performer"] = _unquote(value)
+        elif command == "INDEX" and track is not None:
+            index = INDEX_PATTERN.match(value)
+            if index and int(index.group(1)) == 1:
+                minutes, seconds, frames = (int(index.group(i)) for i in (2, 3, 4))
+                track["start"] = minutes * 60 + seconds + frames / FRAMES_PER_SECOND
+        elif command == "REM":
+            key, _, rem_value = value.partition(" ")
+            if key.upper() == "DATE":
+                sheet["date"] = _unquote(rem_value)
+            elif key.upper() == "GENRE":
+                sheet["genre"] = _unquote(rem_value)
+
+    return sheet
+
+
+def is_splittable(sheet: CueSheet) -> bool:
+    """
+    Check if a cue sheet describes several tracks in a single image file.
+
+    Args:
+        sheet (CueSheet): parsed cue sheet
+
+    Returns:
+        bool: whether the image file can be split into tracks
+    """
+    return sheet["file_count"] == 1 and len(sheet["tracks"]) > 1
+
+
+def track_file_name(track: CueTrack) -> str:
+    """
+    Name the file a cue sheet track is split into.
+
+    Args:
+        track (CueTrack): cue sheet track
+
+    Returns:
+        str: `.m4a` file name for the track
+    """
+    title = track["title"] or f"Track {track['number']}"
+    safe_title = re.sub(r'[/\\:*?"<>|]', "_", title).strip()
+    return f"{track['number']:02d} {safe_title}.m4a"
+
+
+def track_tags(sheet: CueSheet, track: CueTrack) -> Dict[str, str]:
+    """
+    Get the tags for a track from the cue sheet.
+
+    Args:
+        sheet (CueSheet): parsed cue sheet
+        track (CueTrack): track in the cue sheet
+
+    Returns:
+        Dict[str, str]: ffmpeg metadata keys mapped to values
+    """
+    tags = {
+        "title": track["title"],
+        "artist": track["performer"] or sheet["performer"],
+        "album_artist": sheet["performer"],
+        "album": sheet["title"],
+        "date": sheet["date"],
+        "genre": sheet["genre"],
+        "track": f"{track['number']}/{len(sheet['tracks'])}",
+    }
+    return {key: value for key, value in tags.items() if value}
+
+
+def build_split_command(
+    sheet: CueSheet,
+    image_path: str,
+    output_dir: str,
+    encoder_options: Optional[List[str]] = None,
+    audio_filter: Optional[str] = None,
+) -> List[str]:
+    """
+    Build an ffmpeg command that splits an image file into ALAC tracks, or
+    tracks encoded with other encoder options.
+
+    The image is decoded once as a stream and cut into segments at the track
+    start times, with every segment encoded by its own encoder in the same
+    ffmpeg process. Neither a decode per track nor the whole decoded image in
+    memory is needed.
+
+    Args:
+        sheet (CueSheet): parsed cue sheet for the image
+        image_path (str): path of the image file
+        output_dir (str): folder to write tracks to
+        encoder_options (Optional[List[str]]): output arguments each track is
+                                               encoded with. Defaults to None,
+                                               for ALAC.
+        audio_filter (Optional[str]): filter the image is decoded through
+                                      before it is cut, e.g. to resample it.
+                                      Defaults to None.
+
+    Returns:
+        List[str]: ffmpeg command arguments
+    """
+    tracks = sheet["tracks"]
+    count = len(tracks)
+
+    # the first track keeps any pregap before it, so segments are cut at the
+    # start of every following track
+    timestamps = "|".join(f"{track['start']:.6f}" for track in tracks[1:])
+    segment_labels = "".join(f"[s{i}]" for i in range(count))
+    resample = f"{audio_filter}," if audio_filter else ""
+    filters = [f"[0:a]{resample}asegment=timestamps={timestamps}{segment_labels}"]
+    filters.extend(f"[s{i}]asetpts=PTS-STARTPTS[a{i}]" for i in range(count))
+
+    command = [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostdin",
+        "-y",
+        "-i",
+        image_path,
+        "-filter_complex",
+        ";".join(filters),
+    ]
+    for i, track in enumerate(tracks):
+        command.extend(["-map", f"[a{i}]", *(encoder_options or ["-c:a", "alac"])])
+        for key, value in track_tags(sheet, track).items():
+            command.extend(["-metadata", f"{key}={value}"])
+        command.append(os.path.join(output_dir, track_file_name(track)))
+
+    return command
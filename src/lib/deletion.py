@@ -0,0 +1,136 @@
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, TypedDict
+
+from src.lib.folder_snapshot import FolderSnapshot
+from src.lib.helpers import is_dir_empty
+from src.lib.logger import logger
+from src.lib.trash import move_to_trash
+
+if TYPE_CHECKING:
+    from src.lib.journal import RunJournal
+
+
+class PendingDeletion(TypedDict):
+    """Album folder waiting to be deleted with the rest of its batch."""
+
+    """Path of the folder, or of the archive holding the album"""
+    path: str
+
+    """Whether to delete the folder's parent instead, if nothing else is in it"""
+    delete_empty_parent: bool
+
+    """Journal to record the deletion in, if any"""
+    journal: Optional["RunJournal"]
+
+
+class DeletionBatch(object):
+    """
+    Album folders to delete together once a batch of them is processed, instead
+    of each as soon as it is done. Folders that share a parent are deleted
+    with a single look at the parent, which is trashed whole when the batch
+    leaves nothing else in it.
+    """
+
+    def __init__(self) -> None:
+        self.pending: List[PendingDeletion] = []
+
+    def add(
+        self,
+        path: str,
+        delete_empty_parent: bool = False,
+        journal: Optional["RunJournal"] = None,
+    ) -> None:
+        """
+        Queue a folder for deletion.
+
+        Args:
+            path (str): path of the folder, or of the archive holding the album
+            delete_empty_parent (bool): whether to delete the folder's parent
+                                        instead, if nothing else is in it.
+                                        Defaults to False.
+            journal (Optional[RunJournal]): journal to record the deletion in.
+                                            Defaults to None.
+        """
+        self.pending.append(
+            {
+                "path": path,
+                "delete_empty_parent": delete_empty_parent,
+                "journal": journal,
+            }
+        )
+
+    def is_pending(self, path: str) -> bool:
+        """
+        Check if a folder is waiting to be deleted.
+
+        Args:
+            path (str): path of the folder
+
+        Returns:
+            bool: whether the folder is queued for deletion
+        """
+        return any(deletion["path"] == path for deletion in self.pending)
+
+    def __parent_left_empty(
+        self, parent: str, deletions: List[PendingDeletion]
+    ) -> bool:
+        """
+        Check if a parent holds nothing but queued folders that may take their
+        parent with them, listing the parent once for all of them.
+
+        Args:
+            parent (str): parent of the folders
+            deletions (List[PendingDeletion]): queued folders in the parent
+
+        Returns:
+            bool: whether to trash the parent instead of each folder
+        """
+        if not all(deletion["delete_empty_parent"] for deletion in deletions):
+            return False
+        names = [os.path.basename(deletion["path"]) for deletion in deletions]
+        try:
+            return is_dir_empty(
+                parent, ignore_dirs=names, snapshot=FolderSnapshot(parent)
+            )
+        except (OSError, TypeError):
+            return False
+
+    def flush(self) -> None:
+        """
+        Delete every queued folder, recording each deletion in its journal once
+        it is done.
+        """
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        end_section = logger.log_section("delete album folders", kind="stage")
+
+        by_parent: Dict[str, List[PendingDeletion]] = {}
+        for deletion in pending:
+            parent = os.path.dirname(os.path.normpath(deletion["path"]))
+            by_parent.setdefault(parent, []).append(deletion)
+
+        deleted = 0
+        for parent, deletions in by_parent.items():
+            if self.__parent_left_empty(parent, deletions):
+                logger.info(f"no other files in parent dir ({parent}). deleting it")
+                targets = [(parent, deletions)]
+            else:
+                targets = [(deletion["path"], [deletion]) for deletion in deletions]
+
+            for target, done in targets:
+                try:
+                    move_to_trash(target)
+                except Exception as e:
+                    logger.error(f"could not delete {target} ({e})")
+                    continue
+                for deletion in done:
+                    deleted += 1
+                    logger.info(f"deleted {deletion['path']}")
+                    journal = deletion["journal"]
+                    if journal is not None:
+                        journal.record(deletion["path"], "deleted")
+                        journal.forget(deletion["path"])
+
+        logger.info(f"deleted {deleted} of {len(pending)} album folders")
+        end_section()
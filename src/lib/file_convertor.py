@@ -1,11 +1,57 @@
-import mimetypes
+import contextvars
+import json
 import os
-from typing import Dict, Generator, List, Literal, Optional, TypedDict
-
-from pydub import AudioSegment
-from pydub.utils import mediainfo
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import (
+    IO,
+    Callable,
+    Deque,
+    Dict,
+    Generator,
+    List,
+    Literal,
+    Optional,
+    Set,
+    TypedDict,
+)
 
+from src.lib.autotuner import TuningSession, autotuner, is_network_path
 from src.lib.constants import APPLE_MUSIC_COMPATIBLE_MIME_TYPES
+from src.lib.cue_sheet import (
+    CueSheet,
+    build_split_command,
+    is_splittable,
+    parse_cue_sheet,
+    track_file_name,
+)
+from src.lib.folder_snapshot import FolderSnapshot, SnapshotEntry
+from src.lib.governor import estimate_output_size, governor
+from src.lib.helpers import file_size
+from src.lib.job_queue import POLL_INTERVAL, ConversionJob, JobQueue, worker_name
+from src.lib.logger import logger
+from src.lib.loudness import LoudnessMeter, TrackLoudness, pcm_output, read_pcm
+from src.lib.media_classifier import MediaInfo
+from src.lib.output_profile import (
+    ALAC_AS_SOURCE,
+    OutputProfile,
+    audio_filter,
+    encoder_options,
+    keeps_samples,
+    matches_profile,
+)
+from src.lib.verifier import (
+    LOSSLESS_CODECS,
+    LOSSY_SAMPLE_TOLERANCE,
+    Verification,
+    verify_conversion,
+)
 
 
 class FileConversionStatus(TypedDict):
@@ -35,93 +81,803 @@ class FileConversion(TypedDict):
     state: FileConversionStatus
 
 
+class CueSplit(TypedDict):
+    """Split of a single image file into tracks described by a cue sheet."""
+
+    """Name of the cue sheet"""
+    cue_name: str
+
+    """Parsed cue sheet"""
+    sheet: CueSheet
+
+    """Name of the image file"""
+    image_name: str
+
+    """Conversion of each track, in cue sheet order"""
+    tracks: List[FileConversion]
+
+
 class FileConvertor(object):
     """
     Convert all music files in a directory that are not compatible with
     Apple Music imports to .m4a files.
 
+    With a job queue set, whole-file conversions are published to it for
+    worker processes to convert, and this process converts claimed jobs itself
+    while it waits for the rest.
+
+    With `verify` set, the output of each conversion is decoded alongside its
+    source and failed unless it holds the same audio.
+
+    Files are encoded with the output `profile`, and compatible files that
+    don't meet it are converted too.
 
     Args:
         path (str): path to folder containing music files.
+        snapshot (Optional[FolderSnapshot]): existing listing of the folder to
+                                             use instead of listing it again.
+                                             Defaults to None.
     """
 
-    def __init__(self, path: str) -> None:
+    def __init__(self, path: str, snapshot: Optional[FolderSnapshot] = None) -> None:
         self.path = path
+        self.snapshot = snapshot or FolderSnapshot(path)
         self.incompatible_files: List[FileConversion] = []
+        self.cue_splits: List[CueSplit] = []
+        self.job_queue: Optional[JobQueue] = None
+        self.tuner: Optional[TuningSession] = None
+        self.analyze_loudness = False
+        self.loudness: Dict[str, TrackLoudness] = {}
+        self.verify = False
+        self.profile: OutputProfile = ALAC_AS_SOURCE
+
+    def _find_cue_image(
+        self, sheet: CueSheet, audio_files: List[SnapshotEntry]
+    ) -> Optional[SnapshotEntry]:
+        """
+        Find the image file a cue sheet describes. Cue sheets often name the
+        file the image was ripped to rather than what it was later encoded as,
+        so a file with the same base name is used if the exact name is missing.
+
+        Args:
+            sheet (CueSheet): parsed cue sheet
+            audio_files (List[SnapshotEntry]): audio files in the cue sheet's
+                                               folder
+
+        Returns:
+            Optional[SnapshotEntry]: image file, if found
+        """
+        if not sheet["file"]:
+            return None
+        for entry in audio_files:
+            if entry["name"] == sheet["file"]:
+                return entry
+        base_name = os.path.splitext(sheet["file"])[0]
+        for entry in audio_files:
+            if os.path.splitext(entry["name"])[0] == base_name:
+                return entry
+        return None
+
+    def _find_cue_splits(self) -> None:
+        """
+        Find all incompatible image files in folder that a cue sheet describes
+        as several tracks, so they are split instead of converted whole.
+        """
+        audio_files = [
+            entry for entry in self.snapshot.files() if entry["media_kind"] == "audio"
+        ]
+        cue_splits: List[CueSplit] = []
+
+        for entry in self.snapshot.files():
+            if not entry["name"].lower().endswith(".cue"):
+                continue
+            # a cue sheet describes an image in its own folder, e.g. one disc's
+            cue_dir = os.path.dirname(entry["path"])
+            sheet = parse_cue_sheet(entry["path"])
+            image = self._find_cue_image(
+                sheet,
+                [
+                    file
+                    for file in audio_files
+                    if os.path.dirname(file["path"]) == cue_dir
+                ],
+            )
+            if not is_splittable(sheet) or image is None:
+                continue
+            if image["media_info"] and matches_profile(
+                image["media_info"], self.profile
+            ):
+                continue
+
+            tracks: List[FileConversion] = [
+                {
+                    "old_mime_type": image["mime_type"],
+                    "new_mime_type": "audio/ipod",
+                    "old_name": image["name"],
+                    "new_name": track_file_name(track),
+                    "path": cue_dir,
+                    "state": {"status": "pre-conversion", "error_message": None},
+                }
+                for track in sheet["tracks"]
+            ]
+            cue_splits.append(
+                {
+                    "cue_name": entry["name"],
+                    "sheet": sheet,
+                    "image_name": image["name"],
+                    "tracks": tracks,
+                }
+            )
+
+        self.cue_splits = cue_splits
 
     def _find_incompatible_audio_files(self) -> None:
         """
         Find all audio files in folder that are not compatible with Apple
-        Music.
+        Music. Files in sub folders the snapshot lists, e.g. the discs of an
+        album, are converted in the sub folder they are in.
         """
         if not os.path.isdir(self.path):
             raise TypeError("`path` must be a directory")
 
-        # get a list of all files in folder
-        file_names = [
-            file
-            for file in os.listdir(self.path)
-            if os.path.isfile(os.path.join(self.path, file))
-        ]
+        # images described by cue sheets are split rather than converted whole
+        self._find_cue_splits()
+        cue_images: Set[str] = {self.source_path(split) for split in self.cue_splits}
 
-        # find all audio files in files that need conversion
+        # find all audio files in folder that need conversion
         incompatible_files: List[FileConversion] = []
 
-        for name in file_names:
-            mime_type = mimetypes.guess_type(name)[0]
-            is_audio = isinstance(mime_type, str) and mime_type.startswith("audio/")
+        for entry in self.snapshot.files():
+            name = entry["name"]
+            if entry["path"] in cue_images:
+                continue
+            mime_type = entry["mime_type"]
+            media_info = entry["media_info"]
+            is_audio = entry["media_kind"] == "audio"
+            is_compatible = (
+                matches_profile(media_info, self.profile)
+                if media_info
+                else mime_type in APPLE_MUSIC_COMPATIBLE_MIME_TYPES
+            )
 
             # only collect audio files that are not compatible
-            if is_audio and mime_type not in APPLE_MUSIC_COMPATIBLE_MIME_TYPES:
+            if is_audio and not is_compatible:
                 # determine new file name with .m4a extension
                 base_name = name.rsplit(
                     ".",
                 )[0]
                 new_name = f"{base_name}.m4a"
 
+                # don't overwrite misnamed files, e.g. FLAC saved as `.m4a`, or
+                # compatible files that don't meet the output profile
+                if new_name == name:
+                    new_name = f"{base_name}.{self.profile['codec']}.m4a"
+
                 # set up a file conversion dict
                 audio_file: FileConversion = {
                     "old_mime_type": mime_type,
                     "new_mime_type": "audio/ipod",
                     "old_name": name,
                     "new_name": new_name,
-                    "path": self.path,
+                    "path": os.path.dirname(entry["path"]),
                     "state": {"status": "pre-conversion", "error_message": None},
                 }
                 incompatible_files.append(audio_file)
 
         self.incompatible_files = incompatible_files
 
-    def _convert_file(self, file: FileConversion) -> None:
-        """Attempt to convert a single audio file to lossless .m4a.
+    def find_conversions(self) -> None:
+        """
+        Find all conversions and cue sheet splits `convert_all` would do, without
+        converting anything.
+        """
+        self._find_incompatible_audio_files()
+
+    def source_path(self, split: CueSplit) -> str:
+        """Get the path of the image file a cue sheet split reads from.
 
         Args:
-            file (FileConversion): info about file to convert
+            split (CueSplit): info about image file to split
+
+        Returns:
+            str: path of the image file
         """
-        try:
-            file_path = os.path.join(file["path"], file["old_name"])
-            song = AudioSegment.from_file(file_path)
+        if split["tracks"]:
+            return os.path.join(split["tracks"][0]["path"], split["image_name"])
+        return os.path.join(self.path, split["image_name"])
+
+    def source_size(self, file: FileConversion) -> int:
+        """Get the size of the file a conversion reads from.
 
-            # check that tags are present and a dict
-            raw_tags = mediainfo(file_path).get("TAG", {})
-            tags: Optional[Dict[str, str]] = (
-                raw_tags if isinstance(raw_tags, dict) else None
+        Args:
+            file (FileConversion): info about converted file
+
+        Returns:
+            int: size of the source file in bytes
+        """
+        return file_size(os.path.join(file["path"], file["old_name"]))
+
+    def source_location(self) -> str:
+        """Get the path conversions read their sources from.
+
+        Returns:
+            str: path of the folder with the sources
+        """
+        return self.path
+
+    def source_type(self) -> str:
+        """
+        Describe the sources of the folder's conversions by their most common
+        codec, resolution and whether they are read over the network, so
+        concurrency is tuned separately for each kind.
+
+        Returns:
+            str: type of source, e.g. "flac cd local" or "pcm hi-res network"
+        """
+        entries = {entry["path"]: entry for entry in self.snapshot.files()}
+        sources = [
+            (self.source_path(split), split["tracks"][0]["old_mime_type"])
+            for split in self.cue_splits
+            if split["tracks"]
+        ] + [
+            (os.path.join(file["path"], file["old_name"]), file["old_mime_type"])
+            for file in self.incompatible_files
+        ]
+
+        kinds: "Counter[str]" = Counter()
+        for path, mime_type in sources:
+            entry = entries.get(path)
+            media_info: Optional[MediaInfo] = entry["media_info"] if entry else None
+            codec = (media_info and media_info["codec"]) or mime_type or "unknown"
+            hires = media_info is not None and (
+                (media_info["sample_rate"] or 0) > 48000
+                or (media_info["bit_depth"] or 0) > 16
             )
-            song.export(
+            kinds[f"{codec} {'hi-res' if hires else 'cd'}"] += 1
+
+        kind = kinds.most_common(1)[0][0] if kinds else "unknown cd"
+        location = "network" if is_network_path(self.source_location()) else "local"
+        return f"{kind} {location}"
+
+    def source_media_info(self, file: FileConversion) -> Optional[MediaInfo]:
+        """Get the media info of the file a conversion reads from.
+
+        Args:
+            file (FileConversion): info about converted file
+
+        Returns:
+            Optional[MediaInfo]: media info, if the file could be classified
+        """
+        source = os.path.join(file["path"], file["old_name"])
+        for entry in self.snapshot.files():
+            if entry["path"] == source:
+                return entry["media_info"]
+        return None
+
+    def source_channels(self, file: FileConversion) -> Optional[int]:
+        """Get the number of channels of the file a conversion reads from.
+
+        Args:
+            file (FileConversion): info about converted file
+
+        Returns:
+            Optional[int]: number of channels, if known
+        """
+        media_info = self.source_media_info(file)
+        return media_info["channels"] if media_info else None
+
+    def verification(self, files: List[FileConversion]) -> Verification:
+        """
+        Describe how to check converted files against the file they were
+        converted from: a whole file, or every track split from an image.
+
+        Args:
+            files (List[FileConversion]): conversions of a single source, in order
+
+        Returns:
+            Verification: source and converted files to compare
+        """
+        media_info = self.source_media_info(files[0])
+        return {
+            "source": os.path.join(files[0]["path"], files[0]["old_name"]),
+            "open_source": None,
+            "outputs": [os.path.join(file["path"], file["new_name"]) for file in files],
+            "exact": media_info is not None
+            and media_info["codec"] in LOSSLESS_CODECS
+            and keeps_samples(media_info, self.profile),
+            "source_filter": audio_filter(media_info, self.profile),
+            # each lossy output may be padded or keep its encoder delay
+            "tolerance": LOSSY_SAMPLE_TOLERANCE
+            * ((media_info and media_info["channels"]) or 2)
+            * len(files)
+            if self.profile["codec"] == "aac"
+            else 0,
+        }
+
+    def _encode_command(self, source: str, file: FileConversion) -> List[str]:
+        """
+        Build the ffmpeg command that encodes a source into .m4a with the output
+        profile, resampling it in the same pass if the profile needs it, and
+        carrying over its tags, at the priority set by the resource governor.
+
+        Args:
+            source (str): input of the command, a path or "pipe:0"
+            file (FileConversion): info about file to convert
+
+        Returns:
+            List[str]: ffmpeg command arguments
+        """
+        resample = audio_filter(self.source_media_info(file), self.profile)
+        return governor.command(
+            [
+                "ffmpeg",
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-y",
+                "-i",
+                source,
+                "-map",
+                "0:a",
+                "-map_metadata",
+                "0",
+                *(["-af", resample] if resample else []),
+                *encoder_options(self.profile),
+                *(
+                    ["-threads", str(governor.encoder_threads)]
+                    if governor.encoder_threads
+                    else []
+                ),
                 os.path.join(file["path"], file["new_name"]),
-                format="mp4",
-                codec="alac",
-                tags=tags,
+            ]
+        )
+
+    def _encode_and_analyze(
+        self,
+        command: List[str],
+        file: FileConversion,
+        source: Optional[IO[bytes]] = None,
+    ) -> None:
+        """
+        Run an encoder command that also decodes its input to PCM on stdout,
+        and measure the loudness of the PCM while the encoder writes the
+        converted file, so analysis shares the conversion's decode pass.
+
+        Args:
+            command (List[str]): encoder command
+            file (FileConversion): info about file to convert
+            source (Optional[IO[bytes]]): stream to feed to the encoder's stdin,
+                                          if it reads from "pipe:0". Defaults
+                                          to None.
+
+        Raises:
+            RuntimeError: if ffmpeg fails
+        """
+        channels = self.source_channels(file) or 2
+        meter = LoudnessMeter(channels)
+
+        def feed(source: IO[bytes], stdin: IO[bytes]) -> None:
+            """
+            Copy the source to the encoder, alongside reading its output.
+
+            Args:
+                source (IO[bytes]): stream to copy
+                stdin (IO[bytes]): stdin of the encoder
+            """
+            try:
+                shutil.copyfileobj(source, stdin, 1024 * 1024)
+            except BrokenPipeError:
+                # ffmpeg stopped reading, and will report why
+                pass
+            finally:
+                stdin.close()
+
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(
+                command + pcm_output(channels),
+                stdin=subprocess.PIPE if source is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
             )
+            feeder: Optional[threading.Thread] = None
+            if source is not None:
+                assert process.stdin is not None
+                feeder = threading.Thread(target=feed, args=(source, process.stdin))
+                feeder.start()
+            assert process.stdout is not None
+            with process.stdout:
+                read_pcm(process.stdout, meter)
+            if feeder is not None:
+                feeder.join()
+            if process.wait() != 0:
+                stderr.seek(0)
+                message = stderr.read().decode("utf-8", errors="replace").strip()
+                raise RuntimeError(message or "ffmpeg failed")
+        self.loudness[os.path.join(file["path"], file["new_name"])] = meter.result()
+
+    def _convert_file(self, file: FileConversion) -> None:
+        """Attempt to convert a single audio file to .m4a.
+
+        Args:
+            file (FileConversion): info about file to convert
+        """
+        file_path = os.path.join(file["path"], file["old_name"])
+        try:
+            if self.analyze_loudness:
+                self._encode_and_analyze(self._encode_command(file_path, file), file)
+                file["state"]["status"] = "success"
+                return
+            result = subprocess.run(
+                self._encode_command(file_path, file), capture_output=True
+            )
+            if result.returncode != 0:
+                stderr = result.stderr.decode("utf-8", errors="replace").strip()
+                raise RuntimeError(stderr or "ffmpeg failed")
             file["state"]["status"] = "success"
         except Exception as e:
             file["state"]["status"] = "error"
             file["state"]["error_message"] = str(e)
 
-    def convert_all(self) -> Generator[FileConversion, None, None]:
-        """Convert all Apple Music incompatible audio files in folder to .m4a."""
-        self._find_incompatible_audio_files()
+    def _split_cue_image(self, split: CueSplit) -> None:
+        """Attempt to split an image file into .m4a tracks in one pass.
+
+        Args:
+            split (CueSplit): info about image file to split
+        """
+        image_path = self.source_path(split)
+        command = build_split_command(
+            split["sheet"],
+            image_path,
+            os.path.dirname(image_path),
+            encoder_options(self.profile),
+            audio_filter(self.source_media_info(split["tracks"][0]), self.profile),
+        )
+
+        error_message: Optional[str] = None
+        try:
+            result = subprocess.run(governor.command(command), capture_output=True)
+            if result.returncode != 0:
+                # ffmpeg reports the cause of a failure on its last line
+                stderr = result.stderr.decode("utf-8", errors="replace").strip()
+                error_message = stderr.splitlines()[-1] if stderr else "ffmpeg failed"
+        except Exception as e:
+            error_message = str(e)
+
+        for track in split["tracks"]:
+            track["state"]["status"] = "success" if error_message is None else "error"
+            track["state"]["error_message"] = error_message
+
+    def _verify_outputs(self, files: List[FileConversion]) -> None:
+        """
+        Check that converted files hold the same audio as their source, failing
+        them if they don't, so a truncated or corrupt output never stands in
+        for the source.
+
+        Args:
+            files (List[FileConversion]): conversions of a single source, in order
+        """
+        if not self.verify or any(
+            file["state"]["status"] != "success" for file in files
+        ):
+            return
+        verification = self.verification(files)
+        end_section = logger.log_section(
+            "verify file", kind="file", label=verification["source"], log=False
+        )
+        try:
+            with governor.encoder_slot():
+                verify_conversion(verification)
+            end_section()
+        except Exception as e:
+            for file in files:
+                file["state"]["status"] = "error"
+                file["state"]["error_message"] = f"verification failed: {e}"
+            end_section(outcome="error")
+
+    def _fail_without_space(self, files: List[FileConversion], size: int) -> bool:
+        """
+        Fail conversions up front if writing their output would leave too little
+        free space, rather than filling the volume halfway through.
+
+        Args:
+            files (List[FileConversion]): conversions writing the output
+            size (int): estimated bytes of output
+
+        Returns:
+            bool: whether the conversions were failed
+        """
+        if governor.has_space(self.path, size):
+            return False
+        for file in files:
+            file["state"]["status"] = "error"
+            file["state"]["error_message"] = (
+                f"not enough free space for about {size / 1e6:.0f} MB of output"
+            )
+        return True
+
+    def _remove_failed_outputs(self, files: List[FileConversion]) -> None:
+        """
+        Remove any partial output left by failed conversions.
+
+        Args:
+            files (List[FileConversion]): finished conversions
+        """
+        for file in files:
+            if file["state"]["status"] == "error":
+                try:
+                    os.unlink(os.path.join(file["path"], file["new_name"]))
+                except OSError:
+                    pass
+
+    def _run_split(self, split: CueSplit) -> List[FileConversion]:
+        """
+        Split an image file into tracks, timing it as a file section.
+
+        Args:
+            split (CueSplit): info about image file to split
+
+        Returns:
+            List[FileConversion]: info about each split track
+        """
+        image_path = self.source_path(split)
+        end_section = logger.log_section(
+            "split file", kind="file", label=image_path, log=False
+        )
+        mime_type = split["tracks"][0]["old_mime_type"] if split["tracks"] else None
+        size = estimate_output_size(mime_type, file_size(image_path))
+        if not self._fail_without_space(split["tracks"], size):
+            with governor.encoder_slot():
+                self._split_cue_image(split)
+            self._verify_outputs(split["tracks"])
+        self._remove_failed_outputs(split["tracks"])
+        if self.tuner is not None:
+            self.tuner.observe(file_size(image_path))
+        written = sum(
+            file_size(os.path.join(track["path"], track["new_name"]))
+            for track in split["tracks"]
+        )
+        failed = any(track["state"]["status"] == "error" for track in split["tracks"])
+        end_section(
+            bytes_processed=file_size(image_path) + written,
+            bytes_written=written,
+            outcome="error" if failed else None,
+        )
+        return split["tracks"]
+
+    def _run_conversion(self, file: FileConversion) -> List[FileConversion]:
+        """
+        Convert a single file, timing it as a file section.
+
+        Args:
+            file (FileConversion): info about file to convert
+
+        Returns:
+            List[FileConversion]: info about the converted file
+        """
+        old_path = os.path.join(file["path"], file["old_name"])
+        end_section = logger.log_section(
+            "convert file", kind="file", label=old_path, log=False
+        )
+        source_size = self.source_size(file)
+        size = estimate_output_size(file["old_mime_type"], source_size)
+        if not self._fail_without_space([file], size):
+            with governor.encoder_slot():
+                self._convert_file(file)
+            self._verify_outputs([file])
+        self._remove_failed_outputs([file])
+        if self.tuner is not None and file["state"]["status"] == "success":
+            self.tuner.observe(source_size)
+        written = file_size(os.path.join(file["path"], file["new_name"]))
+        end_section(
+            bytes_processed=source_size + written,
+            bytes_written=written,
+            outcome="error" if file["state"]["status"] == "error" else None,
+        )
+        return [file]
+
+    def _await_job(self, file: FileConversion, job_id: int) -> List[FileConversion]:
+        """
+        Wait for a published conversion to be converted by a worker, converting
+        any job this process can claim in the meantime.
+
+        Args:
+            file (FileConversion): info about the published file
+            job_id (int): id of the file's job
+
+        Returns:
+            List[FileConversion]: info about the converted file
+        """
+        assert self.job_queue is not None
+        worker = worker_name()
+        while True:
+            job = self.job_queue.job(job_id)
+            if job is None or job["state"] in ("done", "failed"):
+                break
+            claimed = self.job_queue.claim(worker)
+            if claimed is not None:
+                convertor = FileConvertor(claimed["path"])
+                convertor.verify = self.verify
+                convertor.run_job(self.job_queue, claimed, worker)
+            else:
+                time.sleep(POLL_INTERVAL)
+
+        if job is not None and job["state"] == "done":
+            file["state"]["status"] = "success"
+        else:
+            file["state"]["status"] = "error"
+            file["state"]["error_message"] = (
+                job["error"] if job is not None else "job was removed from the queue"
+            )
+        return [file]
+
+    def run_job(self, queue: JobQueue, job: ConversionJob, worker: str) -> bool:
+        """
+        Convert a leased job of a file in this folder and report the outcome to
+        the queue, renewing the lease while the conversion runs.
+
+        Args:
+            queue (JobQueue): queue the job was leased from
+            job (ConversionJob): leased job
+            worker (str): name of the worker holding the lease
+
+        Returns:
+            bool: whether the file was converted
+        """
+        file: FileConversion = {
+            "old_mime_type": job["old_mime_type"],
+            "new_mime_type": "audio/ipod",
+            "old_name": job["old_name"],
+            "new_name": job["new_name"],
+            "path": job["path"],
+            "state": {"status": "pre-conversion", "error_message": None},
+        }
+        if job["profile"] is not None:
+            self.profile = json.loads(job["profile"])
+        stop = threading.Event()
+
+        def heartbeat() -> None:
+            """Renew the lease until the conversion is done or the lease is lost."""
+            while not stop.wait(queue.lease_seconds / 3):
+                if not queue.heartbeat(job["id"], worker):
+                    return
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            self._run_conversion(file)
+        finally:
+            stop.set()
+            thread.join()
+
+        converted = file["state"]["status"] == "success"
+        error = None if converted else file["state"]["error_message"] or "failed"
+        if not queue.complete(job["id"], worker, error):
+            logger.warning(f"lost the lease on {job['old_name']}, result discarded")
+        return converted
+
+    def convert_all(
+        self, skip: Optional[Callable[[FileConversion], bool]] = None
+    ) -> Generator[FileConversion, None, None]:
+        """Convert all Apple Music incompatible audio files in folder to .m4a.
+
+        Image files described by a cue sheet are split into one .m4a per track.
+
+        Args:
+            skip (Optional[Callable[[FileConversion], bool]]): check for
+                conversions already done, e.g. by an interrupted run, which are
+                neither converted again nor yielded. A cue sheet split is only
+                skipped if all of its tracks are. Defaults to None.
 
+        Yields:
+            FileConversion: info about each converted file
+        """
+        self.find_conversions()
+
+        jobs: List[Callable[[], List[FileConversion]]] = []
+        for split in self.cue_splits:
+            if skip is not None and all(skip(track) for track in split["tracks"]):
+                logger.info(f"skipping split of {split['image_name']}, already done")
+                continue
+            jobs.append(partial(self._run_split, split))
+        files: List[FileConversion] = []
         for file in self.incompatible_files:
-            self._convert_file(file)
-            yield file
+            if skip is not None and skip(file):
+                logger.info(f"skipping conversion of {file['old_name']}, already done")
+                continue
+            files.append(file)
+
+        if self.job_queue is not None and files:
+            job_ids = self.job_queue.publish(self.path, files, self.profile)
+            logger.info(f"published {len(files)} conversions to the job queue")
+            for file, job_id in zip(files, job_ids):
+                jobs.append(partial(self._await_job, file, job_id))
+        else:
+            jobs.extend(partial(self._run_conversion, file) for file in files)
+
+        # tune how many conversions run at once while they run, unless workers
+        # elsewhere convert them
+        if self.job_queue is None and jobs:
+            self.tuner = autotuner.start(self.source_type())
+
+        # run up to `max_encoders` conversions at once, yielding them in order
+        workers = self.tuner.max_encoders if self.tuner is not None else 1
+        workers = min(max(workers, governor.max_encoders), len(jobs)) or 1
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pending: Deque["Future[List[FileConversion]]"] = deque()
+                for job in jobs:
+                    # each conversion keeps the logging context it was started in
+                    pending.append(pool.submit(contextvars.copy_context().run, job))
+                    if len(pending) >= min(governor.max_encoders, workers):
+                        yield from pending.popleft().result()
+                while pending:
+                    yield from pending.popleft().result()
+        finally:
+            if self.job_queue is not None and files:
+                self.job_queue.forget(self.path)
+            if self.tuner is not None:
+                autotuner.finish(self.tuner)
+                self.tuner = None
+
+
+def _work(queue: JobQueue, idle_timeout: Optional[float], verify: bool) -> int:
+    """
+    Claim and convert jobs one at a time.
+
+    Args:
+        queue (JobQueue): queue to claim jobs from
+        idle_timeout (Optional[float]): seconds without a job to claim after
+                                        which to stop, or None to never stop
+        verify (bool): whether to check each output against its source
+
+    Returns:
+        int: number of jobs converted
+    """
+    worker = worker_name()
+    converted = 0
+    idle_since = time.monotonic()
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            if (
+                idle_timeout is not None
+                and time.monotonic() - idle_since > idle_timeout
+            ):
+                return converted
+            time.sleep(POLL_INTERVAL)
+            continue
+        logger.info(f"converting {os.path.join(job['path'], job['old_name'])}")
+        convertor = FileConvertor(job["path"])
+        convertor.verify = verify
+        if convertor.run_job(queue, job, worker):
+            converted += 1
+        idle_since = time.monotonic()
+
+
+def run_worker(
+    queue: JobQueue, idle_timeout: Optional[float] = None, verify: bool = False
+) -> int:
+    """
+    Convert jobs from a queue as a worker, converting up to `max_encoders` files
+    at once.
+
+    Args:
+        queue (JobQueue): queue to claim jobs from
+        idle_timeout (Optional[float]): seconds without a job to claim after
+                                        which to stop, or None to never stop.
+                                        Defaults to None.
+        verify (bool): whether to check each output against its source.
+                       Defaults to False.
+
+    Returns:
+        int: number of jobs converted
+    """
+    logger.info(f"waiting for conversion jobs in {queue.path}")
+    with ThreadPoolExecutor(max_workers=governor.max_encoders) as pool:
+        futures = [
+            pool.submit(
+                contextvars.copy_context().run, _work, queue, idle_timeout, verify
+            )
+            for _ in range(governor.max_encoders)
+        ]
+        return sum(future.result() for future in futures)
@@ -0,0 +1,243 @@
+import os
+import re
+from typing import List, Optional, TypedDict
+
+from src.lib.media_classifier import (
+    MediaInfo,
+    classify_media_file,
+    guess_media_info,
+)
+
+
+class SnapshotEntry(TypedDict):
+    """Cached info about a single entry of a folder."""
+
+    """Name of the entry"""
+    name: str
+
+    """Full path to the entry"""
+    path: str
+
+    """Whether the entry is a file"""
+    is_file: bool
+
+    """Whether the entry is a directory"""
+    is_dir: bool
+
+    """Size of the entry in bytes"""
+    size: int
+
+    """Last modification time of the entry"""
+    mtime: float
+
+    """MIME type the entry was classified as, if any, or guessed from its
+    extension until files are classified"""
+    mime_type: Optional[str]
+
+    """Kind of media the entry holds ("audio", "image"), if any, once files are
+    classified"""
+    media_kind: Optional[str]
+
+    """Container and codec info identified from the file contents, if a media
+    file, once files are classified"""
+    media_info: Optional[MediaInfo]
+
+    """Disc number the entry's sub folder names, if in a disc sub folder"""
+    disc: Optional[int]
+
+
+# sub folders holding a single disc of an album, e.g. "CD1", "Disc 2" or "vol.3"
+DISC_FOLDER_PATTERN = re.compile(
+    r"^(?:cd|dis[ck]|volume|vol\.?)\s*[-_.]?\s*(\d+)(?!\d)", re.IGNORECASE
+)
+
+# sub folders that never hold any of an album's files
+IGNORE_DIRS = ["__MACOSX"]
+
+
+def disc_number(relative_path: str) -> Optional[int]:
+    """
+    Infer the disc of an album a file belongs to from the sub folders it is in.
+
+    Args:
+        relative_path (str): path of the file relative to the album folder
+
+    Returns:
+        Optional[int]: disc number, if a sub folder is named after a disc
+    """
+    for part in os.path.dirname(relative_path).split(os.sep):
+        match = DISC_FOLDER_PATTERN.match(part)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+class FolderSnapshot(object):
+    """
+    Listing of a folder built from a single `os.scandir` pass and shared by
+    everything that needs to look at the folder's contents, so that a folder is
+    only listed and classified once however many times it is searched.
+
+    The listing is taken the first time it is needed and kept until
+    `invalidate` is called, which should be done after anything writes new files
+    to the folder. Files are only classified from their contents the first
+    time `files` is called, so checks that only need names, like whether a
+    folder is empty, never read any file.
+
+    A recursive snapshot lists the whole folder tree in the same pass, so an
+    album split into sub folders, e.g. "CD1" and "CD2" or "Scans", is indexed
+    once as a whole. Hidden sub folders and archive metadata are skipped.
+
+    Args:
+        path (str): path to the folder
+        recursive (bool): whether to also list every sub folder. Defaults to
+                          False.
+    """
+
+    def __init__(self, path: str, recursive: bool = False) -> None:
+        self.path = path
+        self.recursive = recursive
+        self._entries: Optional[List[SnapshotEntry]] = None
+        self._classified = False
+
+    def __scan(self) -> List[SnapshotEntry]:
+        """
+        List every entry in the folder, and in its sub folders if
+        recursive. Sub folders are listed in name order after the folder's own
+        entries.
+
+        Returns:
+            List[SnapshotEntry]: info for each entry in the folder
+        """
+        entries: List[SnapshotEntry] = []
+        pending = [self.path]
+        while pending:
+            dir_path = pending.pop()
+            sub_dirs = self.__scan_dir(dir_path, entries)
+            if self.recursive:
+                pending.extend(sorted(sub_dirs, reverse=True))
+        return entries
+
+    def __scan_dir(self, dir_path: str, entries: List[SnapshotEntry]) -> List[str]:
+        """
+        List the entries of a single folder of the tree.
+
+        Args:
+            dir_path (str): path to the folder
+            entries (List[SnapshotEntry]): listing to add the entries to
+
+        Returns:
+            List[str]: paths of the sub folders to walk into
+        """
+        sub_dirs: List[str] = []
+        with os.scandir(dir_path) as dir_entries:
+            for dir_entry in dir_entries:
+                # skip entries removed since listing, e.g. broken symlinks
+                try:
+                    stat = dir_entry.stat()
+                except FileNotFoundError:
+                    continue
+                is_file = dir_entry.is_file()
+                is_dir = dir_entry.is_dir()
+                if is_dir and not (
+                    dir_entry.name.startswith(".") or dir_entry.name in IGNORE_DIRS
+                ):
+                    sub_dirs.append(dir_entry.path)
+                entries.append(
+                    {
+                        "name": dir_entry.name,
+                        "path": dir_entry.path,
+                        "is_file": is_file,
+                        "is_dir": is_dir,
+                        "size": stat.st_size,
+                        "mtime": stat.st_mtime,
+                        "mime_type": (
+                            guess_media_info(dir_entry.name)["mime_type"]
+                            if is_file
+                            else None
+                        ),
+                        "media_kind": None,
+                        "media_info": None,
+                        "disc": disc_number(os.path.relpath(dir_entry.path, self.path)),
+                    }
+                )
+
+        return sub_dirs
+
+    def __classify(self) -> None:
+        """
+        Identify media files, and files the extension says nothing about, from
+        their contents, and fill in their media info.
+        """
+        for entry in self.entries:
+            mime_type = entry["mime_type"]
+            if not entry["is_file"] or not (
+                mime_type is None or mime_type.startswith(("audio/", "image/"))
+            ):
+                continue
+            media_info = classify_media_file(entry["path"])
+            mime_type = media_info["mime_type"]
+            entry["mime_type"] = mime_type
+            entry["media_info"] = media_info
+            entry["media_kind"] = (
+                mime_type.split("/")[0]
+                if mime_type and mime_type.startswith(("audio/", "image/"))
+                else None
+            )
+
+    @property
+    def entries(self) -> List[SnapshotEntry]:
+        """
+        Info for each entry in the folder, listing the folder if needed. Media
+        info is only set once `files` has been called.
+        """
+        if self._entries is None:
+            self._entries = self.__scan()
+            self._classified = False
+        return self._entries
+
+    def discs(self) -> List[int]:
+        """
+        Get the discs of the album the folder holds, from the disc sub folders
+        its audio files are in.
+
+        Returns:
+            List[int]: disc numbers in order, empty if not split into discs
+        """
+        return sorted(
+            {
+                entry["disc"]
+                for entry in self.files()
+                if entry["disc"] is not None and entry["media_kind"] == "audio"
+            }
+        )
+
+    def files(self, classify: bool = True) -> List[SnapshotEntry]:
+        """
+        Get all files in the folder, classifying them the first time.
+
+        Args:
+            classify (bool): whether the files' media info is needed. Defaults
+                             to True.
+
+        Returns:
+            List[SnapshotEntry]: info for each file in the folder
+        """
+        if classify and not self._classified:
+            self.__classify()
+            self._classified = True
+        return [entry for entry in self.entries if entry["is_file"]]
+
+    def dirs(self) -> List[SnapshotEntry]:
+        """
+        Get all directories in the folder.
+
+        Returns:
+            List[SnapshotEntry]: info for each directory in the folder
+        """
+        return [entry for entry in self.entries if entry["is_dir"]]
+
+    def invalidate(self) -> None:
+        """Drop the cached listing so the folder is listed again on next use."""
+        self._entries = None
+        self._classified = False
@@ -0,0 +1,251 @@
+import os
+import shutil
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, Generator, List, Literal, Optional
+
+from src.lib.logger import logger
+
+# IO priorities encoders can be run at
+IOPriority = Literal["low", "idle"]
+
+# commands prefixed to encoders to lower their IO priority on each platform
+IO_PRIORITY_COMMANDS: Dict[str, Dict[IOPriority, List[str]]] = {
+    "linux": {
+        "low": ["ionice", "-c", "2", "-n", "7"],
+        "idle": ["ionice", "-c", "3"],
+    },
+    "darwin": {
+        "low": ["taskpolicy", "-d", "utility"],
+        "idle": ["taskpolicy", "-d", "throttle"],
+    },
+}
+
+# MIME types of lossy formats, which grow when converted to lossless ALAC
+LOSSY_MIME_TYPES = [
+    "audio/mpeg",
+    "audio/ogg",
+    "audio/opus",
+    "audio/x-ms-wma",
+    "audio/aac",
+]
+
+# estimated size of ALAC output relative to a lossy or lossless source
+LOSSY_OUTPUT_RATIO = 5.0
+LOSSLESS_OUTPUT_RATIO = 1.1
+
+# bytes assumed for a cover image that is only chosen during processing
+DEFAULT_COVER_IMAGE_SIZE = 1024 * 1024
+
+
+def estimate_output_size(mime_type: Optional[str], source_size: int) -> int:
+    """
+    Estimate the size of the ALAC file a source converts to.
+
+    Args:
+        mime_type (Optional[str]): MIME type of the source
+        source_size (int): size of the source, in bytes
+
+    Returns:
+        int: estimated output size, in bytes
+    """
+    ratio = (
+        LOSSY_OUTPUT_RATIO if mime_type in LOSSY_MIME_TYPES else LOSSLESS_OUTPUT_RATIO
+    )
+    return int(source_size * ratio)
+
+
+def _disk_device(path: str) -> str:
+    """
+    Identify the volume a path is on, so reservations on it add up.
+
+    Args:
+        path (str): path on the volume
+
+    Returns:
+        str: identifier of the volume
+    """
+    try:
+        return str(os.stat(path).st_dev)
+    except OSError:
+        return path
+
+
+class ResourceGovernor(object):
+    """
+    Limit the resources conversions and tagging take from the machine: free
+    disk space, CPU and IO priority of encoders, and how many encoders run at
+    once. All limits are off until configured.
+
+    Args:
+        max_encoders (int): maximum number of encoders running at once.
+                            Defaults to 1.
+        nice (Optional[int]): niceness to run encoders at. Defaults to None.
+        io_priority (Optional[IOPriority]): IO priority to run encoders at.
+                                            Defaults to None.
+        min_free_space (int): bytes that must stay free on a volume after the
+                              work admitted onto it. Defaults to 0.
+    """
+
+    def __init__(
+        self,
+        max_encoders: int = 1,
+        nice: Optional[int] = None,
+        io_priority: Optional[IOPriority] = None,
+        min_free_space: int = 0,
+    ) -> None:
+        self.max_encoders = 1
+        self.encoder_threads: Optional[int] = None
+        self.nice: Optional[int] = None
+        self.io_priority: Optional[IOPriority] = None
+        self.min_free_space = 0
+        self._prefix: List[str] = []
+        self._encoders_running = 0
+        self._encoder_condition = threading.Condition()
+        self._reserved: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.configure(max_encoders, nice, io_priority, min_free_space)
+
+    def configure(
+        self,
+        max_encoders: int = 1,
+        nice: Optional[int] = None,
+        io_priority: Optional[IOPriority] = None,
+        min_free_space: int = 0,
+    ) -> None:
+        """
+        Set the limits. Only call this while no encoders are running.
+
+        Args:
+            max_encoders (int): maximum number of encoders running at once.
+                                Defaults to 1.
+            nice (Optional[int]): niceness to run encoders at. Defaults to None.
+            io_priority (Optional[IOPriority]): IO priority to run encoders at.
+                                                Defaults to None.
+            min_free_space (int): bytes that must stay free on a volume after
+                                  the work admitted onto it. Defaults to 0.
+        """
+        self.set_encoder_limits(max_encoders)
+        self.nice = nice
+        self.io_priority = io_priority
+        self.min_free_space = min_free_space
+
+        prefix: List[str] = []
+        if io_priority is not None:
+            io_command = IO_PRIORITY_COMMANDS.get(sys.platform, {}).get(io_priority)
+            if io_command and shutil.which(io_command[0]):
+                prefix.extend(io_command)
+            else:
+                logger.warning(
+                    f"can't set encoder IO priority to '{io_priority}' on this system"
+                )
+        if nice is not None:
+            if shutil.which("nice"):
+                prefix.extend(["nice", "-n", str(nice)])
+            else:
+                logger.warning("can't set encoder niceness on this system")
+        self._prefix = prefix
+
+    def set_encoder_limits(
+        self, max_encoders: int, encoder_threads: Optional[int] = None
+    ) -> None:
+        """
+        Change how many encoders run at once, and how many threads each uses.
+        Encoders already running keep their slots when the limit is lowered.
+
+        Args:
+            max_encoders (int): maximum number of encoders running at once
+            encoder_threads (Optional[int]): threads per encoder, or None to let
+                                             ffmpeg choose. Defaults to None.
+        """
+        with self._encoder_condition:
+            self.max_encoders = max(1, max_encoders)
+            self.encoder_threads = encoder_threads
+            self._encoder_condition.notify_all()
+
+    def command(self, command: List[str]) -> List[str]:
+        """
+        Wrap an encoder command to run at the configured CPU and IO priority.
+
+        Args:
+            command (List[str]): encoder command
+
+        Returns:
+            List[str]: wrapped command
+        """
+        return [*self._prefix, *command]
+
+    @contextmanager
+    def encoder_slot(self) -> Generator[None, None, None]:
+        """
+        Wait until fewer than `max_encoders` encoders run, and hold a slot while
+        one runs.
+
+        Yields:
+            None: while the slot is held
+        """
+        with self._encoder_condition:
+            self._encoder_condition.wait_for(
+                lambda: self._encoders_running < self.max_encoders
+            )
+            self._encoders_running += 1
+        try:
+            yield
+        finally:
+            with self._encoder_condition:
+                self._encoders_running -= 1
+                self._encoder_condition.notify_all()
+
+    def has_space(self, path: str, size: int) -> bool:
+        """
+        Check if writing more bytes to a volume keeps enough space free.
+
+        Args:
+            path (str): path on the volume
+            size (int): bytes to write
+
+        Returns:
+            bool: whether there is enough space
+        """
+        if self.min_free_space <= 0:
+            return True
+        return shutil.disk_usage(path).free - size >= self.min_free_space
+
+    def admit(self, path: str, size: int) -> bool:
+        """
+        Admit work that writes bytes to a volume, if the projected free space
+        stays above `min_free_space`, and reserve the space for it.
+
+        Args:
+            path (str): path on the volume
+            size (int): estimated bytes the work writes
+
+        Returns:
+            bool: whether the work was admitted. Admitted work must be released.
+        """
+        device = _disk_device(path)
+        with self._lock:
+            reserved = self._reserved.get(device, 0)
+            if self.min_free_space > 0:
+                free = shutil.disk_usage(path).free - reserved
+                if free - size < self.min_free_space:
+                    return False
+            self._reserved[device] = reserved + size
+        return True
+
+    def release(self, path: str, size: int) -> None:
+        """
+        Release the space reserved by admitted work once it is done.
+
+        Args:
+            path (str): path on the volume
+            size (int): bytes reserved for the work
+        """
+        device = _disk_device(path)
+        with self._lock:
+            self._reserved[device] = max(0, self._reserved.get(device, 0) - size)
+
+
+# governor shared by all conversions and tagging
+governor = ResourceGovernor()
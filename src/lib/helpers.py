@@ -1,65 +1,197 @@
-import glob
+import contextvars
 import json
-import mimetypes
 import os
-from itertools import chain
-from typing import Any, Dict, Hashable, List, Tuple, cast
-
-from send2trash import send2trash
-
-
-def find_files_by_ext(path: str, extensions: List[str]) -> List[str]:
+import queue
+import threading
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
+
+from src.lib.folder_snapshot import FolderSnapshot
+from src.lib.trash import move_to_trash
+
+
+def find_files_by_ext(
+    path: str, extensions: List[str], snapshot: Optional[FolderSnapshot] = None
+) -> List[str]:
     """Find all file in path folder that have certain extensions.
 
     Args:
         path (str): path of folder containing files
         extensions (List[str]): list of valid extensions
+        snapshot (Optional[FolderSnapshot]): existing listing of the folder to
+                                             search instead of listing it again.
+                                             Defaults to None.
 
     Returns:
         List[str]: full paths to each file with a valid extension
     """
 
-    matched_items = list(
-        chain.from_iterable(
-            [glob.glob(os.path.join(path, f"*{ext}")) for ext in extensions]
-        )
-    )
+    snapshot = snapshot or FolderSnapshot(path)
+
+    # hidden files are skipped, as they would be by a `*{ext}` glob
     matched_files = [
-        item for item in matched_items if os.path.isfile(os.path.join(path, item))
+        entry["path"]
+        for ext in extensions
+        for entry in snapshot.files(classify=False)
+        if entry["name"].endswith(ext) and not entry["name"].startswith(".")
     ]
 
     return matched_files
 
 
-def find_files_by_mime_type(path: str, mime_types: List[str]) -> List[str]:
+def find_files_by_mime_type(
+    path: str, mime_types: List[str], snapshot: Optional[FolderSnapshot] = None
+) -> List[str]:
     """Find all file in path folder that have a certain MIME types.
 
     Args:
         path (str): path of folder containing files
         mime_types (List[str]): MIME types to filter by
+        snapshot (Optional[FolderSnapshot]): existing listing of the folder to
+                                             search instead of listing it again.
+                                             Defaults to None.
 
     Returns:
         List[str]: full paths to each file with matching MIME types
     """
 
-    all_files = [
-        os.path.join(path, item)
-        for item in os.listdir(path)
-        if os.path.isfile(os.path.join(path, item))
-    ]
+    snapshot = snapshot or FolderSnapshot(path)
     matched_files = [
-        file for file in all_files if mimetypes.guess_type(file)[0] in mime_types
+        entry["path"] for entry in snapshot.files() if entry["mime_type"] in mime_types
     ]
 
     return matched_files
 
 
+def file_size(path: str) -> int:
+    """Get the size of a file, treating missing files as empty.
+
+    Args:
+        path (str): path of file
+
+    Returns:
+        int: size of the file in bytes
+    """
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+T = TypeVar("T")
+
+
+class _EndOfBuffer(object):
+    """Sentinel put on a buffer queue once its producer is exhausted."""
+
+    def __init__(self, error: Optional[BaseException] = None) -> None:
+        self.error = error
+
+
+def buffered_generator(
+    items: Iterable[T],
+    buffer_size: int = 1,
+    report_depth: Optional[Callable[[int], None]] = None,
+) -> Generator[T, None, None]:
+    """
+    Consume an iterable on a background thread, keeping at most `buffer_size`
+    items ready ahead of the caller. This lets slow producers (e.g. file
+    conversions) run while the caller is busy with the previous item.
+
+    Args:
+        items (Iterable[T]): iterable to consume in the background
+        buffer_size (int): maximum number of items to hold ahead of the caller.
+                           Defaults to 1.
+        report_depth (Optional[Callable[[int], None]]): called with the number
+                                                        of items waiting in the
+                                                        buffer whenever it
+                                                        changes. Defaults to None.
+
+    Raises:
+        ValueError: if `buffer_size` is less than 1
+
+    Yields:
+        T: each item of `items`, in order
+    """
+
+    if buffer_size < 1:
+        raise ValueError("`buffer_size` must be at least 1")
+
+    buffer: queue.Queue[Union[T, _EndOfBuffer]] = queue.Queue(maxsize=buffer_size)
+    stopped = threading.Event()
+
+    def put(item: Union[T, _EndOfBuffer]) -> bool:
+        """
+        Put an item on the buffer, giving up if the caller stopped consuming.
+
+        Args:
+            item (Union[T, _EndOfBuffer]): item to put on the buffer
+
+        Returns:
+            bool: whether the item was put on the buffer
+        """
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                if report_depth is not None:
+                    report_depth(buffer.qsize())
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        """Move items from the iterable onto the buffer."""
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_EndOfBuffer(e))
+            return
+        put(_EndOfBuffer())
+
+    # run the producer in a copy of the caller's context, so anything it logs
+    # is nested in the caller's open log sections
+    context = contextvars.copy_context()
+    producer = threading.Thread(target=context.run, args=(produce,), daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if report_depth is not None:
+                report_depth(buffer.qsize())
+            if isinstance(item, _EndOfBuffer):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
 # system files to not consider
 IGNORE_FILES = [".DS_Store"]
 
 
 def is_dir_empty(
-    dir_path: str, ignore_files: List[str] = IGNORE_FILES, ignore_dirs: List[str] = []
+    dir_path: str,
+    ignore_files: List[str] = IGNORE_FILES,
+    ignore_dirs: List[str] = [],
+    snapshot: Optional[FolderSnapshot] = None,
 ) -> bool:
     """
     Check if directory is empty of files, and only contains empty folder or
@@ -69,6 +201,13 @@ def is_dir_empty(
         dir_path (str): path of directory to check
         ignore_files (List[str]): list of file names to ignore
         ignore_dirs (List[str]): list of dir names to ignore
+        snapshot (Optional[FolderSnapshot]): existing listing of the directory
+                                             to check the top level against
+                                             instead of listing it again.
+                                             Defaults to None.
+
+    Raises:
+        TypeError: if `dir_path` is not a directory
 
     Returns:
         bool: whether or not the directory is empty
@@ -77,16 +216,30 @@ def is_dir_empty(
     if not os.path.isdir(dir_path):
         raise TypeError("`dir_path` must be a directory")
 
-    for _, dirs, files in os.walk(dir_path, topdown=True):
-        dirs[:] = [d for d in dirs if d not in ignore_dirs]
-        files[:] = [f for f in files if f not in ignore_files]
-        if files:
+    snapshot = snapshot or FolderSnapshot(dir_path)
+
+    # check the top level from the listing, only walking into sub directories
+    for entry in snapshot.entries:
+        if entry["is_dir"]:
+            continue
+        if entry["name"] not in ignore_files:
             return False
 
+    for entry in snapshot.dirs():
+        if entry["name"] in ignore_dirs:
+            continue
+        for _, dirs, files in os.walk(entry["path"], topdown=True):
+            dirs[:] = [d for d in dirs if d not in ignore_dirs]
+            files[:] = [f for f in files if f not in ignore_files]
+            if files:
+                return False
+
     return True
 
 
-def delete_child_and_parent_dir_if_empty(child_path: str) -> Tuple[bool, str]:
+def delete_child_and_parent_dir_if_empty(
+    child_path: str, parent_snapshot: Optional[FolderSnapshot] = None
+) -> Tuple[bool, str]:
     """
     Delete a child dir and if it's parent dir is empty besides the child dir,
     then the parent dir is also deleted.
@@ -94,6 +247,13 @@ def delete_child_and_parent_dir_if_empty(child_path: str) -> Tuple[bool, str]:
 
     Args:
         child_path (str): path to child dir
+        parent_snapshot (Optional[FolderSnapshot]): existing listing of the
+                                                    parent dir to check instead
+                                                    of listing it again.
+                                                    Defaults to None.
+
+    Raises:
+        TypeError: if `child_path` is not a directory
 
     Returns:
         Tuple[bool, str]: (whether the parent dir was also deleted, parent dir)
@@ -104,11 +264,15 @@ def delete_child_and_parent_dir_if_empty(child_path: str) -> Tuple[bool, str]:
 
     # delete parent directory if it is empty
     parent_dir = os.path.dirname(child_path)
-    if is_dir_empty(parent_dir, ignore_dirs=[os.path.basename(child_path)]):
-        send2trash(parent_dir)
+    if is_dir_empty(
+        parent_dir,
+        ignore_dirs=[os.path.basename(child_path)],
+        snapshot=parent_snapshot,
+    ):
+        move_to_trash(parent_dir)
         return True, parent_dir
     else:
-        send2trash(child_path)
+        move_to_trash(child_path)
         return False, parent_dir
 
 
@@ -0,0 +1,303 @@
+import json
+import os
+import socket
+import threading
+import time
+from typing import TYPE_CHECKING, List, Literal, Optional, TypedDict, cast
+
+if TYPE_CHECKING:
+    from src.lib.file_convertor import FileConversion
+    from src.lib.output_profile import OutputProfile
+
+# states a conversion job moves through
+JobState = Literal["pending", "leased", "done", "failed"]
+
+# times a job is leased before it is failed, so a file that kills every worker
+# converting it doesn't hold up its folder forever
+MAX_JOB_ATTEMPTS = 3
+
+# seconds to wait for another process holding the queue's write lock
+BUSY_TIMEOUT = 30.0
+
+# seconds between checks for new or finished jobs
+POLL_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    folder TEXT NOT NULL,
+    path TEXT NOT NULL,
+    old_name TEXT NOT NULL,
+    new_name TEXT NOT NULL,
+    old_mime_type TEXT,
+    profile TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+CREATE INDEX IF NOT EXISTS jobs_folder ON jobs (folder);
+"""
+
+
+class ConversionJob(TypedDict):
+    """Conversion of a single file, as kept in the job queue."""
+
+    """Id of the job"""
+    id: int
+
+    """Path of the album folder the job was published for"""
+    folder: str
+
+    """Path of the folder with the file"""
+    path: str
+
+    """Name of the file to convert from"""
+    old_name: str
+
+    """Name of the converted file"""
+    new_name: str
+
+    """MIME type of the file to convert from"""
+    old_mime_type: Optional[str]
+
+    """Output profile to convert with, as JSON, if not the default"""
+    profile: Optional[str]
+
+    """State of the job"""
+    state: JobState
+
+    """Worker that leased the job last"""
+    worker: Optional[str]
+
+    """Unix time the current lease runs out at"""
+    lease_expires: Optional[float]
+
+    """Times the job was leased"""
+    attempts: int
+
+    """Error the job failed with"""
+    error: Optional[str]
+
+
+def worker_name() -> str:
+    """
+    Get a name for the current thread that is unique across hosts sharing a
+    queue.
+
+    Returns:
+        str: host name, process id and thread id
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class JobQueue(object):
+    """
+    Queue of file conversions in an SQLite database, shared by a coordinator
+    that publishes them and any number of worker processes, on any host that
+    mounts the database and the music folders at the same paths.
+
+    Workers lease jobs for `lease_seconds` and renew the lease with heartbeats
+    while converting. A job whose lease runs out, because its worker died or
+    lost the share, is leased again by the next worker to claim one.
+
+    Args:
+        path (str): path of the database file
+        lease_seconds (float): seconds a lease lasts without a heartbeat.
+                               Defaults to 60.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 60.0) -> None:
+        import sqlite3
+
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False
+        )
+        self._connection.row_factory = sqlite3.Row
+        with self._lock:
+            self._connection.executescript(SCHEMA)
+            # queues created before output profiles have no column for them
+            columns = {
+                row["name"]
+                for row in self._connection.execute("PRAGMA table_info(jobs)")
+            }
+            if "profile" not in columns:
+                self._connection.execute("ALTER TABLE jobs ADD COLUMN profile TEXT")
+
+    def close(self) -> None:
+        """Close the connection to the database."""
+        with self._lock:
+            self._connection.close()
+
+    def publish(
+        self,
+        folder: str,
+        files: List["FileConversion"],
+        profile: Optional["OutputProfile"] = None,
+    ) -> List[int]:
+        """
+        Publish conversions for workers to claim.
+
+        Args:
+            folder (str): path of the album folder the conversions are for
+            files (List[FileConversion]): conversions to publish
+            profile (Optional[OutputProfile]): output profile to convert with.
+                                               Defaults to None, for the
+                                               default profile.
+
+        Returns:
+            List[int]: id of each published job, in order
+        """
+        ids: List[int] = []
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                for file in files:
+                    cursor = self._connection.execute(
+                        "INSERT INTO jobs (folder, path, old_name, new_name, "
+                        + "old_mime_type, profile) VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            folder,
+                            file["path"],
+                            file["old_name"],
+                            file["new_name"],
+                            file["old_mime_type"],
+                            json.dumps(profile) if profile is not None else None,
+                        ),
+                    )
+                    assert cursor.lastrowid is not None
+                    ids.append(cursor.lastrowid)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return ids
+
+    def claim(self, worker: str) -> Optional[ConversionJob]:
+        """
+        Lease the oldest job that is pending or whose lease ran out. Jobs that
+        ran out of leases `MAX_JOB_ATTEMPTS` times are failed instead.
+
+        Args:
+            worker (str): name of the claiming worker
+
+        Returns:
+            Optional[ConversionJob]: leased job, if there was one to claim
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.execute(
+                    "UPDATE jobs SET state = 'failed', error = ? WHERE state = "
+                    + "'leased' AND lease_expires < ? AND attempts >= ?",
+                    (
+                        f"lease ran out {MAX_JOB_ATTEMPTS} times",
+                        now,
+                        MAX_JOB_ATTEMPTS,
+                    ),
+                )
+                row = self._connection.execute(
+                    "SELECT id FROM jobs WHERE state = 'pending' OR (state = "
+                    + "'leased' AND lease_expires < ?) ORDER BY id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    self._connection.execute("COMMIT")
+                    return None
+                self._connection.execute(
+                    "UPDATE jobs SET state = 'leased', worker = ?, lease_expires "
+                    + "= ?, attempts = attempts + 1 WHERE id = ?",
+                    (worker, now + self.lease_seconds, row["id"]),
+                )
+                job = self._job(row["id"])
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return job
+
+    def heartbeat(self, job_id: int, worker: str) -> bool:
+        """
+        Renew a worker's lease on a job.
+
+        Args:
+            job_id (int): id of the job
+            worker (str): name of the worker holding the lease
+
+        Returns:
+            bool: whether the worker still held the lease
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? "
+                + "AND state = 'leased'",
+                (time.time() + self.lease_seconds, job_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str, error: Optional[str] = None) -> bool:
+        """
+        Report a leased job as converted or failed. Reports from a worker that
+        lost its lease are ignored, as the job was handed to another worker.
+
+        Args:
+            job_id (int): id of the job
+            worker (str): name of the worker holding the lease
+            error (Optional[str]): error the conversion failed with. Defaults
+                                   to None.
+
+        Returns:
+            bool: whether the report was accepted
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET state = ?, error = ?, lease_expires = NULL "
+                + "WHERE id = ? AND worker = ? AND state = 'leased'",
+                ("done" if error is None else "failed", error, job_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def _job(self, job_id: int) -> Optional[ConversionJob]:
+        """
+        Read a job without taking the lock.
+
+        Args:
+            job_id (int): id of the job
+
+        Returns:
+            Optional[ConversionJob]: job, if it exists
+        """
+        row = self._connection.execute(
+            "SELECT * FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return cast(ConversionJob, dict(row)) if row is not None else None
+
+    def job(self, job_id: int) -> Optional[ConversionJob]:
+        """
+        Read a job.
+
+        Args:
+            job_id (int): id of the job
+
+        Returns:
+            Optional[ConversionJob]: job, if it exists
+        """
+        with self._lock:
+            return self._job(job_id)
+
+    def forget(self, folder: str) -> None:
+        """
+        Remove all jobs of a folder, once the coordinator has their results.
+
+        Args:
+            folder (str): path of the album folder
+        """
+        with self._lock:
+            self._connection.execute("DELETE FROM jobs WHERE folder = ?", (folder,))
@@ -0,0 +1,267 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import IO, Dict, List, Literal, Optional, Tuple, TypedDict
+
+from src.lib.logger import logger
+from src.lib.planner import ThroughputHistory
+
+# stages a journal records completion of
+JournalStage = Literal["converted", "tagged", "imported", "deleted"]
+
+# journal stages mapped to the processing stages they save work in
+SAVED_STAGES: Dict[str, str] = {
+    "converted": "file conversions",
+    "tagged": "cover image tagging",
+    "imported": "Apple Music import",
+}
+
+
+class JournalEntry(TypedDict):
+    """Completion of a single step, as written to the journal."""
+
+    """Unix time the step completed at"""
+    time: float
+
+    """Path of the album folder"""
+    folder: str
+
+    """Completed stage"""
+    stage: JournalStage
+
+    """Name of the file the step handled, or "" for folder steps"""
+    file: str
+
+    """Size of the file when the step completed, to tell if it changed since"""
+    size: Optional[int]
+
+    """Modification time of the file when the step completed"""
+    mtime_ns: Optional[int]
+
+    """Bytes the step read, counted as saved if it is skipped"""
+    bytes: int
+
+
+def _file_identity(path: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Get the size and modification time of a file.
+
+    Args:
+        path (Optional[str]): path of the file
+
+    Returns:
+        Tuple[Optional[int], Optional[int]]: size and modification time, or
+                                             Nones if there is no file
+    """
+    if path is None:
+        return None, None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class RunJournal(object):
+    """
+    Append-only journal of the steps completed in each album folder, so a run
+    that dies halfway can be continued where it stopped by the next run.
+
+    Every step is written as a JSON line and fsynced before it is relied on.
+    Steps of a folder are forgotten once the folder is processed without errors.
+
+    Args:
+        path (str): path of the journal file
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries: Dict[Tuple[str, str, str], JournalEntry] = {}
+        self.saved: Dict[str, Tuple[int, int]] = {}
+        self._file: Optional[IO[str]] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        """
+        Replay the journal left by previous runs. A line torn by a crash while
+        it was being written is ignored.
+
+        Returns:
+            int: number of completed steps replayed
+        """
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return 0
+
+        for line in lines:
+            try:
+                entry: JournalEntry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self.entries[(entry["folder"], entry["stage"], entry["file"])] = entry
+        return len(self.entries)
+
+    def _write_line(self, entry: JournalEntry) -> None:
+        """
+        Append an entry to the journal file and flush it to disk.
+
+        Args:
+            entry (JournalEntry): entry to write
+        """
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record(
+        self,
+        folder: str,
+        stage: JournalStage,
+        file: str = "",
+        path: Optional[str] = None,
+        size: int = 0,
+    ) -> None:
+        """
+        Record that a step completed.
+
+        Args:
+            folder (str): path of the album folder
+            stage (JournalStage): completed stage
+            file (str): name of the file the step handled. Defaults to "", for
+                        folder steps.
+            path (Optional[str]): path of the file, if later runs should only
+                                  skip the step while the file is unchanged.
+                                  Defaults to None.
+            size (int): bytes the step read. Defaults to 0.
+        """
+        file_size, mtime_ns = _file_identity(path)
+        entry: JournalEntry = {
+            "time": time.time(),
+            "folder": folder,
+            "stage": stage,
+            "file": file,
+            "size": file_size,
+            "mtime_ns": mtime_ns,
+            "bytes": size,
+        }
+        with self._lock:
+            self._write_line(entry)
+            self.entries[(folder, stage, file)] = entry
+
+    def refresh(
+        self, folder: str, stage: JournalStage, file: str, path: Optional[str]
+    ) -> None:
+        """
+        Record a file again after a later step changed it, e.g. tagging a
+        converted file, so the earlier step still matches the file on resume.
+
+        Args:
+            folder (str): path of the album folder
+            stage (JournalStage): earlier stage that handled the file
+            file (str): name of the file
+            path (Optional[str]): path of the file
+        """
+        with self._lock:
+            entry = self.entries.get((folder, stage, file))
+        if entry is not None:
+            self.record(folder, stage, file, path, entry["bytes"])
+
+    def skip(
+        self,
+        folder: str,
+        stage: JournalStage,
+        file: str = "",
+        path: Optional[str] = None,
+    ) -> bool:
+        """
+        Check if a step was completed by an earlier run and can be skipped,
+        counting its work as saved if so.
+
+        Args:
+            folder (str): path of the album folder
+            stage (JournalStage): stage of the step
+            file (str): name of the file the step handles. Defaults to "", for
+                        folder steps.
+            path (Optional[str]): path of the file, to check it is unchanged
+                                  since the step completed. Defaults to None.
+
+        Returns:
+            bool: whether the step can be skipped
+        """
+        with self._lock:
+            entry = self.entries.get((folder, stage, file))
+            if entry is None:
+                return False
+            if path is not None and _file_identity(path) != (
+                entry["size"],
+                entry["mtime_ns"],
+            ):
+                return False
+            count, size = self.saved.get(stage, (0, 0))
+            self.saved[stage] = (count + 1, size + entry["bytes"])
+            return True
+
+    def forget(self, folder: str) -> None:
+        """
+        Forget every step of a folder, rewriting the journal without them.
+
+        Args:
+            folder (str): path of the album folder
+        """
+        with self._lock:
+            remaining = [
+                entry for entry in self.entries.values() if entry["folder"] != folder
+            ]
+            if len(remaining) == len(self.entries):
+                return
+            self.entries = {
+                (entry["folder"], entry["stage"], entry["file"]): entry
+                for entry in remaining
+            }
+            self.close()
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.writelines(json.dumps(entry) + "\n" for entry in remaining)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+
+    def close(self) -> None:
+        """Close the journal file. It is reopened by the next record."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def log_saved_work(self, history: ThroughputHistory) -> None:
+        """
+        Log the steps skipped because an earlier run completed them, with the
+        bytes and estimated time they saved.
+
+        Args:
+            history (ThroughputHistory): throughput to estimate saved time from
+        """
+        lines: List[str] = []
+        for stage, name in SAVED_STAGES.items():
+            count, size = self.saved.get(stage, (0, 0))
+            if count == 0:
+                continue
+            seconds = history.estimate(name, count, size)
+            estimate = f", ~{seconds:.1f} s" if seconds is not None else ""
+            lines.append(f"{name}: {count} files, {size / 1e6:.1f} MB{estimate}")
+
+        if not lines:
+            logger.info("resume saved no work")
+            return
+        logger.info("work saved by resuming:")
+        logger.indent()
+        for line in lines:
+            logger.info(line)
+        logger.dedent()
@@ -1,5 +1,25 @@
+import atexit
+import json
 import logging
-from typing import Any, Callable, Dict
+import os
+import queue
+import shutil
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
 
 # CONSTANTS
 
@@ -19,26 +39,383 @@ PROMPT_LEVEL = 51
 logging.addLevelName(PROMPT_LEVEL, "PROMPT")
 
 
+def _cpu_time() -> float:
+    """
+    Get CPU time used so far by this process and its finished child processes
+    (e.g. ffmpeg), so sections that wait on subprocesses are accounted for.
+
+    Returns:
+        float: CPU seconds used
+    """
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class SectionTiming(object):
+    """
+    Timing of a logged section, and of the sections nested inside it.
+
+    Args:
+        name (str): name of the section
+        kind (Optional[str]): what the section covers (e.g. "run", "folder",
+                              "stage", "file"). Defaults to None.
+        label (Optional[str]): what the section is about (e.g. a folder or file
+                               path). Defaults to None.
+    """
+
+    def __init__(
+        self, name: str, kind: Optional[str] = None, label: Optional[str] = None
+    ) -> None:
+        self.name = name
+        self.kind = kind
+        self.label = label
+        self.start = time.monotonic()
+        self.end: Optional[float] = None
+        self.cpu_start = _cpu_time()
+        self.cpu_end: Optional[float] = None
+        self.bytes_processed = 0
+        self.bytes_written = 0
+        self.outcome = "ok"
+        self.children: List["SectionTiming"] = []
+
+    @property
+    def wall_time(self) -> float:
+        """Wall clock seconds spent in the section so far."""
+        return (self.end or time.monotonic()) - self.start
+
+    @property
+    def cpu_time(self) -> float:
+        """CPU seconds spent in the section so far."""
+        return (self.cpu_end or _cpu_time()) - self.cpu_start
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes processed in the section and all sections nested in it."""
+        return self.bytes_processed + sum(child.total_bytes for child in self.children)
+
+    def finish(self) -> None:
+        """Mark the section as ended."""
+        self.end = time.monotonic()
+        self.cpu_end = _cpu_time()
+
+
+def section_fields(sections: Tuple[SectionTiming, ...]) -> Dict[str, Any]:
+    """
+    Describe where in the run a log event happened, from the sections open at
+    the time.
+
+    Args:
+        sections (Tuple[SectionTiming, ...]): open sections, outermost first
+
+    Returns:
+        Dict[str, Any]: section path, folder, stage and file of the event
+    """
+    fields: Dict[str, Any] = {
+        "section_path": [timing.name for timing in sections if timing.kind != "run"],
+        "folder": None,
+        "stage": None,
+        "file": None,
+    }
+    for timing in sections:
+        if timing.kind == "folder":
+            fields["folder"] = timing.label
+        elif timing.kind == "stage":
+            fields["stage"] = timing.name
+        elif timing.kind == "file":
+            fields["file"] = timing.label
+    return fields
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """
+    Format log records from `IndentColoredLogger` as one JSON object per line,
+    without color codes or indentation, for machine parsing.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a log record as a JSON object.
+
+        Args:
+            record (logging.LogRecord): record to format
+
+        Returns:
+            str: JSON object on a single line
+        """
+        event: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "event": getattr(record, "event", "log"),
+            "message": getattr(record, "raw_message", record.getMessage()),
+        }
+        for field in (
+            "section_path",
+            "folder",
+            "stage",
+            "file",
+            "duration",
+            "cpu_time",
+            "bytes",
+            "outcome",
+        ):
+            value = getattr(record, field, None)
+            if value is not None:
+                event[field] = value
+        return json.dumps(event, ensure_ascii=False)
+
+
+class FolderGroupingHandler(logging.Handler):
+    """
+    Pass log records on to other handlers, keeping the output of each folder
+    together when several folders are processed at the same time.
+
+    The first folder to log is output as it goes, while records from other
+    folders are held back until it finishes. Held folders are then output in
+    the order they started logging. Records that are not about a folder, and
+    prompts, are always output straight away.
+
+    Args:
+        *handlers (logging.Handler): handlers to output records with
+    """
+
+    def __init__(self, *handlers: logging.Handler) -> None:
+        super().__init__()
+        self.handlers = list(handlers)
+        self._current_folder: Optional[str] = None
+        self._held: Dict[str, List[logging.LogRecord]] = {}
+
+    def _output(self, record: logging.LogRecord) -> None:
+        """
+        Output a record with every handler.
+
+        Args:
+            record (logging.LogRecord): record to output
+        """
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _output_folder(self, record: logging.LogRecord) -> None:
+        """
+        Output a record of the folder currently being output, moving on to the
+        next held folder if it is the end of the folder.
+
+        Args:
+            record (logging.LogRecord): record to output
+        """
+        self._output(record)
+        is_folder_end = (
+            getattr(record, "event", None) == "section_end"
+            and getattr(record, "section_kind", None) == "folder"
+        )
+        if not is_folder_end:
+            return
+
+        self._current_folder = None
+        while self._held and self._current_folder is None:
+            folder = next(iter(self._held))
+            records = self._held.pop(folder)
+            self._current_folder = folder
+            for held_record in records:
+                # outputting the end of a held folder moves on to the next one
+                self._output_folder(held_record)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Output a record, or hold it back until its folder's turn.
+
+        Args:
+            record (logging.LogRecord): record to output
+        """
+        folder: Optional[str] = getattr(record, "folder", None)
+        if folder is None or record.levelno >= PROMPT_LEVEL:
+            self._output(record)
+        elif self._current_folder in (None, folder):
+            self._current_folder = folder
+            self._output_folder(record)
+        else:
+            self._held.setdefault(folder, []).append(record)
+
+    def close(self) -> None:
+        """Output all held records and close the handler."""
+        for records in self._held.values():
+            for record in records:
+                self._output(record)
+        self._held = {}
+        self._current_folder = None
+        super().close()
+
+
+if TYPE_CHECKING:
+    _StreamHandler = logging.StreamHandler[TextIO]
+else:
+    # StreamHandler can only be subscripted at runtime from Python 3.11
+    _StreamHandler = logging.StreamHandler
+
+
+class StatusStreamHandler(_StreamHandler):
+    """
+    Write log records to a stream, keeping a block of status lines below them on
+    terminals. The block is erased before each record is written and drawn
+    again after it, so it stays at the bottom while the log scrolls above it.
+
+    Args:
+        stream (Optional[TextIO]): stream to write to. Defaults to None, for
+                                   stderr.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        super().__init__(stream)
+        self.status: List[str] = []
+        # number of callers the status lines are hidden for
+        self.paused = 0
+
+    def is_terminal(self) -> bool:
+        """
+        Check if the stream is a terminal that status lines can be redrawn on.
+
+        Returns:
+            bool: whether the stream is a terminal
+        """
+        isatty = getattr(self.stream, "isatty", None)
+        return bool(isatty and isatty())
+
+    def _erase_status(self) -> None:
+        """Move back up over the status lines and clear them."""
+        if self.status and not self.paused:
+            self.stream.write(f"\033[{len(self.status)}F\033[J")
+
+    def _draw_status(self) -> None:
+        """Write the status lines, cut to the terminal width so none wrap."""
+        if self.paused:
+            return
+        width = shutil.get_terminal_size().columns
+        for line in self.status:
+            self.stream.write(line[: width - 1] + "\n")
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Write a record above the status lines.
+
+        Args:
+            record (logging.LogRecord): record to write
+        """
+        if not self.status or self.paused:
+            super().emit(record)
+            return
+        self._erase_status()
+        super().emit(record)
+        self._draw_status()
+        self.flush()
+
+    def set_status(self, lines: List[str]) -> None:
+        """
+        Replace the status lines, or remove them with an empty list.
+
+        Args:
+            lines (List[str]): status lines to show
+        """
+        self.acquire()
+        try:
+            self._erase_status()
+            self.status = list(lines)
+            self._draw_status()
+            self.flush()
+        finally:
+            self.release()
+
+    def pause_status(self) -> None:
+        """
+        Clear the status lines and stop drawing them until `resume_status`, so
+        other output to the terminal isn't overwritten by them.
+        """
+        self.acquire()
+        try:
+            self._erase_status()
+            self.paused += 1
+            self.flush()
+        finally:
+            self.release()
+
+    def resume_status(self) -> None:
+        """Draw the status lines again, once no caller keeps them paused."""
+        self.acquire()
+        try:
+            self.paused = max(0, self.paused - 1)
+            self._draw_status()
+            self.flush()
+        finally:
+            self.release()
+
+
 class IndentColoredLogger(logging.Logger):
     """
     Custom python logger that allows consistent indentation and color coding
     of log levels.
+
+    Indentation and open sections are kept per thread or asyncio task (using
+    context variables), so folders and files can be processed in parallel
+    without mixing up each other's indentation. Console output is written by a
+    background thread from a queue, grouped by folder.
+
+    Args:
+        name (str): logger name. Defaults to the module name.
+        level (int): log level. Defaults to logging.DEBUG.
+        stream (Optional[TextIO]): stream to write console output to. Defaults
+                                   to None, for stderr.
     """
 
-    def __init__(self, name: str = __name__, level: int = logging.DEBUG):
+    def __init__(
+        self,
+        name: str = __name__,
+        level: int = logging.DEBUG,
+        stream: Optional[TextIO] = None,
+    ):
         super().__init__(name, level)
-        self.indent_level = 0
         self.indent_str = "  "
+        self.timing = SectionTiming("run", "run")
+        self._indent_level: ContextVar[int] = ContextVar(
+            f"{name}.indent_level", default=0
+        )
+        self._sections: ContextVar[Tuple[SectionTiming, ...]] = ContextVar(
+            f"{name}.sections", default=(self.timing,)
+        )
+        self.json_handlers: List[logging.Handler] = []
+        self._json_listeners: List[QueueListener] = []
+        self.section_start_listeners: List[Callable[[SectionTiming], None]] = []
+        self.section_listeners: List[Callable[[SectionTiming], None]] = []
 
-        handler = logging.StreamHandler()
+        handler = StatusStreamHandler(stream)
         formatter = logging.Formatter(
             "%(asctime)s %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
         )
         handler.setFormatter(formatter)
 
-        self.addHandler(handler)
+        # write console output from a background thread, so logging from
+        # parallel work never waits on the console
+        self._console_queue: queue.Queue[logging.LogRecord] = queue.Queue()
+        self._console_listener: Optional[QueueListener] = QueueListener(
+            self._console_queue, FolderGroupingHandler(handler)
+        )
+        self._console_listener.start()
+        atexit.register(self.shutdown)
+
+        self._console_handler = handler
+        self._console_queue_handler = QueueHandler(self._console_queue)
+        self.addHandler(self._console_queue_handler)
         self.setLevel(level)
 
+    @property
+    def indent_level(self) -> int:
+        """Number of indents applied to logs in the current thread or task."""
+        return self._indent_level.get()
+
+    @indent_level.setter
+    def indent_level(self, value: int) -> None:
+        self._indent_level.set(value)
+
+    @property
+    def _open_sections(self) -> Tuple[SectionTiming, ...]:
+        """Sections open in the current thread or task, outermost first."""
+        return self._sections.get()
+
     def indent(self, count: int = 1):
         """
         Indent logs by a given number of indents.
@@ -62,26 +439,53 @@ class IndentColoredLogger(logging.Logger):
         section_name: str,
         start_format: str = "[{section_name}]",
         end_format: str = "[/{section_name}]",
+        kind: Optional[str] = None,
+        label: Optional[str] = None,
+        log: bool = True,
     ) -> Callable[..., None]:
         """
         Log an indented section of logic with names section start and stop
         and indented internal logging. Return a function to end a section.
 
+        Each section is also timed, and nested in the timing tree of the run
+        under the section it was started in.
+
         Args:
             section_name (str): the name of the section
             start_format (str): start section template string that include
                                 `section_name`. Defaults to "[{section_name}]"
             end_format (str): end section template string that include
                               `section_name`. Defaults to "[/{section_name}]"
+            kind (Optional[str]): what the section covers (e.g. "folder", "stage",
+                                  "file"). Defaults to None.
+            label (Optional[str]): what the section is about (e.g. a folder or
+                                   file path). Defaults to None.
+            log (bool): whether to log the start and end of the section, or only
+                        time it. Defaults to True.
         Returns:
             Callable: callback to end a section
 
         """
 
-        self.info(start_format.format(section_name=section_name))
-        self.indent()
+        timing = SectionTiming(section_name, kind, label)
+        self._open_sections[-1].children.append(timing)
+        self._sections.set((*self._open_sections, timing))
+        for listener in self.section_start_listeners:
+            listener(timing)
 
-        def end_section(end_format: str = end_format):
+        if log:
+            self.info(
+                start_format.format(section_name=section_name),
+                extra={"event": "section_start", "section_kind": kind},
+            )
+            self.indent()
+
+        def end_section(
+            end_format: str = end_format,
+            bytes_processed: int = 0,
+            bytes_written: int = 0,
+            outcome: Optional[str] = None,
+        ):
             """
             Callback to end a section by logging and de-denting.
 
@@ -89,21 +493,277 @@ class IndentColoredLogger(logging.Logger):
                 end_format (str, optional): use this to add custom data to the end
                                             section format that was acquired during
                                             the section logic. Defaults to end_format.
+                bytes_processed (int, optional): bytes read or written during the
+                                                 section. Defaults to 0.
+                bytes_written (int, optional): part of `bytes_processed` that was
+                                               written. Defaults to 0.
+                outcome (Optional[str], optional): how the section ended, if not
+                                                   "ok" or set by logged errors.
+                                                   Defaults to None.
             """
-            self.dedent()
-            self.info(end_format.format(section_name=section_name))
+            timing.bytes_processed += bytes_processed
+            timing.bytes_written += bytes_written
+            if outcome is not None:
+                timing.outcome = outcome
+            timing.finish()
+            sections = self._open_sections
+            if timing in sections:
+                self._sections.set(
+                    tuple(section for section in sections if section is not timing)
+                )
+            else:
+                sections = (*sections, timing)
+
+            # describe the section as it ends, including its own context
+            extra: Dict[str, Any] = {
+                **section_fields(sections),
+                "event": "section_end",
+                "section_kind": kind,
+                "duration": timing.wall_time,
+                "cpu_time": timing.cpu_time,
+                "bytes": timing.total_bytes,
+                "outcome": timing.outcome,
+            }
+
+            if log:
+                self.dedent()
+                self.info(end_format.format(section_name=section_name), extra=extra)
+            else:
+                self._log_structured(logging.INFO, section_name, extra)
+
+            for listener in self.section_listeners:
+                listener(timing)
 
         return end_section
 
+    def add_section_start_listener(
+        self, listener: Callable[[SectionTiming], None]
+    ) -> None:
+        """
+        Call a function with the timing of every section as it starts, e.g. to
+        start profiling it.
+
+        Args:
+            listener (Callable[[SectionTiming], None]): function to call
+        """
+        self.section_start_listeners.append(listener)
+
+    def add_section_listener(self, listener: Callable[[SectionTiming], None]) -> None:
+        """
+        Call a function with the timing of every section as it ends, e.g. to
+        collect metrics.
+
+        Args:
+            listener (Callable[[SectionTiming], None]): function to call
+        """
+        self.section_listeners.append(listener)
+
+    def add_bytes_processed(self, count: int) -> None:
+        """
+        Add to the bytes processed by the innermost open section.
+
+        Args:
+            count (int): number of bytes read or written
+        """
+        self._open_sections[-1].bytes_processed += count
+
+    def log_timing_summary(self) -> None:
+        """
+        Log a table of where time went during the run, by each nested section.
+        Sections timing individual files are summarized per parent section.
+        """
+        self.timing.finish()
+
+        def row(name: str, count: int, timings: List[SectionTiming]) -> str:
+            """
+            Format a row of the summary table.
+
+            Args:
+                name (str): indented name of the row
+                count (int): number of sections summarized by the row
+                timings (List[SectionTiming]): sections summarized by the row
+
+            Returns:
+                str: formatted row
+            """
+            wall_time = sum(timing.wall_time for timing in timings)
+            cpu_time = sum(timing.cpu_time for timing in timings)
+            mega_bytes = sum(timing.total_bytes for timing in timings) / 1e6
+            rate = f"{mega_bytes / wall_time:9.2f}" if wall_time and mega_bytes else ""
+            return (
+                f"{name[:48]:<48} {count:>6} {wall_time:>10.2f} {cpu_time:>10.2f} "
+                + f"{mega_bytes:>10.2f} {rate:>9}"
+            )
+
+        lines = [
+            f"{'section':<48} {'count':>6} {'wall (s)':>10} {'cpu (s)':>10} "
+            + f"{'MB':>10} {'MB/s':>9}"
+        ]
+
+        def add_rows(timing: SectionTiming, depth: int) -> None:
+            """
+            Add rows for a section and the sections nested in it.
+
+            Args:
+                timing (SectionTiming): section to add rows for
+                depth (int): nesting depth of the section
+            """
+            name = timing.name if not timing.label else f"{timing.name}: {timing.label}"
+            lines.append(row(self.indent_str * depth + name, 1, [timing]))
+
+            files = [child for child in timing.children if child.kind == "file"]
+            if files:
+                lines.append(
+                    row(self.indent_str * (depth + 1) + "files", len(files), files)
+                )
+            for child in timing.children:
+                if child.kind != "file":
+                    add_rows(child, depth + 1)
+
+        add_rows(self.timing, 0)
+
+        self.info("timing summary:")
+        self.indent()
+        for line in lines:
+            self.info(line)
+        self.dedent()
+
+    def add_json_sink(self, path: str) -> None:
+        """
+        Also write every log event to a file as JSON lines, with section path,
+        folder, stage, file, duration and outcome as fields and no color codes.
+
+        Events are put on an unbounded queue and written by a background thread,
+        so logging never waits on the file.
+
+        Args:
+            path (str): path of file to append JSON lines to
+        """
+        file_handler = logging.FileHandler(path, encoding="utf-8")
+        file_handler.setFormatter(JSONLinesFormatter())
+
+        log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        listener = QueueListener(log_queue, file_handler)
+        listener.start()
+
+        self.addHandler(queue_handler)
+        self.json_handlers.append(queue_handler)
+        self._json_listeners.append(listener)
+
+    def close_json_sinks(self) -> None:
+        """Write out all queued JSON log events and close the JSON sinks."""
+        for listener in self._json_listeners:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        for handler in self.json_handlers:
+            self.removeHandler(handler)
+        self.json_handlers = []
+        self._json_listeners = []
+
+    def can_show_status(self) -> bool:
+        """
+        Check if console output is a terminal that status lines can be redrawn
+        on.
+
+        Returns:
+            bool: whether `set_status` shows anything
+        """
+        return self._console_handler.is_terminal()
+
+    def set_status(self, lines: List[str]) -> None:
+        """
+        Show a block of status lines below the console output, redrawn in place
+        on every call. Does nothing unless the console is a terminal.
+
+        Args:
+            lines (List[str]): status lines to show, or an empty list to remove
+                               them
+        """
+        if self.can_show_status():
+            self._console_handler.set_status(lines)
+
+    @contextmanager
+    def status_paused(self) -> Generator[None, None, None]:
+        """
+        Hide the status lines while writing to the terminal other than through
+        the logger, or reading input from it, and show them again after. Log
+        output queued before is written first.
+
+        Yields:
+            None: while the status lines are hidden
+        """
+        terminal = self.can_show_status()
+        if terminal:
+            self.wait_for_output()
+            self._console_handler.pause_status()
+        try:
+            yield
+        finally:
+            if terminal:
+                self.wait_for_output()
+                self._console_handler.resume_status()
+
+    def wait_for_output(self) -> None:
+        """Wait until everything logged so far has been written to the console."""
+        self._console_queue.join()
+
+    def shutdown(self) -> None:
+        """
+        Write out all queued and held log output, and stop the background threads
+        writing it. Anything logged afterwards is written to the console directly.
+        """
+        if self._console_listener is not None:
+            self._console_listener.stop()
+            for handler in self._console_listener.handlers:
+                handler.close()
+            self._console_listener = None
+            if self._console_queue_handler in self.handlers:
+                self.removeHandler(self._console_queue_handler)
+                self.addHandler(self._console_handler)
+        self.close_json_sinks()
+
+    def _log_structured(self, level: int, msg: str, extra: Dict[str, Any]) -> None:
+        """
+        Send an event only to the JSON sinks, e.g. the end of a section that is
+        timed but not logged to the console.
+
+        Args:
+            level (int): log level
+            msg (str): event message
+            extra (Dict[str, Any]): structured fields of the event
+        """
+        if not self.json_handlers or not self.isEnabledFor(level):
+            return
+        record = self.makeRecord(
+            self.name, level, "(unknown file)", 0, msg, (), None, extra=extra
+        )
+        record.raw_message = msg
+        for handler in self.json_handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
     def _log(self, level: int, msg: str, *args: Any, **kwargs: Any):
         """
         Internal logging function that applies color and indentation given the log level
         and indent state of the logger, respectively.
         """
+        if level >= logging.ERROR:
+            for timing in self._open_sections:
+                timing.outcome = "error"
+
+        # keep the plain message and where it was logged for structured handlers
+        extra: Dict[str, Any] = {
+            **section_fields(self._open_sections),
+            "raw_message": str(msg),
+            **(kwargs.pop("extra", None) or {}),
+        }
+
         indent = self.indent_str * self.indent_level
         level_name = logging.getLevelName(level)
         colored_indented_message = f"{COLORS[level_name.lower()]}{indent}{msg}{RESET}"
-        super()._log(level, colored_indented_message, *args, **kwargs)
+        super()._log(level, colored_indented_message, *args, extra=extra, **kwargs)
 
     def prompt(self, msg: str, *args: Any, **kwargs: Any):
         """
@@ -111,6 +771,8 @@ class IndentColoredLogger(logging.Logger):
         """
         if self.isEnabledFor(PROMPT_LEVEL):
             self._log(PROMPT_LEVEL, msg, args, **kwargs)
+            # make sure the prompt is shown before waiting for input
+            self.wait_for_output()
 
 
 logger = IndentColoredLogger()
@@ -0,0 +1,380 @@
+import importlib.util
+import math
+import subprocess
+import tempfile
+from typing import IO, TYPE_CHECKING, Dict, List, Optional, TypedDict
+
+from src.lib.governor import governor
+
+# numpy is imported where it is used, so that runs without any music to
+# process start quickly
+if TYPE_CHECKING:
+    import numpy as np
+    from numpy.typing import NDArray
+
+# sample rate audio is decoded to for analysis, which the K-weighting filter
+# coefficients of ITU-R BS.1770 are given for
+ANALYSIS_SAMPLE_RATE = 48000
+
+# samples in a 100 ms sub-block. Four consecutive sub-blocks make a 400 ms
+# gating block, so gating blocks overlap by 75%
+SUB_BLOCK_SIZE = ANALYSIS_SAMPLE_RATE // 10
+
+# bytes of decoded audio read at a time, which bounds the memory analysis uses
+PCM_CHUNK_SIZE = 1024 * 1024
+
+# loudness that ReplayGain 2.0 and Sound Check gains bring tracks to, in LUFS
+REFERENCE_LOUDNESS = -18.0
+
+# gates of BS.1770 integrated loudness, in LUFS and LU
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+# K-weighting filter of BS.1770 at 48 kHz: a high shelf and a high-pass, as
+# (numerator, denominator) coefficients of each biquad
+K_WEIGHTING_FILTERS = [
+    (
+        [1.53512485958697, -2.69169618940638, 1.19839281085285],
+        [1.0, -1.69065929318241, 0.73248077421585],
+    ),
+    (
+        [1.0, -2.0, 1.0],
+        [1.0, -1.99004745483398, 0.99007225036621],
+    ),
+]
+
+# freeform MP4 tags gain info is written to
+ITUNNORM_TAG = "----:com.apple.iTunes:iTunNORM"
+TRACK_GAIN_TAG = "----:com.apple.iTunes:replaygain_track_gain"
+TRACK_PEAK_TAG = "----:com.apple.iTunes:replaygain_track_peak"
+ALBUM_GAIN_TAG = "----:com.apple.iTunes:replaygain_album_gain"
+ALBUM_PEAK_TAG = "----:com.apple.iTunes:replaygain_album_peak"
+
+# K-weighted power of each FFT bin of a sub-block, computed once
+_bin_weights: Optional["NDArray[np.float64]"] = None
+
+
+class TrackLoudness(TypedDict):
+    """Loudness measured over a track or an album."""
+
+    """Mean square of the K-weighted channels in each 400 ms gating block"""
+    blocks: List[float]
+
+    """Highest absolute sample value"""
+    peak: float
+
+
+def is_available() -> bool:
+    """
+    Check if numpy, which loudness analysis needs, is installed.
+
+    Returns:
+        bool: whether loudness can be analyzed
+    """
+    return importlib.util.find_spec("numpy") is not None
+
+
+def _fft_bin_weights() -> "NDArray[np.float64]":
+    """
+    Get the weight of each FFT bin of a sub-block that turns its power
+    spectrum into the mean square of the K-weighted sub-block: the squared
+    magnitude response of the K-weighting filter, with Parseval's theorem
+    counting the bins of a real FFT.
+
+    Returns:
+        NDArray[np.float64]: weight of each bin
+    """
+    global _bin_weights
+    if _bin_weights is not None:
+        return _bin_weights
+
+    import numpy as np
+
+    omega = 2 * np.pi * np.arange(SUB_BLOCK_SIZE // 2 + 1) / SUB_BLOCK_SIZE
+    z = np.exp(-1j * omega)
+    response = np.ones_like(z)
+    for numerator, denominator in K_WEIGHTING_FILTERS:
+        response *= np.polyval(numerator[::-1], z) / np.polyval(denominator[::-1], z)
+
+    # every bin but DC and Nyquist stands for two bins of the full spectrum
+    counts = np.full(len(omega), 2.0)
+    counts[0] = counts[-1] = 1.0
+    _bin_weights = np.abs(response) ** 2 * counts / SUB_BLOCK_SIZE**2
+    return _bin_weights
+
+
+def _channel_weights(channels: int) -> "NDArray[np.float64]":
+    """
+    Get the BS.1770 weight of each channel: surround channels of 5.1 audio
+    count 1.41 times and the LFE channel not at all.
+
+    Args:
+        channels (int): number of channels
+
+    Returns:
+        NDArray[np.float64]: weight of each channel, in ffmpeg channel order
+    """
+    import numpy as np
+
+    if channels == 6:
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    return np.ones(channels)
+
+
+class LoudnessMeter(object):
+    """
+    Measure the loudness of interleaved 32-bit float PCM at 48 kHz, fed in
+    chunks of any size. Each full 100 ms sub-block is K-weighted in the
+    frequency domain and reduced to its mean square, so only part of a
+    sub-block is held between chunks.
+
+    Args:
+        channels (int): number of interleaved channels
+    """
+
+    def __init__(self, channels: int) -> None:
+        self.channels = max(1, channels)
+        self.sub_blocks: List[float] = []
+        self.peak = 0.0
+        self._pending = bytearray()
+
+    def add(self, data: bytes) -> None:
+        """
+        Measure a chunk of PCM.
+
+        Args:
+            data (bytes): interleaved little-endian 32-bit float samples
+        """
+        import numpy as np
+
+        self._pending.extend(data)
+        block_bytes = SUB_BLOCK_SIZE * self.channels * 4
+        usable = len(self._pending) // block_bytes * block_bytes
+        if usable == 0:
+            return
+
+        samples = np.frombuffer(bytes(self._pending[:usable]), dtype="<f4")
+        samples = samples.reshape(-1, SUB_BLOCK_SIZE, self.channels)
+        self.peak = max(self.peak, float(np.max(np.abs(samples))))
+
+        spectrum = np.fft.rfft(samples, axis=1)
+        power = spectrum.real**2 + spectrum.imag**2
+        mean_squares = np.einsum("bkc,k->bc", power, _fft_bin_weights())
+        self.sub_blocks.extend(
+            (mean_squares @ _channel_weights(self.channels)).tolist()
+        )
+        del self._pending[:usable]
+
+    def result(self) -> TrackLoudness:
+        """
+        Finish measuring. A final partial sub-block only counts towards the
+        peak, as BS.1770 drops incomplete gating blocks.
+
+        Returns:
+            TrackLoudness: measured loudness
+        """
+        import numpy as np
+
+        frame_bytes = self.channels * 4
+        leftover = len(self._pending) // frame_bytes * frame_bytes
+        if leftover:
+            samples = np.frombuffer(bytes(self._pending[:leftover]), dtype="<f4")
+            self.peak = max(self.peak, float(np.max(np.abs(samples))))
+        self._pending.clear()
+
+        sub_blocks = np.array(self.sub_blocks)
+        blocks = (
+            sub_blocks[:-3] + sub_blocks[1:-2] + sub_blocks[2:-1] + sub_blocks[3:]
+        ) / 4
+        return {"blocks": blocks.tolist(), "peak": self.peak}
+
+
+def integrated_loudness(blocks: List[float]) -> Optional[float]:
+    """
+    Get the gated integrated loudness of gating blocks, as in BS.1770.
+
+    Args:
+        blocks (List[float]): mean square of each gating block
+
+    Returns:
+        Optional[float]: loudness in LUFS, or None if it is all silence
+    """
+    import numpy as np
+
+    energies = np.array(blocks)
+    if energies.size == 0:
+        return None
+    with np.errstate(divide="ignore"):
+        loudness = -0.691 + 10 * np.log10(energies)
+
+    gated = energies[loudness > ABSOLUTE_GATE]
+    if gated.size == 0:
+        return None
+    threshold = -0.691 + 10 * math.log10(float(np.mean(gated))) + RELATIVE_GATE
+    gated = energies[(loudness > ABSOLUTE_GATE) & (loudness > threshold)]
+    return -0.691 + 10 * math.log10(float(np.mean(gated)))
+
+
+def album_loudness(tracks: List[TrackLoudness]) -> TrackLoudness:
+    """
+    Combine the loudness of an album's tracks, gating all of their blocks
+    together as if the album were one track.
+
+    Args:
+        tracks (List[TrackLoudness]): loudness of each track
+
+    Returns:
+        TrackLoudness: loudness of the album
+    """
+    return {
+        "blocks": [block for track in tracks for block in track["blocks"]],
+        "peak": max((track["peak"] for track in tracks), default=0.0),
+    }
+
+
+def sound_check(gain: float, peak: float) -> str:
+    """
+    Encode a gain as the iTunNORM value Apple Music reads Sound Check from:
+    ten hex numbers, the first four being the gain relative to 1/1000 and
+    1/2500 watt for each stereo channel, the 7th and 8th the peak.
+
+    Args:
+        gain (float): gain in dB
+        peak (float): highest absolute sample value
+
+    Returns:
+        str: iTunNORM value
+    """
+    scale = 10 ** (-gain / 10)
+    milliwatt = min(max(round(1000 * scale), 1), 65534)
+    decibel = min(max(round(2500 * scale), 1), 65534)
+    peak_value = min(round(peak * 32768), 32768)
+    values = [milliwatt, milliwatt, decibel, decibel, 0, 0, peak_value, peak_value]
+    return "".join(f" {value:08X}" for value in [*values, 0, 0])
+
+
+def loudness_tags(
+    track: TrackLoudness, album: Optional[TrackLoudness] = None
+) -> Dict[str, bytes]:
+    """
+    Build the Sound Check and ReplayGain 2.0 tags of a track.
+
+    Args:
+        track (TrackLoudness): loudness of the track
+        album (Optional[TrackLoudness]): loudness of its album, if known.
+                                         Defaults to None.
+
+    Returns:
+        Dict[str, bytes]: freeform MP4 tag values, or none if the track is
+                          silent
+    """
+    loudness = integrated_loudness(track["blocks"])
+    if loudness is None:
+        return {}
+    gain = REFERENCE_LOUDNESS - loudness
+    tags = {
+        ITUNNORM_TAG: sound_check(gain, track["peak"]).encode(),
+        TRACK_GAIN_TAG: f"{gain:.2f} dB".encode(),
+        TRACK_PEAK_TAG: f"{track['peak']:.6f}".encode(),
+    }
+
+    album_level = integrated_loudness(album["blocks"]) if album else None
+    if album is not None and album_level is not None:
+        tags[ALBUM_GAIN_TAG] = f"{REFERENCE_LOUDNESS - album_level:.2f} dB".encode()
+        tags[ALBUM_PEAK_TAG] = f"{album['peak']:.6f}".encode()
+    return tags
+
+
+def write_loudness_tags(file_path: str, tags: Dict[str, bytes]) -> None:
+    """
+    Write Sound Check and ReplayGain tags to an .m4a file, leaving its other
+    tags as they are.
+
+    Args:
+        file_path (str): file to tag
+        tags (Dict[str, bytes]): freeform MP4 tag values
+    """
+    from mutagen.mp4 import MP4
+
+    audio = MP4(file_path)
+    if not audio.tags:
+        audio.add_tags()
+    for key, value in tags.items():
+        audio[key] = [value]
+    audio.save()
+
+
+def pcm_output(channels: int) -> List[str]:
+    """
+    Build ffmpeg output arguments that also decode the first input's audio to
+    48 kHz float PCM on stdout, for analysis in the same decode pass.
+
+    Args:
+        channels (int): number of channels to output
+
+    Returns:
+        List[str]: ffmpeg output arguments
+    """
+    return [
+        "-map",
+        "0:a:0",
+        "-ac",
+        str(channels),
+        "-ar",
+        str(ANALYSIS_SAMPLE_RATE),
+        "-c:a",
+        "pcm_f32le",
+        "-f",
+        "f32le",
+        "pipe:1",
+    ]
+
+
+def read_pcm(stream: IO[bytes], meter: LoudnessMeter) -> None:
+    """
+    Feed decoded PCM from a stream to a meter, a chunk at a time.
+
+    Args:
+        stream (IO[bytes]): stream of PCM
+        meter (LoudnessMeter): meter to feed
+    """
+    while True:
+        chunk = stream.read(PCM_CHUNK_SIZE)
+        if not chunk:
+            return
+        meter.add(chunk)
+
+
+def analyze_file(path: str, channels: int) -> TrackLoudness:
+    """
+    Decode a file that wasn't converted in this run, and measure its loudness.
+
+    Args:
+        path (str): path of the file
+        channels (int): number of channels to analyze
+
+    Raises:
+        RuntimeError: if ffmpeg fails
+
+    Returns:
+        TrackLoudness: measured loudness
+    """
+    command = governor.command(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", path]
+    ) + pcm_output(channels)
+    meter = LoudnessMeter(channels)
+    with governor.encoder_slot(), tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+        )
+        assert process.stdout is not None
+        with process.stdout:
+            read_pcm(process.stdout, meter)
+        if process.wait() != 0:
+            stderr.seek(0)
+            message = stderr.read().decode("utf-8", errors="replace").strip()
+            raise RuntimeError(message or "ffmpeg failed")
+    return meter.result()
@@ -0,0 +1,571 @@
+import mimetypes
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Iterator, Optional, Tuple, TypedDict, Union
+
+from src.lib.constants import (
+    APPLE_MUSIC_COMPATIBLE_CODECS,
+    APPLE_MUSIC_COMPATIBLE_MIME_TYPES,
+    EXTENSION_MIME_TYPES,
+    MIME_TYPE_ALIASES,
+)
+
+# number of bytes at the start of a file used to identify it
+HEADER_SIZE = 4096
+
+# maximum number of classified files to remember
+CACHE_SIZE = 4096
+
+# file contents, either read into memory or memory mapped
+Buffer = Union[bytes, mmap.mmap]
+
+
+class MediaInfo(TypedDict):
+    """Media info identified from the contents of a file."""
+
+    """MIME type of the file"""
+    mime_type: Optional[str]
+
+    """Container format (e.g. "mp4", "flac", "wav"), if identified from contents"""
+    container: Optional[str]
+
+    """Audio codec (e.g. "alac", "aac", "flac", "pcm"), if identified"""
+    codec: Optional[str]
+
+    """Sample rate in Hz, if known"""
+    sample_rate: Optional[int]
+
+    """Bits per sample, if known and meaningful for the codec"""
+    bit_depth: Optional[int]
+
+    """Number of audio channels, if known"""
+    channels: Optional[int]
+
+    """Duration in seconds, if known"""
+    duration: Optional[float]
+
+
+# memoized classifications keyed by (device, inode, mtime)
+_cache: Dict[Tuple[int, int, int], MediaInfo] = {}
+_cache_lock = threading.Lock()
+
+
+def _media_info(
+    mime_type: Optional[str],
+    container: Optional[str] = None,
+    codec: Optional[str] = None,
+    sample_rate: Optional[int] = None,
+    bit_depth: Optional[int] = None,
+    channels: Optional[int] = None,
+    duration: Optional[float] = None,
+) -> MediaInfo:
+    """
+    Build media info, leaving anything that was not identified unset.
+
+    Args:
+        mime_type (Optional[str]): MIME type of the file
+        container (Optional[str]): container format. Defaults to None.
+        codec (Optional[str]): audio codec. Defaults to None.
+        sample_rate (Optional[int]): sample rate in Hz. Defaults to None.
+        bit_depth (Optional[int]): bits per sample. Defaults to None.
+        channels (Optional[int]): number of audio channels. Defaults to None.
+        duration (Optional[float]): duration in seconds. Defaults to None.
+
+    Returns:
+        MediaInfo: media info
+    """
+    return {
+        "mime_type": mime_type,
+        "container": container,
+        "codec": codec,
+        "sample_rate": sample_rate,
+        "bit_depth": bit_depth,
+        "channels": channels,
+        "duration": duration,
+    }
+
+
+def guess_media_info(path: str) -> MediaInfo:
+    """
+    Guess media info from the extension of a file only.
+
+    Args:
+        path (str): path or name of the file
+
+    Returns:
+        MediaInfo: media info with only the MIME type set
+    """
+    extension = os.path.splitext(path)[1].lower()
+    mime_type = EXTENSION_MIME_TYPES.get(extension) or mimetypes.guess_type(path)[0]
+    return _media_info(MIME_TYPE_ALIASES.get(mime_type or "", mime_type))
+
+
+# MP4
+
+
+def _iter_atoms(data: Buffer, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    Iterate over the MP4 atoms between two offsets.
+
+    Args:
+        data (Buffer): file contents
+        start (int): offset of the first atom
+        end (int): offset to stop at
+
+    Yields:
+        Tuple[bytes, int, int]: (atom type, offset of atom body, offset of atom end)
+    """
+    offset = start
+    while offset + 8 <= end:
+        size, atom_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            return
+        yield atom_type, offset + header_size, offset + size
+        offset += size
+
+
+def _find_atom(
+    data: Buffer, start: int, end: int, path: bytes
+) -> Optional[Tuple[int, int]]:
+    """
+    Find a nested MP4 atom by its path, e.g. `b"moov.trak"`.
+
+    Args:
+        data (Buffer): file contents
+        start (int): offset of the first atom to search
+        end (int): offset to stop searching at
+        path (bytes): dot separated atom types to descend through
+
+    Returns:
+        Optional[Tuple[int, int]]: (offset of atom body, offset of atom end), if found
+    """
+    atom_type, _, rest = path.partition(b".")
+    for found_type, body, atom_end in _iter_atoms(data, start, end):
+        if found_type == atom_type:
+            return _find_atom(data, body, atom_end, rest) if rest else (body, atom_end)
+    return None
+
+
+def _mp4_object_type(data: Buffer, start: int, end: int) -> Optional[int]:
+    """
+    Read the object type of the decoder config in an `esds` atom body.
+
+    Args:
+        data (Buffer): file contents
+        start (int): offset of the `esds` atom body
+        end (int): offset of the `esds` atom end
+
+    Returns:
+        Optional[int]: object type indication, if found
+    """
+    offset = start + 4  # version and flags
+    while offset + 2 <= end:
+        tag = data[offset]
+        offset += 1
+
+        # descriptor lengths are encoded in up to 4 bytes, 7 bits each
+        length = 0
+        for _ in range(4):
+            byte = data[offset]
+            offset += 1
+            length = (length << 7) | (byte & 0x7F)
+            if not byte & 0x80:
+                break
+
+        if tag == 0x03:  # ES descriptor
+            flags = data[offset + 2]
+            offset += 3
+            if flags & 0x80:
+                offset += 2
+            if flags & 0x40:
+                offset += 1 + data[offset]
+            if flags & 0x20:
+                offset += 2
+        elif tag == 0x04:  # decoder config descriptor
+            return data[offset] if offset < end else None
+        else:
+            offset += length
+    return None
+
+
+# sample entry types mapped to codecs
+MP4_SAMPLE_ENTRY_CODECS: Dict[bytes, str] = {
+    b"alac": "alac",
+    b"mp4a": "aac",
+    b"fLaC": "flac",
+    b"Opus": "opus",
+    b".mp3": "mp3",
+    b"ac-3": "ac3",
+    b"ec-3": "eac3",
+}
+
+# MIME types for codecs found in MP4 files that Apple Music cannot import
+MP4_CODEC_MIME_TYPES: Dict[str, str] = {
+    "flac": "audio/flac",
+    "opus": "audio/opus",
+    "mp3": "audio/mpeg",
+}
+
+
+def _classify_mp4(data: Buffer) -> MediaInfo:
+    """
+    Classify an MP4 file from the sample description of its first sound track.
+
+    Args:
+        data (Buffer): file contents
+
+    Returns:
+        MediaInfo: classified media info
+    """
+    size = len(data)
+    moov = _find_atom(data, 0, size, b"moov")
+
+    # the codec is unknown if only part of the file is available
+    if moov is None:
+        return _media_info(APPLE_MUSIC_COMPATIBLE_MIME_TYPES[0], "mp4")
+
+    for atom_type, trak, trak_end in _iter_atoms(data, *moov):
+        if atom_type != b"trak":
+            continue
+        mdia = _find_atom(data, trak, trak_end, b"mdia")
+        if mdia is None:
+            continue
+        hdlr = _find_atom(data, *mdia, b"hdlr")
+        if hdlr is None or data[hdlr[0] + 8 : hdlr[0] + 12] != b"soun":
+            continue
+
+        # duration from the media header
+        duration = None
+        mdhd = _find_atom(data, *mdia, b"mdhd")
+        if mdhd is not None:
+            if data[mdhd[0]] == 1:
+                timescale, length = struct.unpack_from(">IQ", data, mdhd[0] + 20)
+            else:
+                timescale, length = struct.unpack_from(">II", data, mdhd[0] + 12)
+            duration = length / timescale if timescale else None
+
+        stsd = _find_atom(data, *mdia, b"minf.stbl.stsd")
+        if stsd is None:
+            return _media_info(
+                APPLE_MUSIC_COMPATIBLE_MIME_TYPES[0], "mp4", duration=duration
+            )
+
+        # first sample entry follows version, flags and entry count
+        for entry_type, entry, entry_end in _iter_atoms(data, stsd[0] + 8, stsd[1]):
+            codec = MP4_SAMPLE_ENTRY_CODECS.get(entry_type)
+            channels, bit_depth = struct.unpack_from(">HH", data, entry + 16)
+            sample_rate = struct.unpack_from(">I", data, entry + 24)[0] >> 16
+
+            # codec specific boxes follow the audio sample entry, which is
+            # extended by QuickTime sound sample description versions 1 and 2
+            version = struct.unpack_from(">H", data, entry + 8)[0]
+            boxes = entry + {1: 44, 2: 64}.get(version, 28)
+            for box_type, box, box_end in _iter_atoms(data, boxes, entry_end):
+                if box_type == b"alac" and box + 28 <= box_end:
+                    # ALAC config holds the true bit depth and sample rate
+                    bit_depth = data[box + 9]
+                    channels = data[box + 13]
+                    sample_rate = struct.unpack_from(">I", data, box + 24)[0]
+                if box_type == b"esds" and _mp4_object_type(data, box, box_end) in (
+                    0x69,
+                    0x6B,
+                ):
+                    codec = "mp3"
+
+            if codec in APPLE_MUSIC_COMPATIBLE_CODECS:
+                mime_type = APPLE_MUSIC_COMPATIBLE_MIME_TYPES[0]
+            else:
+                mime_type = MP4_CODEC_MIME_TYPES.get(codec or "", "audio/mp4")
+            return _media_info(
+                mime_type,
+                "mp4",
+                codec,
+                sample_rate or None,
+                bit_depth if codec not in ("aac", "mp3") else None,
+                channels or None,
+                duration,
+            )
+
+    return _media_info("video/mp4", "mp4")
+
+
+# OTHER CONTAINERS
+
+
+def _classify_flac(data: Buffer, offset: int) -> MediaInfo:
+    """
+    Classify a FLAC file from its STREAMINFO block.
+
+    Args:
+        data (Buffer): file contents
+        offset (int): offset of the `fLaC` marker
+
+    Returns:
+        MediaInfo: classified media info
+    """
+    if offset + 26 > len(data):
+        return _media_info("audio/flac", "flac", "flac")
+
+    # sample rate (20 bits), channels (3 bits), bits per sample (5 bits) and
+    # total samples (36 bits) are packed into 8 bytes of STREAMINFO
+    packed = int.from_bytes(data[offset + 18 : offset + 26], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bit_depth = ((packed >> 36) & 0x1F) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    duration = total_samples / sample_rate if sample_rate and total_samples else None
+
+    return _media_info(
+        "audio/flac", "flac", "flac", sample_rate, bit_depth, channels, duration
+    )
+
+
+def _classify_wav(data: Buffer) -> MediaInfo:
+    """
+    Classify a WAV file from its `fmt ` and `data` chunks.
+
+    Args:
+        data (Buffer): file contents
+
+    Returns:
+        MediaInfo: classified media info
+    """
+    codec = "pcm"
+    sample_rate = bit_depth = channels = None
+    byte_rate = 0
+    duration = None
+
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", data, offset)
+        if chunk_id == b"fmt " and offset + 24 <= len(data):
+            audio_format, channels, sample_rate, byte_rate, _, bit_depth = (
+                struct.unpack_from("<HHIIHH", data, offset + 8)
+            )
+            if audio_format not in (1, 3, 0xFFFE):
+                codec = None
+        if chunk_id == b"data":
+            duration = chunk_size / byte_rate if byte_rate else None
+            break
+        offset += 8 + chunk_size + (chunk_size & 1)
+
+    return _media_info(
+        "audio/x-wav", "wav", codec, sample_rate, bit_depth, channels, duration
+    )
+
+
+def _read_extended_float(data: bytes) -> float:
+    """
+    Read an 80 bit IEEE 754 extended precision float, as used by AIFF.
+
+    Args:
+        data (bytes): 10 bytes of big endian extended float
+
+    Returns:
+        float: decoded value
+    """
+    exponent, mantissa = struct.unpack(">HQ", data)
+    sign = -1 if exponent & 0x8000 else 1
+    exponent &= 0x7FFF
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    return sign * mantissa * 2.0 ** (exponent - 16383 - 63)
+
+
+def _classify_aiff(data: Buffer) -> MediaInfo:
+    """
+    Classify an AIFF file from its `COMM` chunk.
+
+    Args:
+        data (Buffer): file contents
+
+    Returns:
+        MediaInfo: classified media info
+    """
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id, chunk_size = struct.unpack_from(">4sI", data, offset)
+        if chunk_id == b"COMM" and offset + 26 <= len(data):
+            channels, frames, bit_depth = struct.unpack_from(">HIH", data, offset + 8)
+            sample_rate = int(_read_extended_float(data[offset + 16 : offset + 26]))
+            duration = frames / sample_rate if sample_rate else None
+            return _media_info(
+                "audio/x-aiff",
+                "aiff",
+                "pcm",
+                sample_rate,
+                bit_depth,
+                channels,
+                duration,
+            )
+        offset += 8 + chunk_size + (chunk_size & 1)
+
+    return _media_info("audio/x-aiff", "aiff", "pcm")
+
+
+def _classify_ogg(header: bytes) -> MediaInfo:
+    """
+    Classify an Ogg file from the codec header in its first page.
+
+    Args:
+        header (bytes): start of the file
+
+    Returns:
+        MediaInfo: classified media info
+    """
+    if b"OpusHead" in header:
+        return _media_info("audio/ogg", "ogg", "opus")
+    if b"\x01vorbis" in header:
+        return _media_info("audio/ogg", "ogg", "vorbis")
+    if b"\x7fFLAC" in header:
+        return _media_info("audio/ogg", "ogg", "flac")
+    return _media_info("audio/ogg", "ogg")
+
+
+ASF_HEADER_GUID = bytes.fromhex("3026b2758e66cf11a6d900aa0062ce6c")
+
+
+def _skip_id3(header: bytes) -> int:
+    """
+    Find where data starts after an ID3v2 tag, if the file starts with one.
+
+    Args:
+        header (bytes): start of the file
+
+    Returns:
+        int: offset of the data following the tag
+    """
+    if len(header) < 10 or not header.startswith(b"ID3"):
+        return 0
+
+    # tag size is a 28 bit "synchsafe" integer
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def classify_media_header(data: Buffer, name: str) -> MediaInfo:
+    """
+    Identify the container and codec of a file from its contents, falling back
+    to its extension when the contents are not recognized.
+
+    Only the first `HEADER_SIZE` bytes are read, apart from MP4 files where the
+    sample description atom is looked up wherever it is in the file.
+
+    Args:
+        data (Buffer): file contents
+        name (str): name of the file, used when contents are not recognized
+
+    Returns:
+        MediaInfo: classified media info
+    """
+    header = data[:HEADER_SIZE]
+
+    if header[4:8] == b"ftyp":
+        return _classify_mp4(data)
+    if header.startswith(b"RIFF") and header[8:12] == b"WAVE":
+        return _classify_wav(data)
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        return _media_info("image/webp")
+    if header.startswith(b"FORM") and header[8:12] in (b"AIFF", b"AIFC"):
+        return _classify_aiff(data)
+    if header.startswith(b"OggS"):
+        return _classify_ogg(header)
+    if header.startswith(b"MAC "):
+        return _media_info("audio/x-ape", "ape", "ape")
+    if header.startswith(b"wvpk"):
+        return _media_info("audio/x-wavpack", "wavpack", "wavpack")
+    if header.startswith(ASF_HEADER_GUID):
+        return _media_info("audio/x-ms-wma", "asf")
+    if header.startswith(b"\xff\xd8\xff"):
+        return _media_info("image/jpeg")
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return _media_info("image/png")
+    if header.startswith((b"GIF87a", b"GIF89a")):
+        return _media_info("image/gif")
+    if header.startswith((b"II*\x00", b"MM\x00*")):
+        return _media_info("image/tiff")
+    if header.startswith(b"BM"):
+        return _media_info("image/bmp")
+
+    # FLAC and MP3 files may start with an ID3v2 tag
+    offset = _skip_id3(header)
+    if data[offset : offset + 4] == b"fLaC":
+        return _classify_flac(data, offset)
+    frame = data[offset : offset + 2]
+    if len(frame) == 2 and frame[0] == 0xFF and frame[1] & 0xE6 == 0xE2:
+        return _media_info("audio/mpeg", "mp3", "mp3")
+
+    return guess_media_info(name)
+
+
+def classify_media_file(path: str, stat: Optional[os.stat_result] = None) -> MediaInfo:
+    """
+    Identify the true container and codec of a file from its contents, so that
+    misnamed files (e.g. FLAC saved as `.m4a`) are handled as what they really
+    are. Results are remembered per (inode, mtime) so each file is only read
+    once while it is unchanged.
+
+    Args:
+        path (str): path to the file
+        stat (Optional[os.stat_result]): existing stat of the file, to avoid
+                                         another stat call. Defaults to None.
+
+    Returns:
+        MediaInfo: classified media info, guessed from the extension if the file
+                   cannot be read or its contents are not recognized
+    """
+    try:
+        stat = stat or os.stat(path)
+    except OSError:
+        return guess_media_info(path)
+
+    key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    if stat.st_size == 0:
+        return guess_media_info(path)
+
+    try:
+        with open(path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                media_info = classify_media_header(data, path)
+    except (OSError, ValueError, struct.error, IndexError):
+        media_info = guess_media_info(path)
+
+    with _cache_lock:
+        if len(_cache) >= CACHE_SIZE:
+            _cache.pop(next(iter(_cache)))
+        _cache[key] = media_info
+
+    return media_info
+
+
+def is_apple_music_compatible(media_info: MediaInfo) -> bool:
+    """
+    Check if classified media can be imported into Apple Music as-is.
+
+    Args:
+        media_info (MediaInfo): classified media info
+
+    Returns:
+        bool: whether the media can be imported without conversion
+    """
+    return media_info["mime_type"] in APPLE_MUSIC_COMPATIBLE_MIME_TYPES and (
+        media_info["codec"] is None
+        or media_info["codec"] in APPLE_MUSIC_COMPATIBLE_CODECS
+    )
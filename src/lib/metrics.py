@@ -0,0 +1,531 @@
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from src.lib.logger import SectionTiming, logger
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# CONSTANTS
+
+# prefix of all metric names
+METRIC_PREFIX = "apple_music_import"
+
+# latency histogram buckets, in seconds
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape_label_value(value: str) -> str:
+    """
+    Escape a label value for the Prometheus text format.
+
+    Args:
+        value (str): raw label value
+
+    Returns:
+        str: escaped label value
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """
+    Format label names and values for a sample line.
+
+    Args:
+        names (Sequence[str]): label names
+        values (Sequence[str]): label values, in the same order
+
+    Returns:
+        str: `{name="value",...}`, or an empty string without labels
+    """
+    if not names:
+        return ""
+    pairs = (
+        f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    """
+    Format a sample value, dropping the fraction of whole numbers.
+
+    Args:
+        value (float): sample value
+
+    Returns:
+        str: formatted value
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric(ABC):
+    """
+    Base class of a named metric, with a value for each combination of label
+    values.
+
+    Args:
+        name (str): metric name
+        help_text (str): description of the metric
+        label_names (Sequence[str]): names of labels the metric is split by.
+                                     Defaults to no labels.
+    """
+
+    metric_type = "untyped"
+
+    def __init__(
+        self, name: str, help_text: str, label_names: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        """
+        Order label values by label name.
+
+        Args:
+            labels (Dict[str, str]): label values by name
+
+        Raises:
+            ValueError: if the labels do not match the metric's label names
+
+        Returns:
+            LabelValues: label values in label name order
+        """
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"{self.name} takes labels {list(self.label_names)}, "
+                + f"got {sorted(labels)}"
+            )
+        return tuple(labels[name] for name in self.label_names)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """
+        Format the current values of the metric as sample lines.
+
+        Returns:
+            List[str]: sample lines
+        """
+        pass
+
+    def render(self) -> str:
+        """
+        Format the metric in the Prometheus text format.
+
+        Returns:
+            str: HELP and TYPE lines followed by sample lines
+        """
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.metric_type}",
+            *self.samples(),
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """A metric that only goes up, e.g. a number of processed files."""
+
+    metric_type = "counter"
+
+    def __init__(
+        self, name: str, help_text: str, label_names: Sequence[str] = ()
+    ) -> None:
+        super().__init__(name, help_text, label_names)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """
+        Increase the counter.
+
+        Args:
+            amount (float): amount to increase by. Defaults to 1.
+            **labels (str): label values of the counter to increase
+
+        Raises:
+            ValueError: if `amount` is negative
+        """
+        if amount < 0:
+            raise ValueError("counters can only be increased")
+        key = self._label_values(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        """
+        Format the current values of the counter as sample lines.
+
+        Returns:
+            List[str]: sample lines
+        """
+        with self._lock:
+            values = sorted(self.values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    """A metric that can go up and down, e.g. a queue depth."""
+
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """
+        Set the gauge to a value.
+
+        Args:
+            value (float): new value
+            **labels (str): label values of the gauge to set
+        """
+        key = self._label_values(labels)
+        with self._lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    """
+    A metric counting observed values (e.g. latencies) into buckets.
+
+    Args:
+        name (str): metric name
+        help_text (str): description of the metric
+        label_names (Sequence[str]): names of labels the metric is split by.
+                                     Defaults to no labels.
+        buckets (Sequence[float]): upper bounds of the buckets. Defaults to
+                                   `LATENCY_BUCKETS`.
+    """
+
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, label_names)
+        self.buckets = (*sorted(buckets), float("inf"))
+        self.counts: Dict[LabelValues, List[int]] = {}
+        self.sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Count a value into the histogram.
+
+        Args:
+            value (float): observed value
+            **labels (str): label values of the histogram to count into
+        """
+        key = self._label_values(labels)
+        with self._lock:
+            counts = self.counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.sums[key] = self.sums.get(key, 0) + value
+
+    def samples(self) -> List[str]:
+        """
+        Format the current buckets, sum and count of the histogram as sample
+        lines.
+
+        Returns:
+            List[str]: sample lines
+        """
+        with self._lock:
+            counts = {key: [*value] for key, value in sorted(self.counts.items())}
+            sums = dict(self.sums)
+
+        lines: List[str] = []
+        for key, bucket_counts in counts.items():
+            for bound, count in zip(self.buckets, bucket_counts):
+                labels = _format_labels(
+                    (*self.label_names, "le"), (*key, _format_value(bound))
+                )
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(sums[key])}")
+            lines.append(f"{self.name}_count{labels} {bucket_counts[-1]}")
+        return lines
+
+
+class MetricsRegistry(object):
+    """Collection of metrics that are exported together."""
+
+    def __init__(self) -> None:
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Add a metric to the registry.
+
+        Args:
+            metric (Metric): metric to add
+
+        Returns:
+            Metric: the added metric
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def counter(
+        self, name: str, help_text: str, label_names: Sequence[str] = ()
+    ) -> Counter:
+        """
+        Create and register a counter.
+
+        Args:
+            name (str): metric name, without the common prefix
+            help_text (str): description of the metric
+            label_names (Sequence[str]): names of labels the metric is split by.
+                                         Defaults to no labels.
+
+        Returns:
+            Counter: registered counter
+        """
+        counter = Counter(f"{METRIC_PREFIX}_{name}", help_text, label_names)
+        self.register(counter)
+        return counter
+
+    def gauge(
+        self, name: str, help_text: str, label_names: Sequence[str] = ()
+    ) -> Gauge:
+        """
+        Create and register a gauge.
+
+        Args:
+            name (str): metric name, without the common prefix
+            help_text (str): description of the metric
+            label_names (Sequence[str]): names of labels the metric is split by.
+                                         Defaults to no labels.
+
+        Returns:
+            Gauge: registered gauge
+        """
+        gauge = Gauge(f"{METRIC_PREFIX}_{name}", help_text, label_names)
+        self.register(gauge)
+        return gauge
+
+    def histogram(
+        self, name: str, help_text: str, label_names: Sequence[str] = ()
+    ) -> Histogram:
+        """
+        Create and register a latency histogram.
+
+        Args:
+            name (str): metric name, without the common prefix
+            help_text (str): description of the metric
+            label_names (Sequence[str]): names of labels the metric is split by.
+                                         Defaults to no labels.
+
+        Returns:
+            Histogram: registered histogram
+        """
+        histogram = Histogram(f"{METRIC_PREFIX}_{name}", help_text, label_names)
+        self.register(histogram)
+        return histogram
+
+    def render(self) -> str:
+        """
+        Format all metrics in the Prometheus text format.
+
+        Returns:
+            str: text exposition of all metrics
+        """
+        return "".join(metric.render() for metric in self.metrics)
+
+    def write_textfile(self, path: str) -> None:
+        """
+        Write all metrics to a file for the node exporter textfile collector.
+
+        The file is written next to its final path and then renamed over it, so
+        the collector never reads a partly written file.
+
+        Args:
+            path (str): path of `.prom` file to write
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=".metrics-", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(self.render())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+        """
+        Serve all metrics over HTTP on a background thread.
+
+        Args:
+            port (int): port to listen on, or 0 for any free port
+            host (str): address to listen on. Defaults to "127.0.0.1".
+
+        Returns:
+            ThreadingHTTPServer: running server, to be shut down when done
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            """Respond to every GET request with the current metrics."""
+
+            def do_GET(self) -> None:
+                """Send the current metrics."""
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                """Keep scrapes out of the log."""
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server
+
+
+# METRICS
+
+registry = MetricsRegistry()
+
+folders_processed = registry.counter(
+    "folders_processed_total", "Album folders processed.", ["outcome"]
+)
+tracks_processed = registry.counter(
+    "tracks_processed_total", "Tracks imported into Apple Music.", ["outcome"]
+)
+conversions = registry.counter(
+    "conversions_total", "Files converted or split into tracks.", ["outcome"]
+)
+bytes_read = registry.counter("bytes_read_total", "Bytes of files read.")
+bytes_written = registry.counter("bytes_written_total", "Bytes of files written.")
+conversion_seconds = registry.histogram(
+    "conversion_seconds", "Time to convert or split a file."
+)
+tagging_seconds = registry.histogram("tagging_seconds", "Time to tag a track.")
+import_seconds = registry.histogram(
+    "import_seconds", "Time to import a track into Apple Music."
+)
+stream_queue_depth = registry.gauge(
+    "stream_queue_depth",
+    "Converted tracks waiting to be tagged and imported when streaming.",
+)
+last_update = registry.gauge(
+    "last_update_timestamp_seconds", "Unix time the metrics were last updated."
+)
+
+# file section names mapped to the latency histogram they are counted in
+FILE_SECTION_HISTOGRAMS: Dict[str, Histogram] = {
+    "convert file": conversion_seconds,
+    "split file": conversion_seconds,
+    "tag file": tagging_seconds,
+    "import file": import_seconds,
+}
+
+
+def record_section(timing: SectionTiming) -> None:
+    """
+    Update metrics from the timing of a logged section as it ends.
+
+    Args:
+        timing (SectionTiming): timing of the ended section
+    """
+    if timing.kind == "folder":
+        folders_processed.inc(outcome=timing.outcome)
+    elif timing.kind == "file":
+        histogram = FILE_SECTION_HISTOGRAMS.get(timing.name)
+        if histogram is not None:
+            histogram.observe(timing.wall_time)
+        if timing.name in ("convert file", "split file"):
+            conversions.inc(outcome=timing.outcome)
+        elif timing.name == "import file":
+            tracks_processed.inc(outcome=timing.outcome)
+        bytes_read.inc(timing.bytes_processed - timing.bytes_written)
+        bytes_written.inc(timing.bytes_written)
+    last_update.set(time.time())
+
+
+class MetricsExporter(object):
+    """
+    Collect metrics from the logger's sections during a run, and export them to
+    a node exporter textfile after every folder and/or on a local HTTP port.
+
+    Args:
+        textfile_path (Optional[str]): path of `.prom` file to write metrics
+                                       to. Defaults to None.
+        port (Optional[int]): port to serve metrics on. Defaults to None.
+    """
+
+    def __init__(
+        self, textfile_path: Optional[str] = None, port: Optional[int] = None
+    ) -> None:
+        self.textfile_path = textfile_path
+        self.port = port
+        self.server: Optional["ThreadingHTTPServer"] = None
+
+    def start(self) -> None:
+        """Start collecting metrics, and serving them if a port is set."""
+        logger.add_section_listener(self.on_section_end)
+        if self.port is not None:
+            self.server = registry.serve(self.port)
+
+    def on_section_end(self, timing: SectionTiming) -> None:
+        """
+        Record a section's metrics, writing the textfile when a folder ends.
+
+        Args:
+            timing (SectionTiming): timing of the ended section
+        """
+        record_section(timing)
+        if timing.kind == "folder":
+            self.write()
+
+    def write(self) -> None:
+        """Write metrics to the textfile, if one is set."""
+        if self.textfile_path is not None:
+            registry.write_textfile(self.textfile_path)
+
+    def stop(self) -> None:
+        """Write final metrics and stop serving them."""
+        self.write()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,189 @@
+from typing import List, Literal, Optional, TypedDict
+
+from src.lib.media_classifier import MediaInfo, is_apple_music_compatible
+
+
+class OutputProfile(TypedDict):
+    """How converted files are encoded, and what compatible files must meet."""
+
+    """Codec converted files are encoded with ("alac", "aac")"""
+    codec: Literal["alac", "aac"]
+
+    """Highest sample rate in Hz, if capped"""
+    max_sample_rate: Optional[int]
+
+    """Highest bits per sample of lossless output, if capped"""
+    max_bit_depth: Optional[int]
+
+    """Bit rate of lossy output in kbit/s, if lossy"""
+    bit_rate: Optional[int]
+
+
+# lossless at the source's sample rate and bit depth
+ALAC_AS_SOURCE: OutputProfile = {
+    "codec": "alac",
+    "max_sample_rate": None,
+    "max_bit_depth": None,
+    "bit_rate": None,
+}
+
+# lossless, with hi-res sources resampled to at most 24-bit/48 kHz
+ALAC_24_48: OutputProfile = {
+    "codec": "alac",
+    "max_sample_rate": 48000,
+    "max_bit_depth": 24,
+    "bit_rate": None,
+}
+
+# 256 kbit/s AAC, as sold by the iTunes Store
+AAC_256: OutputProfile = {
+    "codec": "aac",
+    "max_sample_rate": 48000,
+    "max_bit_depth": None,
+    "bit_rate": 256,
+}
+
+# sample rates families are resampled within, so the ratio stays a power of two
+SAMPLE_RATE_FAMILIES = (44100, 48000)
+
+# precision of the soxr resampler in bits, its "very high quality" setting
+RESAMPLER_PRECISION = 28
+
+
+def target_sample_rate(
+    media_info: Optional[MediaInfo], profile: OutputProfile
+) -> Optional[int]:
+    """
+    Find the sample rate a source must be resampled to under a profile: the
+    highest rate of its family (44.1 kHz or 48 kHz multiples) within the
+    profile's limit, or the limit itself.
+
+    Args:
+        media_info (Optional[MediaInfo]): media info of the source
+        profile (OutputProfile): output profile
+
+    Returns:
+        Optional[int]: sample rate to resample to, or None to keep the source's
+    """
+    limit = profile["max_sample_rate"]
+    rate = media_info["sample_rate"] if media_info else None
+    if limit is None or rate is None or rate <= limit:
+        return None
+    for base in SAMPLE_RATE_FAMILIES:
+        if rate % base == 0 and base <= limit:
+            target = base
+            while target * 2 <= limit:
+                target *= 2
+            return target
+    return limit
+
+
+def target_bit_depth(
+    media_info: Optional[MediaInfo], profile: OutputProfile
+) -> Optional[int]:
+    """
+    Find the bit depth a source must be dithered down to under a profile.
+
+    Args:
+        media_info (Optional[MediaInfo]): media info of the source
+        profile (OutputProfile): output profile
+
+    Returns:
+        Optional[int]: bits per sample to dither to, or None to keep the
+                       source's
+    """
+    limit = profile["max_bit_depth"]
+    depth = media_info["bit_depth"] if media_info else None
+    if profile["codec"] != "alac" or limit is None or depth is None:
+        return None
+    return limit if depth > limit else None
+
+
+def matches_profile(media_info: MediaInfo, profile: OutputProfile) -> bool:
+    """
+    Check if classified media can be imported as-is under a profile: it must be
+    compatible with Apple Music, within the profile's sample rate and bit depth,
+    and not lossless where the profile is lossy. Lossy files that are already
+    compatible are never converted up to a lossless profile, which would only
+    make them bigger.
+
+    Args:
+        media_info (MediaInfo): classified media info
+        profile (OutputProfile): output profile
+
+    Returns:
+        bool: whether the media can be imported without conversion
+    """
+    if not is_apple_music_compatible(media_info):
+        return False
+    if profile["codec"] == "aac" and media_info["codec"] == "alac":
+        return False
+    return (
+        target_sample_rate(media_info, profile) is None
+        and target_bit_depth(media_info, profile) is None
+    )
+
+
+def audio_filter(
+    media_info: Optional[MediaInfo], profile: OutputProfile
+) -> Optional[str]:
+    """
+    Build the ffmpeg filter that resamples and dithers a source to fit a
+    profile, so it happens in the conversion's own encode pass.
+
+    Args:
+        media_info (Optional[MediaInfo]): media info of the source
+        profile (OutputProfile): output profile
+
+    Returns:
+        Optional[str]: `aresample` filter, or None if the source fits as it is
+    """
+    sample_rate = target_sample_rate(media_info, profile)
+    bit_depth = target_bit_depth(media_info, profile)
+    if sample_rate is None and bit_depth is None:
+        return None
+
+    options: List[str] = []
+    if sample_rate is not None:
+        options += [
+            "resampler=soxr",
+            f"precision={RESAMPLER_PRECISION}",
+            f"osr={sample_rate}",
+        ]
+    if bit_depth is not None:
+        # ALAC keeps 24 bits of 32-bit samples
+        options += [
+            f"osf={'s16p' if bit_depth <= 16 else 's32p'}",
+            "dither_method=triangular",
+        ]
+    return "aresample=" + ":".join(options)
+
+
+def encoder_options(profile: OutputProfile) -> List[str]:
+    """
+    Build the ffmpeg output arguments that encode audio with a profile's codec.
+
+    Args:
+        profile (OutputProfile): output profile
+
+    Returns:
+        List[str]: ffmpeg output arguments
+    """
+    if profile["codec"] == "aac":
+        return ["-c:a", "aac", "-b:a", f"{profile['bit_rate'] or 256}k"]
+    return ["-c:a", "alac"]
+
+
+def keeps_samples(media_info: Optional[MediaInfo], profile: OutputProfile) -> bool:
+    """
+    Check if a source's converted file holds exactly its samples under a
+    profile, i.e. the profile is lossless and nothing is resampled or dithered.
+
+    Args:
+        media_info (Optional[MediaInfo]): media info of the source
+        profile (OutputProfile): output profile
+
+    Returns:
+        bool: whether the samples are kept
+    """
+    return profile["codec"] == "alac" and audio_filter(media_info, profile) is None
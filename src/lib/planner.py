@@ -0,0 +1,344 @@
+import json
+import os
+import tempfile
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, TypedDict
+
+from src.lib.logger import SectionTiming, logger
+
+if TYPE_CHECKING:
+    from src.lib.abstract_album_folder import AbstractAlbumFolder
+
+
+class PlannedConversion(TypedDict):
+    """A conversion or cue sheet split a run would do."""
+
+    """What the conversion does ("convert", "split")"""
+    kind: str
+
+    """Path of the file read by the conversion"""
+    source: str
+
+    """MIME type of the file read by the conversion"""
+    mime_type: Optional[str]
+
+    """Names of the files the conversion would write"""
+    targets: List[str]
+
+    """Size of the file read by the conversion, in bytes"""
+    bytes: int
+
+
+class AlbumProbe(TypedDict):
+    """What processing an album would do, found without decoding or writing."""
+
+    """Conversions and cue sheet splits of incompatible files"""
+    conversions: List[PlannedConversion]
+
+    """Names and sizes of files that are already compatible"""
+    compatible_files: List[Tuple[str, int]]
+
+    """How the cover image would be chosen"""
+    cover_decision: str
+
+
+class StageEstimate(TypedDict):
+    """Estimated cost of a processing stage."""
+
+    """Number of files the stage would handle"""
+    count: int
+
+    """Bytes the stage would read, if known"""
+    bytes: int
+
+    """Estimated seconds the stage would take, if throughput is known"""
+    seconds: Optional[float]
+
+
+class FolderPlan(TypedDict):
+    """Everything a run would do to an album folder, and what it would cost."""
+
+    """Path of the album folder"""
+    path: str
+
+    """Friendly name of the folder type"""
+    folder_type: str
+
+    """Result of probing the album"""
+    probe: AlbumProbe
+
+    """Number of tracks that would be imported"""
+    import_count: int
+
+    """Whether the folder would be deleted after a clean import"""
+    delete: bool
+
+    """Estimated cost of each stage"""
+    stages: Dict[str, StageEstimate]
+
+
+class Throughput(TypedDict):
+    """Measured throughput of a kind of file section."""
+
+    """Bytes read per second, if the section reads files"""
+    bytes_per_second: Optional[float]
+
+    """Seconds per file"""
+    seconds_per_file: float
+
+    """Number of runs the throughput was measured over"""
+    runs: int
+
+
+# weight of the newest run when updating measured throughput
+HISTORY_WEIGHT = 0.3
+
+# stages mapped to the file sections measured for them
+STAGE_SECTIONS: Dict[str, List[str]] = {
+    "file conversions": ["convert file", "split file"],
+    "cover image tagging": ["tag file"],
+    "Apple Music import": ["import file"],
+}
+
+
+class ThroughputHistory(object):
+    """
+    Throughput of each kind of file section measured in previous runs, kept in
+    a JSON file so runs can be planned before they happen.
+
+    Args:
+        path (str): path of the JSON file
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.sections: Dict[str, Throughput] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "ThroughputHistory":
+        """
+        Load the history from a file, or start an empty one if there is none.
+
+        Args:
+            path (str): path of the JSON file
+
+        Returns:
+            ThroughputHistory: loaded history
+        """
+        history = cls(path)
+        try:
+            with open(path, encoding="utf-8") as file:
+                history.sections = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        return history
+
+    def save(self) -> None:
+        """Write the history to its file, replacing it atomically."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(self.sections, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def update(self, timing: SectionTiming) -> None:
+        """
+        Blend the throughput of every file section in a run into the history.
+
+        Args:
+            timing (SectionTiming): timing tree of the run
+        """
+        totals: Dict[str, Tuple[int, float, int]] = {}
+
+        def collect(section: SectionTiming) -> None:
+            """
+            Add up the file sections nested in a section.
+
+            Args:
+                section (SectionTiming): section to collect from
+            """
+            for child in section.children:
+                if child.kind == "file" and child.end is not None:
+                    count, seconds, read = totals.get(child.name, (0, 0.0, 0))
+                    totals[child.name] = (
+                        count + 1,
+                        seconds + child.wall_time,
+                        read + child.bytes_processed - child.bytes_written,
+                    )
+                collect(child)
+
+        collect(timing)
+
+        for name, (count, seconds, read) in totals.items():
+            if seconds <= 0:
+                continue
+            bytes_per_second = read / seconds if read else None
+            seconds_per_file = seconds / count
+            previous = self.sections.get(name)
+            if previous is not None:
+                previous_rate = previous["bytes_per_second"]
+                if bytes_per_second is not None and previous_rate is not None:
+                    bytes_per_second = _blend(previous_rate, bytes_per_second)
+                seconds_per_file = _blend(
+                    previous["seconds_per_file"], seconds_per_file
+                )
+            self.sections[name] = {
+                "bytes_per_second": bytes_per_second,
+                "seconds_per_file": seconds_per_file,
+                "runs": (previous["runs"] if previous else 0) + 1,
+            }
+
+    def estimate(self, stage: str, count: int, size: int) -> Optional[float]:
+        """
+        Estimate how long a stage would take from measured throughput.
+
+        Args:
+            stage (str): name of the stage
+            count (int): number of files the stage would handle
+            size (int): bytes the stage would read, or 0 if unknown
+
+        Returns:
+            Optional[float]: estimated seconds, or None if never measured
+        """
+        if count == 0:
+            return 0.0
+        for name in STAGE_SECTIONS.get(stage, []):
+            throughput = self.sections.get(name)
+            if throughput is None:
+                continue
+            if size and throughput["bytes_per_second"]:
+                return size / throughput["bytes_per_second"]
+            return count * throughput["seconds_per_file"]
+        return None
+
+
+def _blend(previous: float, latest: float) -> float:
+    """
+    Blend a newly measured value into a running average.
+
+    Args:
+        previous (float): running average
+        latest (float): newly measured value
+
+    Returns:
+        float: updated running average
+    """
+    return previous * (1 - HISTORY_WEIGHT) + latest * HISTORY_WEIGHT
+
+
+def plan_folder(
+    folder: "AbstractAlbumFolder", history: ThroughputHistory, delete_folder_after: bool
+) -> FolderPlan:
+    """
+    Plan what processing an album folder would do, and estimate its cost.
+
+    Args:
+        folder (AbstractAlbumFolder): album folder to plan
+        history (ThroughputHistory): throughput measured in previous runs
+        delete_folder_after (bool): whether folders are deleted after import
+
+    Returns:
+        FolderPlan: plan for the folder
+    """
+    probe = folder.probe()
+    conversions = probe["conversions"]
+    import_count = len(probe["compatible_files"]) + sum(
+        len(conversion["targets"]) for conversion in conversions
+    )
+    conversion_bytes = sum(conversion["bytes"] for conversion in conversions)
+    compatible_bytes = sum(size for _, size in probe["compatible_files"])
+
+    # converted files are not written yet, so only compatible files have a size
+    stage_counts = {
+        "file conversions": (len(conversions), conversion_bytes),
+        "cover image tagging": (import_count, 0),
+        "Apple Music import": (import_count, compatible_bytes),
+    }
+    stages: Dict[str, StageEstimate] = {
+        stage: {
+            "count": count,
+            "bytes": size,
+            "seconds": history.estimate(stage, count, size),
+        }
+        for stage, (count, size) in stage_counts.items()
+    }
+
+    return {
+        "path": folder.path,
+        "folder_type": folder.folder_type,
+        "probe": probe,
+        "import_count": import_count,
+        "delete": delete_folder_after and import_count > 0,
+        "stages": stages,
+    }
+
+
+def _format_estimate(estimate: StageEstimate) -> str:
+    """
+    Format a stage estimate for logging.
+
+    Args:
+        estimate (StageEstimate): stage estimate
+
+    Returns:
+        str: files, size and estimated time
+    """
+    size = f", {estimate['bytes'] / 1e6:.1f} MB" if estimate["bytes"] else ""
+    seconds = (
+        f"~{estimate['seconds']:.1f} s"
+        if estimate["seconds"] is not None
+        else "no measured throughput"
+    )
+    return f"{estimate['count']} files{size}, {seconds}"
+
+
+def log_plan(plans: List[FolderPlan]) -> None:
+    """
+    Log the plan of every folder, and the estimated totals of each stage.
+
+    Args:
+        plans (List[FolderPlan]): folder plans
+    """
+    totals: Dict[str, StageEstimate] = {}
+
+    for plan in plans:
+        end_section = logger.log_section(
+            "plan",
+            f"[{{section_name}}]: {plan['folder_type']} folder at '{plan['path']}'",
+        )
+        probe = plan["probe"]
+        if probe["conversions"]:
+            logger.info("conversions:")
+            logger.indent()
+            for conversion in probe["conversions"]:
+                targets = conversion["targets"]
+                target = targets[0] if len(targets) == 1 else f"{len(targets)} tracks"
+                logger.info(
+                    f"{conversion['kind']} {os.path.basename(conversion['source'])} "
+                    + f"--> {target} ({conversion['bytes'] / 1e6:.1f} MB)"
+                )
+            logger.dedent()
+        logger.info(f"cover image: {probe['cover_decision']}")
+        logger.info(f"imports: {plan['import_count']} files")
+        if plan["delete"]:
+            logger.info("deletion: folder would be deleted after a clean import")
+
+        logger.info("estimates:")
+        logger.indent()
+        for stage, estimate in plan["stages"].items():
+            logger.info(f"{stage}: {_format_estimate(estimate)}")
+            total = totals.setdefault(stage, {"count": 0, "bytes": 0, "seconds": 0.0})
+            total["count"] += estimate["count"]
+            total["bytes"] += estimate["bytes"]
+            if total["seconds"] is not None and estimate["seconds"] is not None:
+                total["seconds"] += estimate["seconds"]
+            else:
+                total["seconds"] = None
+        logger.dedent()
+        end_section()
+
+    logger.info("plan totals:")
+    logger.indent()
+    for stage, total in totals.items():
+        logger.info(f"{stage}: {_format_estimate(total)}")
+    logger.dedent()
@@ -0,0 +1,179 @@
+import cProfile
+import fnmatch
+import io
+import os
+import pstats
+import re
+import time
+import tracemalloc
+from typing import List, Optional
+
+from src.lib.logger import SectionTiming, logger
+
+# CONSTANTS
+
+# number of functions and allocation sites listed in each report
+REPORT_LIMIT = 25
+
+
+def _slug(text: str) -> str:
+    """
+    Make text safe to use in a file name.
+
+    Args:
+        text (str): text to convert
+
+    Returns:
+        str: lowercase text with runs of other characters replaced by "-"
+    """
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:60]
+
+
+class StageProfiler(object):
+    """
+    Profile each stage of `AbstractAlbumFolder.process_files` with cProfile, and
+    optionally trace its memory allocations with tracemalloc.
+
+    Each profiled section gets a `.prof` file (for `pstats`, `snakeviz` etc.)
+    and a `.txt` report of its slowest functions and, when tracing memory, its
+    peak memory and top allocation sites, written into `run_dir`.
+
+    Only the thread a section runs in is profiled, so work on background
+    threads (e.g. conversions when streaming track imports) shows up as time
+    waiting on them.
+
+    Args:
+        run_dir (str): folder to write profiles and reports to
+        trace_memory (bool): whether to also trace memory allocations. Defaults
+                             to False.
+        folder_pattern (Optional[str]): if set, only profile folders whose path
+                                        matches this glob pattern, as a whole
+                                        instead of per stage. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        run_dir: str,
+        trace_memory: bool = False,
+        folder_pattern: Optional[str] = None,
+    ) -> None:
+        self.run_dir = run_dir
+        self.trace_memory = trace_memory
+        self.folder_pattern = folder_pattern
+        self.report_paths: List[str] = []
+        self._profile: Optional[cProfile.Profile] = None
+        self._section: Optional[SectionTiming] = None
+        self._folder: Optional[str] = None
+        self._count = 0
+
+    def start(self) -> None:
+        """Create the run folder and start profiling sections as they run."""
+        os.makedirs(self.run_dir, exist_ok=True)
+        if self.trace_memory:
+            tracemalloc.start()
+        logger.add_section_start_listener(self.on_section_start)
+        logger.add_section_listener(self.on_section_end)
+
+    def stop(self) -> None:
+        """Stop tracing memory, and log where reports were written."""
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        logger.info(f"profiles written to: {self.run_dir}")
+
+    def _should_profile(self, timing: SectionTiming) -> bool:
+        """
+        Check if a section should be profiled on its own.
+
+        Args:
+            timing (SectionTiming): started section
+
+        Returns:
+            bool: whether to profile the section
+        """
+        if self.folder_pattern is None:
+            return timing.kind == "stage"
+        return (
+            timing.kind == "folder"
+            and timing.label is not None
+            and fnmatch.fnmatch(timing.label, self.folder_pattern)
+        )
+
+    def on_section_start(self, timing: SectionTiming) -> None:
+        """
+        Start profiling a section if it is a stage or chosen folder.
+
+        Args:
+            timing (SectionTiming): started section
+        """
+        if timing.kind == "folder":
+            self._folder = timing.label
+        if self._profile is not None or not self._should_profile(timing):
+            return
+
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._section = timing
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def on_section_end(self, timing: SectionTiming) -> None:
+        """
+        Stop profiling a section and write its profile and report.
+
+        Args:
+            timing (SectionTiming): ended section
+        """
+        if timing is not self._section or self._profile is None:
+            return
+        self._profile.disable()
+        profile = self._profile
+        self._profile = None
+        self._section = None
+
+        self._count += 1
+        folder = os.path.basename(self._folder or "") or "run"
+        base_name = f"{self._count:03d}-{_slug(folder)}"
+        if timing.kind == "stage":
+            base_name += f"-{_slug(timing.name)}"
+        base_path = os.path.join(self.run_dir, base_name)
+
+        profile.dump_stats(f"{base_path}.prof")
+        with open(f"{base_path}.txt", "w", encoding="utf-8") as report:
+            report.write(self._report(timing, profile))
+        self.report_paths.append(f"{base_path}.txt")
+
+    def _report(self, timing: SectionTiming, profile: cProfile.Profile) -> str:
+        """
+        Summarize where a profiled section spent its time and memory.
+
+        Args:
+            timing (SectionTiming): profiled section
+            profile (cProfile.Profile): profile of the section
+
+        Returns:
+            str: text report
+        """
+        lines = [
+            f"section: {timing.name}",
+            f"folder: {self._folder}",
+            f"profiled at: {time.strftime('%Y-%m-%d %H:%M:%S')}",
+            f"wall time: {timing.wall_time:.3f}s",
+            f"cpu time: {timing.cpu_time:.3f}s",
+        ]
+
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f"traced memory: {current / 1e6:.2f} MB")
+            lines.append(f"peak traced memory: {peak / 1e6:.2f} MB")
+            lines.append("")
+            lines.append(f"top {REPORT_LIMIT} allocation sites still in use:")
+            statistics = tracemalloc.take_snapshot().statistics("lineno")
+            lines.extend(f"  {stat}" for stat in statistics[:REPORT_LIMIT])
+
+        stats_text = io.StringIO()
+        stats = pstats.Stats(profile, stream=stats_text)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_LIMIT)
+        lines.append("")
+        lines.append(stats_text.getvalue().strip())
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,310 @@
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Tuple
+
+from src.lib.logger import SectionTiming, logger
+from src.lib.planner import STAGE_SECTIONS, ThroughputHistory, plan_folder
+from src.lib.scheduler import FALLBACK_BYTES_PER_SECOND, FALLBACK_SECONDS_PER_FILE
+
+if TYPE_CHECKING:
+    from src.lib.abstract_album_folder import AbstractAlbumFolder
+
+# CONSTANTS
+
+# seconds of finished files current throughput is measured over
+RATE_WINDOW = 30.0
+
+# number of a stage's latest files its throughput is measured over, for
+# estimating the time left
+RATE_FILES = 50
+
+# seconds between redraws of the status lines on a terminal
+REDRAW_INTERVAL = 1.0
+
+# short names of stages, for progress lines
+STAGE_NAMES: Dict[str, str] = {
+    "file conversions": "converting",
+    "cover image tagging": "tagging",
+    "Apple Music import": "importing",
+}
+
+# file sections mapped to the stage they are counted in
+SECTION_STAGES: Dict[str, str] = {
+    section: stage for stage, sections in STAGE_SECTIONS.items() for section in sections
+}
+
+# (end time, start time, stage, bytes read) of a finished file section
+FinishedFile = Tuple[float, float, str, int]
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Format a duration for progress lines.
+
+    Args:
+        seconds (float): duration in seconds
+
+    Returns:
+        str: e.g. "1h 02m", "5m 07s" or "42s"
+    """
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+
+class ProgressTracker(object):
+    """
+    Track how much of a run is done from the logger's sections, and show it
+    with current throughput and an estimated time left: as status lines redrawn
+    below the log on a terminal, or as a progress line logged periodically
+    otherwise.
+
+    The remaining work of each stage starts from the plans of the discovered
+    folders, and is corrected with the files each folder actually processed as
+    it finishes. The time left is estimated from the throughput of each stage
+    measured during the run, falling back to throughput of previous runs.
+
+    Args:
+        history (ThroughputHistory): throughput measured in previous runs
+        interval (float): seconds between progress lines when output is not a
+                          terminal
+    """
+
+    def __init__(self, history: ThroughputHistory, interval: float) -> None:
+        self.history = history
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.folders_total = 0
+        self.folders_done = 0
+        self.planned: Dict[str, Dict[str, List[int]]] = {}
+        self.total: Dict[str, List[int]] = {stage: [0, 0] for stage in STAGE_SECTIONS}
+        self.done: Dict[str, List[int]] = {stage: [0, 0] for stage in STAGE_SECTIONS}
+        self.folder_done: Dict[str, List[int]] = {}
+        self.finished: Deque[FinishedFile] = deque()
+        self.recent: Dict[str, Deque[FinishedFile]] = {
+            stage: deque(maxlen=RATE_FILES) for stage in STAGE_SECTIONS
+        }
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self, folders: List["AbstractAlbumFolder"]) -> None:
+        """
+        Plan the remaining work of every folder, and start showing progress.
+
+        Args:
+            folders (List[AbstractAlbumFolder]): folders the run will process
+        """
+        for folder in folders:
+            try:
+                plan = plan_folder(folder, self.history, False)
+            except Exception:
+                # the folder's work is counted as it happens instead
+                continue
+            self.planned[folder.path] = {
+                stage: [estimate["count"], estimate["bytes"]]
+                for stage, estimate in plan["stages"].items()
+                if stage in self.total
+            }
+            for stage, (count, size) in self.planned[folder.path].items():
+                self.total[stage][0] += count
+                self.total[stage][1] += size
+        self.folders_total = len(folders)
+        self.started = time.monotonic()
+
+        logger.add_section_start_listener(self.on_section_start)
+        logger.add_section_listener(self.on_section_end)
+        self.thread = threading.Thread(target=self._show, name="progress", daemon=True)
+        self.thread.start()
+
+    def on_section_start(self, timing: SectionTiming) -> None:
+        """
+        Start counting the files of a folder when its section starts.
+
+        Args:
+            timing (SectionTiming): timing of the started section
+        """
+        if timing.kind != "folder":
+            return
+        with self.lock:
+            self.folder_done = {stage: [0, 0] for stage in STAGE_SECTIONS}
+
+    def on_section_end(self, timing: SectionTiming) -> None:
+        """
+        Count a finished file towards its stage, or a finished folder towards
+        the run.
+
+        Args:
+            timing (SectionTiming): timing of the ended section
+        """
+        if timing.kind == "folder":
+            self._finish_folder(timing.label)
+            return
+        stage = SECTION_STAGES.get(timing.name)
+        if stage is None or timing.kind != "file":
+            return
+        # splits read their source once and write several tracks
+        size = max(timing.bytes_processed - timing.bytes_written, 0)
+        with self.lock:
+            for counts in (self.done[stage], self.folder_done.get(stage)):
+                if counts is not None:
+                    counts[0] += 1
+                    counts[1] += size
+            finished = (timing.end or time.monotonic(), timing.start, stage, size)
+            self.finished.append(finished)
+            self.recent[stage].append(finished)
+
+    def _finish_folder(self, path: Optional[str]) -> None:
+        """
+        Replace a finished folder's planned work with the work it did.
+
+        Args:
+            path (Optional[str]): path of the folder
+        """
+        with self.lock:
+            planned = self.planned.pop(path or "", {})
+            for stage, counts in self.folder_done.items():
+                planned_counts = planned.get(stage, [0, 0])
+                self.total[stage][0] += counts[0] - planned_counts[0]
+                self.total[stage][1] += counts[1] - planned_counts[1]
+            self.folders_done += 1
+            self.folder_done = {}
+
+    @staticmethod
+    def stage_rate(files: List[FinishedFile]) -> Optional[Tuple[float, float]]:
+        """
+        Measure the throughput of a stage from its latest finished files.
+
+        Args:
+            files (List[FinishedFile]): latest finished files of the stage
+
+        Returns:
+            Optional[Tuple[float, float]]: files and bytes per second, or None
+                                           if no file of the stage finished
+        """
+        if not files:
+            return None
+        # files run concurrently and stages take turns, so the time any file of
+        # the stage was running is measured rather than the sum or whole span
+        busy = 0.0
+        busy_until = float("-inf")
+        for end, start, _, _ in sorted(files, key=lambda file: file[1]):
+            if end > busy_until:
+                busy += end - max(start, busy_until)
+                busy_until = end
+        busy = max(busy, 1e-3)
+        return len(files) / busy, sum(file[3] for file in files) / busy
+
+    def estimate_left(
+        self, stage: str, count: int, size: int, rate: Optional[Tuple[float, float]]
+    ) -> float:
+        """
+        Estimate how long the remaining work of a stage takes.
+
+        Args:
+            stage (str): name of the stage
+            count (int): files left
+            size (int): bytes left to read, if known
+            rate (Optional[Tuple[float, float]]): files and bytes per second
+                                                  measured during the run
+
+        Returns:
+            float: estimated seconds
+        """
+        if count == 0:
+            return 0.0
+        # only conversions know the size of every file they will read up front
+        sized = stage == "file conversions"
+        if rate is not None:
+            if sized and size and rate[1]:
+                return size / rate[1]
+            return count / rate[0]
+        estimate = self.history.estimate(stage, count, size if sized else 0)
+        if estimate is not None:
+            return estimate
+        return count * FALLBACK_SECONDS_PER_FILE + size / (
+            FALLBACK_BYTES_PER_SECOND.get(stage, 50e6)
+        )
+
+    def status(self) -> List[str]:
+        """
+        Describe the progress of the run.
+
+        Returns:
+            List[str]: a summary line, then a line per stage
+        """
+        now = time.monotonic()
+        with self.lock:
+            while self.finished and self.finished[0][0] < now - RATE_WINDOW:
+                self.finished.popleft()
+            finished = list(self.finished)
+            recent = {stage: list(files) for stage, files in self.recent.items()}
+            done = {stage: list(counts) for stage, counts in self.done.items()}
+            total = {
+                stage: [max(counts[0], done[stage][0]), max(counts[1], done[stage][1])]
+                for stage, counts in self.total.items()
+            }
+            folders_done, folders_total = self.folders_done, self.folders_total
+
+        window = max(min(RATE_WINDOW, now - self.started), 1e-3)
+        bytes_per_second = sum(file[3] for file in finished) / window
+        # tracks per second of the stage that finished a file last
+        current_rate = ""
+        if finished:
+            stage = finished[-1][2]
+            tracks = sum(1 for file in finished if file[2] == stage)
+            current_rate = f", {STAGE_NAMES[stage]} {tracks / window:.1f} tracks/s"
+
+        seconds_left = 0.0
+        stage_lines: List[str] = []
+        for stage in STAGE_SECTIONS:
+            count = total[stage][0] - done[stage][0]
+            size = total[stage][1] - done[stage][1]
+            seconds_left += self.estimate_left(
+                stage, count, size, self.stage_rate(recent[stage])
+            )
+            size_line = (
+                f", {done[stage][1] / 1e6:.0f}/{total[stage][1] / 1e6:.0f} MB"
+                if total[stage][1]
+                else ""
+            )
+            stage_lines.append(
+                f"  {STAGE_NAMES[stage]}: {done[stage][0]}/{total[stage][0]} "
+                + f"files{size_line}"
+            )
+
+        summary = (
+            f"{folders_done}/{folders_total} folders, "
+            + f"{bytes_per_second / 1e6:.1f} MB/s"
+            + current_rate
+            + f", ETA {format_duration(seconds_left)}"
+        )
+        return [f"[progress] {summary}"] + stage_lines
+
+    def _show(self) -> None:
+        """
+        Show progress until stopped: redrawn every second on a terminal, or
+        logged every `interval` seconds otherwise.
+        """
+        terminal = logger.can_show_status()
+        interval = REDRAW_INTERVAL if terminal else self.interval
+        while not self.stopping.wait(interval):
+            lines = self.status()
+            if terminal:
+                logger.set_status(lines)
+            else:
+                logger.info(" | ".join(line.strip() for line in lines))
+
+    def stop(self) -> None:
+        """Stop showing progress, and remove the status lines."""
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        logger.set_status([])
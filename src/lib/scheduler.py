@@ -0,0 +1,145 @@
+import os
+from typing import Dict, List, Literal, Optional, Tuple, Type
+
+from src.lib.abstract_album_folder import AbstractAlbumFolder
+from src.lib.logger import logger
+from src.lib.planner import FolderPlan, ThroughputHistory, plan_folder
+
+# orders folders can be processed in
+SchedulePolicy = Literal["discovery", "shortest-job-first", "oldest-first", "priority"]
+
+# throughput assumed for stages no run has measured yet, in bytes per second,
+# so costs of folders with and without conversions stay comparable
+FALLBACK_BYTES_PER_SECOND: Dict[str, float] = {
+    "file conversions": 5e6,
+    "cover image tagging": 100e6,
+    "Apple Music import": 50e6,
+}
+
+# seconds assumed per file for stages no run has measured yet, on top of bytes
+FALLBACK_SECONDS_PER_FILE = 0.05
+
+
+def estimate_cost(plan: FolderPlan) -> float:
+    """
+    Estimate how long processing a folder takes, from measured throughput
+    where there is some and assumed throughput otherwise.
+
+    Args:
+        plan (FolderPlan): plan of the folder
+
+    Returns:
+        float: estimated seconds
+    """
+    cost = 0.0
+    for stage, estimate in plan["stages"].items():
+        if estimate["seconds"] is not None:
+            cost += estimate["seconds"]
+            continue
+        cost += estimate["count"] * FALLBACK_SECONDS_PER_FILE
+        cost += estimate["bytes"] / FALLBACK_BYTES_PER_SECOND.get(stage, 50e6)
+    return cost
+
+
+def download_time(folder: AbstractAlbumFolder) -> float:
+    """
+    Get when a folder was downloaded, from its modification time.
+
+    Args:
+        folder (AbstractAlbumFolder): album folder
+
+    Returns:
+        float: unix time, or infinity if the folder is gone
+    """
+    try:
+        return os.stat(folder.path).st_mtime
+    except OSError:
+        return float("inf")
+
+
+def schedule_folders(
+    folders: List[AbstractAlbumFolder],
+    policy: SchedulePolicy,
+    history: ThroughputHistory,
+    priorities: Dict[Type[AbstractAlbumFolder], int],
+) -> List[AbstractAlbumFolder]:
+    """
+    Order album folders for processing.
+
+    - "discovery": the order folders were discovered in
+    - "shortest-job-first": cheapest folders first, so many small albums are
+      not held up behind a large box set
+    - "oldest-first": folders downloaded earliest first
+    - "priority": folder types with the highest priority first, cheapest first
+      within a priority
+
+    Costs are estimated by probing each folder, which reads only file listings
+    and headers. Folders that can't be probed are processed last.
+
+    Args:
+        folders (List[AbstractAlbumFolder]): discovered album folders
+        policy (SchedulePolicy): order to process folders in
+        history (ThroughputHistory): throughput measured in previous runs
+        priorities (Dict[Type[AbstractAlbumFolder], int]): priority of each
+            folder type, for the "priority" policy. Types not listed have 0.
+
+    Raises:
+        ValueError: if the policy is unknown
+
+    Returns:
+        List[AbstractAlbumFolder]: folders in processing order
+    """
+    if policy == "discovery":
+        return list(folders)
+    if policy == "oldest-first":
+        ordered = sorted(
+            folders, key=lambda folder: (download_time(folder), folder.path)
+        )
+        log_schedule(policy, [(folder, None) for folder in ordered])
+        return ordered
+    if policy not in ("shortest-job-first", "priority"):
+        raise ValueError(f"unknown schedule policy: {policy}")
+
+    costs: Dict[str, float] = {}
+    for folder in folders:
+        try:
+            costs[folder.path] = estimate_cost(plan_folder(folder, history, False))
+        except Exception as e:
+            logger.warning(f"could not estimate cost of '{folder.path}' ({e})")
+            costs[folder.path] = float("inf")
+
+    def key(folder: AbstractAlbumFolder) -> Tuple[int, float, str]:
+        """
+        Sort key of a folder.
+
+        Args:
+            folder (AbstractAlbumFolder): album folder
+
+        Returns:
+            Tuple[int, float, str]: negated priority, cost and path
+        """
+        priority = priorities.get(type(folder), 0) if policy == "priority" else 0
+        return -priority, costs[folder.path], folder.path
+
+    ordered = sorted(folders, key=key)
+    log_schedule(policy, [(folder, costs[folder.path]) for folder in ordered])
+    return ordered
+
+
+def log_schedule(
+    policy: SchedulePolicy, schedule: List[Tuple[AbstractAlbumFolder, Optional[float]]]
+) -> None:
+    """
+    Log the order folders will be processed in.
+
+    Args:
+        policy (SchedulePolicy): policy the folders were ordered by
+        schedule (List[Tuple[AbstractAlbumFolder, Optional[float]]]): folders in
+            processing order, with their estimated cost if known
+    """
+    logger.info(f"processing order ({policy}):")
+    logger.indent()
+    for index, (folder, cost) in enumerate(schedule):
+        estimate = f" (~{cost:.1f} s)" if cost is not None else ""
+        logger.info(f"{index + 1}. {folder.folder_type}: {folder.path}{estimate}")
+    logger.dedent()
@@ -0,0 +1,236 @@
+import errno
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from src.lib.logger import logger
+
+# size of reads and writes when a file has to be copied by hand, large enough
+# to keep round-trips to network mounts few
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Linux ioctl that shares a file's data blocks with another (a reflink)
+FICLONE = 0x40049409
+
+# errors meaning a copy method isn't supported between two files, so the next
+# method should be tried
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EBADF,
+}
+
+# size and modification time of each file in a folder, by relative path
+FolderState = Dict[str, Tuple[int, int]]
+
+
+def _reflink(source: str, target: str) -> bool:
+    """
+    Try to copy a file by sharing its data blocks, which is instant on copy on
+    write filesystems (Btrfs, XFS, APFS).
+
+    Args:
+        source (str): file to copy
+        target (str): path of the copy, which must not exist
+
+    Returns:
+        bool: whether the file was copied
+    """
+    if sys.platform == "darwin":
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.clonefile(source.encode(), target.encode(), 0) == 0
+    if sys.platform != "linux":
+        return False
+
+    import fcntl
+
+    with open(source, "rb") as source_file, open(target, "wb") as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+            return True
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+            return False
+
+
+def _copy_file_range(source: str, target: str) -> bool:
+    """
+    Try to copy a file inside the kernel with `copy_file_range`, which lets
+    network filesystems copy server side and skips user space buffers.
+
+    Args:
+        source (str): file to copy
+        target (str): path of the copy
+
+    Returns:
+        bool: whether the file was copied
+    """
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is None:
+        return False
+
+    with open(source, "rb") as source_file, open(target, "wb") as target_file:
+        remaining = os.fstat(source_file.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied: int = copy_file_range(
+                    source_file.fileno(), target_file.fileno(), remaining
+                )
+                if copied == 0:
+                    break
+                remaining -= copied
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+            return False
+    return remaining == 0
+
+
+def copy_file(source: str, target: str) -> str:
+    """
+    Copy a file with the fastest method that works between the two paths, and
+    keep its modification time.
+
+    Args:
+        source (str): file to copy
+        target (str): path of the copy
+
+    Returns:
+        str: method the file was copied with ("reflink", "copy_file_range",
+             "copy")
+    """
+    if os.path.lexists(target):
+        os.unlink(target)
+
+    if _reflink(source, target):
+        method = "reflink"
+    elif _copy_file_range(source, target):
+        method = "copy_file_range"
+    else:
+        with open(source, "rb") as source_file, open(target, "wb") as target_file:
+            shutil.copyfileobj(source_file, target_file, COPY_CHUNK_SIZE)
+        method = "copy"
+
+    stat = os.stat(source)
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return method
+
+
+def folder_state(path: str) -> FolderState:
+    """
+    Get the size and modification time of every file in a folder tree.
+
+    Args:
+        path (str): folder
+
+    Returns:
+        FolderState: size and modification time of each file, by relative path
+    """
+    state: FolderState = {}
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            file_path = os.path.join(dir_path, file_name)
+            stat = os.stat(file_path)
+            state[os.path.relpath(file_path, path)] = (stat.st_size, stat.st_mtime_ns)
+    return state
+
+
+def copy_files(
+    source_dir: str, target_dir: str, relative_paths: List[str], workers: int
+) -> int:
+    """
+    Copy files between folder trees in parallel, so latency to a network mount
+    is paid for several files at once.
+
+    Args:
+        source_dir (str): folder to copy from
+        target_dir (str): folder to copy to
+        relative_paths (List[str]): paths of files to copy, relative to both
+        workers (int): number of files to copy at once
+
+    Returns:
+        int: bytes copied
+    """
+
+    def copy(relative_path: str) -> int:
+        """
+        Copy a single file, creating the folders it is nested in.
+
+        Args:
+            relative_path (str): path of the file, relative to both folders
+
+        Returns:
+            int: bytes copied
+        """
+        source = os.path.join(source_dir, relative_path)
+        target = os.path.join(target_dir, relative_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        copy_file(source, target)
+        return os.path.getsize(target)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return sum(pool.map(copy, relative_paths))
+
+
+def stage_folder(path: str, scratch_dir: str, workers: int) -> Tuple[str, FolderState]:
+    """
+    Copy a folder into a new folder in a local scratch directory, so processing
+    doesn't pay for round-trips to the slow or network mounted original.
+
+    Args:
+        path (str): folder to stage
+        scratch_dir (str): directory to create the staged folder in
+        workers (int): number of files to copy at once
+
+    Returns:
+        Tuple[str, FolderState]: path of the staged folder, and the state of its
+                                 files right after staging
+    """
+    os.makedirs(scratch_dir, exist_ok=True)
+    staged_path = tempfile.mkdtemp(prefix="apple_music_import_", dir=scratch_dir)
+    end_section = logger.log_section("staging folder", kind="stage")
+    try:
+        state = folder_state(path)
+        copied = copy_files(path, staged_path, list(state), workers)
+    except BaseException:
+        shutil.rmtree(staged_path, ignore_errors=True)
+        end_section(outcome="error")
+        raise
+    logger.info(f"staged {len(state)} files ({copied / 1e6:.1f} MB) to {staged_path}")
+    end_section(bytes_processed=copied * 2, bytes_written=copied)
+    return staged_path, folder_state(staged_path)
+
+
+def write_back(
+    staged_path: str, path: str, staged_state: FolderState, workers: int
+) -> int:
+    """
+    Copy files that processing created or changed in a staged folder back to
+    the original folder.
+
+    Args:
+        staged_path (str): staged folder
+        path (str): original folder
+        staged_state (FolderState): state of the staged folder after staging
+        workers (int): number of files to copy at once
+
+    Returns:
+        int: number of files written back
+    """
+    changed = [
+        relative_path
+        for relative_path, identity in folder_state(staged_path).items()
+        if staged_state.get(relative_path) != identity
+    ]
+    if changed:
+        copy_files(staged_path, path, changed, workers)
+    return len(changed)
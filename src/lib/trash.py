@@ -0,0 +1,147 @@
+import os
+import sys
+from datetime import datetime
+from typing import List, Optional
+from urllib.parse import quote
+
+from send2trash import send2trash
+
+
+def _mount_point(path: str) -> str:
+    """
+    Find the mount point of the filesystem a path is on.
+
+    Args:
+        path (str): path to look up
+
+    Returns:
+        str: mount point
+    """
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def _trash_dirs(path: str) -> List[str]:
+    """
+    List the trash folders a path could be moved to, in the order the platform
+    prefers them: the user's own trash, then the trash of the path's volume.
+
+    Args:
+        path (str): path to trash
+
+    Returns:
+        List[str]: trash folders to move files into
+    """
+    mount_point = _mount_point(os.path.dirname(os.path.abspath(path)))
+    uid = str(os.getuid()) if hasattr(os, "getuid") else "0"
+    if sys.platform == "darwin":
+        return [
+            os.path.expanduser("~/.Trash"),
+            os.path.join(mount_point, ".Trashes", uid),
+        ]
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return [
+        os.path.join(data_home, "Trash", "files"),
+        os.path.join(mount_point, f".Trash-{uid}", "files"),
+    ]
+
+
+def trash_dir(path: str) -> Optional[str]:
+    """
+    Find a trash folder on the same filesystem as a path, which it can be moved
+    to by renaming it rather than copying it.
+
+    Args:
+        path (str): path to trash
+
+    Returns:
+        Optional[str]: trash folder, if one is on the same filesystem and can be
+                       written to
+    """
+    device = os.lstat(path).st_dev
+    for directory in _trash_dirs(path):
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            if os.stat(directory).st_dev == device and os.access(directory, os.W_OK):
+                return directory
+        except OSError:
+            continue
+    return None
+
+
+def _reserve_name(directory: str, path: str) -> str:
+    """
+    Pick a name in a trash folder that no earlier trashed file has, and on
+    freedesktop systems write the info file that lets the file be restored.
+
+    Args:
+        directory (str): trash folder to move the path into
+        path (str): path to trash
+
+    Returns:
+        str: path to move the trashed path to
+    """
+    name = os.path.basename(os.path.normpath(path))
+    base_name, extension = os.path.splitext(name)
+    info_dir = (
+        os.path.join(os.path.dirname(directory), "info")
+        if os.path.basename(directory) == "files"
+        else None
+    )
+    if info_dir is not None:
+        os.makedirs(info_dir, mode=0o700, exist_ok=True)
+
+    counter = 0
+    while True:
+        candidate = name if counter == 0 else f"{base_name} {counter}{extension}"
+        counter += 1
+        if os.path.lexists(os.path.join(directory, candidate)):
+            continue
+        if info_dir is None:
+            return os.path.join(directory, candidate)
+        try:
+            # creating the info file exclusively claims the name
+            fd = os.open(
+                os.path.join(info_dir, f"{candidate}.trashinfo"),
+                os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                0o600,
+            )
+        except FileExistsError:
+            continue
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(
+                "[Trash Info]\n"
+                + f"Path={quote(os.path.abspath(path))}\n"
+                + f"DeletionDate={datetime.now().strftime('%Y-%m-%dT%H:%M:%S')}\n"
+            )
+        return os.path.join(directory, candidate)
+
+
+def move_to_trash(path: str) -> None:
+    """
+    Move a file or folder to the trash. Where a trash folder is on the same
+    filesystem it is renamed into it, which takes the same time however much it
+    holds; anything else is handed to `send2trash`.
+
+    Args:
+        path (str): path to trash
+    """
+    directory = trash_dir(path)
+    if directory is None:
+        send2trash(path)
+        return
+
+    destination = _reserve_name(directory, path)
+    try:
+        os.rename(path, destination)
+    except OSError:
+        info_path = os.path.join(
+            os.path.dirname(directory),
+            "info",
+            f"{os.path.basename(destination)}.trashinfo",
+        )
+        if os.path.exists(info_path):
+            os.unlink(info_path)
+        send2trash(path)
@@ -0,0 +1,287 @@
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import IO, Callable, List, Optional, TypedDict
+
+from src.lib.governor import governor
+
+# bytes of decoded audio compared at a time from each side, which bounds the
+# memory verification uses
+VERIFY_CHUNK_SIZE = 1024 * 1024
+
+# bytes of each decoded sample. Audio is compared as 24-bit PCM, the most ALAC
+# keeps, so sources with more bits compare as their converted files hold them
+SAMPLE_BYTES = 3
+
+# codecs that decode to exactly the samples the source holds. The outputs of
+# any other codec are only checked to hold as many samples as their source
+LOSSLESS_CODECS = {"alac", "ape", "flac", "pcm", "tta", "wavpack"}
+
+# samples per channel a lossy output may hold more or fewer of than its source:
+# AAC's encoder delay and the padding of its last 1024-sample frame, which
+# decoders don't always trim
+LOSSY_SAMPLE_TOLERANCE = 2048
+
+
+class Verification(TypedDict):
+    """Source audio and the converted files that must decode to the same audio."""
+
+    """Path of the source, or "pipe:0" to read it from `open_source`"""
+    source: str
+
+    """Opens the stream to decode the source from, if it isn't a path"""
+    open_source: Optional[Callable[[], IO[bytes]]]
+
+    """Converted files that together hold the source's audio, in order"""
+    outputs: List[str]
+
+    """Whether the decoded samples must match exactly, not only their count"""
+    exact: bool
+
+    """Filter the source is decoded through to match resampled outputs, if any"""
+    source_filter: Optional[str]
+
+    """Samples, across all channels, the outputs may have more or fewer of"""
+    tolerance: int
+
+
+def decode_command(path: str, audio_filter: Optional[str] = None) -> List[str]:
+    """
+    Build the ffmpeg command that decodes the first audio stream of a file to
+    raw 24-bit PCM on stdout, at the priority set by the resource governor.
+
+    Args:
+        path (str): file to decode, or "pipe:0"
+        audio_filter (Optional[str]): filter to decode through. Defaults to
+                                      None.
+
+    Returns:
+        List[str]: ffmpeg command arguments
+    """
+    return governor.command(
+        [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-i",
+            path,
+            "-map",
+            "0:a:0",
+            *(["-af", audio_filter] if audio_filter else []),
+            "-c:a",
+            "pcm_s24le",
+            "-f",
+            "s24le",
+            "pipe:1",
+        ]
+    )
+
+
+class DecodedAudio(object):
+    """
+    Read the PCM of one or more files, decoded one after another as if they
+    were a single stream. Only one decoder runs at a time, and only what is
+    read is held in memory.
+
+    Args:
+        paths (List[str]): files to decode, in order
+        open_source (Optional[Callable[[], IO[bytes]]]): opens the stream to
+            feed to a decoder of "pipe:0". Defaults to None.
+        audio_filter (Optional[str]): filter to decode through. Defaults to
+                                      None.
+    """
+
+    def __init__(
+        self,
+        paths: List[str],
+        open_source: Optional[Callable[[], IO[bytes]]] = None,
+        audio_filter: Optional[str] = None,
+    ) -> None:
+        self.paths = list(paths)
+        self.open_source = open_source
+        self.audio_filter = audio_filter
+        self.process: Optional["subprocess.Popen[bytes]"] = None
+        self.source: Optional[IO[bytes]] = None
+        self.feeder: Optional[threading.Thread] = None
+        self.stderr: Optional[IO[bytes]] = None
+
+    def _start(self, path: str) -> None:
+        """
+        Start decoding a file.
+
+        Args:
+            path (str): file to decode, or "pipe:0"
+        """
+        self.stderr = tempfile.TemporaryFile()
+        piped = path == "pipe:0" and self.open_source is not None
+        self.process = subprocess.Popen(
+            decode_command(path, self.audio_filter),
+            stdin=subprocess.PIPE if piped else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=self.stderr,
+        )
+        if piped:
+            assert self.open_source is not None and self.process.stdin is not None
+            self.source = self.open_source()
+            self.feeder = threading.Thread(
+                target=self._feed, args=(self.source, self.process.stdin)
+            )
+            self.feeder.start()
+
+    def _feed(self, source: IO[bytes], stdin: IO[bytes]) -> None:
+        """
+        Copy the source to the decoder, alongside reading its output.
+
+        Args:
+            source (IO[bytes]): stream to copy
+            stdin (IO[bytes]): stdin of the decoder
+        """
+        try:
+            shutil.copyfileobj(source, stdin, VERIFY_CHUNK_SIZE)
+        except (BrokenPipeError, ValueError):
+            # the decoder stopped reading, and will report why
+            pass
+        finally:
+            try:
+                stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def _finish(self) -> None:
+        """
+        Wait for the running decoder to exit.
+
+        Raises:
+            RuntimeError: if the decoder failed
+        """
+        assert self.process is not None and self.stderr is not None
+        process, stderr = self.process, self.stderr
+        self.process = None
+        try:
+            if process.stdout is not None:
+                process.stdout.close()
+            self._stop_feeding()
+            if process.wait() != 0:
+                stderr.seek(0)
+                message = stderr.read().decode("utf-8", errors="replace").strip()
+                raise RuntimeError(message or "ffmpeg failed to decode")
+        finally:
+            stderr.close()
+            self.stderr = None
+
+    def _stop_feeding(self) -> None:
+        """Wait for the source to be fed to the decoder, and close it."""
+        if self.feeder is not None:
+            self.feeder.join()
+            self.feeder = None
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+
+    def read(self, size: int) -> bytes:
+        """
+        Read decoded PCM, moving on to the next file when one ends.
+
+        Args:
+            size (int): bytes to read
+
+        Returns:
+            bytes: `size` bytes of PCM, or fewer once every file is decoded
+        """
+        chunks: List[bytes] = []
+        remaining = size
+        while remaining > 0:
+            if self.process is None:
+                if not self.paths:
+                    break
+                self._start(self.paths.pop(0))
+            assert self.process is not None and self.process.stdout is not None
+            chunk = self.process.stdout.read(remaining)
+            if not chunk:
+                self._finish()
+                continue
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        """Stop decoding, without waiting for the rest of the audio."""
+        self.paths = []
+        if self.process is None:
+            return
+        self.process.kill()
+        try:
+            self._finish()
+        except RuntimeError:
+            pass
+
+
+def _count_remaining(audio: DecodedAudio) -> int:
+    """
+    Decode the rest of some audio, counting its bytes.
+
+    Args:
+        audio (DecodedAudio): audio to decode
+
+    Returns:
+        int: bytes decoded
+    """
+    count = 0
+    while True:
+        chunk = audio.read(VERIFY_CHUNK_SIZE)
+        if not chunk:
+            return count
+        count += len(chunk)
+
+
+def verify_conversion(verification: Verification) -> None:
+    """
+    Decode a source and its converted files side by side, a chunk at a time,
+    and check they hold the same audio.
+
+    Args:
+        verification (Verification): source and converted files to compare
+
+    Raises:
+        RuntimeError: if the converted files don't hold the source's audio, or
+                      either can't be decoded
+    """
+    source = DecodedAudio(
+        [verification["source"]],
+        verification["open_source"],
+        verification["source_filter"],
+    )
+    output = DecodedAudio(verification["outputs"])
+    offset = 0
+    try:
+        while True:
+            expected = source.read(VERIFY_CHUNK_SIZE)
+            actual = output.read(VERIFY_CHUNK_SIZE)
+            if len(expected) != len(actual):
+                source_size = offset + len(expected) + _count_remaining(source)
+                output_size = offset + len(actual) + _count_remaining(output)
+                difference = abs(source_size - output_size) // SAMPLE_BYTES
+                if not verification["exact"] and (
+                    difference <= verification["tolerance"]
+                ):
+                    return
+                raise RuntimeError(
+                    f"converted audio has {output_size // SAMPLE_BYTES} samples, "
+                    + f"its source has {source_size // SAMPLE_BYTES}"
+                )
+            if verification["exact"] and expected != actual:
+                index = next(
+                    i for i, (a, b) in enumerate(zip(expected, actual)) if a != b
+                )
+                raise RuntimeError(
+                    "converted audio differs from its source from sample "
+                    + f"{(offset + index) // SAMPLE_BYTES}"
+                )
+            if not expected:
+                return
+            offset += len(expected)
+    finally:
+        source.close()
+        output.close()
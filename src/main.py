@@ -1,49 +1,392 @@
+import argparse
 import glob
 import json
 import os
-import subprocess
+import sys
+import time
 from itertools import chain
-from typing import List
+from typing import TYPE_CHECKING, Dict, List, Optional, Type
 
-from src.config import DELETE_FOLDER_AFTER_IMPORT, FOLDER_TYPE_GLOB_MAPPINGS
+from src.config import (
+    AUTOTUNE_PATH,
+    DELETE_FOLDER_AFTER_IMPORT,
+    DELETION_BATCH_SIZE,
+    ENCODER_IO_PRIORITY,
+    ENCODER_NICE,
+    FOLDER_TYPE_GLOB_MAPPINGS,
+    FOLDER_TYPE_OUTPUT_PROFILES,
+    FOLDER_TYPE_PRIORITIES,
+    JOB_LEASE_SECONDS,
+    JOB_QUEUE_PATH,
+    JOURNAL_PATH,
+    JSON_LOG_PATH,
+    LOUDNESS_ANALYSIS,
+    MAX_CONCURRENT_ENCODERS,
+    METRICS_PORT,
+    METRICS_TEXTFILE_PATH,
+    MIN_FREE_SPACE,
+    PROFILE_DIR,
+    PROGRESS_DISPLAY,
+    PROGRESS_INTERVAL,
+    SCHEDULE_POLICY,
+    SCRATCH_DIR,
+    STAGING_COPY_WORKERS,
+    STREAM_BUFFER_SIZE,
+    STREAM_TRACKS,
+    THROUGHPUT_HISTORY_PATH,
+    VERIFY_CONVERSIONS,
+)
 from src.lib.abstract_album_folder import AbstractAlbumFolder
+from src.lib.autotuner import autotuner
+from src.lib.deletion import DeletionBatch
+from src.lib.file_convertor import run_worker
+from src.lib.governor import governor
 from src.lib.helpers import ClassKeyJSONEncoder
+from src.lib.job_queue import JobQueue
 from src.lib.logger import logger
+from src.lib.loudness import is_available as loudness_available
+from src.lib.output_profile import OutputProfile
+from src.lib.planner import ThroughputHistory, log_plan, plan_folder
+from src.lib.progress import ProgressTracker
+from src.lib.scheduler import schedule_folders
 
+if TYPE_CHECKING:
+    from src.lib.profiler import StageProfiler
 
-def main():
-    # get app version info
-    result = subprocess.run(["uv", "version"], capture_output=True)
+# name of the app's package, to read its version from
+PACKAGE_NAME = "apple-music-import"
 
-    logger.info(result.stdout.decode("utf-8").strip())
-    logger.info("-" * 30)
-    logger.info("run settings:")
-    logger.indent()
-    logger.info("FOLDER_TYPE_GLOB_MAPPINGS = ")
-    logger.indent()
-    logger.info(f"{json.dumps(FOLDER_TYPE_GLOB_MAPPINGS, cls=ClassKeyJSONEncoder)}")
-    logger.dedent()
-    logger.info(f"DELETE_FOLDER_AFTER_IMPORT = {DELETE_FOLDER_AFTER_IMPORT}")
-    logger.dedent()
-    logger.info("-" * 30)
+# project file to read the app's version from when it isn't installed
+PYPROJECT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pyproject.toml"
+)
 
-    # get a list of all folders discovered using `FOLDER_TYPE_GLOB_MAPPINGS`
+
+def app_version() -> str:
+    """
+    Get the version of the app from its package metadata if it is installed,
+    or else from the project file it is run from.
+
+    Returns:
+        str: app version, or "unknown" if neither has one
+    """
+    from importlib import metadata
+
+    try:
+        return metadata.version(PACKAGE_NAME)
+    except metadata.PackageNotFoundError:
+        pass
+
+    if sys.version_info >= (3, 11):
+        import tomllib
+    else:
+        import tomli as tomllib
+
+    try:
+        with open(PYPROJECT_PATH, "rb") as file:
+            return str(tomllib.load(file)["project"]["version"])
+    except (OSError, KeyError, tomllib.TOMLDecodeError):
+        return "unknown"
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse command line arguments.
+
+    Args:
+        argv (Optional[List[str]]): arguments to parse. Defaults to None, for
+                                    the arguments the app was run with.
+
+    Returns:
+        argparse.Namespace: parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="apple_music_import",
+        description="convert, tag cover images, and import music files into "
+        + "Apple Music",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="list what a run would do to each folder and estimate its cost, "
+        + "without changing any files",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="report how much work was saved by continuing an interrupted run",
+    )
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="convert files from the job queue at `JOB_QUEUE_PATH` for a "
+        + "coordinating run, instead of running",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile each processing stage with cProfile",
+    )
+    parser.add_argument(
+        "--profile-folder",
+        metavar="GLOB",
+        help="only profile album folders whose path matches GLOB, as a whole",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="also trace memory allocations of profiled stages with tracemalloc",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        metavar="DIR",
+        help="folder to write profiles to (defaults to a new folder in "
+        + "`PROFILE_DIR`)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Set up logging, metrics and profiling for a run, and run it.
+
+    Args:
+        argv (Optional[List[str]]): command line arguments. Defaults to None, for
+                                    the arguments the app was run with.
+    """
+    args = parse_args(argv)
+
+    if JSON_LOG_PATH:
+        logger.add_json_sink(os.path.expanduser(JSON_LOG_PATH))
+
+    if args.plan:
+        try:
+            plan()
+        finally:
+            logger.shutdown()
+        return
+
+    governor.configure(
+        MAX_CONCURRENT_ENCODERS, ENCODER_NICE, ENCODER_IO_PRIORITY, MIN_FREE_SPACE
+    )
+    if args.worker:
+        try:
+            work()
+        finally:
+            logger.shutdown()
+        return
+
+    from src.lib.metrics import MetricsExporter
+
+    autotuner.configure(
+        os.path.expanduser(AUTOTUNE_PATH) if AUTOTUNE_PATH else None,
+        MAX_CONCURRENT_ENCODERS,
+    )
+    metrics_exporter = MetricsExporter(
+        os.path.expanduser(METRICS_TEXTFILE_PATH) if METRICS_TEXTFILE_PATH else None,
+        METRICS_PORT,
+    )
+    metrics_exporter.start()
+
+    profiler: Optional["StageProfiler"] = None
+    if args.profile or args.profile_folder or args.trace_memory:
+        from src.lib.profiler import StageProfiler
+
+        run_dir = args.profile_dir or os.path.join(
+            os.path.expanduser(PROFILE_DIR), time.strftime("%Y%m%d-%H%M%S")
+        )
+        profiler = StageProfiler(run_dir, args.trace_memory, args.profile_folder)
+        profiler.start()
+
+    try:
+        run(args.resume)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        metrics_exporter.stop()
+        logger.shutdown()
+
+
+def discover_folders(
+    folder_type_glob_mappings: Dict[Type[AbstractAlbumFolder], List[str]],
+    output_profiles: Optional[Dict[Type[AbstractAlbumFolder], OutputProfile]] = None,
+) -> List[AbstractAlbumFolder]:
+    """
+    Find all album folders matched by the globs of each folder type. Matches
+    nested in another matched album, e.g. its disc sub folders, are left out.
+
+    Args:
+        folder_type_glob_mappings (Dict[Type[AbstractAlbumFolder], List[str]]):
+            album folder classes mapped to globs locating their folders
+        output_profiles (Optional[Dict[Type[AbstractAlbumFolder], OutputProfile]]):
+            output profile of each folder type. Types not listed keep the
+            default profile. Defaults to None.
+
+    Returns:
+        List[AbstractAlbumFolder]: album folder instances for all matches
+    """
     all_folders: List[AbstractAlbumFolder] = []
 
-    for folder_class, globs in FOLDER_TYPE_GLOB_MAPPINGS.items():
+    for folder_class, globs in folder_type_glob_mappings.items():
         # find all files that match globs
         all_path_matches = chain.from_iterable(
             glob.glob(os.path.expanduser(folder_glob)) for folder_glob in globs
         )
 
-        # filter out only the folder matches
+        # filter out only the matches that are albums of this folder type
         folder_path_matches = list(
-            set([item for item in all_path_matches if os.path.isdir(item)])
+            set([item for item in all_path_matches if folder_class.is_album_path(item)])
         )
 
         # instantiate folder processing classes for each discovered folder
         folders = [folder_class(folder_path) for folder_path in folder_path_matches]
+        if output_profiles and folder_class in output_profiles:
+            for folder in folders:
+                folder.output_profile = output_profiles[folder_class]
         all_folders.extend(folders)
+
+    # sub folders of an album, e.g. its discs, are processed with the album
+    album_paths = {os.path.normpath(folder.path) for folder in all_folders}
+    return [
+        folder
+        for folder in all_folders
+        if not any(parent in album_paths for parent in parent_paths(folder.path))
+    ]
+
+
+def parent_paths(path: str) -> List[str]:
+    """
+    Get every folder a path is nested in.
+
+    Args:
+        path (str): path to a file or folder
+
+    Returns:
+        List[str]: paths of its parent folders, innermost first
+    """
+    parents: List[str] = []
+    parent = os.path.dirname(os.path.normpath(path))
+    while parent and parent not in parents:
+        parents.append(parent)
+        parent = os.path.dirname(parent)
+    return parents
+
+
+def log_settings() -> None:
+    """Log the version and settings the app runs with."""
+    logger.info(f"{PACKAGE_NAME} {app_version()}")
+    logger.info("-" * 30)
+    logger.info("run settings:")
+    logger.indent()
+    logger.info("FOLDER_TYPE_GLOB_MAPPINGS = ")
+    logger.indent()
+    logger.info(f"{json.dumps(FOLDER_TYPE_GLOB_MAPPINGS, cls=ClassKeyJSONEncoder)}")
+    logger.dedent()
+    logger.info(
+        "FOLDER_TYPE_OUTPUT_PROFILES = "
+        + f"{json.dumps(FOLDER_TYPE_OUTPUT_PROFILES, cls=ClassKeyJSONEncoder)}"
+    )
+    logger.info(f"SCHEDULE_POLICY = {SCHEDULE_POLICY}")
+    logger.info(
+        "FOLDER_TYPE_PRIORITIES = "
+        + f"{json.dumps(FOLDER_TYPE_PRIORITIES, cls=ClassKeyJSONEncoder)}"
+    )
+    logger.info(f"DELETE_FOLDER_AFTER_IMPORT = {DELETE_FOLDER_AFTER_IMPORT}")
+    logger.info(f"DELETION_BATCH_SIZE = {DELETION_BATCH_SIZE}")
+    logger.info(f"STREAM_TRACKS = {STREAM_TRACKS}")
+    logger.info(f"STREAM_BUFFER_SIZE = {STREAM_BUFFER_SIZE}")
+    logger.info(f"MAX_CONCURRENT_ENCODERS = {MAX_CONCURRENT_ENCODERS}")
+    logger.info(f"AUTOTUNE_PATH = {AUTOTUNE_PATH}")
+    logger.info(f"LOUDNESS_ANALYSIS = {LOUDNESS_ANALYSIS}")
+    logger.info(f"VERIFY_CONVERSIONS = {VERIFY_CONVERSIONS}")
+    logger.info(f"ENCODER_NICE = {ENCODER_NICE}")
+    logger.info(f"ENCODER_IO_PRIORITY = {ENCODER_IO_PRIORITY}")
+    logger.info(f"MIN_FREE_SPACE = {MIN_FREE_SPACE}")
+    logger.info(f"SCRATCH_DIR = {SCRATCH_DIR}")
+    logger.info(f"STAGING_COPY_WORKERS = {STAGING_COPY_WORKERS}")
+    logger.info(f"JOB_QUEUE_PATH = {JOB_QUEUE_PATH}")
+    logger.info(f"JOB_LEASE_SECONDS = {JOB_LEASE_SECONDS}")
+    logger.info(f"PROGRESS_DISPLAY = {PROGRESS_DISPLAY}")
+    logger.info(f"PROGRESS_INTERVAL = {PROGRESS_INTERVAL}")
+    logger.info(f"JSON_LOG_PATH = {JSON_LOG_PATH}")
+    logger.info(f"METRICS_TEXTFILE_PATH = {METRICS_TEXTFILE_PATH}")
+    logger.info(f"METRICS_PORT = {METRICS_PORT}")
+    logger.info(f"JOURNAL_PATH = {JOURNAL_PATH}")
+    logger.info(f"THROUGHPUT_HISTORY_PATH = {THROUGHPUT_HISTORY_PATH}")
+    logger.dedent()
+    logger.info("-" * 30)
+
+
+def plan():
+    """
+    Discover album folders and log what processing each would do and its
+    estimated cost, without changing any files.
+    """
+    log_settings()
+    all_folders = discover_folders(
+        FOLDER_TYPE_GLOB_MAPPINGS, FOLDER_TYPE_OUTPUT_PROFILES
+    )
+    if len(all_folders) == 0:
+        logger.info("no folders discovered")
+        logger.info("-" * 30)
+        return
+
+    history = ThroughputHistory.load(os.path.expanduser(THROUGHPUT_HISTORY_PATH))
+    log_plan(
+        [
+            plan_folder(folder, history, DELETE_FOLDER_AFTER_IMPORT)
+            for folder in all_folders
+        ]
+    )
+
+
+def work():
+    """
+    Convert files from the job queue for coordinating runs, until interrupted.
+    """
+    log_settings()
+    if not JOB_QUEUE_PATH:
+        logger.error("`JOB_QUEUE_PATH` must be set to run as a worker")
+        return
+
+    queue = JobQueue(os.path.expanduser(JOB_QUEUE_PATH), JOB_LEASE_SECONDS)
+    try:
+        converted = run_worker(queue, verify=VERIFY_CONVERSIONS)
+    except KeyboardInterrupt:
+        logger.info("worker stopped")
+        return
+    finally:
+        queue.close()
+    logger.info(f"converted {converted} files")
+
+
+def run(resume: bool = False):
+    """
+    Discover album folders and process each of them, continuing any run that
+    was interrupted before.
+
+    Args:
+        resume (bool): whether to report the work saved by continuing an
+                       interrupted run. Defaults to False.
+    """
+    from src.lib.journal import RunJournal
+
+    log_settings()
+
+    journal = RunJournal(os.path.expanduser(JOURNAL_PATH)) if JOURNAL_PATH else None
+    if journal is not None:
+        replayed = journal.load()
+        if replayed:
+            logger.info(f"continuing interrupted run ({replayed} steps completed)")
+            logger.info("-" * 30)
+    elif resume:
+        logger.warning("`JOURNAL_PATH` is not set, so there is no run to resume")
+
+    # get a list of all folders discovered using `FOLDER_TYPE_GLOB_MAPPINGS`
+    all_folders = discover_folders(
+        FOLDER_TYPE_GLOB_MAPPINGS, FOLDER_TYPE_OUTPUT_PROFILES
+    )
+
     if len(all_folders) == 0:
         logger.info("no folders discovered")
         logger.info("-" * 30)
@@ -55,9 +398,62 @@ def main():
     logger.dedent()
     logger.info("-" * 30)
 
+    history = ThroughputHistory.load(os.path.expanduser(THROUGHPUT_HISTORY_PATH))
+    all_folders = schedule_folders(
+        all_folders, SCHEDULE_POLICY, history, FOLDER_TYPE_PRIORITIES
+    )
+    logger.info("-" * 30)
+
+    analyze_loudness = LOUDNESS_ANALYSIS and loudness_available()
+    if LOUDNESS_ANALYSIS and not analyze_loudness:
+        logger.warning("numpy is not installed, so loudness will not be analyzed")
+
     # process each folder
-    for folder in all_folders:
-        folder.process_files(DELETE_FOLDER_AFTER_IMPORT)
+    scratch_dir = os.path.expanduser(SCRATCH_DIR) if SCRATCH_DIR else None
+    job_queue = (
+        JobQueue(os.path.expanduser(JOB_QUEUE_PATH), JOB_LEASE_SECONDS)
+        if JOB_QUEUE_PATH
+        else None
+    )
+    deletions = DeletionBatch() if DELETION_BATCH_SIZE > 0 else None
+    progress = ProgressTracker(history, PROGRESS_INTERVAL) if PROGRESS_DISPLAY else None
+    if progress is not None:
+        progress.start(all_folders)
+    try:
+        for folder in all_folders:
+            folder.process_files(
+                DELETE_FOLDER_AFTER_IMPORT,
+                STREAM_TRACKS,
+                STREAM_BUFFER_SIZE,
+                journal,
+                scratch_dir,
+                STAGING_COPY_WORKERS,
+                job_queue,
+                analyze_loudness,
+                VERIFY_CONVERSIONS,
+                deletions,
+            )
+            if deletions is not None and len(deletions.pending) >= DELETION_BATCH_SIZE:
+                deletions.flush()
+    finally:
+        # folders already imported are deleted even if the run is interrupted
+        if deletions is not None:
+            deletions.flush()
+        if progress is not None:
+            progress.stop()
+    if job_queue is not None:
+        job_queue.close()
+
+    logger.info("-" * 30)
+    logger.log_timing_summary()
+
+    # keep the throughput of this run to estimate the cost of later runs
+    if journal is not None:
+        journal.close()
+        if resume:
+            journal.log_saved_work(history)
+    history.update(logger.timing)
+    history.save()
 
 
 if __name__ == "__main__":
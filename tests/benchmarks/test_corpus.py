@@ -0,0 +1,98 @@
+import os
+import wave
+from pathlib import Path
+from typing import Dict, Optional
+
+import pytest
+
+from benchmarks.corpus import CorpusSpec, folder_globs, generate_corpus
+from src.folder_classes.bandcamp_folder import BandCampAlbumFolder
+from src.folder_classes.soulseek_folder import SoulseekAlbumFolder
+from src.main import discover_folders
+
+WAV_SPEC: CorpusSpec = {
+    "seed": 7,
+    "folder_count": 2,
+    "layouts": ["bandcamp", "soulseek"],
+    "tracks_per_folder": 2,
+    "track_formats": ["wav"],
+    "track_seconds": 0.5,
+    "sample_rate": 8000,
+    "bit_depth": 24,
+    "channels": 1,
+    "cover_size": 16,
+    "loose_cover": True,
+    "embedded_cover": False,
+}
+
+
+def read_tree(root: Path) -> Dict[str, bytes]:
+    """Read every file under a folder.
+
+    Args:
+        root (Path): folder to read
+
+    Returns:
+        Dict[str, bytes]: relative paths mapped to file contents
+    """
+    return {
+        str(path.relative_to(root)): path.read_bytes()
+        for path in sorted(root.rglob("*"))
+        if path.is_file()
+    }
+
+
+def test_generate_corpus_layouts(tmp_path: Path):
+    paths = generate_corpus(str(tmp_path), WAV_SPEC)
+
+    assert [os.path.relpath(path, tmp_path) for path in paths] == [
+        os.path.join("bandcamp", "Artist 00", "Album 00"),
+        os.path.join("bandcamp", "Artist 01", "Album 01"),
+        os.path.join("soulseek", "complete", "user00", "Album 00"),
+        os.path.join("soulseek", "complete", "user01", "Album 01"),
+    ]
+    assert sorted(os.listdir(paths[0])) == [
+        "01 Track 1.wav",
+        "02 Track 2.wav",
+        "cover.jpg",
+    ]
+    with wave.open(os.path.join(paths[0], "01 Track 1.wav")) as file:
+        assert file.getframerate() == 8000
+        assert file.getsampwidth() == 3
+        assert file.getnframes() == 4000
+
+    # the corpus is found by the app's folder discovery
+    globs = folder_globs(str(tmp_path))
+    folders = discover_folders(
+        {
+            BandCampAlbumFolder: globs["bandcamp"],
+            SoulseekAlbumFolder: globs["soulseek"],
+        }
+    )
+    assert sorted(folder.path for folder in folders) == sorted(paths)
+
+
+def test_generate_corpus_is_deterministic(tmp_path: Path):
+    generate_corpus(str(tmp_path / "a"), WAV_SPEC)
+    generate_corpus(str(tmp_path / "b"), WAV_SPEC)
+    generate_corpus(str(tmp_path / "c"), {**WAV_SPEC, "seed": 8})
+
+    assert read_tree(tmp_path / "a") == read_tree(tmp_path / "b")
+    assert read_tree(tmp_path / "a") != read_tree(tmp_path / "c")
+
+
+def test_generate_corpus_needs_ffmpeg(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    def which(name: str) -> Optional[str]:
+        """Find no commands.
+
+        Args:
+            name (str): command name
+
+        Returns:
+            Optional[str]: None
+        """
+        return None
+
+    monkeypatch.setattr("shutil.which", which)
+    with pytest.raises(RuntimeError):
+        generate_corpus(str(tmp_path), {**WAV_SPEC, "track_formats": ["flac"]})
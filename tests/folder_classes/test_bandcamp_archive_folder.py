@@ -0,0 +1,118 @@
+import os
+import zipfile
+from pathlib import Path
+from typing import List
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.folder_classes.bandcamp_archive_folder import BandCampArchiveAlbumFolder
+from src.lib.archive_file_convertor import ArchiveFileConvertor
+from src.lib.file_convertor import FileConversion, FileConvertor
+
+
+@pytest.fixture
+def archive_path(tmp_path: Path) -> Path:
+    archive_path = tmp_path / "album.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("01 One.flac", b"fLaC" + b"\x00" * 60)
+        archive.writestr("02 Two.m4a", b"hello")
+        archive.writestr("cover.jpg", b"\xff\xd8\xff\xe0")
+    return archive_path
+
+
+def test_folder_type_property(archive_path: Path) -> None:
+    folder = BandCampArchiveAlbumFolder(str(archive_path))
+    assert folder.folder_type == "bandcamp archive"
+
+
+def test_is_album_path(archive_path: Path, tmp_path: Path) -> None:
+    (tmp_path / "not_a_zip.zip").write_text("hello")
+
+    assert BandCampArchiveAlbumFolder.is_album_path(str(archive_path)) is True
+    assert BandCampArchiveAlbumFolder.is_album_path(str(tmp_path)) is False
+    assert (
+        BandCampArchiveAlbumFolder.is_album_path(str(tmp_path / "not_a_zip.zip"))
+        is False
+    )
+
+
+def test_process_files_from_archive(archive_path: Path) -> None:
+    folder = BandCampArchiveAlbumFolder(str(archive_path))
+    imported: List[str] = []
+    working_files: List[str] = []
+    working_paths: List[str] = []
+
+    def convert_file(self: FileConvertor, file: FileConversion) -> None:
+        Path(file["path"], file["new_name"]).write_bytes(b"converted")
+        file["state"]["status"] = "success"
+
+    def import_file(path: str) -> None:
+        imported.append(os.path.basename(path))
+        working_paths.append(os.path.dirname(path))
+        working_files[:] = sorted(os.listdir(os.path.dirname(path)))
+
+    with (
+        patch(
+            "src.lib.archive_file_convertor.ArchiveFileConvertor._convert_file",
+            convert_file,
+        ),
+        patch(
+            "src.lib.abstract_album_folder.import_file_to_apple_music",
+            side_effect=import_file,
+        ),
+        patch("mutagen.mp4.MP4"),
+        patch("src.folder_classes.bandcamp_archive_folder.move_to_trash") as mock_trash,
+    ):
+        folder.process_files(True)
+
+    # the cover and compatible track are extracted, the other track converted
+    assert sorted(imported) == ["01 One.m4a", "02 Two.m4a"]
+    assert working_files == ["01 One.m4a", "02 Two.m4a", "cover.jpg"]
+    assert folder.cover_image is not None
+    assert folder.cover_image.mime_type == "image/jpeg"
+
+    # the working folder is cleaned up and no longer used, and the archive deleted
+    assert not os.path.exists(working_paths[0])
+    assert folder.working_path == folder.path
+    assert folder.snapshot.path == folder.path
+    mock_trash.assert_called_once_with(str(archive_path))
+
+
+@patch("src.folder_classes.bandcamp_archive_folder.logger")
+@patch("src.folder_classes.bandcamp_archive_folder.move_to_trash")
+def test_delete_folder(
+    mock_trash: MagicMock, mock_logger: MagicMock, archive_path: Path
+) -> None:
+    folder = BandCampArchiveAlbumFolder(str(archive_path))
+    folder.delete_folder()
+
+    mock_trash.assert_called_once_with(str(archive_path))
+    mock_logger.info.assert_called_once_with(f"archive was deleted ({archive_path})")
+
+
+def test_process_files_in_scratch_dir(archive_path: Path, tmp_path: Path) -> None:
+    folder = BandCampArchiveAlbumFolder(str(archive_path))
+    scratch_dir = tmp_path / "scratch"
+    archive_paths: List[str] = []
+
+    def convert_file(self: ArchiveFileConvertor, file: FileConversion) -> None:
+        archive_paths.append(self.archive_path)
+        Path(file["path"], file["new_name"]).write_bytes(b"converted")
+        file["state"]["status"] = "success"
+
+    with (
+        patch(
+            "src.lib.archive_file_convertor.ArchiveFileConvertor._convert_file",
+            convert_file,
+        ),
+        patch("src.lib.abstract_album_folder.import_file_to_apple_music"),
+        patch("mutagen.mp4.MP4"),
+        patch("src.folder_classes.bandcamp_archive_folder.move_to_trash"),
+    ):
+        folder.process_files(True, scratch_dir=str(scratch_dir))
+
+    # tracks are converted from a copy of the archive in the scratch directory
+    assert os.path.dirname(os.path.dirname(archive_paths[0])) == str(scratch_dir)
+    assert os.listdir(scratch_dir) == []
+    assert folder.archive_path == str(archive_path)
@@ -0,0 +1,605 @@
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Generator, List, Optional
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.lib.abstract_album_folder import AbstractAlbumFolder
+from src.lib.cover_image import CoverImage
+from src.lib.deletion import DeletionBatch
+from src.lib.file_convertor import FileConversion
+from src.lib.governor import governor
+from src.lib.journal import RunJournal
+from src.lib.logger import logger
+from src.lib.loudness import ALBUM_GAIN_TAG, ITUNNORM_TAG
+
+
+class ConcreteAlbumFolder(AbstractAlbumFolder):
+    def __init__(self, path: str) -> None:
+        super().__init__(path, "cover.jpg")
+        self.deleted = False
+
+    @property
+    def folder_type(self) -> str:
+        return "test"
+
+    def delete_folder(self) -> None:
+        self.deleted = True
+
+
+def generate_file_conversions(
+    album_dir: Path, names: List[str], fail: List[str] = []
+) -> List[FileConversion]:
+    return [
+        {
+            "old_mime_type": "audio/flac",
+            "new_mime_type": "audio/ipod",
+            "old_name": f"{name}.flac",
+            "new_name": f"{name}.m4a",
+            "path": str(album_dir),
+            "state": {
+                "status": "error" if name in fail else "success",
+                "error_message": "failed" if name in fail else None,
+            },
+        }
+        for name in names
+    ]
+
+
+@pytest.fixture()
+def album_dir(tmp_path: Path) -> Path:
+    album_dir = tmp_path / "album"
+    album_dir.mkdir()
+    (album_dir / "cover.jpg").write_text("image")
+    (album_dir / "existing.m4a").write_text("audio")
+    return album_dir
+
+
+def run_process_files(
+    album_dir: Path,
+    conversions: List[FileConversion],
+    events: List[str],
+    stream_tracks: bool,
+) -> ConcreteAlbumFolder:
+    folder = ConcreteAlbumFolder(str(album_dir))
+
+    def convert_all(skip: object = None) -> Generator[FileConversion, None, None]:
+        for file in conversions:
+            events.append(f"convert {file['new_name']}")
+            yield file
+
+    def tag(path: str, tags: object = None, disc: object = None) -> None:
+        events.append(f"tag {Path(path).name}")
+
+    def import_file(path: str) -> None:
+        events.append(f"import {Path(path).name}")
+
+    with (
+        patch("src.lib.abstract_album_folder.FileConvertor") as mock_convertor,
+        patch(
+            "src.lib.abstract_album_folder.find_files_by_mime_type",
+            side_effect=lambda *_: [  # type: ignore[reportUnknownLambdaType]
+                str(album_dir / "existing.m4a"),
+                *(
+                    [
+                        str(album_dir / file["new_name"])
+                        for file in conversions
+                        if file["state"]["status"] == "success"
+                    ]
+                    if not stream_tracks
+                    else []
+                ),
+            ],
+        ),
+        patch(
+            "src.lib.abstract_album_folder.import_file_to_apple_music",
+            side_effect=import_file,
+        ),
+        patch.object(folder.cover_image, "tag_music_file", side_effect=tag),
+    ):
+        mock_convertor.return_value.convert_all.side_effect = convert_all
+        folder.process_files(True, stream_tracks, 1)
+
+    return folder
+
+
+def test_process_files_staged(album_dir: Path):
+    events: List[str] = []
+    conversions = generate_file_conversions(album_dir, ["a", "b"])
+    folder = run_process_files(album_dir, conversions, events, False)
+
+    # every file is converted before any file is tagged or imported
+    assert events == [
+        "convert a.m4a",
+        "convert b.m4a",
+        "tag existing.m4a",
+        "tag a.m4a",
+        "tag b.m4a",
+        "import existing.m4a",
+        "import a.m4a",
+        "import b.m4a",
+    ]
+    assert folder.deleted is True
+
+
+def test_process_files_streaming(album_dir: Path):
+    events: List[str] = []
+    conversions = generate_file_conversions(album_dir, ["a", "b", "c"])
+    folder = run_process_files(album_dir, conversions, events, True)
+
+    # compatible files are imported first, and each converted file is tagged
+    # and imported in conversion order
+    processed = [event for event in events if not event.startswith("convert")]
+    assert processed == [
+        "tag existing.m4a",
+        "import existing.m4a",
+        "tag a.m4a",
+        "import a.m4a",
+        "tag b.m4a",
+        "import b.m4a",
+        "tag c.m4a",
+        "import c.m4a",
+    ]
+
+    # each file is converted before it is tagged
+    for name in ["a.m4a", "b.m4a", "c.m4a"]:
+        assert events.index(f"convert {name}") < events.index(f"tag {name}")
+
+    assert folder.compatible_file_paths == [
+        str(album_dir / name) for name in ["existing.m4a", "a.m4a", "b.m4a", "c.m4a"]
+    ]
+    assert folder.deleted is True
+
+
+def test_process_files_streaming_conversion_error_blocks_delete(album_dir: Path):
+    events: List[str] = []
+    conversions = generate_file_conversions(album_dir, ["a", "b"], fail=["a"])
+    folder = run_process_files(album_dir, conversions, events, True)
+
+    # the failed file is never tagged or imported, but the rest are
+    assert "tag a.m4a" not in events
+    assert "import b.m4a" in events
+    assert folder.has_errors is True
+    assert folder.deleted is False
+
+
+def test_process_files_streaming_import_error_blocks_delete(album_dir: Path):
+    folder = ConcreteAlbumFolder(str(album_dir))
+
+    with (
+        patch("src.lib.abstract_album_folder.FileConvertor") as mock_convertor,
+        patch(
+            "src.lib.abstract_album_folder.find_files_by_mime_type",
+            return_value=[str(album_dir / "existing.m4a")],
+        ),
+        patch(
+            "src.lib.abstract_album_folder.import_file_to_apple_music",
+            side_effect=Exception("import failed"),
+        ),
+        patch.object(folder.cover_image, "tag_music_file") as mock_tag,
+    ):
+        mock_convertor.return_value.convert_all.return_value = iter([])
+        folder.process_files(True, True)
+
+    mock_tag.assert_called_once_with(str(album_dir / "existing.m4a"), None, None)
+    assert folder.has_errors is True
+    assert folder.deleted is False
+
+
+@pytest.mark.parametrize("stream_tracks", [False, True])
+def test_process_files_skips_import_of_untagged_file(
+    album_dir: Path, stream_tracks: bool
+):
+    events: List[str] = []
+    conversions = generate_file_conversions(album_dir, ["a", "b"])
+
+    with patch.object(
+        governor,
+        "has_space",
+        side_effect=lambda path, size: not path.endswith("a.m4a"),  # type: ignore[reportUnknownLambdaType]
+    ):
+        folder = run_process_files(album_dir, conversions, events, stream_tracks)
+
+    # the file without room to be tagged is never imported
+    assert "tag a.m4a" not in events
+    assert "import a.m4a" not in events
+    assert "import existing.m4a" in events and "import b.m4a" in events
+    assert folder.has_errors is True
+    assert folder.deleted is False
+
+
+def test_process_files_tags_discs_of_multi_disc_album(album_dir: Path):
+    for disc in ("CD1", "CD2"):
+        (album_dir / disc).mkdir()
+        (album_dir / disc / "01.m4a").write_text("audio")
+    folder = ConcreteAlbumFolder(str(album_dir))
+    discs: Dict[str, object] = {}
+
+    def tag(path: str, tags: object = None, disc: object = None) -> None:
+        discs[os.path.relpath(path, album_dir)] = disc
+
+    with (
+        patch("src.lib.abstract_album_folder.FileConvertor") as mock_convertor,
+        patch("src.lib.abstract_album_folder.import_file_to_apple_music"),
+        patch.object(folder.cover_image, "tag_music_file", side_effect=tag),
+    ):
+        mock_convertor.return_value.convert_all.return_value = iter([])
+        folder.process_files()
+
+    # every disc is imported as part of the one album
+    assert discs == {
+        "existing.m4a": None,
+        os.path.join("CD1", "01.m4a"): (1, 2),
+        os.path.join("CD2", "01.m4a"): (2, 2),
+    }
+
+
+def test_process_files_pauses_status_while_choosing_cover_image(album_dir: Path):
+    folder = ConcreteAlbumFolder(str(album_dir))
+    folder.cover_image = None
+    events: List[str] = []
+
+    @contextmanager
+    def status_paused() -> Generator[None, None, None]:
+        events.append("pause status")
+        yield
+        events.append("resume status")
+
+    def display(self: CoverImage) -> None:
+        events.append(f"display {Path(self.path).name}")
+
+    def pick(*_: object) -> str:
+        events.append("input")
+        return "1"
+
+    with (
+        patch("src.lib.abstract_album_folder.FileConvertor") as mock_convertor,
+        patch(
+            "src.lib.abstract_album_folder.find_files_by_mime_type",
+            return_value=[str(album_dir / "existing.m4a")],
+        ),
+        patch("src.lib.abstract_album_folder.CoverImagesInAlbumFiles"),
+        patch("src.lib.abstract_album_folder.import_file_to_apple_music"),
+        patch.object(CoverImage, "display", display),
+        patch.object(CoverImage, "tag_music_file"),
+        patch.object(logger, "status_paused", status_paused),
+        patch("builtins.input", side_effect=pick),
+    ):
+        mock_convertor.return_value.convert_all.return_value = iter([])
+        folder.process_files()
+
+    # previews are shown and the choice is read with the status hidden
+    assert events == [
+        "pause status",
+        "display cover.jpg",
+        "input",
+        "display cover.jpg",
+        "resume status",
+    ]
+
+
+def test_process_files_without_compatible_files(tmp_path: Path):
+    folder = ConcreteAlbumFolder(str(tmp_path))
+    mock_import = MagicMock()
+
+    with (
+        patch("src.lib.abstract_album_folder.FileConvertor") as mock_convertor,
+        patch("src.lib.abstract_album_folder.import_file_to_apple_music", mock_import),
+    ):
+        mock_convertor.return_value.convert_all.return_value = iter([])
+        folder.process_files(True)
+
+    mock_import.assert_not_called()
+    assert folder.deleted is False
+
+
+def test_process_files_resumes_from_journal(album_dir: Path):
+    (album_dir / "second.m4a").write_text("audio")
+    paths = [str(album_dir / "existing.m4a"), str(album_dir / "second.m4a")]
+    journal_path = str(album_dir.parent / "journal.jsonl")
+    events: List[str] = []
+
+    def run(fail_import: Optional[str] = None) -> ConcreteAlbumFolder:
+        folder = ConcreteAlbumFolder(str(album_dir))
+        journal = RunJournal(journal_path)
+        journal.load()
+
+        def tag(path: str, tags: object = None, disc: object = None) -> None:
+            events.append(f"tag {Path(path).name}")
+
+        def import_file(path: str) -> None:
+            if Path(path).name == fail_import:
+                raise KeyboardInterrupt()
+            events.append(f"import {Path(path).name}")
+
+        with (
+            patch("src.lib.abstract_album_folder.FileConvertor") as mock_convertor,
+            patch(
+                "src.lib.abstract_album_folder.find_files_by_mime_type",
+                return_value=paths,
+            ),
+            patch(
+                "src.lib.abstract_album_folder.import_file_to_apple_music",
+                side_effect=import_file,
+            ),
+            patch.object(folder.cover_image, "tag_music_file", side_effect=tag),
+        ):
+            mock_convertor.return_value.convert_all.return_value = iter([])
+            try:
+                folder.process_files(True, journal=journal)
+            finally:
+                journal.close()
+        return folder
+
+    # the first run dies while importing the second file
+    with pytest.raises(KeyboardInterrupt):
+        run(fail_import="second.m4a")
+    folder = run()
+
+    # no file is tagged or imported twice
+    assert events == [
+        "tag existing.m4a",
+        "tag second.m4a",
+        "import existing.m4a",
+        "import second.m4a",
+    ]
+    assert folder.deleted is True
+
+    # a folder processed without errors is forgotten
+    assert RunJournal(journal_path).load() == 0
+
+
+def test_process_files_resumes_converted_and_tagged_files(album_dir: Path):
+    (album_dir / "existing.m4a").unlink()
+    (album_dir / "a.flac").write_text("audio")
+    (album_dir / "b.flac").write_text("audio")
+    journal_path = str(album_dir.parent / "journal.jsonl")
+    events: List[str] = []
+
+    def encode(command: List[str], **kwargs: object) -> MagicMock:
+        Path(command[-1]).write_text("converted")
+        events.append(f"convert {Path(command[-1]).name}")
+        return MagicMock(returncode=0)
+
+    def run(fail_import: bool = False) -> ConcreteAlbumFolder:
+        folder = ConcreteAlbumFolder(str(album_dir))
+        journal = RunJournal(journal_path)
+        journal.load()
+
+        def tag(path: str, tags: object = None, disc: object = None) -> None:
+            # tagging rewrites the converted file
+            with open(path, "a") as file:
+                file.write(" tagged")
+            events.append(f"tag {Path(path).name}")
+
+        def import_file(path: str) -> None:
+            if fail_import and any(event.startswith("import") for event in events):
+                raise KeyboardInterrupt()
+            events.append(f"import {Path(path).name}")
+
+        with (
+            patch("src.lib.file_convertor.subprocess.run", side_effect=encode),
+            patch(
+                "src.lib.abstract_album_folder.import_file_to_apple_music",
+                side_effect=import_file,
+            ),
+            patch.object(folder.cover_image, "tag_music_file", side_effect=tag),
+        ):
+            try:
+                folder.process_files(True, journal=journal)
+            finally:
+                journal.close()
+        return folder
+
+    # the first run dies while importing the second file
+    with pytest.raises(KeyboardInterrupt):
+        run(fail_import=True)
+    (imported,) = [event for event in events if event.startswith("import")]
+    assert sorted(events) == [
+        "convert a.m4a",
+        "convert b.m4a",
+        imported,
+        "tag a.m4a",
+        "tag b.m4a",
+    ]
+    events.clear()
+    folder = run()
+
+    # converted and tagged files are neither converted nor tagged again
+    assert len(events) == 1 and events[0].startswith("import")
+    assert events[0] != imported
+    assert folder.deleted is True
+
+
+def test_process_files_skips_folder_without_free_space(album_dir: Path):
+    folder = ConcreteAlbumFolder(str(album_dir))
+    mock_import = MagicMock()
+
+    with (
+        patch.object(governor, "min_free_space", 1),
+        patch("src.lib.governor.shutil.disk_usage", return_value=MagicMock(free=0)),
+        patch("src.lib.abstract_album_folder.import_file_to_apple_music", mock_import),
+    ):
+        folder.process_files(True)
+
+    mock_import.assert_not_called()
+    assert folder.deleted is False
+
+
+def test_process_files_in_scratch_dir(album_dir: Path):
+    folder = ConcreteAlbumFolder(str(album_dir))
+    scratch_dir = album_dir.parent / "scratch"
+    imported: List[str] = []
+
+    def convert_all(skip: object = None) -> Generator[FileConversion, None, None]:
+        Path(folder.working_path, "converted.m4a").write_text("converted")
+        yield from []
+
+    def tag(path: str, tags: object = None, disc: object = None) -> None:
+        with open(path, "a") as file:
+            file.write(" tagged")
+
+    with (
+        patch("src.lib.abstract_album_folder.FileConvertor") as mock_convertor,
+        patch(
+            "src.lib.abstract_album_folder.find_files_by_mime_type",
+            side_effect=lambda path, *_: [  # type: ignore[reportUnknownLambdaType]
+                os.path.join(path, "existing.m4a"),  # type: ignore[reportUnknownArgumentType]
+                os.path.join(path, "converted.m4a"),  # type: ignore[reportUnknownArgumentType]
+            ],
+        ),
+        patch(
+            "src.lib.abstract_album_folder.import_file_to_apple_music",
+            side_effect=imported.append,
+        ),
+        patch.object(folder.cover_image, "tag_music_file", side_effect=tag),
+    ):
+        mock_convertor.return_value.convert_all.side_effect = convert_all
+        folder.process_files(False, scratch_dir=str(scratch_dir))
+
+    # tracks are processed and imported from the scratch copy
+    staged_paths = {os.path.dirname(path) for path in imported}
+    assert len(imported) == 2 and len(staged_paths) == 1
+    assert os.path.dirname(staged_paths.pop()) == str(scratch_dir)
+
+    # changed files are written back and the scratch copy removed
+    assert (album_dir / "existing.m4a").read_text() == "audio tagged"
+    assert (album_dir / "converted.m4a").read_text() == "converted tagged"
+    assert os.listdir(scratch_dir) == []
+    assert folder.working_path == str(album_dir)
+
+
+def test_process_files_analyzes_loudness(album_dir: Path):
+    folder = ConcreteAlbumFolder(str(album_dir))
+    conversions = generate_file_conversions(album_dir, ["a"])
+    converted_path = str(album_dir / "a.m4a")
+    existing_path = str(album_dir / "existing.m4a")
+    measured = {"blocks": [0.01] * 10, "peak": 0.5}
+    tags: Dict[str, Optional[Dict[str, bytes]]] = {}
+
+    def tag(
+        path: str, loudness: Optional[Dict[str, bytes]] = None, disc: object = None
+    ) -> None:
+        tags[Path(path).name] = loudness
+
+    with (
+        patch("src.lib.abstract_album_folder.FileConvertor") as mock_convertor,
+        patch(
+            "src.lib.abstract_album_folder.find_files_by_mime_type",
+            return_value=[existing_path, converted_path],
+        ),
+        patch("src.lib.abstract_album_folder.import_file_to_apple_music"),
+        patch(
+            "src.lib.abstract_album_folder.classify_media_file",
+            return_value={"channels": 2},
+        ),
+        patch(
+            "src.lib.abstract_album_folder.analyze_file", return_value=measured
+        ) as mock_analyze,
+        patch.object(folder.cover_image, "tag_music_file", side_effect=tag),
+    ):
+        mock_convertor.return_value.convert_all.return_value = iter(conversions)
+        # the converted file was measured in its conversion pass
+        mock_convertor.return_value.loudness = {converted_path: measured}
+        folder.process_files(analyze_loudness=True)
+
+    # only the file that wasn't converted is decoded again
+    mock_analyze.assert_called_once_with(existing_path, 2)
+    for name in ["existing.m4a", "a.m4a"]:
+        track_tags = tags[name]
+        assert track_tags is not None
+        assert ALBUM_GAIN_TAG in track_tags and ITUNNORM_TAG in track_tags
+
+
+def test_process_files_streaming_tags_album_gain_after_last_track(album_dir: Path):
+    folder = ConcreteAlbumFolder(str(album_dir))
+    conversions = generate_file_conversions(album_dir, ["a"])
+    converted_path = str(album_dir / "a.m4a")
+    existing_path = str(album_dir / "existing.m4a")
+    measured = {"blocks": [0.01] * 10, "peak": 0.5}
+    tags: Dict[str, Optional[Dict[str, bytes]]] = {}
+    events: List[str] = []
+
+    def tag(
+        path: str, loudness: Optional[Dict[str, bytes]] = None, disc: object = None
+    ) -> None:
+        tags[Path(path).name] = loudness
+
+    def write_loudness(path: str, loudness: Dict[str, bytes]) -> None:
+        events.append(f"album gain {Path(path).name}")
+
+    def import_file(path: str) -> None:
+        events.append(f"import {Path(path).name}")
+
+    with (
+        patch("src.lib.abstract_album_folder.FileConvertor") as mock_convertor,
+        patch(
+            "src.lib.abstract_album_folder.find_files_by_mime_type",
+            return_value=[existing_path],
+        ),
+        patch(
+            "src.lib.abstract_album_folder.import_file_to_apple_music",
+            side_effect=import_file,
+        ),
+        patch(
+            "src.lib.abstract_album_folder.classify_media_file",
+            return_value={"channels": 2},
+        ),
+        patch("src.lib.abstract_album_folder.analyze_file", return_value=measured),
+        patch(
+            "src.lib.abstract_album_folder.write_loudness_tags",
+            side_effect=write_loudness,
+        ) as mock_write_loudness,
+        patch.object(folder.cover_image, "tag_music_file", side_effect=tag),
+    ):
+        mock_convertor.return_value.convert_all.return_value = iter(conversions)
+        mock_convertor.return_value.loudness = {converted_path: measured}
+        folder.process_files(stream_tracks=True, analyze_loudness=True)
+
+    # each track is tagged with its own gain as it is streamed
+    for name in ["existing.m4a", "a.m4a"]:
+        track_tags = tags[name]
+        assert track_tags is not None
+        assert ITUNNORM_TAG in track_tags and ALBUM_GAIN_TAG not in track_tags
+
+    # and with album gain once the last track is done
+    written = {
+        call.args[0]: call.args[1] for call in mock_write_loudness.call_args_list
+    }
+    assert set(written) == {existing_path, converted_path}
+    assert all(ALBUM_GAIN_TAG in track_tags for track_tags in written.values())
+
+    # before any track is imported, as Apple Music copies them as they are
+    assert events == [
+        "album gain existing.m4a",
+        "album gain a.m4a",
+        "import existing.m4a",
+        "import a.m4a",
+    ]
+
+
+def test_process_files_queues_deletion_in_batch(album_dir: Path):
+    folder = ConcreteAlbumFolder(str(album_dir))
+    journal = RunJournal(str(album_dir.parent / "journal.jsonl"))
+    deletions = DeletionBatch()
+
+    with (
+        patch("src.lib.abstract_album_folder.FileConvertor") as mock_convertor,
+        patch(
+            "src.lib.abstract_album_folder.find_files_by_mime_type",
+            return_value=[str(album_dir / "existing.m4a")],
+        ),
+        patch("src.lib.abstract_album_folder.import_file_to_apple_music"),
+        patch.object(folder.cover_image, "tag_music_file"),
+    ):
+        mock_convertor.return_value.convert_all.return_value = iter([])
+        folder.process_files(True, journal=journal, deletions=deletions)
+
+    # the folder is left for the batch to delete, which forgets its steps
+    assert folder.deleted is False
+    assert deletions.pending == [
+        {"path": str(album_dir), "delete_empty_parent": False, "journal": journal}
+    ]
+    assert journal.skip(str(album_dir), "imported", "existing.m4a") is True
@@ -0,0 +1,145 @@
+import os
+import zipfile
+from pathlib import Path
+from typing import Any, List
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.lib.archive_file_convertor import ArchiveFileConvertor, member_paths
+
+FLAC_HEADER = b"fLaC" + b"\x00" * 60
+
+
+class FakeProcess(object):
+    """Stand in for an ffmpeg process that records what was piped into it."""
+
+    def __init__(self, command: List[str], returncode: int, **kwargs: Any) -> None:
+        self.command = command
+        self.returncode = returncode
+        self.stdin = MagicMock()
+        self.stderr = kwargs["stderr"]
+        self.piped = b""
+        self.stdin.write.side_effect = self.write
+
+    def write(self, data: bytes) -> int:
+        self.piped += data
+        return len(data)
+
+    def wait(self) -> int:
+        if self.returncode == 0:
+            Path(self.command[-1]).write_bytes(b"converted " + self.piped)
+        else:
+            self.stderr.write(b"invalid data found")
+        return self.returncode
+
+
+@pytest.fixture()
+def archive_path(tmp_path: Path) -> Path:
+    archive_path = tmp_path / "album.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("Band - Album/01 One.flac", FLAC_HEADER)
+        archive.writestr("Band - Album/02 Two.m4a", b"hello")
+        archive.writestr("Band - Album/cover.jpg", b"\xff\xd8\xff\xe0")
+        archive.writestr("Band - Album/notes.txt", b"notes")
+    return archive_path
+
+
+def test_archive_file_convertor_streams_members(archive_path: Path, tmp_path: Path):
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    processes: List[FakeProcess] = []
+
+    def popen(command: List[str], **kwargs: Any) -> FakeProcess:
+        processes.append(FakeProcess(command, 0, **kwargs))
+        return processes[-1]
+
+    file_convertor = ArchiveFileConvertor(str(archive_path), str(output_dir))
+    with patch("src.lib.archive_file_convertor.subprocess.Popen", side_effect=popen):
+        files = list(file_convertor.convert_all())
+
+    # only the incompatible member is converted, read from a pipe
+    assert [file["old_name"] for file in files] == ["01 One.flac"]
+    assert files[0]["state"]["status"] == "success"
+    assert "pipe:0" in processes[0].command
+    assert processes[0].piped == FLAC_HEADER
+    assert (output_dir / "01 One.m4a").read_bytes() == b"converted " + FLAC_HEADER
+
+    # nothing else was extracted
+    assert os.listdir(output_dir) == ["01 One.m4a"]
+
+
+def test_archive_file_convertor_conversion_error(archive_path: Path, tmp_path: Path):
+    file_convertor = ArchiveFileConvertor(str(archive_path), str(tmp_path))
+    with patch(
+        "src.lib.archive_file_convertor.subprocess.Popen",
+        side_effect=lambda command, **kwargs: FakeProcess(command, 1, **kwargs),  # type: ignore[reportUnknownLambdaType]
+    ):
+        files = list(file_convertor.convert_all())
+
+    assert files[0]["state"] == {
+        "status": "error",
+        "error_message": "invalid data found",
+    }
+
+
+def test_archive_file_convertor_verifies_against_member(
+    archive_path: Path, tmp_path: Path
+):
+    file_convertor = ArchiveFileConvertor(str(archive_path), str(tmp_path))
+    file_convertor.find_conversions()
+
+    verification = file_convertor.verification(file_convertor.incompatible_files)
+
+    # the member is decoded from the archive again, without extracting it
+    assert verification["source"] == "pipe:0"
+    assert verification["outputs"] == [str(tmp_path / "01 One.m4a")]
+    assert verification["exact"] is True
+    assert verification["open_source"] is not None
+    with verification["open_source"]() as member:
+        assert member.read() == FLAC_HEADER
+
+
+def test_member_paths(tmp_path: Path):
+    with zipfile.ZipFile(tmp_path / "discs.zip", "w") as archive:
+        archive.writestr("Album/CD1/01.flac", FLAC_HEADER)
+        archive.writestr("Album/CD2/01.flac", FLAC_HEADER)
+        archive.writestr("Album/cover.jpg", b"\xff\xd8\xff\xe0")
+        archive.writestr("Album/__MACOSX/._cover.jpg", b"")
+
+    with zipfile.ZipFile(tmp_path / "discs.zip") as archive:
+        # the folder holding everything is left out, disc folders are kept
+        assert member_paths(archive) == {
+            "Album/CD1/01.flac": os.path.join("CD1", "01.flac"),
+            "Album/CD2/01.flac": os.path.join("CD2", "01.flac"),
+            "Album/cover.jpg": "cover.jpg",
+        }
+
+    with zipfile.ZipFile(tmp_path / "unsafe.zip", "w") as archive:
+        archive.writestr("../01.flac", FLAC_HEADER)
+    with zipfile.ZipFile(tmp_path / "unsafe.zip") as archive:
+        with pytest.raises(ValueError):
+            member_paths(archive)
+
+
+def test_archive_file_convertor_keeps_disc_folders(tmp_path: Path):
+    archive_path = tmp_path / "discs.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("CD1/01.flac", FLAC_HEADER)
+        archive.writestr("CD2/01.flac", FLAC_HEADER + b"disc 2")
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+
+    def popen(command: List[str], **kwargs: Any) -> FakeProcess:
+        return FakeProcess(command, 0, **kwargs)
+
+    file_convertor = ArchiveFileConvertor(str(archive_path), str(output_dir))
+    with patch("src.lib.archive_file_convertor.subprocess.Popen", side_effect=popen):
+        files = list(file_convertor.convert_all())
+
+    # tracks with the same name on each disc don't overwrite each other
+    assert all(file["state"]["status"] == "success" for file in files)
+    assert (output_dir / "CD1" / "01.m4a").read_bytes() == b"converted " + FLAC_HEADER
+    assert (output_dir / "CD2" / "01.m4a").read_bytes() == (
+        b"converted " + FLAC_HEADER + b"disc 2"
+    )
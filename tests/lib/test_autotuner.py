@@ -0,0 +1,122 @@
+from pathlib import Path
+from typing import Generator
+from unittest.mock import mock_open, patch
+
+import pytest
+
+from src.lib.autotuner import Autotuner, TuningSession, is_network_path
+from src.lib.governor import governor
+
+
+@pytest.fixture(autouse=True)
+def restore_governor() -> Generator[None, None, None]:
+    limits = governor.max_encoders, governor.encoder_threads
+    yield
+    governor.set_encoder_limits(*limits)
+
+
+def throughput(encoders: int, threads: int) -> float:
+    # fastest with 3 encoders of 2 threads each
+    return 100.0 - 10 * (encoders - 3) ** 2 - 10 * (threads - 2) ** 2
+
+
+def test_session_hill_climbs_to_fastest_settings():
+    session = TuningSession("flac cd local", (1, 1), 8, 16)
+
+    for _ in range(50):
+        if session.converged:
+            break
+        session._step(throughput(*session.settings), 1.0)  # type: ignore[reportPrivateUsage]
+
+    assert session.converged
+    assert session.settings == (3, 2)
+    assert (governor.max_encoders, governor.encoder_threads) == (3, 2)
+    result = session.result()
+    assert result is not None
+    assert result["encoders"] == 3 and result["bytes_per_second"] == 100.0
+
+
+def test_session_keeps_within_limits():
+    session = TuningSession("flac cd local", (5, 5), 2, 4)
+    assert session.settings == (2, 2)
+
+    session._step(1.0, 1.0)  # type: ignore[reportPrivateUsage]
+    # more encoders or threads would exceed the limits, so fewer is tried
+    assert session.settings == (1, 2)
+
+
+def test_session_measures_windows():
+    session = TuningSession("flac cd local", (2, 1), 4, 4)
+    with patch("src.lib.autotuner.time.monotonic", side_effect=[1.0, 1.0]):
+        session._window_start = 0.0  # type: ignore[reportPrivateUsage]
+        for _ in range(3):
+            session.observe(1_000_000)
+
+    result = session.result()
+    assert result is not None
+    assert result["bytes_per_second"] == 3_000_000
+    assert result["tracks_per_second"] == 3
+
+
+def test_autotuner_persists_settings(tmp_path: Path):
+    path = str(tmp_path / "autotune.json")
+    tuner = Autotuner()
+    tuner.configure(path, 2)
+
+    session = tuner.start("pcm hi-res network")
+    assert session is not None
+    assert session.settings[0] == min(2, session.max_encoders)
+    session._step(5e6, 2.0)  # type: ignore[reportPrivateUsage]
+    tuner.finish(session)
+
+    reloaded = Autotuner()
+    reloaded.configure(path, 2)
+    assert reloaded.settings["pcm hi-res network"]["bytes_per_second"] == 5e6
+
+
+def test_autotuner_keeps_to_encoder_cap_and_restores_limits(tmp_path: Path):
+    governor.set_encoder_limits(2)
+    tuner = Autotuner()
+    tuner.configure(str(tmp_path / "autotune.json"), 2)
+    tuner.settings["flac cd local"] = {
+        "encoders": 16,
+        "encoder_threads": 1,
+        "bytes_per_second": 1.0,
+        "tracks_per_second": 1.0,
+    }
+
+    with (
+        patch("src.lib.autotuner.os.cpu_count", return_value=32),
+        patch("src.lib.autotuner.available_memory", return_value=None),
+    ):
+        session = tuner.start("flac cd local")
+    assert session is not None
+    assert session.max_encoders == 2
+    assert session.settings == (2, 1)
+
+    # the last settings tried don't outlive the session
+    session._apply((1, 4))  # type: ignore[reportPrivateUsage]
+    tuner.finish(session)
+    assert (governor.max_encoders, governor.encoder_threads) == (2, None)
+
+
+def test_autotuner_off_without_path():
+    tuner = Autotuner()
+    tuner.configure(None, 2)
+    assert tuner.start("flac cd local") is None
+
+
+def test_is_network_path():
+    mounts = (
+        "/dev/sda1 / ext4 rw 0 0\n"
+        + "server:/music /mnt/music nfs4 rw 0 0\n"
+        + "//nas/share /mnt/share\\040drive cifs rw 0 0\n"
+    )
+    with (
+        patch("builtins.open", mock_open(read_data=mounts)),
+        patch("src.lib.autotuner.os.path.realpath", side_effect=lambda path: path),  # type: ignore[reportUnknownLambdaType]
+    ):
+        assert is_network_path("/mnt/music/album") is True
+        assert is_network_path("/mnt/share drive/album") is True
+        assert is_network_path("/mnt/musical") is False
+        assert is_network_path("/home/music") is False
@@ -0,0 +1,135 @@
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.lib.cue_sheet import (
+    build_split_command,
+    is_splittable,
+    parse_cue_sheet,
+    track_file_name,
+    track_tags,
+)
+from src.lib.file_convertor import FileConvertor
+
+CUE_SHEET = """REM GENRE "Ambient"
+REM DATE 1994
+PERFORMER "The Band"
+TITLE "The Album"
+FILE "The Band - The Album.wav" WAVE
+  TRACK 01 AUDIO
+    TITLE "Intro: Part 1"
+    INDEX 01 00:00:00
+  TRACK 02 AUDIO
+    TITLE "Song"
+    PERFORMER "The Band feat. Guest"
+    INDEX 00 03:10:00
+    INDEX 01 03:12:37
+"""
+
+
+@pytest.fixture()
+def cue_album(tmp_path: Path) -> Path:
+    (tmp_path / "album.cue").write_text(CUE_SHEET, encoding="cp1252")
+    (tmp_path / "The Band - The Album.flac").write_text("hello")
+    (tmp_path / "bonus.mp3").write_text("hello")
+    return tmp_path
+
+
+def test_parse_cue_sheet(cue_album: Path):
+    sheet = parse_cue_sheet(str(cue_album / "album.cue"))
+
+    assert sheet["file"] == "The Band - The Album.wav"
+    assert sheet["file_count"] == 1
+    assert sheet["title"] == "The Album"
+    assert sheet["performer"] == "The Band"
+    assert sheet["date"] == "1994"
+    assert sheet["genre"] == "Ambient"
+    assert is_splittable(sheet)
+
+    first, second = sheet["tracks"]
+    assert first == {
+        "number": 1,
+        "title": "Intro: Part 1",
+        "performer": None,
+        "start": 0.0,
+    }
+    assert second["performer"] == "The Band feat. Guest"
+    assert second["start"] == pytest.approx(192 + 37 / 75)
+
+    assert track_file_name(first) == "01 Intro_ Part 1.m4a"
+    assert track_tags(sheet, second) == {
+        "title": "Song",
+        "artist": "The Band feat. Guest",
+        "album_artist": "The Band",
+        "album": "The Album",
+        "date": "1994",
+        "genre": "Ambient",
+        "track": "2/2",
+    }
+
+
+def test_build_split_command(cue_album: Path):
+    sheet = parse_cue_sheet(str(cue_album / "album.cue"))
+    command = build_split_command(sheet, "/album/image.flac", "/album")
+
+    # a single input is decoded once and segmented into one output per track
+    assert command.count("-i") == 1
+    filters = command[command.index("-filter_complex") + 1]
+    assert filters.startswith("[0:a]asegment=timestamps=192.493333[s0][s1];")
+    assert command.count("-map") == 2
+    assert command[-1] == "/album/02 Song.m4a"
+    assert "title=Intro: Part 1" in command
+
+    # a profile's resampling happens before the image is cut, in the same pass
+    command = build_split_command(
+        sheet,
+        "/album/image.flac",
+        "/album",
+        ["-c:a", "aac", "-b:a", "256k"],
+        "aresample=osr=48000",
+    )
+    filters = command[command.index("-filter_complex") + 1]
+    assert filters.startswith("[0:a]aresample=osr=48000,asegment=timestamps=")
+    assert command.count("aac") == 2
+
+
+def test_file_convertor_splits_cue_images(cue_album: Path):
+    file_convertor = FileConvertor(str(cue_album))
+
+    with (
+        patch(
+            "src.lib.file_convertor.subprocess.run",
+            return_value=MagicMock(returncode=0),
+        ) as mock_run,
+        patch.object(FileConvertor, "_convert_file") as mock_convert_file,
+    ):
+        files = list(file_convertor.convert_all())
+
+    # the image is split once, not converted whole
+    mock_run.assert_called_once()
+    assert mock_run.call_args[0][0][5] == str(cue_album / "The Band - The Album.flac")
+    assert [file["new_name"] for file in files] == [
+        "01 Intro_ Part 1.m4a",
+        "02 Song.m4a",
+        "bonus.m4a",
+    ]
+    assert all(file["state"]["status"] == "success" for file in files[:2])
+    assert mock_convert_file.call_count == 1
+
+
+def test_file_convertor_cue_split_failure(cue_album: Path):
+    file_convertor = FileConvertor(str(cue_album))
+
+    with (
+        patch(
+            "src.lib.file_convertor.subprocess.run",
+            return_value=MagicMock(returncode=1, stderr=b"line\nbad input\n"),
+        ),
+        patch.object(FileConvertor, "_convert_file"),
+    ):
+        files = list(file_convertor.convert_all())
+
+    assert [file["state"] for file in files[:2]] == [
+        {"status": "error", "error_message": "bad input"}
+    ] * 2
@@ -0,0 +1,82 @@
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+from src.lib.deletion import DeletionBatch
+from src.lib.journal import RunJournal
+
+
+def make_albums(parent: Path, names: List[str]) -> List[str]:
+    paths: List[str] = []
+    for name in names:
+        album = parent / name
+        album.mkdir(parents=True)
+        (album / "01 One.flac").write_text("audio")
+        paths.append(str(album))
+    return paths
+
+
+def test_flush_trashes_parent_left_empty(tmp_path: Path):
+    user_dir = tmp_path / "user"
+    albums = make_albums(user_dir, ["a", "b", "c"])
+    (user_dir / ".DS_Store").write_text("")
+    journal = RunJournal(str(tmp_path / "journal.jsonl"))
+    batch = DeletionBatch()
+    for album in albums:
+        journal.record(album, "imported", "01 One.m4a")
+        batch.add(album, True, journal)
+    assert batch.is_pending(albums[0])
+
+    with patch("src.lib.deletion.move_to_trash") as mock_trash:
+        batch.flush()
+
+    # the parent goes in one move instead of a move per album
+    mock_trash.assert_called_once_with(str(user_dir))
+    assert batch.pending == []
+    assert not batch.is_pending(albums[0])
+    assert all(not journal.skip(album, "imported", "01 One.m4a") for album in albums)
+
+
+def test_flush_keeps_parent_with_other_files(tmp_path: Path):
+    user_dir = tmp_path / "user"
+    albums = make_albums(user_dir, ["a", "b", "downloading"])
+    batch = DeletionBatch()
+    for album in albums[:2]:
+        batch.add(album, True)
+
+    with patch("src.lib.deletion.move_to_trash") as mock_trash:
+        batch.flush()
+
+    assert [call.args[0] for call in mock_trash.call_args_list] == albums[:2]
+
+
+def test_flush_trashes_archives_alone(tmp_path: Path):
+    archive = tmp_path / "album.zip"
+    archive.write_bytes(b"PK")
+    batch = DeletionBatch()
+    batch.add(str(archive))
+
+    with patch("src.lib.deletion.move_to_trash") as mock_trash:
+        batch.flush()
+
+    mock_trash.assert_called_once_with(str(archive))
+
+
+def test_flush_keeps_journal_of_failed_deletions(tmp_path: Path):
+    albums = make_albums(tmp_path, ["a", "b"])
+    journal = RunJournal(str(tmp_path / "journal.jsonl"))
+    batch = DeletionBatch()
+    for album in albums:
+        journal.record(album, "imported", "01 One.m4a")
+        batch.add(album, journal=journal)
+
+    def trash(path: str) -> None:
+        if path == albums[0]:
+            raise PermissionError("permission denied")
+
+    with patch("src.lib.deletion.move_to_trash", side_effect=trash):
+        batch.flush()
+
+    # the album that couldn't be deleted is still known to be imported
+    assert journal.skip(albums[0], "imported", "01 One.m4a") is True
+    assert journal.skip(albums[1], "imported", "01 One.m4a") is False
@@ -1,12 +1,22 @@
+import io
+import json
+import multiprocessing
 import os
+import subprocess
+import time
 from pathlib import Path
 from typing import TypedDict
 from unittest.mock import MagicMock, patch
 
 import pytest
-from pydub import AudioSegment
 
-from src.lib.file_convertor import FileConversion, FileConvertor
+from src.lib.autotuner import autotuner
+from src.lib.file_convertor import FileConversion, FileConvertor, run_worker
+from src.lib.folder_snapshot import FolderSnapshot
+from src.lib.governor import governor
+from src.lib.job_queue import JobQueue
+from src.lib.loudness import integrated_loudness
+from src.lib.verifier import Verification
 
 
 class FileConvertorItems(TypedDict):
@@ -134,18 +144,10 @@ def test_file_convertor_convert_files(
         file_conversion_1["path"], file_conversion_1["new_name"]
     )
 
-    mock_song_1 = MagicMock(spec=AudioSegment)
-
-    # test if there are already tags on the files
-    with (
-        patch(
-            "src.lib.file_convertor.AudioSegment.from_file", return_value=mock_song_1
-        ) as mock_audiosegment_from_file,
-        patch(
-            "src.lib.file_convertor.mediainfo",
-            return_value={"TAG": {"covr": ["fake_image_data"]}},
-        ) as mock_mediainfo,
-    ):
+    with patch(
+        "src.lib.file_convertor.subprocess.run",
+        return_value=subprocess.CompletedProcess([], 0, b"", b""),
+    ) as mock_run:
         # check pre-conversion status
         assert file_conversion_1["state"]["status"] == "pre-conversion"
         assert file_conversion_1["state"]["error_message"] is None
@@ -153,53 +155,27 @@ def test_file_convertor_convert_files(
         # convert the file
         file_convertor._convert_file(file_conversion_1)  # type: ignore[reportPrivateUsage]
 
-        # check that conversion was successful
-        mock_audiosegment_from_file.assert_called_once_with(old_file_path_1)
-        mock_song_1.export.assert_called_once_with(
-            new_file_path_1,
-            format="mp4",
-            codec="alac",
-            tags=mock_mediainfo.return_value["TAG"],
-        )
+        # check that the file was encoded to ALAC with its tags carried over
+        command = mock_run.call_args.args[0]
+        assert command[command.index("-i") + 1] == old_file_path_1
+        assert command[command.index("-map_metadata") + 1] == "0"
+        assert command[command.index("-c:a") + 1] == "alac"
+        assert command[-1] == new_file_path_1
         assert file_conversion_1["state"]["status"] == "success"
         assert file_conversion_1["state"]["error_message"] is None
 
-    # test if there are no tags on the files
+    # test if ffmpeg fails
 
     file_conversion_2 = generate_file_conversion(album_dir)
-    old_file_path_2 = os.path.join(
-        file_conversion_2["path"], file_conversion_2["old_name"]
-    )
-    new_file_path_2 = os.path.join(
-        file_conversion_2["path"], file_conversion_2["new_name"]
-    )
-
-    mock_song_2 = MagicMock(spec=AudioSegment)
 
-    with (
-        patch(
-            "src.lib.file_convertor.AudioSegment.from_file", return_value=mock_song_2
-        ) as mock_audiosegment_from_file,
-        patch("src.lib.file_convertor.mediainfo", return_value={}),
+    with patch(
+        "src.lib.file_convertor.subprocess.run",
+        return_value=subprocess.CompletedProcess([], 1, b"", b"Invalid data\n"),
     ):
-        # check pre-conversion status
-        assert file_conversion_2["state"]["status"] == "pre-conversion"
-        assert file_conversion_2["state"]["error_message"] is None
-
-        # convert the file
         file_convertor._convert_file(file_conversion_2)  # type: ignore[reportPrivateUsage]
 
-        # check that conversion was successful
-        mock_audiosegment_from_file.assert_called_once_with(old_file_path_2)
-        mock_song_2.export.assert_called_once_with(
-            new_file_path_2,
-            format="mp4",
-            codec="alac",
-            tags={},
-        )
-
-        assert file_conversion_2["state"]["status"] == "success"
-        assert file_conversion_2["state"]["error_message"] is None
+        assert file_conversion_2["state"]["status"] == "error"
+        assert file_conversion_2["state"]["error_message"] == "Invalid data"
 
     # test if file conversion throws an error
 
@@ -207,7 +183,7 @@ def test_file_convertor_convert_files(
     error_during_conversion = ValueError("Random error")
 
     with patch(
-        "src.lib.file_convertor.AudioSegment.from_file",
+        "src.lib.file_convertor.subprocess.run",
         side_effect=error_during_conversion,
     ):
         # check pre-conversion status
@@ -224,6 +200,34 @@ def test_file_convertor_convert_files(
         )
 
 
+def test_file_convertor_converts_discs_in_their_sub_folders(tmp_path: Path):
+    for disc in ("CD1", "CD2"):
+        (tmp_path / disc).mkdir()
+        (tmp_path / disc / "01.flac").write_text("hello")
+    (tmp_path / "CD2" / "image.flac").write_text("hello")
+    (tmp_path / "CD2" / "image.cue").write_text(
+        'FILE "image.wav" WAVE\n'
+        + '  TRACK 01 AUDIO\n    TITLE "One"\n    INDEX 01 00:00:00\n'
+        + '  TRACK 02 AUDIO\n    TITLE "Two"\n    INDEX 01 03:00:00\n'
+    )
+
+    file_convertor = FileConvertor(
+        str(tmp_path), FolderSnapshot(str(tmp_path), recursive=True)
+    )
+    file_convertor.find_conversions()
+
+    # files with the same name on each disc are converted next to their source
+    assert sorted(
+        os.path.join(file["path"], file["new_name"])
+        for file in file_convertor.incompatible_files
+    ) == [str(tmp_path / "CD1" / "01.m4a"), str(tmp_path / "CD2" / "01.m4a")]
+
+    # the image is split into the folder of the disc it is on
+    (split,) = file_convertor.cue_splits
+    assert file_convertor.source_path(split) == str(tmp_path / "CD2" / "image.flac")
+    assert [track["path"] for track in split["tracks"]] == [str(tmp_path / "CD2")] * 2
+
+
 def test_file_convertor_convert_all(
     setup_file_convertor: FileConvertorItems,
 ):
@@ -248,3 +252,254 @@ def test_file_convertor_convert_all(
         spy_find_incompatible.assert_called_once()
         assert len(file_convertor.incompatible_files) == 3
         assert spy_convert_file.call_count == 3
+
+
+def test_file_convertor_convert_all_skips_done_conversions(
+    setup_file_convertor: FileConvertorItems,
+):
+    file_convertor = setup_file_convertor["file_convertor"]
+
+    def skip(file: FileConversion) -> bool:
+        return file["old_name"] == "file_1.mp3"
+
+    with patch.object(FileConvertor, "_convert_file") as mock_convert_file:
+        files = [file for file in file_convertor.convert_all(skip)]
+
+    assert sorted(file["old_name"] for file in files) == ["file_2.wav", "file_4.wma"]
+    assert mock_convert_file.call_count == 2
+
+
+def test_file_convertor_convert_all_in_parallel_keeps_order(
+    setup_file_convertor: FileConvertorItems,
+):
+    file_convertor = setup_file_convertor["file_convertor"]
+    delays = {"file_1.mp3": 0.05, "file_2.wav": 0.0, "file_4.wma": 0.02}
+
+    def convert_file(self: FileConvertor, file: FileConversion) -> None:
+        time.sleep(delays[file["old_name"]])
+        file["state"]["status"] = "success"
+
+    with (
+        patch.object(governor, "max_encoders", 3),
+        patch.object(FileConvertor, "_convert_file", convert_file),
+    ):
+        files = [file["old_name"] for file in file_convertor.convert_all()]
+
+    assert files == [file["old_name"] for file in file_convertor.incompatible_files]
+
+
+def test_file_convertor_fails_without_free_space(
+    setup_file_convertor: FileConvertorItems,
+):
+    file_convertor = setup_file_convertor["file_convertor"]
+    album_dir = setup_file_convertor["album_dir"]
+
+    def convert_file(self: FileConvertor, file: FileConversion) -> None:
+        # leave a partial output behind
+        Path(file["path"], file["new_name"]).write_text("partial")
+        file["state"]["status"] = "error"
+
+    with (
+        patch.object(governor, "min_free_space", 1),
+        patch(
+            "src.lib.governor.shutil.disk_usage",
+            return_value=MagicMock(free=0),
+        ),
+        patch.object(FileConvertor, "_convert_file") as mock_convert_file,
+    ):
+        files = list(file_convertor.convert_all())
+
+    mock_convert_file.assert_not_called()
+    assert all(file["state"]["status"] == "error" for file in files)
+    assert "not enough free space" in str(files[0]["state"]["error_message"])
+
+    with patch.object(FileConvertor, "_convert_file", convert_file):
+        list(file_convertor.convert_all())
+
+    assert not any(
+        path.name.endswith(".m4a") and path.name != "file_3.m4a"
+        for path in album_dir.iterdir()
+    )
+
+
+def test_file_convertor_convert_all_with_job_queue(
+    setup_file_convertor: FileConvertorItems, tmp_path: Path
+):
+    file_convertor = setup_file_convertor["file_convertor"]
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    file_convertor.job_queue = queue
+
+    def convert_file(self: FileConvertor, file: FileConversion) -> None:
+        file["state"]["status"] = (
+            "error" if file["old_name"] == "file_2.wav" else "success"
+        )
+        file["state"]["error_message"] = "broken file"
+
+    # with no workers running, the coordinator converts every job itself
+    with patch.object(FileConvertor, "_convert_file", convert_file):
+        files = list(file_convertor.convert_all())
+
+    assert [file["old_name"] for file in files] == [
+        file["old_name"] for file in file_convertor.incompatible_files
+    ]
+    statuses = {file["old_name"]: file["state"]["status"] for file in files}
+    assert statuses == {
+        "file_1.mp3": "success",
+        "file_2.wav": "error",
+        "file_4.wma": "success",
+    }
+    assert all(
+        file["state"]["error_message"] == "broken file"
+        for file in files
+        if file["old_name"] == "file_2.wav"
+    )
+    # jobs are removed from the queue once their results are in
+    assert queue.claim("worker") is None
+
+
+def convert_in_worker(self: FileConvertor, file: FileConversion) -> None:
+    time.sleep(0.02)
+    with open(os.path.join(file["path"], file["new_name"]), "a") as output:
+        output.write(f"{os.getpid()}\n")
+    file["state"]["status"] = "success"
+
+
+def work(queue_path: str) -> None:
+    with (
+        patch.object(FileConvertor, "_convert_file", convert_in_worker),
+        patch("src.lib.job_queue.POLL_INTERVAL", 0.01),
+    ):
+        run_worker(JobQueue(queue_path), idle_timeout=0.5)
+
+
+def test_run_worker_processes(tmp_path: Path):
+    album_dir = tmp_path / "album"
+    album_dir.mkdir()
+    names = [f"track {index}" for index in range(12)]
+    for name in names:
+        (album_dir / f"{name}.flac").write_text("hello")
+    queue_path = str(tmp_path / "queue.db")
+    queue = JobQueue(queue_path)
+    job_ids = queue.publish(
+        str(album_dir),
+        [
+            {
+                "old_mime_type": "audio/flac",
+                "new_mime_type": "audio/ipod",
+                "old_name": f"{name}.flac",
+                "new_name": f"{name}.m4a",
+                "path": str(album_dir),
+                "state": {"status": "pre-conversion", "error_message": None},
+            }
+            for name in names
+        ],
+    )
+
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=work, args=(queue_path,)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+
+    assert all(worker.exitcode == 0 for worker in workers)
+    jobs = [queue.job(job_id) for job_id in job_ids]
+    assert all(job is not None and job["state"] == "done" for job in jobs)
+
+    # every file is converted exactly once, by several workers
+    pids = [(album_dir / f"{name}.m4a").read_text().splitlines() for name in names]
+    assert all(len(file_pids) == 1 for file_pids in pids)
+    assert len({file_pids[0] for file_pids in pids}) > 1
+
+
+def test_file_convertor_convert_all_autotunes(
+    setup_file_convertor: FileConvertorItems, tmp_path: Path
+):
+    file_convertor = setup_file_convertor["file_convertor"]
+    autotune_path = tmp_path / "autotune.json"
+    autotuner.configure(str(autotune_path), 1)
+    limits = governor.max_encoders, governor.encoder_threads
+
+    def convert_file(self: FileConvertor, file: FileConversion) -> None:
+        file["state"]["status"] = "success"
+
+    try:
+        with (
+            patch("src.lib.autotuner.MIN_WINDOW_CONVERSIONS", 1),
+            patch.object(FileConvertor, "_convert_file", convert_file),
+        ):
+            files = list(file_convertor.convert_all())
+    finally:
+        autotuner.configure(None, 1)
+        governor.set_encoder_limits(*limits)
+
+    assert len(files) == 3
+    # the fastest settings are kept for the source type
+    assert list(json.loads(autotune_path.read_text())) == [file_convertor.source_type()]
+
+
+def test_file_convertor_analyzes_loudness_in_conversion_pass(
+    setup_file_convertor: FileConvertorItems,
+):
+    np = pytest.importorskip("numpy")
+    file_convertor = setup_file_convertor["file_convertor"]
+    file_convertor.analyze_loudness = True
+    file_conversion = generate_file_conversion(setup_file_convertor["album_dir"])
+
+    time = np.arange(48000 * 2) / 48000
+    wave = 0.1 * np.sin(2 * np.pi * 997 * time)
+    process = MagicMock()
+    process.stdout = io.BytesIO(np.stack([wave, wave], 1).astype("<f4").tobytes())
+    process.wait.return_value = 0
+
+    with patch(
+        "src.lib.file_convertor.subprocess.Popen", return_value=process
+    ) as mock_popen:
+        file_convertor._convert_file(file_conversion)  # type: ignore[reportPrivateUsage]
+
+    # one ffmpeg writes the converted file and decodes PCM for analysis
+    mock_popen.assert_called_once()
+    command = mock_popen.call_args.args[0]
+    assert command.count("-i") == 1
+    assert command[command.index("-c:a") + 1] == "alac"
+    assert command[-1] == "pipe:1"
+    assert file_conversion["state"]["status"] == "success"
+
+    new_path = os.path.join(file_conversion["path"], file_conversion["new_name"])
+    loudness = integrated_loudness(file_convertor.loudness[new_path]["blocks"])
+    assert loudness == pytest.approx(-20, abs=0.05)
+
+
+def test_file_convertor_verification_failure_fails_conversion(
+    setup_file_convertor: FileConvertorItems,
+):
+    file_convertor = setup_file_convertor["file_convertor"]
+    file_convertor.verify = True
+    album_dir = setup_file_convertor["album_dir"]
+
+    def convert_file(self: FileConvertor, file: FileConversion) -> None:
+        Path(file["path"], file["new_name"]).write_text("truncated")
+        file["state"]["status"] = "success"
+
+    def verify(verification: Verification) -> None:
+        if verification["source"].endswith(".wav"):
+            raise RuntimeError("converted audio has 10 samples, its source has 20")
+
+    with (
+        patch.object(FileConvertor, "_convert_file", convert_file),
+        patch(
+            "src.lib.file_convertor.verify_conversion", side_effect=verify
+        ) as mock_verify,
+    ):
+        files = {file["old_name"]: file for file in file_convertor.convert_all()}
+
+    assert mock_verify.call_count == 3
+    assert files["file_1.mp3"]["state"]["status"] == "success"
+    assert files["file_2.wav"]["state"] == {
+        "status": "error",
+        "error_message": "verification failed: converted audio has 10 samples, "
+        + "its source has 20",
+    }
+    # the output that doesn't match its source is removed
+    assert (album_dir / "file_1.m4a").exists()
+    assert not (album_dir / "file_2.m4a").exists()
@@ -0,0 +1,136 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+from src.lib.cover_image import CoverImagesInAlbumFiles
+from src.lib.file_convertor import FileConvertor
+from src.lib.folder_snapshot import FolderSnapshot, disc_number
+from src.lib.helpers import find_files_by_ext, find_files_by_mime_type, is_dir_empty
+from src.lib.media_classifier import classify_media_file
+
+
+def test_folder_snapshot_entries(tmp_path: Path):
+    (tmp_path / "song.mp3").write_text("hello")
+    (tmp_path / "cover.jpg").write_text("hello world")
+    (tmp_path / "notes.txt").write_text("hi")
+    (tmp_path / "scans").mkdir()
+
+    snapshot = FolderSnapshot(str(tmp_path))
+    snapshot.files()
+    entries = {entry["name"]: entry for entry in snapshot.entries}
+
+    assert set(entries) == {"song.mp3", "cover.jpg", "notes.txt", "scans"}
+    assert entries["song.mp3"]["path"] == str(tmp_path / "song.mp3")
+    assert entries["song.mp3"]["is_file"] is True
+    assert entries["song.mp3"]["size"] == 5
+    assert entries["song.mp3"]["mtime"] == os.stat(tmp_path / "song.mp3").st_mtime
+    assert entries["song.mp3"]["mime_type"] == "audio/mpeg"
+    assert entries["song.mp3"]["media_kind"] == "audio"
+    assert entries["cover.jpg"]["media_kind"] == "image"
+    assert entries["notes.txt"]["media_kind"] is None
+    assert entries["scans"]["is_dir"] is True
+    assert entries["scans"]["mime_type"] is None
+
+    assert {entry["name"] for entry in snapshot.files()} == {
+        "song.mp3",
+        "cover.jpg",
+        "notes.txt",
+    }
+    assert [entry["name"] for entry in snapshot.dirs()] == ["scans"]
+
+
+def test_folder_snapshot_lists_once_until_invalidated(tmp_path: Path):
+    (tmp_path / "song.mp3").write_text("hello")
+
+    snapshot = FolderSnapshot(str(tmp_path))
+
+    with patch("src.lib.folder_snapshot.os.scandir", wraps=os.scandir) as spy:
+        # every helper shares the same listing
+        find_files_by_ext(str(tmp_path), [".jpg", ".png", ".mp3"], snapshot)
+        find_files_by_mime_type(str(tmp_path), ["audio/mpeg"], snapshot)
+        is_dir_empty(str(tmp_path), snapshot=snapshot)
+        FileConvertor(str(tmp_path), snapshot)._find_incompatible_audio_files()  # type: ignore[reportPrivateUsage]
+        CoverImagesInAlbumFiles(str(tmp_path), snapshot).process()
+        assert spy.call_count == 1
+
+        # new files are only seen after invalidation
+        (tmp_path / "song.m4a").write_text("hello")
+        assert len(snapshot.files()) == 1
+        snapshot.invalidate()
+        assert len(snapshot.files()) == 2
+        assert spy.call_count == 2
+
+
+def test_folder_snapshot_classifies_files_on_first_use(tmp_path: Path):
+    (tmp_path / "song.mp3").write_text("hello")
+    (tmp_path / "cover.jpg").write_text("hello world")
+    (tmp_path / "scans").mkdir()
+
+    snapshot = FolderSnapshot(str(tmp_path))
+
+    with patch(
+        "src.lib.folder_snapshot.classify_media_file",
+        wraps=classify_media_file,
+    ) as spy:
+        # checks that only need names never read a file
+        assert not is_dir_empty(str(tmp_path), snapshot=snapshot)
+        assert find_files_by_ext(str(tmp_path), [".mp3"], snapshot) == [
+            str(tmp_path / "song.mp3")
+        ]
+        assert [entry["name"] for entry in snapshot.dirs()] == ["scans"]
+        spy.assert_not_called()
+
+        # media files are classified once, when media info is first needed
+        assert find_files_by_mime_type(str(tmp_path), ["audio/mpeg"], snapshot) == [
+            str(tmp_path / "song.mp3")
+        ]
+        snapshot.files()
+        assert spy.call_count == 2
+
+        # and again after the folder is listed again
+        snapshot.invalidate()
+        snapshot.files()
+        assert spy.call_count == 4
+
+
+def test_folder_snapshot_lists_disc_sub_folders(tmp_path: Path):
+    (tmp_path / "cover.jpg").write_text("hello world")
+    for folder in ("CD1", "Disc 2", "Scans", ".hidden", "__MACOSX"):
+        (tmp_path / folder).mkdir()
+    (tmp_path / "CD1" / "01.flac").write_text("hello")
+    (tmp_path / "Disc 2" / "01.flac").write_text("hello")
+    (tmp_path / "Scans" / "back.jpg").write_text("hello")
+    (tmp_path / ".hidden" / "01.flac").write_text("hello")
+    (tmp_path / "__MACOSX" / "._01.flac").write_text("hello")
+
+    # only the top level unless recursive
+    assert {entry["name"] for entry in FolderSnapshot(str(tmp_path)).files()} == {
+        "cover.jpg"
+    }
+
+    snapshot = FolderSnapshot(str(tmp_path), recursive=True)
+    files = {
+        os.path.relpath(entry["path"], tmp_path): entry["disc"]
+        for entry in snapshot.files()
+    }
+
+    assert files == {
+        "cover.jpg": None,
+        os.path.join("CD1", "01.flac"): 1,
+        os.path.join("Disc 2", "01.flac"): 2,
+        os.path.join("Scans", "back.jpg"): None,
+    }
+    assert snapshot.discs() == [1, 2]
+    assert find_files_by_mime_type(str(tmp_path), ["audio/flac"], snapshot) == [
+        str(tmp_path / "CD1" / "01.flac"),
+        str(tmp_path / "Disc 2" / "01.flac"),
+    ]
+
+
+def test_disc_number():
+    assert disc_number(os.path.join("CD1", "01.flac")) == 1
+    assert disc_number(os.path.join("disc_02", "01.flac")) == 2
+    assert disc_number(os.path.join("Vol. 3", "Scans", "back.jpg")) == 3
+    assert disc_number(os.path.join("CDs", "01.flac")) is None
+    assert disc_number(os.path.join("Discography", "01.flac")) is None
+    assert disc_number("01.flac") is None
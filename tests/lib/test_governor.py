@@ -0,0 +1,99 @@
+import threading
+import time
+from pathlib import Path
+from typing import List, NamedTuple
+from unittest.mock import patch
+
+from src.lib.governor import ResourceGovernor, estimate_output_size
+
+
+class DiskUsage(NamedTuple):
+    total: int
+    used: int
+    free: int
+
+
+def test_estimate_output_size():
+    assert estimate_output_size("audio/mpeg", 1000) == 5000
+    assert estimate_output_size("audio/flac", 1000) == 1100
+    assert estimate_output_size(None, 1000) == 1100
+
+
+def test_command_without_limits():
+    governor = ResourceGovernor()
+    assert governor.command(["ffmpeg", "-i", "a"]) == ["ffmpeg", "-i", "a"]
+
+
+def test_command_with_priorities():
+    with (
+        patch("src.lib.governor.sys.platform", "linux"),
+        patch("src.lib.governor.shutil.which", return_value="/usr/bin/tool"),
+    ):
+        governor = ResourceGovernor(nice=10, io_priority="idle")
+    assert governor.command(["ffmpeg"]) == [
+        "ionice",
+        "-c",
+        "3",
+        "nice",
+        "-n",
+        "10",
+        "ffmpeg",
+    ]
+
+    with (
+        patch("src.lib.governor.sys.platform", "darwin"),
+        patch("src.lib.governor.shutil.which", return_value="/usr/bin/tool"),
+    ):
+        governor = ResourceGovernor(io_priority="low")
+    assert governor.command(["ffmpeg"]) == ["taskpolicy", "-d", "utility", "ffmpeg"]
+
+
+def test_command_skips_missing_tools():
+    with patch("src.lib.governor.shutil.which", return_value=None):
+        governor = ResourceGovernor(nice=10, io_priority="low")
+    assert governor.command(["ffmpeg"]) == ["ffmpeg"]
+
+
+def test_encoder_slots_cap_concurrency():
+    governor = ResourceGovernor(max_encoders=2)
+    running: List[int] = []
+    peak: List[int] = [0]
+    lock = threading.Lock()
+
+    def encode() -> None:
+        with governor.encoder_slot():
+            with lock:
+                running.append(1)
+                peak[0] = max(peak[0], len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+    threads = [threading.Thread(target=encode) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+
+
+def test_admit_and_release(tmp_path: Path):
+    governor = ResourceGovernor(min_free_space=100)
+    path = str(tmp_path)
+
+    with patch(
+        "src.lib.governor.shutil.disk_usage", return_value=DiskUsage(1000, 500, 500)
+    ):
+        assert governor.admit(path, 300) is True
+        # the first reservation leaves only 200 bytes free
+        assert governor.admit(path, 150) is False
+        assert governor.has_space(path, 350) is True
+        governor.release(path, 300)
+        assert governor.admit(path, 150) is True
+
+
+def test_admit_without_minimum(tmp_path: Path):
+    governor = ResourceGovernor()
+    assert governor.admit(str(tmp_path), 10**18) is True
+    assert governor.has_space(str(tmp_path), 10**18) is True
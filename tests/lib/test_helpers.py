@@ -1,13 +1,16 @@
+import contextvars
 import json
 import mimetypes
 import os
+import threading
 from pathlib import Path
-from typing import List
+from typing import Generator, List
 
 import pytest
 
 from src.lib.helpers import (
     ClassKeyJSONEncoder,
+    buffered_generator,
     delete_child_and_parent_dir_if_empty,
     find_files_by_ext,
     find_files_by_mime_type,
@@ -269,3 +272,55 @@ def test_ClassKeyJSONEncoder():
     result_json = json.dumps(class_json, cls=ClassKeyJSONEncoder)
 
     assert expected_json == result_json
+
+
+def test_buffered_generator_yields_all_items_in_order():
+    assert list(buffered_generator(iter(range(10)), 3)) == list(range(10))
+    empty: List[int] = []
+    assert list(buffered_generator(empty, 1)) == []
+
+    with pytest.raises(ValueError) as e:
+        list(buffered_generator([1], 0))
+    assert str(e.value) == "`buffer_size` must be at least 1"
+
+
+def test_buffered_generator_bounds_read_ahead():
+    produced: List[int] = []
+    wait = threading.Event()
+
+    def producer() -> Generator[int, None, None]:
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    items = buffered_generator(producer(), 2)
+    assert next(items) == 0
+
+    # the producer can only run ahead by the buffer size, plus the item it is
+    # blocked on putting into the buffer
+    wait.wait(0.3)
+    assert len(produced) <= 4
+
+    assert list(items) == list(range(1, 10))
+
+
+def test_buffered_generator_reraises_producer_errors():
+    def producer() -> Generator[int, None, None]:
+        yield 1
+        raise RuntimeError("producer failed")
+
+    items = buffered_generator(producer(), 1)
+    assert next(items) == 1
+    with pytest.raises(RuntimeError) as e:
+        next(items)
+    assert str(e.value) == "producer failed"
+
+
+def test_buffered_generator_runs_producer_in_callers_context():
+    variable: contextvars.ContextVar[str] = contextvars.ContextVar("variable")
+    variable.set("caller")
+
+    def producer() -> Generator[str, None, None]:
+        yield variable.get("missing")
+
+    assert list(buffered_generator(producer(), 1)) == ["caller"]
@@ -0,0 +1,127 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+from src.lib.file_convertor import FileConversion
+from src.lib.job_queue import SCHEMA, JobQueue
+from src.lib.output_profile import AAC_256
+
+
+def generate_file_conversions(
+    album_dir: Path, names: List[str]
+) -> List[FileConversion]:
+    return [
+        {
+            "old_mime_type": "audio/flac",
+            "new_mime_type": "audio/ipod",
+            "old_name": f"{name}.flac",
+            "new_name": f"{name}.m4a",
+            "path": str(album_dir),
+            "state": {"status": "pre-conversion", "error_message": None},
+        }
+        for name in names
+    ]
+
+
+def test_claim_in_publish_order(tmp_path: Path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    ids = queue.publish(str(tmp_path), generate_file_conversions(tmp_path, ["a", "b"]))
+
+    first = queue.claim("worker 1")
+    second = queue.claim("worker 2")
+
+    assert first is not None and second is not None
+    assert [first["id"], second["id"]] == ids
+    assert first["old_name"] == "a.flac" and first["worker"] == "worker 1"
+    assert queue.claim("worker 3") is None
+
+
+def test_complete(tmp_path: Path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    ids = queue.publish(str(tmp_path), generate_file_conversions(tmp_path, ["a", "b"]))
+    for _ in ids:
+        job = queue.claim("worker")
+        assert job is not None
+        error = "broken file" if job["old_name"] == "b.flac" else None
+        assert queue.complete(job["id"], "worker", error) is True
+
+    done, failed = queue.job(ids[0]), queue.job(ids[1])
+    assert done is not None and done["state"] == "done"
+    assert failed is not None and failed["state"] == "failed"
+    assert failed["error"] == "broken file"
+
+
+def test_expired_lease_is_taken_over(tmp_path: Path):
+    queue = JobQueue(str(tmp_path / "queue.db"), lease_seconds=0.05)
+    queue.publish(str(tmp_path), generate_file_conversions(tmp_path, ["a"]))
+
+    job = queue.claim("worker 1")
+    assert job is not None
+    assert queue.heartbeat(job["id"], "worker 1") is True
+    assert queue.claim("worker 2") is None
+
+    time.sleep(0.1)
+    taken_over = queue.claim("worker 2")
+
+    assert taken_over is not None and taken_over["id"] == job["id"]
+    assert taken_over["attempts"] == 2
+    # the first worker lost its lease, so its result is discarded
+    assert queue.heartbeat(job["id"], "worker 1") is False
+    assert queue.complete(job["id"], "worker 1") is False
+    assert queue.complete(job["id"], "worker 2") is True
+
+
+def test_job_fails_after_max_attempts(tmp_path: Path):
+    queue = JobQueue(str(tmp_path / "queue.db"), lease_seconds=0.01)
+    (job_id,) = queue.publish(str(tmp_path), generate_file_conversions(tmp_path, ["a"]))
+
+    with patch("src.lib.job_queue.MAX_JOB_ATTEMPTS", 2):
+        assert queue.claim("worker 1") is not None
+        time.sleep(0.02)
+        assert queue.claim("worker 2") is not None
+        time.sleep(0.02)
+        assert queue.claim("worker 3") is None
+
+    job = queue.job(job_id)
+    assert job is not None and job["state"] == "failed"
+    assert job["error"] == "lease ran out 2 times"
+
+
+def test_forget(tmp_path: Path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    (job_id,) = queue.publish("album 1", generate_file_conversions(tmp_path, ["a"]))
+    queue.publish("album 2", generate_file_conversions(tmp_path, ["b"]))
+
+    queue.forget("album 1")
+
+    assert queue.job(job_id) is None
+    job = queue.claim("worker")
+    assert job is not None and job["folder"] == "album 2"
+
+
+def test_publish_with_output_profile(tmp_path: Path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    queue.publish(str(tmp_path), generate_file_conversions(tmp_path, ["a"]), AAC_256)
+    queue.publish(str(tmp_path), generate_file_conversions(tmp_path, ["b"]))
+
+    first, second = queue.claim("worker"), queue.claim("worker")
+
+    assert first is not None and first["profile"] is not None
+    assert json.loads(first["profile"]) == AAC_256
+    assert second is not None and second["profile"] is None
+
+
+def test_queue_without_profile_column_is_migrated(tmp_path: Path):
+    path = str(tmp_path / "queue.db")
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA.replace("    profile TEXT,\n", ""))
+    connection.close()
+
+    queue = JobQueue(path)
+    queue.publish(str(tmp_path), generate_file_conversions(tmp_path, ["a"]), AAC_256)
+
+    job = queue.claim("worker")
+    assert job is not None and job["profile"] is not None
@@ -0,0 +1,81 @@
+import os
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+from src.lib.journal import RunJournal
+from src.lib.planner import ThroughputHistory
+
+
+def test_record_and_load(tmp_path: Path) -> None:
+    path = str(tmp_path / "state" / "journal.jsonl")
+    journal = RunJournal(path)
+    journal.record("/album", "imported", "a.m4a", size=100)
+    journal.record("/album", "deleted")
+    journal.close()
+
+    # a line torn by a crash is ignored
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"folder": "/album", "sta')
+
+    replayed = RunJournal(path)
+    assert replayed.load() == 2
+    assert replayed.skip("/album", "imported", "a.m4a") is True
+    assert replayed.skip("/album", "imported", "b.m4a") is False
+    assert replayed.skip("/album", "deleted") is True
+    assert replayed.saved == {"imported": (1, 100), "deleted": (1, 0)}
+
+
+def test_skip_checks_file_is_unchanged(tmp_path: Path) -> None:
+    track = tmp_path / "a.m4a"
+    track.write_text("tagged")
+    journal = RunJournal(str(tmp_path / "journal.jsonl"))
+    journal.record("/album", "tagged", "a.m4a", str(track), 6)
+
+    assert journal.skip("/album", "tagged", "a.m4a", str(track)) is True
+
+    # e.g. extracted again from an archive
+    track.write_text("untagged")
+    assert journal.skip("/album", "tagged", "a.m4a", str(track)) is False
+    os.unlink(track)
+    assert journal.skip("/album", "tagged", "a.m4a", str(track)) is False
+    journal.close()
+
+
+def test_forget(tmp_path: Path) -> None:
+    path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(path)
+    journal.record("/album one", "imported", "a.m4a")
+    journal.record("/album two", "imported", "a.m4a")
+    journal.forget("/album one")
+    journal.record("/album two", "imported", "b.m4a")
+    journal.close()
+
+    replayed = RunJournal(path)
+    assert replayed.load() == 2
+    assert replayed.skip("/album one", "imported", "a.m4a") is False
+    assert replayed.skip("/album two", "imported", "b.m4a") is True
+
+
+def test_log_saved_work(tmp_path: Path) -> None:
+    journal = RunJournal(str(tmp_path / "journal.jsonl"))
+    journal.saved = {"converted": (2, 4_000_000), "imported": (3, 0)}
+    history = ThroughputHistory(str(tmp_path / "history.json"))
+    history.sections["convert file"] = {
+        "bytes_per_second": 1_000_000.0,
+        "seconds_per_file": 1.0,
+        "runs": 1,
+    }
+    messages: List[str] = []
+
+    def info(message: str) -> None:
+        messages.append(message)
+
+    with patch("src.lib.journal.logger.info", side_effect=info):
+        journal.log_saved_work(history)
+
+    assert messages == [
+        "work saved by resuming:",
+        "file conversions: 2 files, 4.0 MB, ~4.0 s",
+        "Apple Music import: 3 files, 0.0 MB",
+    ]
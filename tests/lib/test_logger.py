@@ -1,5 +1,9 @@
+import json
+import threading
 from io import StringIO
+from pathlib import Path
 from typing import Callable, Tuple, TypeAlias
+from unittest.mock import patch
 
 import pytest
 
@@ -128,3 +132,263 @@ def test_custom_log_section_start_and_end_formats(
     assert "  inside of section" == output[2]
     assert "|test section|" == output[3]
     assert "outside of section" == output[4]
+
+
+def test_log_section_timing_tree(logger_with_stream: LoggerWithStream):
+    logger, _ = logger_with_stream
+
+    with patch("src.lib.logger.time.monotonic", side_effect=[1, 2, 3, 4.5, 7, 10]):
+        end_folder = logger.log_section("processing folder", kind="folder", label="a")
+        end_stage = logger.log_section("file conversions", kind="stage")
+        end_file = logger.log_section("convert file", kind="file", log=False)
+        logger.add_bytes_processed(100)
+        end_file(bytes_processed=50)
+        end_stage()
+        end_folder()
+
+    folder = logger.timing.children[0]
+    assert (folder.kind, folder.label) == ("folder", "a")
+    assert folder.wall_time == 9
+    assert folder.total_bytes == 150
+
+    stage = folder.children[0]
+    assert stage.name == "file conversions"
+    assert stage.wall_time == 5
+
+    file = stage.children[0]
+    assert file.kind == "file"
+    assert file.wall_time == 1.5
+    assert file.bytes_processed == 150
+    assert file.cpu_time >= 0
+
+
+def test_silent_log_section(logger_with_stream: LoggerWithStream):
+    logger, stream = logger_with_stream
+
+    end_section = logger.log_section("convert file", kind="file", log=False)
+    logger.info("inside of section")
+    end_section()
+
+    # only timed, not logged or indented
+    assert stream.getvalue().splitlines() == [
+        f"{COLORS['info']}inside of section{RESET}"
+    ]
+
+
+def test_log_timing_summary(
+    logger_with_stream: LoggerWithStream, strip_color: StripColor
+):
+    logger, stream = logger_with_stream
+
+    end_folder = logger.log_section("processing folder", kind="folder", label="a")
+    for _ in range(3):
+        end_file = logger.log_section("tag file", kind="file", log=False)
+        end_file(bytes_processed=1_000_000)
+    end_folder()
+    stream.seek(0)
+    stream.truncate()
+
+    logger.log_timing_summary()
+
+    output = [strip_color(line, "info") for line in stream.getvalue().splitlines()]
+    assert output[0] == "timing summary:"
+    assert output[1].split() == [
+        "section",
+        "count",
+        "wall",
+        "(s)",
+        "cpu",
+        "(s)",
+        "MB",
+        "MB/s",
+    ]
+    assert output[2].split()[:2] == ["run", "1"]
+    assert output[3].split()[:4] == ["processing", "folder:", "a", "1"]
+
+    # files are summarized in a single row
+    assert output[4].split()[:2] == ["files", "3"]
+    assert output[4].split()[4] == "3.00"
+    assert len(output) == 5
+
+
+def test_json_sink(logger_with_stream: LoggerWithStream, tmp_path: Path):
+    logger, _ = logger_with_stream
+    log_path = tmp_path / "log.jsonl"
+    logger.add_json_sink(str(log_path))
+
+    end_folder = logger.log_section("processing folder", kind="folder", label="a")
+    end_stage = logger.log_section("converting files", kind="stage")
+    end_file = logger.log_section(
+        "convert file", kind="file", label="a/1.flac", log=False
+    )
+    logger.error("could not convert")
+    end_file(bytes_processed=100)
+    end_stage()
+    end_folder()
+    logger.close_json_sinks()
+
+    text = log_path.read_text()
+    assert "\x1b" not in text and "\\u001b" not in text
+    events = [json.loads(line) for line in text.splitlines()]
+    assert [event["event"] for event in events] == [
+        "section_start",
+        "section_start",
+        "log",
+        "section_end",
+        "section_end",
+        "section_end",
+    ]
+
+    error = events[2]
+    assert error["level"] == "error"
+    assert error["message"] == "could not convert"
+    assert error["section_path"] == [
+        "processing folder",
+        "converting files",
+        "convert file",
+    ]
+    assert error["folder"] == "a"
+    assert error["stage"] == "converting files"
+    assert error["file"] == "a/1.flac"
+
+    # the silent file section only ends in the JSON sink
+    file_end = events[3]
+    assert file_end["message"] == "convert file"
+    assert file_end["file"] == "a/1.flac"
+    assert file_end["bytes"] == 100
+    assert file_end["outcome"] == "error"
+    assert file_end["duration"] >= 0
+
+    folder_end = events[5]
+    assert folder_end["message"] == "[/processing folder]"
+    assert folder_end["outcome"] == "error"
+    assert "file" not in folder_end
+    assert logger.json_handlers == []
+
+
+def test_indent_and_sections_are_per_thread(logger_with_stream: LoggerWithStream):
+    logger, stream = logger_with_stream
+
+    end_folder = logger.log_section("processing folder", kind="folder", label="a")
+
+    def work() -> None:
+        # a new thread starts outside of any section, at no indent
+        logger.info("in thread")
+        end_file = logger.log_section("convert file", kind="file", log=False)
+        end_file()
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+    logger.info("after thread")
+    end_folder()
+
+    lines = stream.getvalue().splitlines()
+    assert lines[1] == f"{COLORS['info']}in thread{RESET}"
+    assert lines[2] == f"{COLORS['info']}  after thread{RESET}"
+    assert [child.kind for child in logger.timing.children] == ["folder", "file"]
+
+
+def test_parallel_folder_output_is_grouped():
+    stream = StringIO()
+    logger = IndentColoredLogger(name="test_grouped_logger", stream=stream)
+    turns = [threading.Event() for _ in range(4)]
+
+    def process(label: str, first_turn: int) -> None:
+        end_folder = logger.log_section("processing folder", kind="folder", label=label)
+        for turn in (first_turn, first_turn + 2):
+            turns[turn].wait(1)
+            logger.info(f"{label} step {turn}")
+            if turn + 1 < len(turns):
+                turns[turn + 1].set()
+        end_folder()
+
+    # interleave the steps of two folders processed at the same time
+    threads = [
+        threading.Thread(target=process, args=("a", 0)),
+        threading.Thread(target=process, args=("b", 1)),
+    ]
+    for thread in threads:
+        thread.start()
+    turns[0].set()
+    for thread in threads:
+        thread.join()
+    logger.info("done")
+    logger.shutdown()
+
+    # strip timestamps and colors
+    messages = [
+        line[20:].removeprefix(COLORS["info"]).removesuffix(RESET)
+        for line in stream.getvalue().splitlines()
+    ]
+    folder = "[processing folder]"
+    end_folder = "[/processing folder]"
+    assert messages in (
+        [folder, "  a step 0", "  a step 2", end_folder]
+        + [folder, "  b step 1", "  b step 3", end_folder, "done"],
+        [folder, "  b step 1", "  b step 3", end_folder]
+        + [folder, "  a step 0", "  a step 2", end_folder, "done"],
+    )
+
+
+def test_status_lines_stay_below_log():
+    class Terminal(StringIO):
+        def isatty(self) -> bool:
+            return True
+
+    stream = Terminal()
+    logger = IndentColoredLogger(name="test_status_logger", stream=stream)
+    assert logger.can_show_status()
+
+    logger.set_status(["[progress] 1/2 folders", "  converting: 1/1 files"])
+    logger.info("imported")
+    logger.wait_for_output()
+    logger.set_status([])
+    logger.shutdown()
+
+    output = stream.getvalue()
+    status = "[progress] 1/2 folders\n  converting: 1/1 files\n"
+    # erased before the log line, drawn again after it, then erased for good
+    assert output.startswith(status + "\033[2F\033[J")
+    assert f"imported{RESET}\n{status}\033[2F\033[J" in output
+    assert output.endswith("\033[2F\033[J")
+
+
+def test_status_lines_are_hidden_while_paused():
+    class Terminal(StringIO):
+        def isatty(self) -> bool:
+            return True
+
+    stream = Terminal()
+    logger = IndentColoredLogger(name="test_paused_status_logger", stream=stream)
+
+    logger.set_status(["[progress] 1/2 folders"])
+    with logger.status_paused():
+        # written to the terminal directly, like an image preview or input
+        stream.write("preview\n")
+        logger.set_status(["[progress] 2/2 folders"])
+        logger.info("imported")
+        logger.wait_for_output()
+        paused_output = stream.getvalue()
+    resumed_output = stream.getvalue()[len(paused_output) :]
+    logger.set_status([])
+    logger.shutdown()
+
+    # the status is erased once, and neither redrawn nor erased while paused
+    assert paused_output.startswith("[progress] 1/2 folders\n\033[1F\033[Jpreview\n")
+    assert paused_output.count("\033[1F\033[J") == 1
+    assert "[progress] 2/2 folders" not in paused_output
+    assert paused_output.endswith(f"imported{RESET}\n")
+    # and the latest status is drawn again after
+    assert resumed_output == "[progress] 2/2 folders\n"
+
+
+def test_status_lines_need_a_terminal():
+    stream = StringIO()
+    logger = IndentColoredLogger(name="test_no_status_logger", stream=stream)
+
+    logger.set_status(["[progress] 1/2 folders"])
+    logger.shutdown()
+
+    assert not logger.can_show_status()
+    assert stream.getvalue() == ""
@@ -0,0 +1,122 @@
+import io
+import math
+from typing import List
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.lib.loudness import (  # noqa: E402
+    ALBUM_GAIN_TAG,
+    ITUNNORM_TAG,
+    TRACK_GAIN_TAG,
+    TRACK_PEAK_TAG,
+    LoudnessMeter,
+    album_loudness,
+    analyze_file,
+    integrated_loudness,
+    loudness_tags,
+    sound_check,
+)
+
+
+def sine_pcm(level: float, seconds: float = 5.0, channels: int = 2) -> bytes:
+    time = np.arange(int(48000 * seconds)) / 48000
+    wave = 10 ** (level / 20) * np.sin(2 * np.pi * 997 * time)
+    return np.stack([wave] * channels, axis=1).astype("<f4").tobytes()
+
+
+def measure(data: bytes, chunk_sizes: List[int], channels: int = 2) -> LoudnessMeter:
+    meter = LoudnessMeter(channels)
+    offset, index = 0, 0
+    while offset < len(data):
+        size = chunk_sizes[index % len(chunk_sizes)]
+        meter.add(data[offset : offset + size])
+        offset += size
+        index += 1
+    return meter
+
+
+def test_stereo_sine_loudness():
+    # a stereo 997 Hz sine at -23 dBFS measures -23 LUFS
+    result = measure(sine_pcm(-23), [1024 * 1024]).result()
+    loudness = integrated_loudness(result["blocks"])
+
+    assert loudness == pytest.approx(-23, abs=0.05)
+    assert result["peak"] == pytest.approx(10 ** (-23 / 20), rel=1e-3)
+
+
+def test_chunking_does_not_change_result():
+    data = sine_pcm(-20, 2.0)
+    whole = measure(data, [len(data)]).result()
+    chunked = measure(data, [7, 40_001, 123_457]).result()
+
+    assert chunked["blocks"] == pytest.approx(whole["blocks"])
+    assert chunked["peak"] == whole["peak"]
+
+
+def test_silence_has_no_tags():
+    result = measure(bytes(48000 * 2 * 4), [65536]).result()
+
+    assert integrated_loudness(result["blocks"]) is None
+    assert loudness_tags(result) == {}
+
+
+def test_loudness_tags():
+    quiet = measure(sine_pcm(-28), [1024 * 1024]).result()
+    loud = measure(sine_pcm(-18), [1024 * 1024]).result()
+
+    tags = loudness_tags(quiet, album_loudness([quiet, loud]))
+
+    assert float(tags[TRACK_GAIN_TAG].split()[0]) == pytest.approx(10, abs=0.05)
+    assert tags[TRACK_PEAK_TAG] == f"{quiet['peak']:.6f}".encode()
+    # the album is as loud as the mean energy of both tracks
+    album_level = -18 + 10 * math.log10((1 + 0.1) / 2)
+    assert float(tags[ALBUM_GAIN_TAG].split()[0]) == pytest.approx(
+        -18 - album_level, abs=0.05
+    )
+    assert len(tags[ITUNNORM_TAG].split()) == 10
+
+
+def test_sound_check():
+    assert sound_check(0.0, 1.0) == (
+        " 000003E8 000003E8 000009C4 000009C4 00000000 00000000"
+        + " 00008000 00008000 00000000 00000000"
+    )
+    # 10 dB of gain is a tenth of the reference level
+    assert sound_check(10.0, 0.5).split()[0] == f"{100:08X}"
+    assert int(sound_check(-100.0, 0.5).split()[0], 16) == 65534
+
+
+def test_analyze_file():
+    process = MagicMock()
+    process.stdout = io.BytesIO(sine_pcm(-23, channels=1))
+    process.wait.return_value = 0
+
+    with patch("src.lib.loudness.subprocess.Popen", return_value=process) as mock_popen:
+        result = analyze_file("/music/track.m4a", 1)
+
+    command = mock_popen.call_args.args[0]
+    assert command[command.index("-i") + 1] == "/music/track.m4a"
+    assert command[command.index("-ac") + 1] == "1"
+    assert command[-1] == "pipe:1"
+    # a mono channel counts once, so it measures 3 LU below the stereo sine
+    loudness = integrated_loudness(result["blocks"])
+    assert loudness is not None
+    assert loudness == pytest.approx(-23 - 10 * math.log10(2), abs=0.05)
+
+
+def test_analyze_file_failure():
+    process = MagicMock()
+    process.stdout = io.BytesIO(b"")
+    process.wait.return_value = 1
+
+    def popen(command: List[str], **kwargs: object) -> MagicMock:
+        stderr = kwargs["stderr"]
+        stderr.write(b"Invalid data\n")  # type: ignore[reportAttributeAccessIssue]
+        return process
+
+    with patch("src.lib.loudness.subprocess.Popen", side_effect=popen):
+        with pytest.raises(RuntimeError, match="Invalid data"):
+            analyze_file("/music/track.m4a", 2)
@@ -0,0 +1,226 @@
+import mmap
+import os
+import struct
+import wave
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.lib.file_convertor import FileConvertor
+from src.lib.media_classifier import (
+    classify_media_file,
+    classify_media_header,
+    is_apple_music_compatible,
+)
+from src.lib.output_profile import AAC_256, ALAC_24_48
+from src.lib.verifier import LOSSY_SAMPLE_TOLERANCE
+
+
+def atom(atom_type: bytes, body: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(body), atom_type) + body
+
+
+def make_mp4(sample_entry: bytes) -> bytes:
+    """Build a minimal MP4 file with one sound track using a sample entry."""
+    hdlr = atom(b"hdlr", b"\x00" * 8 + b"soun" + b"\x00" * 12)
+    mdhd = atom(b"mdhd", b"\x00" * 12 + struct.pack(">II", 44100, 441000) + b"\x00" * 4)
+    stsd = atom(b"stsd", b"\x00" * 4 + struct.pack(">I", 1) + sample_entry)
+    stbl = atom(b"stbl", stsd)
+    minf = atom(b"minf", stbl)
+    mdia = atom(b"mdia", mdhd + hdlr + minf)
+    trak = atom(b"trak", mdia)
+    moov = atom(b"moov", trak)
+    ftyp = atom(b"ftyp", b"M4A \x00\x00\x00\x00")
+    mdat = atom(b"mdat", b"\x00" * 64)
+
+    # put `moov` at the end, as many encoders do
+    return ftyp + mdat + moov
+
+
+def audio_sample_entry(entry_type: bytes, sample_rate: int, children: bytes) -> bytes:
+    body = (
+        b"\x00" * 6
+        + struct.pack(">H", 1)
+        + b"\x00" * 8
+        + struct.pack(">HHHHI", 2, 16, 0, 0, min(sample_rate, 65535) << 16)
+        + children
+    )
+    return atom(entry_type, body)
+
+
+def make_alac(bit_depth: int, sample_rate: int) -> bytes:
+    config = (
+        b"\x00" * 4
+        + struct.pack(">IBBBBBBHII", 4096, 0, bit_depth, 40, 10, 14, 2, 255, 0, 0)
+        + struct.pack(">I", sample_rate)
+    )
+    return make_mp4(audio_sample_entry(b"alac", sample_rate, atom(b"alac", config)))
+
+
+def make_flac(sample_rate: int, channels: int, bit_depth: int, samples: int) -> bytes:
+    packed = (
+        (sample_rate << 44) | ((channels - 1) << 41) | ((bit_depth - 1) << 36) | samples
+    )
+    streaminfo = b"\x00" * 10 + packed.to_bytes(8, "big") + b"\x00" * 16
+    return b"fLaC" + b"\x80" + len(streaminfo).to_bytes(3, "big") + streaminfo
+
+
+def test_classify_flac_and_id3_tagged_flac():
+    info = classify_media_header(make_flac(96000, 2, 24, 96000 * 3), "a.flac")
+    assert info["mime_type"] == "audio/flac"
+    assert info["container"] == "flac"
+    assert info["codec"] == "flac"
+    assert info["sample_rate"] == 96000
+    assert info["channels"] == 2
+    assert info["bit_depth"] == 24
+    assert info["duration"] == 3
+
+    id3 = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + b"\x00" * 10
+    info = classify_media_header(id3 + make_flac(44100, 2, 16, 0), "a.mp3")
+    assert info["codec"] == "flac"
+    assert info["duration"] is None
+
+
+def test_classify_mp4_codecs():
+    info = classify_media_header(make_alac(24, 192000), "a.m4a")
+    assert info["mime_type"] == "audio/mp4a-latm"
+    assert info["container"] == "mp4"
+    assert info["codec"] == "alac"
+    assert info["bit_depth"] == 24
+    assert info["sample_rate"] == 192000
+    assert info["duration"] == 10
+    assert is_apple_music_compatible(info)
+
+    info = classify_media_header(
+        make_mp4(audio_sample_entry(b"mp4a", 44100, b"")), "a.m4a"
+    )
+    assert info["codec"] == "aac"
+    assert info["bit_depth"] is None
+    assert is_apple_music_compatible(info)
+
+    # FLAC in an mp4 container can't be imported
+    info = classify_media_header(
+        make_mp4(audio_sample_entry(b"fLaC", 44100, b"")), "a.m4a"
+    )
+    assert info["codec"] == "flac"
+    assert info["mime_type"] == "audio/flac"
+    assert not is_apple_music_compatible(info)
+
+
+def test_classify_wav(tmp_path: Path):
+    path = tmp_path / "a.wav"
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(48000)
+        wav.writeframes(b"\x00" * 4 * 48000)
+
+    info = classify_media_file(str(path))
+    assert info["mime_type"] == "audio/x-wav"
+    assert info["codec"] == "pcm"
+    assert info["sample_rate"] == 48000
+    assert info["bit_depth"] == 16
+    assert info["channels"] == 2
+    assert info["duration"] == 1
+
+
+@pytest.mark.parametrize(
+    "header,mime_type",
+    [
+        (b"\xff\xd8\xff\xe0" + b"\x00" * 16, "image/jpeg"),
+        (b"\x89PNG\r\n\x1a\n" + b"\x00" * 16, "image/png"),
+        (b"OggS" + b"\x00" * 24 + b"\x01vorbis", "audio/ogg"),
+        (b"MAC " + b"\x00" * 16, "audio/x-ape"),
+        (b"\xff\xfb\x90\x00" + b"\x00" * 16, "audio/mpeg"),
+    ],
+)
+def test_classify_headers(header: bytes, mime_type: str):
+    assert classify_media_header(header, "unknown.bin")["mime_type"] == mime_type
+
+
+def test_classify_falls_back_to_extension(tmp_path: Path):
+    text = tmp_path / "file.mp3"
+    text.write_text("hello")
+    assert classify_media_file(str(text))["mime_type"] == "audio/mpeg"
+    assert classify_media_file(str(text))["codec"] is None
+
+    # `.m4a` is guessed as "audio/mp4" on some platforms
+    assert classify_media_file(str(tmp_path / "missing.m4a"))["mime_type"] == (
+        "audio/mp4a-latm"
+    )
+
+
+def test_classify_media_file_is_memoized(tmp_path: Path):
+    path = tmp_path / "a.flac"
+    path.write_bytes(make_flac(44100, 2, 16, 44100))
+
+    with patch("src.lib.media_classifier.mmap.mmap", wraps=mmap.mmap) as spy:
+        classify_media_file(str(path))
+        classify_media_file(str(path))
+        assert spy.call_count == 1
+
+        # a modified file is classified again
+        path.write_bytes(make_flac(48000, 2, 16, 48000))
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert classify_media_file(str(path))["sample_rate"] == 48000
+        assert spy.call_count == 2
+
+
+def test_misnamed_flac_is_converted(tmp_path: Path):
+    (tmp_path / "misnamed.m4a").write_bytes(make_flac(44100, 2, 16, 44100))
+    (tmp_path / "real.m4a").write_bytes(make_alac(16, 44100))
+
+    file_convertor = FileConvertor(str(tmp_path))
+    file_convertor._find_incompatible_audio_files()  # type: ignore[reportPrivateUsage]
+
+    assert [file["old_name"] for file in file_convertor.incompatible_files] == [
+        "misnamed.m4a"
+    ]
+    assert file_convertor.incompatible_files[0]["old_mime_type"] == "audio/flac"
+    assert file_convertor.incompatible_files[0]["new_name"] == "misnamed.alac.m4a"
+
+
+def test_output_profile_converts_files_beyond_it(tmp_path: Path):
+    (tmp_path / "hires.m4a").write_bytes(make_alac(24, 192000))
+    (tmp_path / "cd.m4a").write_bytes(make_alac(16, 44100))
+    (tmp_path / "hires.flac").write_bytes(make_flac(96000, 2, 24, 96000))
+
+    file_convertor = FileConvertor(str(tmp_path))
+    file_convertor.profile = ALAC_24_48
+    file_convertor._find_incompatible_audio_files()  # type: ignore[reportPrivateUsage]
+    conversions = {
+        file["old_name"]: file["new_name"] for file in file_convertor.incompatible_files
+    }
+    assert conversions == {"hires.m4a": "hires.alac.m4a", "hires.flac": "hires.m4a"}
+
+    command = file_convertor._encode_command(  # type: ignore[reportPrivateUsage]
+        "hires.flac", file_convertor.incompatible_files[-1]
+    )
+    # resampled within the 48 kHz family in the encode pass
+    assert command[command.index("-af") + 1] == (
+        "aresample=resampler=soxr:precision=28:osr=48000"
+    )
+    assert command[command.index("-c:a") + 1] == "alac"
+    verification = file_convertor.verification([file_convertor.incompatible_files[-1]])
+    assert verification["exact"] is False
+    assert verification["source_filter"] == command[command.index("-af") + 1]
+    assert verification["tolerance"] == 0
+
+    # a lossy profile converts every lossless track
+    file_convertor.profile = AAC_256
+    file_convertor._find_incompatible_audio_files()  # type: ignore[reportPrivateUsage]
+    assert sorted(file["new_name"] for file in file_convertor.incompatible_files) == [
+        "cd.aac.m4a",
+        "hires.aac.m4a",
+        "hires.m4a",
+    ]
+
+    # AAC outputs may differ from their source by about a frame of samples
+    flac = [
+        f for f in file_convertor.incompatible_files if f["old_name"] == "hires.flac"
+    ]
+    verification = file_convertor.verification(flac)
+    assert verification["exact"] is False
+    assert verification["tolerance"] == LOSSY_SAMPLE_TOLERANCE * 2
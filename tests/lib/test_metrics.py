@@ -0,0 +1,110 @@
+import os
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from src.lib import metrics
+from src.lib.logger import IndentColoredLogger
+from src.lib.metrics import Counter, Gauge, Histogram, Metric, MetricsRegistry
+
+
+def test_counter_render():
+    counter = Counter("files_total", "Files.", ["outcome"])
+    counter.inc(outcome="ok")
+    counter.inc(2, outcome="ok")
+    counter.inc(outcome='bad "one"')
+
+    assert counter.render().splitlines() == [
+        "# HELP files_total Files.",
+        "# TYPE files_total counter",
+        'files_total{outcome="bad \\"one\\""} 1',
+        'files_total{outcome="ok"} 3',
+    ]
+
+    with pytest.raises(ValueError):
+        counter.inc(-1, outcome="ok")
+    with pytest.raises(ValueError):
+        counter.inc(stage="tag")
+
+
+def test_gauge_render():
+    gauge = Gauge("depth", "Depth.")
+    gauge.set(3)
+    gauge.set(1)
+
+    assert gauge.render().splitlines()[1:] == ["# TYPE depth gauge", "depth 1"]
+
+
+def test_histogram_render():
+    histogram = Histogram("latency_seconds", "Latency.", buckets=[1, 0.5])
+    histogram.observe(0.25)
+    histogram.observe(0.75)
+    histogram.observe(2)
+
+    assert histogram.render().splitlines()[1:] == [
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.5"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 3",
+        "latency_seconds_count 3",
+    ]
+
+
+def test_write_textfile(tmp_path: Path):
+    registry = MetricsRegistry()
+    registry.counter("runs_total", "Runs.").inc()
+    path = tmp_path / "apple_music_import.prom"
+    path.write_text("old")
+
+    registry.write_textfile(str(path))
+
+    assert path.read_text() == registry.render()
+    assert "apple_music_import_runs_total 1" in path.read_text()
+    # no temporary files are left behind
+    assert os.listdir(tmp_path) == ["apple_music_import.prom"]
+
+
+def test_serve():
+    registry = MetricsRegistry()
+    registry.counter("runs_total", "Runs.").inc()
+    server = registry.serve(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert response.read().decode("utf-8") == registry.render()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_record_section():
+    logger = IndentColoredLogger(name="test_metrics_logger")
+    logger.handlers = []
+    logger.add_section_listener(metrics.record_section)
+
+    folders = metrics.folders_processed.values.get(("ok",), 0)
+    conversions = metrics.conversions.values.get(("error",), 0)
+    conversion_count = metrics.conversion_seconds.counts.get((), [0])[-1]
+    read = metrics.bytes_read.values.get((), 0)
+    written = metrics.bytes_written.values.get((), 0)
+
+    end_folder = logger.log_section("processing folder", kind="folder", label="a")
+    end_file = logger.log_section("convert file", kind="file", log=False)
+    end_file(bytes_processed=300, bytes_written=100, outcome="error")
+    end_folder()
+
+    assert metrics.folders_processed.values[("ok",)] == folders + 1
+    assert metrics.conversions.values[("error",)] == conversions + 1
+    assert metrics.conversion_seconds.counts[()][-1] == conversion_count + 1
+    assert metrics.bytes_read.values[()] == read + 200
+    assert metrics.bytes_written.values[()] == written + 100
+
+
+def test_metric_subclasses_must_format_samples():
+    class Unformatted(Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Unformatted("unformatted", "never formats its samples")  # type: ignore[abstract]
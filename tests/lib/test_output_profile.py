@@ -0,0 +1,78 @@
+from typing import Optional
+
+import pytest
+
+from src.lib.media_classifier import MediaInfo
+from src.lib.output_profile import (
+    AAC_256,
+    ALAC_24_48,
+    ALAC_AS_SOURCE,
+    audio_filter,
+    encoder_options,
+    keeps_samples,
+    matches_profile,
+    target_sample_rate,
+)
+
+
+def media_info(
+    codec: str = "alac", sample_rate: int = 44100, bit_depth: Optional[int] = 16
+) -> MediaInfo:
+    return {
+        "mime_type": "audio/mp4a-latm",
+        "container": "mp4",
+        "codec": codec,
+        "sample_rate": sample_rate,
+        "bit_depth": bit_depth,
+        "channels": 2,
+        "duration": None,
+    }
+
+
+@pytest.mark.parametrize(
+    "sample_rate,expected",
+    [(44100, None), (48000, None), (88200, 44100), (192000, 48000), (50000, 48000)],
+)
+def test_target_sample_rate_keeps_family(sample_rate: int, expected: Optional[int]):
+    assert target_sample_rate(media_info(sample_rate=sample_rate), ALAC_24_48) == (
+        expected
+    )
+    assert target_sample_rate(media_info(sample_rate=sample_rate), ALAC_AS_SOURCE) is (
+        None
+    )
+
+
+def test_matches_profile():
+    assert matches_profile(media_info(bit_depth=24, sample_rate=48000), ALAC_24_48)
+    assert not matches_profile(media_info(bit_depth=24, sample_rate=96000), ALAC_24_48)
+    assert not matches_profile(media_info(bit_depth=32), ALAC_24_48)
+    assert matches_profile(media_info(bit_depth=24, sample_rate=192000), ALAC_AS_SOURCE)
+
+    # lossless tracks are encoded to a lossy profile, but never the other way
+    assert not matches_profile(media_info(), AAC_256)
+    assert matches_profile(media_info("aac", bit_depth=None), AAC_256)
+    assert matches_profile(media_info("aac", bit_depth=None), ALAC_24_48)
+
+    flac = media_info("flac")
+    flac["mime_type"] = "audio/flac"
+    assert not matches_profile(flac, ALAC_AS_SOURCE)
+
+
+def test_audio_filter_and_encoder_options():
+    hires = media_info(bit_depth=32, sample_rate=176400)
+    assert audio_filter(hires, ALAC_24_48) == (
+        "aresample=resampler=soxr:precision=28:osr=44100"
+        + ":osf=s32p:dither_method=triangular"
+    )
+    assert audio_filter(hires, AAC_256) == (
+        "aresample=resampler=soxr:precision=28:osr=44100"
+    )
+    assert audio_filter(hires, ALAC_AS_SOURCE) is None
+    assert audio_filter(None, ALAC_24_48) is None
+
+    assert encoder_options(ALAC_24_48) == ["-c:a", "alac"]
+    assert encoder_options(AAC_256) == ["-c:a", "aac", "-b:a", "256k"]
+
+    assert keeps_samples(media_info(), ALAC_24_48)
+    assert not keeps_samples(hires, ALAC_24_48)
+    assert not keeps_samples(media_info(), AAC_256)
@@ -0,0 +1,144 @@
+import json
+import os
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from src.folder_classes.bandcamp_archive_folder import BandCampArchiveAlbumFolder
+from src.folder_classes.bandcamp_folder import BandCampAlbumFolder
+from src.folder_classes.soulseek_folder import SoulseekAlbumFolder
+from src.lib.logger import SectionTiming
+from src.lib.planner import ThroughputHistory, plan_folder
+
+FLAC_DATA = b"fLaC" + b"\x00" * 60
+
+
+@pytest.fixture()
+def album_dir(tmp_path: Path) -> Path:
+    album_dir = tmp_path / "album"
+    album_dir.mkdir()
+    (album_dir / "01 One.flac").write_bytes(FLAC_DATA)
+    (album_dir / "02 Two.m4a").write_text("hello")
+    (album_dir / "cover.jpg").write_text("image")
+    return album_dir
+
+
+def file_section(
+    name: str, wall_time: float, read: int, written: int = 0
+) -> SectionTiming:
+    section = SectionTiming(name, "file")
+    section.start = 0.0
+    section.end = wall_time
+    section.bytes_processed = read + written
+    section.bytes_written = written
+    return section
+
+
+def run_timing(*sections: SectionTiming) -> SectionTiming:
+    timing = SectionTiming("run", "run")
+    folder = SectionTiming("processing folder", "folder")
+    folder.children.extend(sections)
+    timing.children.append(folder)
+    return timing
+
+
+def test_plan_folder(album_dir: Path) -> None:
+    before = sorted(os.listdir(album_dir))
+
+    plan = plan_folder(
+        BandCampAlbumFolder(str(album_dir)),
+        ThroughputHistory(str(album_dir / "history.json")),
+        True,
+    )
+
+    assert plan["probe"]["conversions"] == [
+        {
+            "kind": "convert",
+            "source": str(album_dir / "01 One.flac"),
+            "mime_type": "audio/flac",
+            "targets": ["01 One.m4a"],
+            "bytes": len(FLAC_DATA),
+        }
+    ]
+    assert plan["probe"]["compatible_files"] == [("02 Two.m4a", 5)]
+    assert plan["probe"]["cover_decision"] == "use cover.jpg"
+    assert plan["import_count"] == 2
+    assert plan["delete"] is True
+    assert plan["stages"]["file conversions"] == {
+        "count": 1,
+        "bytes": len(FLAC_DATA),
+        "seconds": None,
+    }
+    assert sorted(os.listdir(album_dir)) == before
+
+
+def test_plan_folder_without_cover_image(album_dir: Path) -> None:
+    (album_dir / "cover.jpg").unlink()
+    (album_dir / "front.png").write_text("image")
+
+    plan = plan_folder(
+        SoulseekAlbumFolder(str(album_dir)),
+        ThroughputHistory(str(album_dir / "history.json")),
+        False,
+    )
+
+    assert plan["probe"]["cover_decision"].startswith("prompt to pick from 1 images")
+    assert plan["delete"] is False
+
+
+def test_plan_archive_folder(tmp_path: Path) -> None:
+    archive_path = tmp_path / "album.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("01 One.flac", FLAC_DATA)
+        archive.writestr("cover.jpg", b"\xff\xd8\xff\xe0")
+
+    plan = plan_folder(
+        BandCampArchiveAlbumFolder(str(archive_path)),
+        ThroughputHistory(str(tmp_path / "history.json")),
+        True,
+    )
+
+    assert [c["targets"] for c in plan["probe"]["conversions"]] == [["01 One.m4a"]]
+    assert plan["probe"]["conversions"][0]["bytes"] == len(FLAC_DATA)
+    assert plan["probe"]["cover_decision"] == "use cover.jpg from the archive"
+    assert sorted(os.listdir(tmp_path)) == ["album.zip"]
+
+
+def test_history_update_and_estimate(tmp_path: Path) -> None:
+    history = ThroughputHistory(str(tmp_path / "history.json"))
+    assert history.estimate("file conversions", 2, 1000) is None
+    assert history.estimate("file conversions", 0, 0) == 0.0
+
+    history.update(
+        run_timing(
+            file_section("convert file", 2.0, 1000, written=500),
+            file_section("convert file", 2.0, 1000, written=500),
+            file_section("tag file", 0.5, 0),
+        )
+    )
+
+    assert history.sections["convert file"] == {
+        "bytes_per_second": 500.0,
+        "seconds_per_file": 2.0,
+        "runs": 1,
+    }
+    assert history.estimate("file conversions", 2, 3000) == 6.0
+    assert history.estimate("cover image tagging", 4, 0) == 2.0
+
+    history.update(run_timing(file_section("convert file", 1.0, 1000)))
+
+    assert history.sections["convert file"]["bytes_per_second"] == pytest.approx(650)
+    assert history.sections["convert file"]["runs"] == 2
+
+
+def test_history_save_and_load(tmp_path: Path) -> None:
+    path = tmp_path / "state" / "history.json"
+    history = ThroughputHistory.load(str(path))
+    assert history.sections == {}
+
+    history.update(run_timing(file_section("import file", 1.0, 100)))
+    history.save()
+
+    assert json.loads(path.read_text())["import file"]["runs"] == 1
+    assert ThroughputHistory.load(str(path)).sections == history.sections
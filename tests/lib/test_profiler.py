@@ -0,0 +1,66 @@
+import os
+import pstats
+from pathlib import Path
+
+from src.lib.logger import IndentColoredLogger
+from src.lib.profiler import StageProfiler
+
+
+def run_folder(profiler: StageProfiler, folder_path: str) -> None:
+    """Run a folder with two stages through a logger feeding the profiler.
+
+    Args:
+        profiler (StageProfiler): profiler to feed
+        folder_path (str): path of the folder
+    """
+    logger = IndentColoredLogger(name="test_profiler_logger")
+    logger.handlers = []
+    logger.add_section_start_listener(profiler.on_section_start)
+    logger.add_section_listener(profiler.on_section_end)
+
+    end_folder = logger.log_section(
+        "processing folder", kind="folder", label=folder_path
+    )
+    end_stage = logger.log_section("file conversions", kind="stage")
+    end_file = logger.log_section("convert file", kind="file", log=False)
+    data = [bytes(1000) for _ in range(100)]
+    end_file()
+    end_stage()
+    end_stage = logger.log_section("Apple Music import", kind="stage")
+    end_stage()
+    end_folder()
+    del data
+
+
+def test_profile_each_stage(tmp_path: Path):
+    profiler = StageProfiler(str(tmp_path))
+    run_folder(profiler, "/music/Some Album")
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "001-some-album-file-conversions.prof",
+        "001-some-album-file-conversions.txt",
+        "002-some-album-apple-music-import.prof",
+        "002-some-album-apple-music-import.txt",
+    ]
+    # profiles can be loaded by pstats
+    pstats.Stats(str(tmp_path / "001-some-album-file-conversions.prof"))
+
+    report = (tmp_path / "001-some-album-file-conversions.txt").read_text()
+    assert report.startswith("section: file conversions\nfolder: /music/Some Album\n")
+    assert "peak traced memory" not in report
+
+
+def test_profile_chosen_folder_with_memory(tmp_path: Path):
+    profiler = StageProfiler(str(tmp_path), trace_memory=True, folder_pattern="*/b")
+    profiler.start()
+    try:
+        run_folder(profiler, "/music/a")
+        run_folder(profiler, "/music/b")
+    finally:
+        profiler.stop()
+
+    assert sorted(os.listdir(tmp_path)) == ["001-b.prof", "001-b.txt"]
+    report = (tmp_path / "001-b.txt").read_text()
+    assert report.startswith("section: processing folder\n")
+    assert "peak traced memory" in report
+    assert "allocation sites still in use" in report
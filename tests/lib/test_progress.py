@@ -0,0 +1,128 @@
+from typing import Dict, List, Tuple
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.lib.logger import IndentColoredLogger
+from src.lib.planner import FolderPlan, ThroughputHistory
+from src.lib.progress import ProgressTracker, format_duration
+
+
+def plan(path: str, stages: Dict[str, Tuple[int, int]]) -> FolderPlan:
+    return {
+        "path": path,
+        "folder_type": "Bandcamp",
+        "probe": {"conversions": [], "compatible_files": [], "cover_decision": ""},
+        "import_count": 0,
+        "delete": False,
+        "stages": {
+            stage: {"count": count, "bytes": size, "seconds": None}
+            for stage, (count, size) in stages.items()
+        },
+    }
+
+
+@pytest.fixture()
+def tracker_logger():
+    logger = IndentColoredLogger(name="test_progress_logger")
+    logger.handlers = []
+    with patch("src.lib.progress.logger", logger):
+        yield logger
+
+
+def start_tracker(plans: List[FolderPlan]) -> ProgressTracker:
+    folders = [MagicMock(path=folder_plan["path"]) for folder_plan in plans]
+    tracker = ProgressTracker(ThroughputHistory("unused.json"), interval=3600)
+    with patch("src.lib.progress.plan_folder", side_effect=plans):
+        tracker.start(folders)  # type: ignore[arg-type]
+    return tracker
+
+
+def run_files(logger: IndentColoredLogger, name: str, count: int, size: int = 0):
+    for _ in range(count):
+        end_file = logger.log_section(name, kind="file", log=False)
+        end_file(bytes_processed=size + 100, bytes_written=100)
+
+
+def test_progress_counts_files_and_corrects_totals(
+    tracker_logger: IndentColoredLogger,
+):
+    tracker = start_tracker(
+        [
+            plan(
+                "/music/a",
+                {
+                    "file conversions": (2, 4_000_000),
+                    "cover image tagging": (3, 0),
+                    "Apple Music import": (3, 0),
+                },
+            ),
+            plan(
+                "/music/b",
+                {
+                    "file conversions": (0, 0),
+                    "cover image tagging": (1, 0),
+                    "Apple Music import": (1, 0),
+                },
+            ),
+        ]
+    )
+
+    end_folder = tracker_logger.log_section("folder", kind="folder", label="/music/a")
+    run_files(tracker_logger, "convert file", 2, 2_000_000)
+    lines = tracker.status()
+    assert lines[0].startswith("[progress] 0/2 folders, ")
+    assert ", converting " in lines[0] and "tracks/s, ETA " in lines[0]
+    assert lines[1:] == [
+        "  converting: 2/2 files, 4/4 MB",
+        "  tagging: 0/4 files",
+        "  importing: 0/4 files",
+    ]
+
+    # the folder had a track more than planned
+    run_files(tracker_logger, "tag file", 4)
+    run_files(tracker_logger, "import file", 4)
+    end_folder()
+    tracker.stop()
+
+    assert tracker.status()[1:] == [
+        "  converting: 2/2 files, 4/4 MB",
+        "  tagging: 4/5 files",
+        "  importing: 4/5 files",
+    ]
+    assert tracker.status()[0].startswith("[progress] 1/2 folders, ")
+
+
+def test_progress_estimates_time_left():
+    history = ThroughputHistory("unused.json")
+    tracker = ProgressTracker(history, interval=60)
+
+    # measured during the run, by size where every file's size is known
+    assert tracker.estimate_left("file conversions", 4, 10_000_000, (2.0, 5e6)) == 2.0
+    assert tracker.estimate_left("Apple Music import", 4, 10_000_000, (2.0, 5e6)) == 2.0
+
+    # measured in previous runs
+    history.sections["tag file"] = {
+        "bytes_per_second": None,
+        "seconds_per_file": 0.5,
+        "runs": 3,
+    }
+    assert tracker.estimate_left("cover image tagging", 4, 0, None) == 2.0
+
+    # never measured
+    assert tracker.estimate_left("file conversions", 2, 5_000_000, None) == 1.1
+    assert tracker.estimate_left("file conversions", 0, 0, None) == 0.0
+
+
+def test_progress_stage_rate_counts_busy_time():
+    # two files overlap, and the stage was idle between the second and third
+    files = [(2.0, 0.0, "a", 10), (3.0, 1.0, "a", 20), (10.0, 8.0, "a", 30)]
+
+    assert ProgressTracker.stage_rate(files) == (0.6, 12.0)
+    assert ProgressTracker.stage_rate([]) is None
+
+
+def test_format_duration():
+    assert format_duration(42.4) == "42s"
+    assert format_duration(307) == "5m 07s"
+    assert format_duration(3720) == "1h 02m"
@@ -0,0 +1,87 @@
+import os
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from src.lib.abstract_album_folder import AbstractAlbumFolder
+from src.lib.planner import ThroughputHistory
+from src.lib.scheduler import schedule_folders
+
+
+class FolderA(AbstractAlbumFolder):
+    @property
+    def folder_type(self) -> str:
+        return "a"
+
+    def delete_folder(self) -> None:
+        pass
+
+
+class FolderB(FolderA):
+    @property
+    def folder_type(self) -> str:
+        return "b"
+
+
+def make_album(root: Path, name: str, track_sizes: List[int], mtime: int) -> str:
+    album_dir = root / name
+    album_dir.mkdir()
+    for index, size in enumerate(track_sizes):
+        (album_dir / f"{index:02d}.flac").write_bytes(b"fLaC" + b"\x00" * size)
+    os.utime(album_dir, (mtime, mtime))
+    return str(album_dir)
+
+
+@pytest.fixture()
+def folders(tmp_path: Path) -> List[AbstractAlbumFolder]:
+    return [
+        FolderA(make_album(tmp_path, "box set", [10_000_000] * 3, 3000)),
+        FolderB(make_album(tmp_path, "single", [1_000], 2000)),
+        FolderA(make_album(tmp_path, "ep", [1_000_000] * 2, 1000)),
+    ]
+
+
+def names(folders: List[AbstractAlbumFolder]) -> List[str]:
+    return [os.path.basename(folder.path) for folder in folders]
+
+
+def test_schedule_discovery(folders: List[AbstractAlbumFolder], tmp_path: Path):
+    history = ThroughputHistory(str(tmp_path / "history.json"))
+    ordered = schedule_folders(folders, "discovery", history, {})
+    assert names(ordered) == ["box set", "single", "ep"]
+
+
+def test_schedule_shortest_job_first(
+    folders: List[AbstractAlbumFolder], tmp_path: Path
+):
+    history = ThroughputHistory(str(tmp_path / "history.json"))
+    ordered = schedule_folders(folders, "shortest-job-first", history, {})
+    assert names(ordered) == ["single", "ep", "box set"]
+
+
+def test_schedule_oldest_first(folders: List[AbstractAlbumFolder], tmp_path: Path):
+    history = ThroughputHistory(str(tmp_path / "history.json"))
+    ordered = schedule_folders(folders, "oldest-first", history, {})
+    assert names(ordered) == ["ep", "single", "box set"]
+
+
+def test_schedule_priority(folders: List[AbstractAlbumFolder], tmp_path: Path):
+    history = ThroughputHistory(str(tmp_path / "history.json"))
+    ordered = schedule_folders(folders, "priority", history, {FolderA: 1})
+    assert names(ordered) == ["ep", "box set", "single"]
+
+
+def test_schedule_unprobeable_folders_last(
+    folders: List[AbstractAlbumFolder], tmp_path: Path
+):
+    history = ThroughputHistory(str(tmp_path / "history.json"))
+    folders.append(FolderA(str(tmp_path / "missing")))
+    ordered = schedule_folders(folders, "shortest-job-first", history, {})
+    assert names(ordered)[-1] == "missing"
+
+
+def test_schedule_unknown_policy(folders: List[AbstractAlbumFolder], tmp_path: Path):
+    history = ThroughputHistory(str(tmp_path / "history.json"))
+    with pytest.raises(ValueError):
+        schedule_folders(folders, "largest-first", history, {})  # type: ignore[arg-type]
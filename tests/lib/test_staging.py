@@ -0,0 +1,65 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+from src.lib.staging import copy_file, folder_state, stage_folder, write_back
+
+
+def make_folder(path: Path) -> Path:
+    (path / "disc 1").mkdir(parents=True)
+    (path / "cover.jpg").write_bytes(b"image")
+    (path / "disc 1" / "01.flac").write_bytes(b"fLaC" + b"\x00" * 100)
+    os.utime(path / "cover.jpg", ns=(1_000_000_000, 2_000_000_000))
+    return path
+
+
+def test_copy_file_keeps_modification_time(tmp_path: Path):
+    source = tmp_path / "source"
+    source.write_bytes(b"data" * 1000)
+    os.utime(source, ns=(1_000_000_000, 2_000_000_000))
+
+    copy_file(str(source), str(tmp_path / "target"))
+
+    assert (tmp_path / "target").read_bytes() == b"data" * 1000
+    assert os.stat(tmp_path / "target").st_mtime_ns == 2_000_000_000
+
+
+def test_copy_file_falls_back_to_plain_copy(tmp_path: Path):
+    source = tmp_path / "source"
+    source.write_bytes(b"data")
+    (tmp_path / "target").write_bytes(b"old data")
+
+    with (
+        patch("src.lib.staging._reflink", return_value=False),
+        patch("src.lib.staging._copy_file_range", return_value=False),
+    ):
+        method = copy_file(str(source), str(tmp_path / "target"))
+
+    assert method == "copy"
+    assert (tmp_path / "target").read_bytes() == b"data"
+
+
+def test_stage_folder(tmp_path: Path):
+    folder = make_folder(tmp_path / "album")
+
+    staged_path, state = stage_folder(str(folder), str(tmp_path / "scratch"), 2)
+
+    assert os.path.dirname(staged_path) == str(tmp_path / "scratch")
+    assert state == folder_state(str(folder))
+    assert (
+        Path(staged_path, "disc 1", "01.flac").read_bytes()
+        == (folder / "disc 1" / "01.flac").read_bytes()
+    )
+
+
+def test_write_back_copies_changed_files(tmp_path: Path):
+    folder = make_folder(tmp_path / "album")
+    staged_path, state = stage_folder(str(folder), str(tmp_path / "scratch"), 2)
+
+    Path(staged_path, "disc 1", "01.m4a").write_bytes(b"converted")
+    Path(staged_path, "cover.jpg").write_bytes(b"tagged image")
+
+    assert write_back(staged_path, str(folder), state, 2) == 2
+    assert (folder / "disc 1" / "01.m4a").read_bytes() == b"converted"
+    assert (folder / "cover.jpg").read_bytes() == b"tagged image"
+    assert write_back(staged_path, str(folder), folder_state(staged_path), 2) == 0
@@ -0,0 +1,57 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.lib.trash import move_to_trash
+
+
+@pytest.fixture()
+def trash(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr("src.lib.trash.sys.platform", "linux")
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    return tmp_path / "data" / "Trash"
+
+
+def test_move_to_trash_renames_on_same_filesystem(tmp_path: Path, trash: Path):
+    for index in range(2):
+        album = tmp_path / "Band - Album"
+        album.mkdir()
+        (album / "01 One.flac").write_text(f"take {index}")
+
+        with patch("src.lib.trash.send2trash") as mock_send2trash:
+            move_to_trash(str(album))
+
+        mock_send2trash.assert_not_called()
+        assert not album.exists()
+
+    # a second folder of the same name doesn't replace the first
+    assert sorted(os.listdir(trash / "files")) == ["Band - Album", "Band - Album 1"]
+    assert (trash / "files" / "Band - Album 1" / "01 One.flac").read_text() == "take 1"
+    info = (trash / "info" / "Band - Album.trashinfo").read_text()
+    assert "Path=" + str(tmp_path).replace(" ", "%20") in info
+    assert "DeletionDate=" in info
+
+
+def test_move_to_trash_falls_back_to_send2trash(tmp_path: Path, trash: Path):
+    album = tmp_path / "album"
+    album.mkdir()
+
+    with (
+        patch("src.lib.trash.os.rename", side_effect=OSError(18, "cross-device")),
+        patch("src.lib.trash.send2trash") as mock_send2trash,
+    ):
+        move_to_trash(str(album))
+
+    mock_send2trash.assert_called_once_with(str(album))
+    assert os.listdir(trash / "info") == []
+
+    # without a trash on the same filesystem
+    with (
+        patch("src.lib.trash.trash_dir", return_value=None),
+        patch("src.lib.trash.send2trash") as mock_send2trash,
+    ):
+        move_to_trash(str(album))
+
+    mock_send2trash.assert_called_once_with(str(album))
@@ -0,0 +1,141 @@
+import io
+from typing import Any, Dict, List
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.lib.verifier import Verification, verify_conversion
+
+
+class FakeDecoder(object):
+    """Stand in for an ffmpeg process that decodes a file to PCM on stdout."""
+
+    def __init__(self, command: List[str], pcm: bytes, **kwargs: Any) -> None:
+        # a file that fails to decode exits with an error, having output nothing
+        self.returncode = 1 if pcm == b"corrupt" else 0
+        self.command = command
+        self.stdout = io.BytesIO(pcm if self.returncode == 0 else b"")
+        self.stdin = MagicMock()
+        self.stderr = kwargs["stderr"]
+        self.piped = b""
+        self.stdin.write.side_effect = self.write
+
+    def write(self, data: bytes) -> int:
+        self.piped += data
+        return len(data)
+
+    def kill(self) -> None:
+        pass
+
+    def wait(self) -> int:
+        if self.returncode != 0:
+            self.stderr.write(b"Invalid data found when processing input")
+        return self.returncode
+
+
+def run_verification(
+    decoded: Dict[str, bytes], verification: Verification
+) -> List[FakeDecoder]:
+    decoders: List[FakeDecoder] = []
+
+    def popen(command: List[str], **kwargs: Any) -> FakeDecoder:
+        path = command[command.index("-i") + 1]
+        decoders.append(FakeDecoder(command, decoded[path], **kwargs))
+        return decoders[-1]
+
+    # compare in small chunks, so chunks span the tracks of a split
+    with (
+        patch("src.lib.verifier.subprocess.Popen", side_effect=popen),
+        patch("src.lib.verifier.VERIFY_CHUNK_SIZE", 4),
+    ):
+        verify_conversion(verification)
+    return decoders
+
+
+def verification(
+    outputs: List[str], exact: bool = True, tolerance: int = 0
+) -> Verification:
+    return {
+        "source": "/music/image.flac",
+        "open_source": None,
+        "outputs": outputs,
+        "exact": exact,
+        "source_filter": None,
+        "tolerance": tolerance,
+    }
+
+
+def test_verify_split_tracks_against_image():
+    decoded = {
+        "/music/image.flac": bytes(range(30)),
+        "/music/01.m4a": bytes(range(10)),
+        "/music/02.m4a": bytes(range(10, 30)),
+    }
+    decoders = run_verification(
+        decoded, verification(["/music/01.m4a", "/music/02.m4a"])
+    )
+
+    assert [d.command[d.command.index("-i") + 1] for d in decoders] == [
+        "/music/image.flac",
+        "/music/01.m4a",
+        "/music/02.m4a",
+    ]
+    assert all(d.command[-3:] == ["-f", "s24le", "pipe:1"] for d in decoders)
+
+
+def test_verify_truncated_output():
+    decoded = {"/music/image.flac": bytes(30), "/music/01.m4a": bytes(21)}
+
+    with pytest.raises(RuntimeError, match="has 7 samples, its source has 10"):
+        run_verification(decoded, verification(["/music/01.m4a"]))
+
+
+def test_verify_different_samples():
+    decoded = {
+        "/music/image.flac": bytes(30),
+        "/music/01.m4a": bytes(19) + b"\x01" + bytes(10),
+    }
+
+    with pytest.raises(RuntimeError, match="differs from its source from sample 6"):
+        run_verification(decoded, verification(["/music/01.m4a"]))
+
+    # outputs of lossy sources only need as many samples
+    run_verification(decoded, verification(["/music/01.m4a"], exact=False))
+
+
+def test_verify_lossy_output_within_tolerance():
+    # an AAC output holds its encoder delay and a padded last frame
+    decoded = {"/music/image.flac": bytes(30), "/music/01.m4a": bytes(42)}
+
+    run_verification(decoded, verification(["/music/01.m4a"], False, tolerance=4))
+    with pytest.raises(RuntimeError, match="has 14 samples, its source has 10"):
+        run_verification(decoded, verification(["/music/01.m4a"], False, tolerance=3))
+
+    # lossless outputs must hold exactly as many samples
+    with pytest.raises(RuntimeError, match="has 14 samples, its source has 10"):
+        run_verification(decoded, verification(["/music/01.m4a"], tolerance=4))
+
+
+def test_verify_decode_failure():
+    decoded = {"/music/image.flac": bytes(30), "/music/01.m4a": b"corrupt"}
+
+    with pytest.raises(RuntimeError, match="Invalid data found"):
+        run_verification(decoded, verification(["/music/01.m4a"]))
+
+
+def test_verify_piped_source():
+    member = io.BytesIO(b"flac member")
+    decoded = {"pipe:0": bytes(9), "/music/01.m4a": bytes(9)}
+    piped: Verification = {
+        "source": "pipe:0",
+        "open_source": lambda: member,
+        "outputs": ["/music/01.m4a"],
+        "exact": True,
+        "source_filter": None,
+        "tolerance": 0,
+    }
+
+    decoders = run_verification(decoded, piped)
+
+    assert decoders[0].piped == b"flac member"
+    assert member.closed
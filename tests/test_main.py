@@ -0,0 +1,68 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from src.folder_classes.soulseek_folder import SoulseekAlbumFolder
+from src.main import app_version, discover_folders, parse_args
+
+
+def test_parse_args():
+    args = parse_args([])
+    assert not args.plan
+    assert not args.worker
+    assert not args.profile
+    assert args.profile_folder is None
+    assert not args.trace_memory
+
+    args = parse_args(["--profile", "--trace-memory", "--profile-dir", "out"])
+    assert args.profile
+    assert args.trace_memory
+    assert args.profile_dir == "out"
+
+    args = parse_args(["--profile-folder", "*/album"])
+    assert args.profile_folder == "*/album"
+
+    assert parse_args(["--plan"]).plan
+    assert parse_args(["--resume"]).resume
+    assert parse_args(["--worker"]).worker
+
+
+def test_app_version():
+    if sys.version_info >= (3, 11):
+        import tomllib
+    else:
+        import tomli as tomllib
+
+    with open(Path(__file__).parent.parent / "pyproject.toml", "rb") as file:
+        version = tomllib.load(file)["project"]["version"]
+
+    # the app is run from its project without being installed
+    assert app_version() == version
+
+
+def test_heavy_dependencies_are_imported_lazily():
+    # check in a fresh interpreter, since other tests import everything
+    code = (
+        "import sys, src.main; "
+        + "print(sorted(m for m in ('PIL', 'requests', 'mutagen', "
+        + "'http.server', 'cProfile', 'sqlite3', 'hashlib', 'src.lib.journal', "
+        + "'src.lib.metrics') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True
+    )
+    assert result.stdout.decode("utf-8").strip() == "[]"
+
+
+def test_discover_folders_skips_disc_sub_folders(tmp_path: Path):
+    (tmp_path / "user" / "album" / "CD1").mkdir(parents=True)
+    (tmp_path / "user" / "single").mkdir()
+
+    folders = discover_folders(
+        {SoulseekAlbumFolder: [str(tmp_path / "*" / "*"), str(tmp_path / "*/*/*")]}
+    )
+
+    assert sorted(folder.path for folder in folders) == [
+        str(tmp_path / "user" / "album"),
+        str(tmp_path / "user" / "single"),
+    ]